@@ -0,0 +1,126 @@
+# benchmarks/admission_bench.py
+"""
+Mede a admissão pelo cabeçalho (nutrisnap_ai1/admission.py) sobre arquivos válidos e problemáticos
+gerados em um diretório temporário, e compara com o custo de descobrir o mesmo problema só na
+decodificação com o Pillow (Image.open + load). Confere também o motivo de recusa de cada arquivo.
+
+Uso: python benchmarks/admission_bench.py [--repeat 2000]
+"""
+import argparse
+import json
+import os
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import warnings
+import zlib
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from PIL import Image
+
+from nutrisnap_ai1 import admission, logs
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+def make_files(directory: str) -> dict[str, tuple[str, str | None]]:
+    """{nome: (caminho, motivo de recusa esperado ou None)}."""
+    files = {}
+
+    def _add(name: str, expected: str | None, content: bytes | None = None) -> str:
+        path = os.path.join(directory, name)
+        if content is not None:
+            with open(path, "wb") as f:
+                f.write(content)
+        files[name] = (path, expected)
+        return path
+
+    photo = Image.effect_noise((1024, 768), 64).convert("RGB")
+    photo.save(_add("foto.jpg", None), format="JPEG", quality=85)
+    photo.save(_add("foto_progressiva.jpg", None), format="JPEG", quality=85, progressive=True)
+    photo.save(_add("foto.png", None), format="PNG")
+    photo.save(_add("foto.webp", None), format="WEBP", quality=80)
+    photo.save(_add("foto_sem_perdas.webp", None), format="WEBP", lossless=True)
+    photo.convert("P").save(_add("foto.gif", None), format="GIF")
+
+    frames = [Image.new("RGB", (64, 64), (index * 40, 80, 120)) for index in range(5)]
+    frames[0].save(_add("animado.gif", "animated"), format="GIF", save_all=True, append_images=frames[1:], duration=80)
+    frames[0].save(_add("animado.png", "animated"), format="PNG", save_all=True, append_images=frames[1:], duration=80)
+    frames[0].save(_add("animado.webp", "animated"), format="WEBP", save_all=True, append_images=frames[1:], duration=80)
+    photo.save(_add("foto.tiff", "format_not_allowed"), format="TIFF")
+    photo.save(_add("foto.bmp", "format_not_allowed"), format="BMP")
+
+    with open(files["foto.jpg"][0], "rb") as f:
+        jpeg = f.read()
+    _add("truncado.jpg", "corrupt_header", jpeg[:20])
+    _add("texto.jpg", "unknown_format", b"isto nao e uma imagem\n" * 40)
+    _add("vazio.jpg", "empty", b"")
+    # Bomba: IHDR de 50.000 x 50.000 com um IDAT minúsculo
+    idat = zlib.compress(b"\x00" * 4096, 9)
+    _add("bomba.png", "decompression_bomb", b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 50000, 50000, 8, 2, 0, 0, 0))
+         + _png_chunk(b"IDAT", idat) + _png_chunk(b"IEND", b""))
+    # Cabeçalho que promete 6.000 x 6.000 (abaixo dos limites absolutos) em poucos bytes
+    _add("bomba_razao.png", "decompression_bomb", b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 6000, 6000, 8, 2, 0, 0, 0))
+         + _png_chunk(b"IDAT", idat) + _png_chunk(b"IEND", b""))
+    # Panorama de 20.000 x 100 com dados plausíveis: só o lado máximo é excedido
+    _add("gigante.png", "dimensions_too_large", b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 20000, 100, 8, 2, 0, 0, 0))
+         + _png_chunk(b"IDAT", zlib.compress(os.urandom(64 * 1024))) + _png_chunk(b"IEND", b""))
+    huge = _add("enorme.jpg", "too_large")
+    with open(huge, "wb") as f: # Arquivo esparso: tamanho acima do limite sem ocupar o disco
+        f.write(jpeg[:1024])
+        f.truncate(admission.default_limits().max_bytes + 1)
+    _add("inexistente.jpg", "not_found")
+    return files
+
+def decode_cost(path: str) -> tuple[float, str]:
+    """Tempo até o Pillow decodificar (ou falhar) o arquivo inteiro, como aconteceria sem a admissão."""
+    started = time.perf_counter()
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(path) as image:
+                image.load()
+        outcome = "ok"
+    except Exception as e:
+        outcome = type(e).__name__
+    return time.perf_counter() - started, outcome
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da admissão de imagens pelo cabeçalho.")
+    parser.add_argument("--repeat", type=int, default=2000, help="Verificações por arquivo.")
+    args = parser.parse_args()
+
+    rows, mismatches = {}, []
+    with tempfile.TemporaryDirectory() as tmp, logs.suppressed():
+        files = make_files(tmp)
+        for name, (path, expected) in files.items():
+            rejection = admission.check(path)
+            reason = rejection.reason if rejection else None
+            if reason != expected:
+                mismatches.append({"file": name, "expected": expected, "got": reason})
+            samples = []
+            for _ in range(args.repeat):
+                started = time.perf_counter_ns()
+                admission.check(path)
+                samples.append(time.perf_counter_ns() - started)
+            decode_s, decode_outcome = decode_cost(path) if os.path.exists(path) else (0.0, "FileNotFoundError")
+            rows[name] = {"bytes": os.path.getsize(path) if os.path.exists(path) else None, "rejection": reason,
+                          "admission_us_p50": round(statistics.median(samples) / 1000, 1),
+                          "pillow_decode_ms": round(decode_s * 1000, 2), "pillow_outcome": decode_outcome}
+
+    print(json.dumps({
+        "config": vars(args),
+        "files": rows,
+        "counters": admission.stats(),
+        "reason_mismatches": mismatches,
+    }, indent=2, ensure_ascii=False))
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
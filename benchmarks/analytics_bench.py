@@ -0,0 +1,96 @@
+# benchmarks/analytics_bench.py
+"""
+Compara o relatório "calorias por item" feito lendo todos os data/results/*_analysis.json (glob + json.load)
+com o mesmo relatório sobre o armazenamento colunar (nutrisnap_ai1/analytics.py), usando resultados
+sintéticos em um diretório temporário. Mede também a ingestão inicial e a incremental.
+
+Uso: python benchmarks/analytics_bench.py [--results 20000] [--items 5] [--distinct-items 300]
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from nutrisnap_ai1 import analytics, logs
+
+CONFIDENCES = ("Alto", "Médio", "Baixo")
+
+def write_results(directory: str, count: int, items_per_result: int, distinct_items: int, seed: int, start: int = 0):
+    rng = random.Random(seed)
+    base_time = datetime(2024, 1, 1)
+    for index in range(start, start + count):
+        items = [{"item_name": f"Alimento {rng.randrange(distinct_items)}", "estimated_calories": rng.randrange(20, 900),
+                  "confidence": rng.choice(CONFIDENCES), "notes": ""} for _ in range(items_per_result)]
+        record = {"image_file": f"prato_{index}.jpg",
+                  "analysis_timestamp": (base_time + timedelta(minutes=7 * index)).isoformat(),
+                  "status": "sucesso",
+                  "data": {"total_calories": sum(item["estimated_calories"] for item in items), "identified_items": items}}
+        with open(os.path.join(directory, f"prato_{index}_analysis.json"), "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+
+def report_from_json_files(directory: str) -> dict:
+    """Forma atual: abre e interpreta todos os arquivos para agregar por item."""
+    per_item: dict[str, list[int]] = {}
+    for path in glob.glob(os.path.join(directory, "*_analysis.json")):
+        with open(path, encoding="utf-8") as f:
+            record = json.load(f)
+        for item in record["data"]["identified_items"]:
+            per_item.setdefault(analytics.normalize_item_name(item["item_name"]), []).append(item["estimated_calories"])
+    return {name: (len(values), statistics.median(values)) for name, values in per_item.items()}
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, round(time.perf_counter() - started, 4)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do armazenamento colunar de relatórios.")
+    parser.add_argument("--results", type=int, default=20000, help="Arquivos de resultado sintéticos.")
+    parser.add_argument("--items", type=int, default=5, help="Itens por resultado.")
+    parser.add_argument("--distinct-items", dest="distinct_items", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, logs.suppressed():
+        results_dir, store_dir = os.path.join(tmp, "results"), os.path.join(tmp, "analytics")
+        os.makedirs(results_dir)
+        write_results(results_dir, args.results, args.items, args.distinct_items, args.seed)
+
+        json_report, json_s = timed(report_from_json_files, results_dir)
+        store = analytics.AnalyticsStore(store_dir)
+        _, ingest_s = timed(store.ingest, results_dir)
+        increment = max(1, args.results // 100)
+        write_results(results_dir, increment, args.items, args.distinct_items, args.seed + 1, start=args.results)
+        added, incremental_s = timed(store.ingest, results_dir)
+
+        reopened = analytics.AnalyticsStore(store_dir) # Leitura a frio: só abre os memmaps
+        by_item, by_item_s = timed(reopened.by_item)
+        _, percentiles_s = timed(reopened.calorie_percentiles)
+        _, buckets_s = timed(reopened.time_buckets, "day")
+        _, confidence_s = timed(reopened.confidence_distribution)
+
+    mismatches = sum(1 for row in by_item if row["item"] in json_report and row["count"] < json_report[row["item"]][0])
+    print(json.dumps({
+        "config": vars(args),
+        "rows": reopened.rows,
+        "json_glob_report_s": json_s,
+        "initial_ingest_s": ingest_s,
+        "incremental_ingest": {"new_results": increment, "rows_added": added, "seconds": incremental_s},
+        "columnar_query_s": {"by_item": by_item_s, "calorie_percentiles": percentiles_s,
+                             "time_buckets_day": buckets_s, "confidence_distribution": confidence_s},
+        "speedup_by_item": round(json_s / by_item_s, 1) if by_item_s else None,
+        "count_mismatches": mismatches,
+    }, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
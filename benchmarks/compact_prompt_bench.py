@@ -0,0 +1,178 @@
+# benchmarks/compact_prompt_bench.py
+"""
+Compara o prompt completo (config.OPTIMIZED_PROMPT, o modelo estima as calorias) com o modo compacto
+(config.COMPACT_PROMPT, só itens e gramas + tabela nutricional local) em tokens e latência, offline.
+
+Os mesmos pratos sintéticos (alimentos da tabela, com apelidos variados) passam pelo AnalyzerSession
+nos dois modos, com um backend simulado cuja latência segue o modelo usual de LLMs:
+    latência = ttft + tokens de entrada / prefill_tps + tokens de saída / decode_tps
+(tokens estimados em ~4 caracteres, como em ratelimit.estimate_input_tokens). Também mede o custo
+local do parsing (+ consultas à tabela no modo compacto) e as estatísticas por consulta da tabela.
+
+Uso: python benchmarks/compact_prompt_bench.py [--images 40] [--ttft 0.35] [--decode-tps 150] [--time-scale 1.0]
+"""
+import argparse
+import asyncio
+import csv
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from PIL import Image
+
+from nutrisnap_ai1 import analysis, backends, config, logs, metrics, nutrition, ratelimit
+
+CONFIDENCES = ("Alto", "Alto", "Médio", "Baixo")
+DESCRIPTORS = (" caseiro", " com ervas", " (porção média)", " temperado", " bem passado")
+
+def load_foods(table_path: str) -> list[tuple[list[str], float]]:
+    """(nomes aceitos: nome + apelidos, kcal/100 g) de cada alimento do CSV da tabela."""
+    foods = []
+    with open(table_path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            names = [row["name"], *[alias for alias in (row.get("aliases") or "").split("|") if alias]]
+            foods.append((names, float(row["kcal_100g"])))
+    return foods
+
+def make_dishes(foods, count: int, seed: int) -> list[list[tuple[str, int, float]]]:
+    """Pratos com 3 a 6 itens: (nome como o modelo escreveria, gramas, kcal/100 g); às vezes com um complemento."""
+    rng = random.Random(seed)
+    dishes = []
+    for _ in range(count):
+        dish = []
+        for names, kcal in rng.sample(foods, rng.randint(3, 6)):
+            name = rng.choice(names)
+            if rng.random() < 0.25: # Descrições livres exercitam as buscas por tokens e trigramas
+                name += rng.choice(DESCRIPTORS)
+            dish.append((name[:1].upper() + name[1:], rng.choice(range(30, 260, 10)), kcal))
+        dishes.append(dish)
+    return dishes
+
+def full_text(dish, rng: random.Random) -> str:
+    """Resposta no formato do OPTIMIZED_PROMPT: calorias estimadas pelo modelo (com a variação típica)."""
+    items = [{"item_name": name, "estimated_calories": int(round(grams * kcal / 100 * rng.uniform(0.8, 1.25))),
+              "confidence": rng.choice(CONFIDENCES),
+              "notes": f"Porção de aproximadamente {grams} g; estimativa baseada no volume visível e no preparo aparente."}
+             for name, grams, kcal in dish]
+    return json.dumps({
+        "total_calories": sum(item["estimated_calories"] for item in items),
+        "identified_items": items,
+        "analysis_summary_notes": "Imagem nítida; porções estimadas visualmente a partir do tamanho do prato. "
+                                  "Possível presença de óleo não visível nos itens preparados.",
+    }, ensure_ascii=False)
+
+def compact_text(dish) -> str:
+    return json.dumps({"items": [{"name": name, "grams": grams} for name, grams, _ in dish]}, ensure_ascii=False)
+
+class SimulatedModelBackend(backends.Backend):
+    """Responde o prato associado a cada imagem no formato pedido, com latência proporcional aos tokens."""
+    name = "simulado"
+
+    def __init__(self, dishes: dict[str, list], args):
+        self.dishes = dishes
+        self.args = args
+        self._rng = random.Random(args.seed)
+        self.calls: dict[str, list[dict]] = {"full": [], "compact": []}
+
+    def _respond(self, request: backends.GenerationRequest) -> tuple[str, float]:
+        dish = self.dishes[request.image_path]
+        text = compact_text(dish) if request.compact else full_text(dish, self._rng)
+        input_tokens = ratelimit.estimate_input_tokens(request.prompt)
+        output_tokens = len(text) // 4
+        latency = self.args.ttft + input_tokens / self.args.prefill_tps + output_tokens / self.args.decode_tps
+        self.calls["compact" if request.compact else "full"].append(
+            {"input_tokens": input_tokens, "output_tokens": output_tokens, "modeled_latency_s": latency})
+        return text, latency
+
+    def generate(self, request: backends.GenerationRequest) -> backends.TextResponse:
+        text, latency = self._respond(request)
+        time.sleep(latency * self.args.time_scale)
+        return backends.TextResponse(text)
+
+    async def generate_async(self, request: backends.GenerationRequest) -> backends.TextResponse:
+        text, latency = self._respond(request)
+        await asyncio.sleep(latency * self.args.time_scale)
+        return backends.TextResponse(text)
+
+def _quantiles(values: list[float], digits: int = 4) -> dict:
+    ordered = sorted(values)
+    return {"p50": round(statistics.median(ordered), digits),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], digits),
+            "mean": round(statistics.fmean(ordered), digits)}
+
+async def run_mode(backend: SimulatedModelBackend, image_paths: list[str], compact: bool) -> dict:
+    session = analysis.AnalyzerSession(api_key="benchmark-offline", backend=backend, limiter=False,
+                                       preprocess_images=False, near_duplicates=False, compact=compact)
+
+    async def _timed(path: str) -> tuple[dict, float]:
+        started = time.perf_counter()
+        result = await session.analyze_async(path, use_cache=False)
+        return result, time.perf_counter() - started
+
+    outcomes = await asyncio.gather(*(_timed(path) for path in image_paths))
+    calls = backend.calls["compact" if compact else "full"]
+    results = [result for result, _ in outcomes]
+    return {
+        "prompt_chars": len(session.prompt),
+        "input_tokens_per_request": calls[0]["input_tokens"],
+        "output_tokens": _quantiles([call["output_tokens"] for call in calls], 1),
+        "modeled_latency_s": _quantiles([call["modeled_latency_s"] for call in calls]),
+        "end_to_end_s": _quantiles([elapsed for _, elapsed in outcomes]),
+        "parse_ms": _quantiles([result["timings"]["parse_response"] for result in results if "timings" in result], 3),
+        "successes": sum(1 for result in results if result.get("status") == "sucesso"),
+        "items_without_calories": sum(1 for result in results for item in (result.get("data") or {}).get("identified_items", [])
+                                      if item["estimated_calories"] is None),
+    }
+
+def make_jpeg(path: str, seed: int):
+    rng = random.Random(seed)
+    Image.new("RGB", (32, 32), tuple(rng.randrange(256) for _ in range(3))).save(path, format="JPEG")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do modo compacto (tabela nutricional local) x prompt completo.")
+    parser.add_argument("--images", type=int, default=40, help="Pratos sintéticos analisados em cada modo.")
+    parser.add_argument("--ttft", type=float, default=0.35, help="Tempo até o primeiro token (s).")
+    parser.add_argument("--prefill-tps", dest="prefill_tps", type=float, default=20000.0, help="Tokens de entrada por segundo.")
+    parser.add_argument("--decode-tps", dest="decode_tps", type=float, default=150.0, help="Tokens de saída por segundo.")
+    parser.add_argument("--time-scale", dest="time_scale", type=float, default=1.0,
+                        help="Fator aplicado às esperas simuladas (0 mede só o custo local).")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    metrics.set_enabled(True) # Para obter o tempo de parse_response de cada resultado
+    with tempfile.TemporaryDirectory() as tmp, logs.suppressed():
+        table = nutrition.get_default_table() # A mesma usada pela sessão no modo compacto
+        dishes = make_dishes(load_foods(config.get_settings().nutrition_table_path), args.images, args.seed)
+        image_paths = []
+        for index in range(args.images):
+            path = str(Path(tmp) / f"prato_{index}.jpg")
+            make_jpeg(path, index)
+            image_paths.append(path)
+        dishes_by_path = dict(zip(image_paths, dishes))
+        # Aquecimento fora da medição: import do SDK (conversão da imagem em blob) e primeiras consultas
+        warmup = SimulatedModelBackend(dishes_by_path, argparse.Namespace(**{**vars(args), "time_scale": 0.0}))
+        for compact in (False, True):
+            asyncio.run(run_mode(warmup, image_paths[:1], compact))
+        backend = SimulatedModelBackend(dishes_by_path, args)
+        full = asyncio.run(run_mode(backend, image_paths, compact=False))
+        compact = asyncio.run(run_mode(backend, image_paths, compact=True))
+
+    print(json.dumps({
+        "config": vars(args),
+        "full_prompt": full,
+        "compact_prompt": compact,
+        "input_tokens_saved_pct": round(100 * (1 - compact["input_tokens_per_request"] / full["input_tokens_per_request"]), 1),
+        "output_tokens_saved_pct": round(100 * (1 - compact["output_tokens"]["mean"] / full["output_tokens"]["mean"]), 1),
+        "modeled_latency_p50_speedup": round(full["modeled_latency_s"]["p50"] / compact["modeled_latency_s"]["p50"], 2),
+        "nutrition_lookup": table.stats(),
+    }, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# benchmarks/fake_backend.py
+"""
+Backend falso e configurável do Gemini para benchmarks offline.
+
+Implementa generate_content/generate_content_async (a mesma interface usada por AnalyzerSession)
+com latência log-normal de cauda longa, erros 503 e throttling 429 injetados, tamanho da resposta
+(número de itens) e ruído de formatação (JSON cercado por ```json, prosa no final, JSON truncado).
+Com stream=True, entrega a resposta em pedaços: o primeiro após `first_chunk_fraction` da latência
+sorteada e os demais distribuídos no restante dela. Requisições com várias imagens (modo empacotado)
+recebem um array com um objeto por imagem, e a latência cresce `pack_image_cost` por imagem extra.
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+
+from google.api_core import exceptions as api_exceptions
+
+NOISE_KINDS = ("clean", "fenced", "prose", "truncated")
+
+class FakeBackendConfig:
+    """Parâmetros do backend falso; `seed` torna as sequências sorteadas repetíveis."""
+
+    def __init__(self, latency_median_s: float = 0.3, latency_sigma: float = 0.6,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, items: int = 4,
+                 fenced_rate: float = 0.0, prose_rate: float = 0.0, truncated_rate: float = 0.0,
+                 first_chunk_fraction: float = 0.2, stream_chunks: int = 16, pack_image_cost: float = 0.3,
+                 seed: int = 1234):
+        self.latency_median_s = latency_median_s
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.items = items
+        self.fenced_rate = fenced_rate
+        self.prose_rate = prose_rate
+        self.truncated_rate = truncated_rate
+        self.first_chunk_fraction = first_chunk_fraction
+        self.stream_chunks = stream_chunks
+        self.pack_image_cost = pack_image_cost
+        self.seed = seed
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+class FakeResponse:
+    """Imita os atributos de GenerateContentResponse lidos por analysis._result_from_response."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.prompt_feedback = None
+        self.candidates = []
+
+def build_response_data(rng: random.Random, items: int) -> dict:
+    identified_items = []
+    for index in range(items):
+        calories = rng.choice([None] + [rng.randint(20, 600) for _ in range(9)])
+        identified_items.append({
+            "item_name": f"Item Sintético {index + 1}",
+            "estimated_calories": calories,
+            "confidence": rng.choice(["Alto", "Alto", "Médio", "Baixo"]),
+            "notes": "Porção estimada visualmente; " + "detalhe " * rng.randint(2, 12),
+        })
+    known = [item["estimated_calories"] for item in identified_items if item["estimated_calories"] is not None]
+    return {
+        "total_calories": sum(known) if known else None,
+        "identified_items": identified_items,
+        "analysis_summary_notes": "Resposta sintética do backend falso de benchmark.",
+    }
+
+def apply_noise(rng: random.Random, text: str, kind: str) -> str:
+    """Aplica um tipo de ruído de formatação observado em respostas reais do modelo."""
+    if kind == "fenced":
+        return f"```json\n{text}\n```"
+    if kind == "prose":
+        return text + "\n\nObservação: as estimativas acima são aproximadas e dependem do tamanho real da porção."
+    if kind == "truncated":
+        cut = rng.randint(len(text) // 2, len(text) - 2)
+        return text[:cut]
+    return text
+
+def make_response_text(rng: random.Random, items: int, kind: str, image_count: int = 1) -> str:
+    if image_count == 1:
+        return apply_noise(rng, json.dumps(build_response_data(rng, items), ensure_ascii=False), kind)
+    data = [{"image_index": number, **build_response_data(rng, items)} for number in range(1, image_count + 1)]
+    return apply_noise(rng, json.dumps(data, ensure_ascii=False), kind)
+
+def count_images(parts) -> int:
+    """Número de imagens nas partes da requisição (tudo o que não é texto); sem partes, uma."""
+    if not parts:
+        return 1
+    return max(1, sum(1 for part in parts if not isinstance(part, str)))
+
+class FakeGeminiModel:
+    """Modelo falso thread-safe; também conta chamadas, erros e throttles injetados."""
+
+    def __init__(self, backend_config: FakeBackendConfig):
+        self.config = backend_config
+        self._rng = random.Random(backend_config.seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.injected_errors = 0
+        self.injected_throttles = 0
+
+    def _draw(self, image_count: int = 1) -> tuple[float, str | None, str]:
+        """Sorteia (latência, erro injetado ou None, texto da resposta) sob lock, para ser repetível."""
+        cfg = self.config
+        with self._lock:
+            self.calls += 1
+            latency = self._rng.lognormvariate(0, cfg.latency_sigma) * cfg.latency_median_s
+            latency *= 1 + cfg.pack_image_cost * (image_count - 1)
+            roll = self._rng.random()
+            if roll < cfg.throttle_rate:
+                self.injected_throttles += 1
+                return latency * 0.1, "throttle", ""
+            if roll < cfg.throttle_rate + cfg.error_rate:
+                self.injected_errors += 1
+                return latency, "error", ""
+            noise_roll = self._rng.random()
+            if noise_roll < cfg.truncated_rate:
+                kind = "truncated"
+            elif noise_roll < cfg.truncated_rate + cfg.fenced_rate:
+                kind = "fenced"
+            elif noise_roll < cfg.truncated_rate + cfg.fenced_rate + cfg.prose_rate:
+                kind = "prose"
+            else:
+                kind = "clean"
+            return latency, None, make_response_text(self._rng, cfg.items, kind, image_count)
+
+    @staticmethod
+    def _raise(error_kind: str):
+        if error_kind == "throttle":
+            raise api_exceptions.ResourceExhausted("429 Resource has been exhausted (backend falso)")
+        raise api_exceptions.ServiceUnavailable("503 Service unavailable (backend falso)")
+
+    def _stream_plan(self, latency: float, text: str) -> tuple[float, float, list[str]]:
+        """(espera até o primeiro pedaço, espera entre pedaços, pedaços do texto)."""
+        count = max(1, self.config.stream_chunks)
+        size = max(1, -(-len(text) // count))
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        first_wait = latency * self.config.first_chunk_fraction
+        return first_wait, (latency - first_wait) / len(chunks), chunks
+
+    def _stream(self, latency: float, error_kind: str | None, text: str):
+        first_wait, gap, chunks = self._stream_plan(latency, text)
+        time.sleep(first_wait)
+        if error_kind:
+            self._raise(error_kind)
+        for index, chunk in enumerate(chunks):
+            if index:
+                time.sleep(gap)
+            yield FakeResponse(chunk)
+
+    async def _stream_async(self, latency: float, error_kind: str | None, text: str):
+        first_wait, gap, chunks = self._stream_plan(latency, text)
+        await asyncio.sleep(first_wait)
+        if error_kind:
+            self._raise(error_kind)
+        for index, chunk in enumerate(chunks):
+            if index:
+                await asyncio.sleep(gap)
+            yield FakeResponse(chunk)
+
+    def generate_content(self, parts, stream: bool = False, **kwargs):
+        latency, error_kind, text = self._draw(count_images(parts))
+        if stream:
+            return self._stream(latency, error_kind, text)
+        time.sleep(latency)
+        if error_kind:
+            self._raise(error_kind)
+        return FakeResponse(text)
+
+    async def generate_content_async(self, parts, stream: bool = False, **kwargs):
+        latency, error_kind, text = self._draw(count_images(parts))
+        if stream:
+            return self._stream_async(latency, error_kind, text)
+        await asyncio.sleep(latency)
+        if error_kind:
+            self._raise(error_kind)
+        return FakeResponse(text)
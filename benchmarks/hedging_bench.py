@@ -0,0 +1,119 @@
+# benchmarks/hedging_bench.py
+"""
+Requisições duplicadas (nutrisnap_ai1/hedging.py) contra o backend falso de latência log-normal.
+
+Roda o mesmo batch com e sem hedging, no caminho síncrono (batch.run_batch) e no asyncio
+(analyze_async), e compara p50/p95/p99 da latência por imagem e o custo em chamadas extras ao
+backend. Antes da medição, um aquecimento enche o histograma móvel (min_samples) de cada sessão.
+
+Uso: python benchmarks/hedging_bench.py [--images 2000] [--latency-median 0.05] [--latency-sigma 1.0]
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from PIL import Image
+
+from fake_backend import FakeBackendConfig, FakeGeminiModel
+from nutrisnap_ai1 import analysis, batch, hedging, logs
+
+def _latency_summary(latencies: list[float]) -> dict:
+    ordered = sorted(latencies)
+    return {name: round(batch.percentile(ordered, pct), 4) for name, pct in (("p50", 50), ("p95", 95), ("p99", 99))}
+
+def _session(args, seed: int, hedger: hedging.Hedger | bool) -> tuple[analysis.AnalyzerSession, FakeGeminiModel]:
+    model = FakeGeminiModel(FakeBackendConfig(latency_median_s=args.latency_median, latency_sigma=args.latency_sigma,
+                                              seed=seed))
+    session = analysis.AnalyzerSession(api_key="benchmark-offline", model=model, limiter=False, preprocess_images=False,
+                                       near_duplicates=False, compact=False, admission_checks=False, hedger=hedger)
+    return session, model
+
+def _hedger(args) -> hedging.Hedger:
+    """Hedger com orçamento próprio, para que cada cenário comece com o crédito zerado."""
+    return hedging.Hedger(args.percentile, args.min_samples, hedging.HedgeBudget(args.max_fraction),
+                          hedging.RollingHistogram(args.window))
+
+def run_sync(args, paths: list[str], hedger: hedging.Hedger | bool) -> dict:
+    session, model = _session(args, args.seed, hedger)
+    worker = functools.partial(session.analyze, use_cache=False)
+    batch.run_batch(paths[:args.warmup], worker, concurrency=args.concurrency)
+    calls_before = model.calls
+    stats = batch.run_batch(paths, worker, concurrency=args.concurrency)
+    return _report(stats.latencies, model.calls - calls_before, len(paths), stats.summary()["wall_time_s"], session)
+
+def run_async(args, paths: list[str], hedger: hedging.Hedger | bool) -> dict:
+    session, model = _session(args, args.seed + 1, hedger)
+
+    async def _run(batch_paths: list[str]) -> tuple[list[float], float]:
+        slots = asyncio.Semaphore(args.concurrency)
+        latencies = []
+
+        async def _one(path: str):
+            async with slots:
+                started = time.perf_counter()
+                await session.analyze_async(path, use_cache=False)
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(_one(path) for path in batch_paths))
+        return latencies, time.perf_counter() - started
+
+    asyncio.run(_run(paths[:args.warmup]))
+    calls_before = model.calls
+    latencies, wall_s = asyncio.run(_run(paths))
+    return _report(latencies, model.calls - calls_before, len(paths), round(wall_s, 3), session)
+
+def _report(latencies: list[float], calls: int, images: int, wall_s: float, session: analysis.AnalyzerSession) -> dict:
+    report = {"latency_s": _latency_summary(latencies), "wall_time_s": wall_s, "backend_calls": calls,
+              "extra_calls_pct": round(100 * (calls - images) / images, 2)}
+    if session.hedger is not None:
+        report["hedging"] = session.hedger.stats()
+    return report
+
+def _compare(off: dict, on: dict) -> dict:
+    return {f"{name}_change_pct": round(100 * (on["latency_s"][name] / off["latency_s"][name] - 1), 1)
+            for name in ("p50", "p95", "p99")}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das requisições duplicadas (hedging) com o backend falso.")
+    parser.add_argument("--images", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200, help="Imagens analisadas antes da medição (enche o histograma).")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-median", dest="latency_median", type=float, default=0.05)
+    parser.add_argument("--latency-sigma", dest="latency_sigma", type=float, default=1.0,
+                        help="Sigma da log-normal; 1.0 dá p99 ~10x o p50.")
+    parser.add_argument("--percentile", type=float, default=95.0)
+    parser.add_argument("--max-fraction", dest="max_fraction", type=float, default=0.05)
+    parser.add_argument("--min-samples", dest="min_samples", type=int, default=50)
+    parser.add_argument("--window", type=float, default=60.0)
+    parser.add_argument("--distinct", type=int, default=64, help="Imagens sintéticas distintas (repetidas até --images).")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, logs.suppressed():
+        distinct = []
+        for index in range(args.distinct):
+            path = os.path.join(tmp, f"prato_{index:03d}.jpg")
+            Image.new("RGB", (32, 32), (index % 256, 90, 40)).save(path, format="JPEG")
+            distinct.append(path)
+        paths = [distinct[index % len(distinct)] for index in range(args.images)]
+
+        results = {"sync": {"off": run_sync(args, paths, False), "on": run_sync(args, paths, _hedger(args))},
+                   "async": {"off": run_async(args, paths, False), "on": run_async(args, paths, _hedger(args))}}
+
+    for mode in results.values():
+        mode["comparison"] = _compare(mode["off"], mode["on"])
+    print(json.dumps({"config": vars(args), **results}, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/http_stub_server.py
+"""
+Stub HTTP local para o backend "http" (backends.HttpStubBackend). Responde POST /generate com
+{"text": "..."} gerado pelo backend falso de fake_backend.py (mesma latência, erros e ruído
+configuráveis); erros injetados viram respostas HTTP 429/503.
+
+Uso: python benchmarks/http_stub_server.py [--port 8765] [--latency 0.05] [--throttle-rate 0.02]
+     python scripts/run_analysis.py --batch data/input_images --backend http --concurrency 16
+"""
+import argparse
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from fake_backend import FakeBackendConfig, FakeGeminiModel
+
+def make_handler(model: FakeGeminiModel):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Keep-alive entre chamadas do cliente
+
+        def _reply(self, status: int, payload: dict):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path != "/generate":
+                self._reply(404, {"error": "rota desconhecida"})
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            try: # Do corpo só importa o número de imagens (modo empacotado)
+                response = model.generate_content([None] * int(body.get("image_count", 1)))
+            except Exception as e:
+                self._reply(getattr(e, "code", 500) or 500, {"error": str(e)})
+                return
+            self._reply(200, {"text": response.text})
+
+        def log_message(self, format, *args):
+            pass # Sem log por requisição
+
+    return StubHandler
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub HTTP local que imita o Gemini para --backend http.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="Latência mediana (s).")
+    parser.add_argument("--latency-sigma", type=float, default=0.6)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de 503.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fração de 429.")
+    parser.add_argument("--items", type=int, default=4)
+    parser.add_argument("--fenced-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    model = FakeGeminiModel(FakeBackendConfig(
+        latency_median_s=args.latency, latency_sigma=args.latency_sigma, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, items=args.items, fenced_rate=args.fenced_rate, seed=args.seed,
+    ))
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(model))
+    print(f"Stub HTTP ouvindo em http://{args.host}:{args.port}/generate", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/import_time.py
+"""
+Orçamento de cold start do pacote: importa os módulos usados pelos workers em um interpretador
+novo com `python -X importtime`, mede o tempo cumulativo (mediana de várias execuções) e falha
+(código de saída 1) se passar de --budget-ms. Também verifica que:
+  - o import não carrega módulos pesados (SDK do Gemini, numpy, Pillow, dotenv);
+  - o import não escreve nada em stdout/stderr.
+
+Uso: python benchmarks/import_time.py [--budget-ms 150] [--runs 7] [--modules nutrisnap_ai1.analysis,...]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = "nutrisnap_ai1,nutrisnap_ai1.analysis,nutrisnap_ai1.batch,nutrisnap_ai1.sinks"
+HEAVY_MODULES = ("google.generativeai", "google.api_core", "numpy", "PIL", "dotenv")
+
+def _run(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.pop("PYTHONWARNINGS", None)
+    return subprocess.run([sys.executable, *flags, "-c", code], cwd=PROJECT_ROOT, env=env,
+                          capture_output=True, text=True, check=False)
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """[(módulo, profundidade, tempo cumulativo em µs)] a partir da saída de -X importtime."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative_us, name_field = line[len("import time:"):].split("|")
+        if not cumulative_us.strip().isdigit(): # Cabeçalho
+            continue
+        depth = len(name_field) - len(name_field.lstrip()) # 1 espaço = import de primeiro nível
+        entries.append((name_field.strip(), depth, int(cumulative_us)))
+    return entries
+
+def measure(modules: list[str], runs: int) -> dict:
+    """Mediana do tempo de import dos `modules` (sem o custo de inicialização do interpretador)."""
+    startup = {name for name, _, _ in parse_importtime(_run("pass", "-X", "importtime").stderr)}
+    code = "; ".join(f"import {module}" for module in modules)
+    totals, entries = [], []
+    for _ in range(runs):
+        result = _run(code, "-X", "importtime")
+        if result.returncode != 0:
+            raise RuntimeError(f"Falha ao importar {modules}: {result.stderr.strip()[-500:]}")
+        entries = parse_importtime(result.stderr)
+        totals.append(sum(us for name, depth, us in entries if depth == 1 and name not in startup))
+    loaded = {name for name, _, _ in entries}
+    heaviest = sorted(((us, name) for name, depth, us in entries if name not in startup), reverse=True)[:10]
+    return {
+        "modules": modules,
+        "import_ms_median": round(statistics.median(totals) / 1000, 1),
+        "import_ms_runs": [round(total / 1000, 1) for total in totals],
+        "heaviest_ms": [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in heaviest],
+        "heavy_modules_loaded": [heavy for heavy in HEAVY_MODULES
+                                 if any(name == heavy or name.startswith(heavy + ".") for name in loaded)],
+    }
+
+def check_silent_import(modules: list[str]) -> str:
+    """Saída (stdout + stderr) produzida ao importar os módulos; deve ser vazia."""
+    result = _run("; ".join(f"import {module}" for module in modules))
+    return (result.stdout + result.stderr).strip()
+
+def main():
+    parser = argparse.ArgumentParser(description="Orçamento de tempo de import do pacote nutrisnap_ai1.")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="Tempo máximo de import (mediana, ms).")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--modules", default=DEFAULT_MODULES, help="Módulos importados (separados por vírgula).")
+    args = parser.parse_args()
+
+    modules = [module.strip() for module in args.modules.split(",") if module.strip()]
+    report = measure(modules, max(1, args.runs))
+    report["budget_ms"] = args.budget_ms
+    report["import_output"] = check_silent_import(modules)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    failures = []
+    if report["import_ms_median"] > args.budget_ms:
+        failures.append(f"import levou {report['import_ms_median']} ms (orçamento: {args.budget_ms} ms)")
+    if report["heavy_modules_loaded"]:
+        failures.append(f"módulos pesados carregados no import: {', '.join(report['heavy_modules_loaded'])}")
+    if report["import_output"]:
+        failures.append(f"o import escreveu na saída: {report['import_output'][:200]!r}")
+    for failure in failures:
+        print(f"FALHA: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
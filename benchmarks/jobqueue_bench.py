@@ -0,0 +1,113 @@
+# benchmarks/jobqueue_bench.py
+"""
+Fila de jobs durável (nutrisnap_ai1/jobqueue.py) com vários processos worker e o backend mock, offline.
+
+Gera imagens sintéticas, enfileira (duas vezes, para conferir que não duplica), sobe --workers
+processos `scripts/run_queue.py work --mock` sobre o mesmo arquivo SQLite e mata um deles com
+SIGKILL no meio do caminho. Acompanha o progresso/ETA pelo status da fila e, ao final, confere que
+todos os jobs foram concluídos uma única vez, que os jobs do worker morto voltaram para a fila
+depois do tempo de visibilidade e que ele aparece como worker sem heartbeat.
+
+Uso: python benchmarks/jobqueue_bench.py [--images 600] [--workers 4] [--concurrency 4] [--mock-latency 0.05]
+"""
+import argparse
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from PIL import Image
+
+from nutrisnap_ai1 import jobqueue, logs
+
+RUN_QUEUE = str(PROJECT_ROOT / "scripts" / "run_queue.py")
+
+def _worker(args, db_path: str, name: str) -> subprocess.Popen:
+    command = [sys.executable, RUN_QUEUE, "--queue", db_path, "--visibility", str(args.visibility), "work", "--mock",
+               "--mock-latency", str(args.mock_latency), "--no-cache", "--concurrency", str(args.concurrency),
+               "--worker-id", name]
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            env={**os.environ, "NUTRISNAP_LOG_LEVEL": "error"})
+
+def _leased_by(db_path: str, worker_id: str) -> int:
+    """Jobs concedidos a `worker_id` no momento (leitura direta do banco da fila)."""
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        (count,) = conn.execute("SELECT COUNT(*) FROM jobs WHERE state = 'leased' AND lease_owner = ?", (worker_id,)).fetchone()
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da fila de jobs com vários processos e um worker morto.")
+    parser.add_argument("--images", type=int, default=600)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=4, help="Threads por processo worker.")
+    parser.add_argument("--mock-latency", dest="mock_latency", type=float, default=0.05)
+    parser.add_argument("--visibility", type=float, default=3.0, help="Tempo de visibilidade das concessões (s).")
+    parser.add_argument("--kill-after", dest="kill_after", type=float, default=0.25,
+                        help="Fração concluída em que um worker é morto com SIGKILL.")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, logs.suppressed():
+        image_paths = []
+        for index in range(args.images):
+            path = os.path.join(tmp, f"prato_{index:05d}.jpg")
+            Image.new("RGB", (32, 32), (index % 256, (index // 256) % 256, 40)).save(path, format="JPEG")
+            image_paths.append(path)
+        db_path = os.path.join(tmp, "jobs.sqlite")
+        queue = jobqueue.JobQueue(db_path, visibility_timeout_s=args.visibility)
+        added = queue.enqueue(image_paths)
+        added_again = queue.enqueue(image_paths)
+
+        started = time.perf_counter()
+        workers = {f"worker-{index}": _worker(args, db_path, f"worker-{index}") for index in range(args.workers)}
+        victim, killed_at, leased_by_victim, trace = "worker-0", None, 0, []
+        while time.perf_counter() - started < args.timeout:
+            progress = queue.progress()
+            trace.append({"t_s": round(time.perf_counter() - started, 2), "percent_done": progress["percent_done"],
+                          "jobs_per_s": progress["jobs_per_s"], "eta_s": progress["eta_s"]})
+            if killed_at is None and progress["percent_done"] >= 100 * args.kill_after:
+                workers[victim].send_signal(signal.SIGKILL)
+                killed_at = time.perf_counter() - started
+                leased_by_victim = _leased_by(db_path, victim)
+            if all(process.poll() is not None for process in workers.values()):
+                break
+            time.sleep(0.25)
+        wall_s = time.perf_counter() - started
+        for process in workers.values():
+            if process.poll() is None:
+                process.kill()
+        final = queue.progress()
+        results = list(queue.results())
+        queue.close()
+
+    exit_codes = {name: process.returncode for name, process in workers.items()}
+    completed_once = len({path for path, state, *_ in results if state == "done"}) == len(results) == args.images
+    report = {
+        "config": vars(args),
+        "enqueued": added, "enqueued_again": added_again,
+        "wall_time_s": round(wall_s, 2),
+        "throughput_jobs_per_s": round(args.images / wall_s, 1),
+        "ideal_jobs_per_s": round(args.workers * args.concurrency / args.mock_latency, 1),
+        "killed_worker": {"name": victim, "at_s": round(killed_at, 2) if killed_at is not None else None,
+                          "jobs_held": leased_by_victim},
+        "final_progress": final,
+        "exit_codes": exit_codes,
+        "all_jobs_completed_once": completed_once,
+        "progress_trace": trace[::max(1, len(trace) // 12)],
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    ok = (completed_once and added == args.images and added_again == 0 and final["failed"] == 0
+          and final["retried"] >= leased_by_victim and final["workers_dead"] == (1 if killed_at is not None else 0))
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# benchmarks/phash_index_bench.py
+"""
+Benchmark do índice de quase-duplicatas (phash.PHashIndex): construção e latência de busca
+com N hashes aleatórios (padrão: 1 milhão), metade das consultas com vizinho próximo no índice.
+
+Uso: python benchmarks/phash_index_bench.py [--entries 1000000] [--queries 2000] [--max-distance 6]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np
+
+from nutrisnap_ai1 import phash
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência de busca do índice pHash.")
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--max-distance", type=int, default=6)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    hashes = rng.integers(0, np.iinfo(np.uint64).max, size=args.entries, dtype=np.uint64, endpoint=True)
+    keys = rng.integers(0, 256, size=(args.entries, 32), dtype=np.uint8)
+
+    index = phash.PHashIndex()
+    start = time.perf_counter()
+    index.add_many(hashes, keys, persist=False)
+    build_s = time.perf_counter() - start
+
+    # Metade das consultas: hash existente com alguns bits trocados; metade: hash aleatório (miss)
+    query_hashes = []
+    for i in range(args.queries):
+        if i % 2 == 0:
+            value = int(hashes[rng.integers(0, args.entries)])
+            for bit in rng.choice(64, size=min(args.max_distance, 4), replace=False):
+                value ^= 1 << int(bit)
+            query_hashes.append(value)
+        else:
+            query_hashes.append(int(rng.integers(0, np.iinfo(np.uint64).max, dtype=np.uint64, endpoint=True)))
+
+    latencies_us = []
+    hits = 0
+    for value in query_hashes:
+        start = time.perf_counter_ns()
+        match = index.lookup(value, args.max_distance)
+        latencies_us.append((time.perf_counter_ns() - start) / 1e3)
+        hits += match is not None
+    latencies_us.sort()
+
+    report = {
+        "entries": args.entries,
+        "max_distance": args.max_distance,
+        "build_s": round(build_s, 2),
+        "queries": args.queries,
+        "hits": hits,
+        "lookup_us": {
+            "p50": round(latencies_us[len(latencies_us) // 2], 1),
+            "p99": round(latencies_us[int(len(latencies_us) * 0.99)], 1),
+            "max": round(latencies_us[-1], 1),
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/preprocess_bench.py
+"""
+Benchmark do pré-processamento de upload (preprocess.prepare_image) sobre um corpus sintético:
+fotos grandes tipo celular (12 MP), fotos médias com rotação EXIF, PNGs e imagens já pequenas.
+
+Uso: python benchmarks/preprocess_bench.py [--per-kind 5] [--max-side 1024] [--format JPEG]
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from PIL import Image
+
+from nutrisnap_ai1 import preprocess
+
+# (nome, largura, altura, formato, orientação EXIF)
+CORPUS_KINDS = [
+    ("celular_12mp", 4032, 3024, "JPEG", 1),
+    ("celular_rotacionada", 3024, 4032, "JPEG", 6),
+    ("png_captura", 2400, 1600, "PNG", 1),
+    ("pequena", 640, 480, "JPEG", 1),
+]
+
+def _synthetic_image(width: int, height: int, seed: int) -> Image.Image:
+    # Ruído + gradiente: comprime de forma parecida com uma foto real (muito mais que uma cor sólida)
+    noise = Image.effect_noise((width // 4, height // 4), 40 + seed % 20).resize((width, height))
+    gradient = Image.linear_gradient("L").resize((width, height))
+    return Image.merge("RGB", (noise, gradient, Image.blend(noise, gradient, 0.5)))
+
+def build_corpus(directory: Path, per_kind: int) -> list[Path]:
+    paths = []
+    for kind, width, height, fmt, orientation in CORPUS_KINDS:
+        for i in range(per_kind):
+            img = _synthetic_image(width, height, i)
+            path = directory / f"{kind}_{i}.{fmt.lower()}"
+            if fmt == "JPEG":
+                exif = Image.Exif()
+                exif[0x0112] = orientation
+                img.save(path, format="JPEG", quality=92, exif=exif)
+            else:
+                img.save(path, format=fmt)
+            paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pré-processamento de imagens antes do upload.")
+    parser.add_argument("--per-kind", type=int, default=5, help="Imagens sintéticas por tipo.")
+    parser.add_argument("--max-side", type=int, default=1024)
+    parser.add_argument("--format", type=str, default="JPEG", choices=["JPEG", "WEBP"])
+    parser.add_argument("--quality", type=int, default=85)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="nutrisnap_corpus_") as tmp:
+        paths = build_corpus(Path(tmp), args.per_kind)
+        per_kind = {}
+        for path in paths:
+            kind = path.stem.rsplit("_", 1)[0]
+            start = time.perf_counter()
+            prepared = preprocess.prepare_image(str(path), max_side=args.max_side, output_format=args.format, quality=args.quality)
+            elapsed_ms = (time.perf_counter() - start) * 1e3
+            entry = per_kind.setdefault(kind, {"images": 0, "bytes_before": 0, "bytes_after": 0, "ms_total": 0.0, "passthrough": 0})
+            entry["images"] += 1
+            entry["bytes_before"] += prepared.bytes_before
+            entry["bytes_after"] += prepared.bytes_after
+            entry["ms_total"] += elapsed_ms
+            entry["passthrough"] += int(prepared.passthrough)
+
+    report = {"max_side": args.max_side, "format": args.format, "quality": args.quality, "kinds": {}}
+    for kind, entry in per_kind.items():
+        report["kinds"][kind] = {
+            "images": entry["images"],
+            "avg_bytes_before": entry["bytes_before"] // entry["images"],
+            "avg_bytes_after": entry["bytes_after"] // entry["images"],
+            "reduction_ratio": round(entry["bytes_before"] / max(1, entry["bytes_after"]), 2),
+            "avg_ms": round(entry["ms_total"] / entry["images"], 2),
+            "passthrough": entry["passthrough"],
+        }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
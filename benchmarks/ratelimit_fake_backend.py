@@ -0,0 +1,98 @@
+# benchmarks/ratelimit_fake_backend.py
+"""
+Exercita o ratelimit.RateLimiter contra um backend falso local que impõe uma cota no "servidor"
+(429 quando excedida), injeta 503 aleatórios e latência log-normal. Mostra as estatísticas ao vivo
+(taxa, concorrência AIMD, throttling, retentativas) e um resumo final.
+
+Uso: python benchmarks/ratelimit_fake_backend.py [--calls 600] [--workers 64] [--server-rpm 1200]
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from google.api_core import exceptions as api_exceptions
+
+from nutrisnap_ai1 import ratelimit
+
+class FakeQuotaBackend:
+    """Backend que aceita no máximo `server_rpm` requisições/min e `max_concurrent` simultâneas."""
+
+    def __init__(self, server_rpm: float, max_concurrent: int, error_rate: float, latency_median_s: float):
+        self.server_bucket = ratelimit.TokenBucket(server_rpm)
+        self.max_concurrent = max_concurrent
+        self.error_rate = error_rate
+        self.latency_median_s = latency_median_s
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def generate(self) -> str:
+        with self._lock:
+            self.in_flight += 1
+            over_concurrency = self.in_flight > self.max_concurrent
+        try:
+            if over_concurrency or not self.server_bucket.try_acquire(1):
+                raise api_exceptions.ResourceExhausted("429 Resource has been exhausted (fake quota)")
+            time.sleep(random.lognormvariate(0, 0.5) * self.latency_median_s)
+            if random.random() < self.error_rate:
+                raise api_exceptions.ServiceUnavailable("503 fake backend unavailable")
+            return "{}"
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+def main():
+    parser = argparse.ArgumentParser(description="RateLimiter contra backend falso com 429/503 e latência.")
+    parser.add_argument("--calls", type=int, default=600)
+    parser.add_argument("--workers", type=int, default=64, help="Threads cliente disputando o limitador.")
+    parser.add_argument("--server-rpm", type=float, default=1200, help="Cota do backend falso (req/min).")
+    parser.add_argument("--server-concurrency", type=int, default=12, help="Concorrência máxima aceita pelo backend falso.")
+    parser.add_argument("--client-rpm", type=float, default=3000, help="Limite de req/min do cliente.")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fração de 503 injetados.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latência mediana do backend (s).")
+    args = parser.parse_args()
+
+    backend = FakeQuotaBackend(args.server_rpm, args.server_concurrency, args.error_rate, args.latency)
+    limiter = ratelimit.RateLimiter(
+        args.client_rpm, 10_000_000,
+        concurrency=ratelimit.AdaptiveConcurrency(initial=32, maximum=64, cooldown_s=0.5),
+        retry_policy=ratelimit.RetryPolicy(max_attempts=8, base_delay_s=0.05, max_delay_s=2.0),
+    )
+    failures = []
+
+    def _one_call(_):
+        try:
+            limiter.call(backend.generate, estimated_tokens=1000)
+        except Exception as e:
+            failures.append(type(e).__name__)
+
+    done = threading.Event()
+
+    def _live_stats():
+        while not done.wait(1.0):
+            stats = limiter.stats()
+            print(f"[ao vivo] req/min={stats['requests_last_minute']} concorrência={stats['concurrency_limit']} "
+                  f"em andamento={stats['in_flight']} 429={stats['throttled']} retentativas={stats['retries']} "
+                  f"sucessos={stats['successes']}", file=sys.stderr)
+
+    reporter = threading.Thread(target=_live_stats, daemon=True)
+    reporter.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(_one_call, range(args.calls)))
+    elapsed = time.perf_counter() - start
+    done.set()
+
+    report = {"elapsed_s": round(elapsed, 2), "calls": args.calls, "failed_calls": len(failures),
+              "throughput_per_s": round(args.calls / elapsed, 2), "limiter": limiter.stats()}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
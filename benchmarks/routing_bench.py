@@ -0,0 +1,138 @@
+# benchmarks/routing_bench.py
+"""
+Roteamento por níveis de modelo (nutrisnap_ai1/routing.py) com backends roteirizados, offline.
+
+Cada imagem sintética recebe um roteiro para o modelo rápido: "easy" (itens de confiança Alto),
+"low" (maioria dos itens "Baixo"), "null" (item sem calorias) ou "broken" (resposta que não é JSON);
+o modelo forte sempre responde bem. O batch roda com o roteador (limite de concorrência no nível
+forte) e com o modelo forte para tudo, comparando latência e custo relativo. Confere também que só
+as imagens roteirizadas escalaram, pelo motivo certo, e que o limite de concorrência foi respeitado.
+
+Uso: python benchmarks/routing_bench.py [--images 200] [--hard-share 0.15] [--fast-latency 0.4] [--strong-latency 1.6]
+"""
+import argparse
+import functools
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from PIL import Image
+
+from nutrisnap_ai1 import analysis, backends, batch, logs, routing
+
+EXPECTED_REASONS = {"easy": [], "low": ["low_confidence"], "null": ["null_calories"], "broken": ["parse_failure"]}
+
+def scripted_text(kind: str) -> str:
+    """Resposta no formato do prompt completo para o roteiro dado."""
+    if kind == "broken":
+        return "Desculpe, não consegui analisar esta imagem com segurança."
+    confidences = {"easy": ["Alto", "Alto", "Médio"], "low": ["Baixo", "Baixo", "Médio"], "null": ["Alto", "Médio", "Alto"]}[kind]
+    items = [{"item_name": f"Item {index}", "estimated_calories": None if kind == "null" and index == 1 else 100 + 50 * index,
+              "confidence": confidence, "notes": ""} for index, confidence in enumerate(confidences)]
+    return json.dumps({"total_calories": sum(item["estimated_calories"] or 0 for item in items),
+                       "identified_items": items, "analysis_summary_notes": ""}, ensure_ascii=False)
+
+class ScriptedBackend(backends.Backend):
+    """Responde o roteiro de cada imagem (o modelo forte sempre "easy") com latência fixa e conta a concorrência."""
+    name = "roteirizado"
+
+    def __init__(self, script: dict[str, str] | None, latency_s: float):
+        self.script = script # None: sempre "easy"
+        self.latency_s = latency_s
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def generate(self, request: backends.GenerationRequest) -> backends.TextResponse:
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency_s)
+            return backends.TextResponse(scripted_text(self.script[request.image_path] if self.script else "easy"))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+def _session(model_name: str) -> analysis.AnalyzerSession:
+    return analysis.AnalyzerSession(api_key="benchmark-offline", model_name=model_name, limiter=False,
+                                    preprocess_images=False, near_duplicates=False, compact=False)
+
+def _latency_summary(latencies: list[float]) -> dict:
+    ordered = sorted(latencies)
+    return {"mean": round(sum(ordered) / len(ordered), 4), "p50": round(batch.percentile(ordered, 50), 4),
+            "p95": round(batch.percentile(ordered, 95), 4)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do roteamento por níveis de modelo com backends roteirizados.")
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--hard-share", dest="hard_share", type=float, default=0.15,
+                        help="Fração de imagens que o modelo rápido responde mal (divididas entre low, null e broken).")
+    parser.add_argument("--fast-latency", dest="fast_latency", type=float, default=0.4)
+    parser.add_argument("--strong-latency", dest="strong_latency", type=float, default=1.6)
+    parser.add_argument("--strong-cost", dest="strong_cost", type=float, default=8.0,
+                        help="Custo de uma chamada ao modelo forte em unidades do modelo rápido.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--strong-concurrency", dest="strong_concurrency", type=int, default=4)
+    parser.add_argument("--time-scale", dest="time_scale", type=float, default=0.1,
+                        help="Fator aplicado às latências simuladas.")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp, logs.suppressed():
+        script = {}
+        for index in range(args.images):
+            path = str(Path(tmp) / f"prato_{index}.jpg")
+            Image.new("RGB", (32, 32), (index % 256, 90, 40)).save(path, format="JPEG")
+            script[path] = rng.choice(("low", "null", "broken")) if rng.random() < args.hard_share else "easy"
+        paths = list(script)
+
+        fast = ScriptedBackend(script, args.fast_latency * args.time_scale)
+        strong = ScriptedBackend(None, args.strong_latency * args.time_scale)
+        router = routing.TieredRouter([
+            routing.Tier("fast", _session("modelo-rapido"), fast),
+            routing.Tier("strong", _session("modelo-forte"), strong, max_concurrency=args.strong_concurrency),
+        ], max_low_confidence=0.5)
+        results = {}
+        routed = batch.run_batch(paths, functools.partial(router.analyze, use_cache=False), concurrency=args.concurrency,
+                                 on_result=lambda path, result, _: results.__setitem__(path, result))
+
+        baseline_backend = ScriptedBackend(None, args.strong_latency * args.time_scale)
+        baseline_session = _session("modelo-forte")
+        baseline = batch.run_batch(paths, functools.partial(baseline_session.analyze, use_cache=False,
+                                                            backend=baseline_backend), concurrency=args.concurrency)
+
+    mismatches = []
+    for path, kind in script.items():
+        reasons = results[path]["routing"]["attempts"][0]["escalation_reasons"]
+        if reasons != EXPECTED_REASONS[kind]:
+            mismatches.append({"image": Path(path).name, "script": kind, "got": reasons})
+    unsuccessful = sum(1 for result in results.values() if not result["status"].startswith("sucesso"))
+    routed_cost = fast.calls + strong.calls * args.strong_cost
+    baseline_cost = baseline_backend.calls * args.strong_cost
+    print(json.dumps({
+        "config": vars(args),
+        "routing": router.stats(),
+        "routed": {"latency_s": _latency_summary(routed.latencies), "wall_time_s": routed.summary()["wall_time_s"],
+                   "fast_calls": fast.calls, "strong_calls": strong.calls, "strong_max_in_flight": strong.max_in_flight,
+                   "unsuccessful_results": unsuccessful, "cost_units": routed_cost},
+        "strong_only": {"latency_s": _latency_summary(baseline.latencies), "wall_time_s": baseline.summary()["wall_time_s"],
+                        "calls": baseline_backend.calls, "cost_units": baseline_cost},
+        "cost_saved_pct": round(100 * (1 - routed_cost / baseline_cost), 1),
+        "escalation_mismatches": mismatches[:10],
+    }, indent=2, ensure_ascii=False))
+    if mismatches or unsuccessful or strong.max_in_flight > args.strong_concurrency:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+# benchmarks/run_suite.py
+"""
+Suíte de benchmark offline: roda o pipeline real (AnalyzerSession + batch.run_batch + RateLimiter)
+contra o backend falso de fake_backend.py, sem rede nem chave de API. Mede:
+  - vazão e latência p50/p95/p99 em função da concorrência;
+  - custo do parser (_parse_gemini_response) por tipo de ruído e tamanho de resposta;
+  - em streaming, tempo até o primeiro item (analyze_stream) versus tempo até o resultado completo;
+  - modo empacotado (analyze_packed): requisições, vazão e latência versus uma imagem por requisição;
+  - pico de memória residente do processo.
+Grava um relatório JSON com metadados (revisão git, versão do Python, configuração) em
+benchmarks/results/ e, com --compare, mostra a variação em relação a um relatório anterior.
+
+Uso: python benchmarks/run_suite.py [--images 200] [--concurrency 1,2,4,8,16,32] [--latency 0.05]
+                                    [--error-rate 0.01] [--throttle-rate 0.02] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from PIL import Image
+
+from fake_backend import NOISE_KINDS, FakeBackendConfig, FakeGeminiModel, make_response_text
+from nutrisnap_ai1 import analysis, batch, logs, ratelimit
+
+RESULTS_DIR = PROJECT_ROOT / "benchmarks" / "results"
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def make_corpus(directory: str, distinct: int, total: int, seed: int) -> list[str]:
+    """Gera `distinct` fotos sintéticas e repete os caminhos até `total` entradas."""
+    rng = random.Random(seed)
+    paths = []
+    for index in range(distinct):
+        img = Image.new("RGB", (1600, 1200), (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+        for _ in range(30):
+            x, y = rng.randint(0, 1500), rng.randint(0, 1100)
+            img.paste((rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)), (x, y, x + 100, y + 100))
+        path = os.path.join(directory, f"prato_{index:03d}.jpg")
+        img.save(path, "JPEG", quality=90)
+        paths.append(path)
+    return [paths[i % distinct] for i in range(total)]
+
+def _bench_limiter(concurrency: int) -> ratelimit.RateLimiter:
+    """Limitador sem limite de cota efetivo, concorrência fixa e retentativas rápidas para os erros injetados."""
+    return ratelimit.RateLimiter(
+        1_000_000, 1_000_000_000,
+        concurrency=ratelimit.AdaptiveConcurrency(initial=concurrency, maximum=concurrency, cooldown_s=0.5),
+        retry_policy=ratelimit.RetryPolicy(max_attempts=5, base_delay_s=0.02, max_delay_s=0.5),
+    )
+
+def bench_concurrency(image_paths: list[str], levels: list[int], backend_config: FakeBackendConfig,
+                      preprocess_images: bool) -> list[dict]:
+    rows = []
+    for level in levels:
+        model = FakeGeminiModel(backend_config)
+        limiter = _bench_limiter(level)
+        session = analysis.AnalyzerSession(api_key="benchmark-offline", model=model, limiter=limiter,
+                                           preprocess_images=preprocess_images, near_duplicates=False)
+        with logs.suppressed(): # Logs por imagem distorceriam a medição
+            stats = batch.run_batch(image_paths, partial(session.analyze, use_cache=False), concurrency=level)
+        summary = stats.summary()
+        rows.append({
+            "concurrency": level,
+            "throughput_images_per_s": summary["throughput_images_per_s"],
+            "latency_s": {key: summary["latency_s"][key] for key in ("p50", "p95", "p99", "max")},
+            "successes": summary["successes"],
+            "errors": summary["errors"],
+            "backend_calls": model.calls,
+            "injected_errors": model.injected_errors,
+            "injected_throttles": model.injected_throttles,
+            "retries": limiter.counters["retries"],
+        })
+        print(f"concorrência={level:>3} vazão={summary['throughput_images_per_s']:>8} img/s "
+              f"p50={summary['latency_s']['p50']} p99={summary['latency_s']['p99']} erros={summary['errors']}",
+              file=sys.stderr)
+    return rows
+
+def _percentile(values: list[float], fraction: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def bench_streaming(image_paths: list[str], backend_config: FakeBackendConfig, preprocess_images: bool) -> dict:
+    """Analisa as imagens em sequência com analyze_stream e mede o primeiro item e o resultado completo."""
+    model = FakeGeminiModel(backend_config)
+    session = analysis.AnalyzerSession(api_key="benchmark-offline", model=model, limiter=_bench_limiter(1),
+                                       preprocess_images=preprocess_images, near_duplicates=False)
+    first_item_s, total_s, ratios = [], [], []
+    successes = 0
+    for path in image_paths:
+        first_item_ns = None
+        start_ns = time.perf_counter_ns()
+
+        def _on_item(item: dict):
+            nonlocal first_item_ns
+            if first_item_ns is None:
+                first_item_ns = time.perf_counter_ns() - start_ns
+
+        with logs.suppressed():
+            result = session.analyze_stream(path, _on_item, use_cache=False)
+        elapsed_ns = time.perf_counter_ns() - start_ns
+        if result.get("status") != "sucesso" or first_item_ns is None:
+            continue
+        successes += 1
+        first_item_s.append(first_item_ns / 1e9)
+        total_s.append(elapsed_ns / 1e9)
+        ratios.append(first_item_ns / elapsed_ns)
+
+    summary = {
+        "images": len(image_paths),
+        "successes": successes,
+        "first_item_s": {"p50": _percentile(first_item_s, 0.5), "p95": _percentile(first_item_s, 0.95)},
+        "full_result_s": {"p50": _percentile(total_s, 0.5), "p95": _percentile(total_s, 0.95)},
+        "first_item_fraction_p50": _percentile(ratios, 0.5),
+    }
+    for block in (summary["first_item_s"], summary["full_result_s"]):
+        for key, value in block.items():
+            block[key] = None if value is None else round(value, 4)
+    if summary["first_item_fraction_p50"] is not None:
+        summary["first_item_fraction_p50"] = round(summary["first_item_fraction_p50"], 3)
+    print(f"streaming: primeiro item p50={summary['first_item_s']['p50']}s, resultado completo "
+          f"p50={summary['full_result_s']['p50']}s ({successes}/{len(image_paths)} sucessos)", file=sys.stderr)
+    return summary
+
+def bench_packing(image_paths: list[str], concurrency: int, pack_sizes: list[int], backend_config: FakeBackendConfig,
+                  preprocess_images: bool) -> list[dict]:
+    """Mesmo corpus com uma imagem por requisição (pack_size=1) e com pacotes de até N imagens."""
+    rows = []
+    for pack_size in pack_sizes:
+        model = FakeGeminiModel(backend_config)
+        limiter = _bench_limiter(concurrency)
+        session = analysis.AnalyzerSession(api_key="benchmark-offline", model=model, limiter=limiter,
+                                           preprocess_images=preprocess_images, near_duplicates=False)
+        with logs.suppressed():
+            if pack_size == 1:
+                stats = batch.run_batch(image_paths, partial(session.analyze, use_cache=False), concurrency=concurrency)
+            else:
+                worker = partial(session.analyze_packed, use_cache=False, max_images=pack_size)
+                stats = batch.run_packed_batch(image_paths, worker, group_size=pack_size, concurrency=concurrency)
+        summary = stats.summary()
+        rows.append({
+            "pack_size": pack_size,
+            "backend_calls": model.calls,
+            "calls_per_image": round(model.calls / len(image_paths), 3),
+            "throughput_images_per_s": summary["throughput_images_per_s"],
+            "latency_s": {key: summary["latency_s"][key] for key in ("p50", "p95", "p99")},
+            "successes": summary["successes"],
+            "errors": summary["errors"],
+        })
+        print(f"pacote={pack_size:>2} chamadas={model.calls:>4} vazão={summary['throughput_images_per_s']:>8} img/s "
+              f"p50={summary['latency_s']['p50']} erros={summary['errors']}", file=sys.stderr)
+    return rows
+
+def _parse_or_none(text: str) -> dict | None:
+    try:
+        return analysis._parse_gemini_response(text)
+    except ValueError: # JSON inválido (ex: resposta truncada) conta como falha de parsing
+        return None
+
+def bench_parser(sizes: list[int], samples: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    rows = []
+    for kind in NOISE_KINDS:
+        for items in sizes:
+            texts = [make_response_text(rng, items, kind) for _ in range(samples)]
+            with logs.suppressed():
+                start = time.perf_counter_ns()
+                parsed = [_parse_or_none(text) for text in texts]
+                elapsed_ns = time.perf_counter_ns() - start
+            rows.append({
+                "noise": kind,
+                "items": items,
+                "mean_response_bytes": round(sum(len(t.encode("utf-8")) for t in texts) / samples),
+                "us_per_call": round(elapsed_ns / samples / 1e3, 2),
+                "parse_success_rate": round(sum(p is not None for p in parsed) / samples, 3),
+            })
+    return rows
+
+def _pct_change(new: float | None, old: float | None) -> str:
+    if new is None or not old:
+        return "n/d"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+def compare(report: dict, baseline: dict):
+    """Imprime a variação de vazão, p99 e custo do parser em relação a um relatório anterior."""
+    print(f"\nComparação com {baseline['meta'].get('git_revision')} ({baseline['meta'].get('created_at')}):")
+    old_rows = {row["concurrency"]: row for row in baseline.get("concurrency", [])}
+    for row in report["concurrency"]:
+        old = old_rows.get(row["concurrency"])
+        if old:
+            print(f"  concorrência={row['concurrency']:>3} vazão {_pct_change(row['throughput_images_per_s'], old['throughput_images_per_s'])}"
+                  f"  p99 {_pct_change(row['latency_s']['p99'], old['latency_s']['p99'])}")
+    old_parser = {(row["noise"], row["items"]): row for row in baseline.get("parser", [])}
+    for row in report["parser"]:
+        old = old_parser.get((row["noise"], row["items"]))
+        if old:
+            print(f"  parser {row['noise']:<9} itens={row['items']:>3} µs/chamada {_pct_change(row['us_per_call'], old['us_per_call'])}")
+    old_packing = {row["pack_size"]: row for row in baseline.get("packing") or []}
+    for row in report.get("packing") or []:
+        old = old_packing.get(row["pack_size"])
+        if old:
+            print(f"  pacote={row['pack_size']:>2} vazão {_pct_change(row['throughput_images_per_s'], old['throughput_images_per_s'])}"
+                  f"  chamadas {_pct_change(row['backend_calls'], old['backend_calls'])}")
+    old_streaming = baseline.get("streaming")
+    if old_streaming and report.get("streaming"):
+        print(f"  streaming primeiro item p50 {_pct_change(report['streaming']['first_item_s']['p50'], old_streaming['first_item_s']['p50'])}"
+              f"  resultado completo p50 {_pct_change(report['streaming']['full_result_s']['p50'], old_streaming['full_result_s']['p50'])}")
+    if report["memory"]["max_rss_mb"] and baseline.get("memory", {}).get("max_rss_mb"):
+        print(f"  pico de memória {_pct_change(report['memory']['max_rss_mb'], baseline['memory']['max_rss_mb'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline com backend Gemini falso.")
+    parser.add_argument("--images", type=int, default=200, help="Imagens por nível de concorrência.")
+    parser.add_argument("--distinct-images", type=int, default=8, help="Fotos sintéticas distintas no corpus.")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="Níveis de concorrência (separados por vírgula).")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latência mediana do backend falso (s).")
+    parser.add_argument("--latency-sigma", type=float, default=0.6, help="Sigma da log-normal (cauda da latência).")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Fração de 503 injetados.")
+    parser.add_argument("--throttle-rate", type=float, default=0.02, help="Fração de 429 injetados.")
+    parser.add_argument("--items", type=int, default=4, help="Itens por resposta no teste de concorrência.")
+    parser.add_argument("--fenced-rate", type=float, default=0.3, help="Fração de respostas em bloco ```json.")
+    parser.add_argument("--prose-rate", type=float, default=0.1, help="Fração de respostas com prosa no final.")
+    parser.add_argument("--truncated-rate", type=float, default=0.02, help="Fração de respostas truncadas.")
+    parser.add_argument("--stream-images", type=int, default=50, help="Imagens do teste de streaming (0 desliga).")
+    parser.add_argument("--first-chunk-fraction", type=float, default=0.2,
+                        help="Fração da latência até o primeiro pedaço em streaming.")
+    parser.add_argument("--pack-sizes", default="1,4,8", help="Tamanhos de pacote comparados (1 = sem empacotamento; vazio desliga).")
+    parser.add_argument("--pack-concurrency", type=int, default=4, help="Concorrência do teste de empacotamento.")
+    parser.add_argument("--pack-image-cost", type=float, default=0.3,
+                        help="Latência extra do backend falso por imagem adicional no pacote (fração da latência).")
+    parser.add_argument("--parser-sizes", default="1,4,20,100", help="Tamanhos (itens) do microbenchmark do parser.")
+    parser.add_argument("--parser-samples", type=int, default=500)
+    parser.add_argument("--no-preprocess", action="store_true", help="Desliga o pré-processamento das imagens.")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default=None, help="Caminho do relatório JSON (padrão: benchmarks/results/).")
+    parser.add_argument("--compare", default=None, help="Relatório JSON anterior para comparação.")
+    args = parser.parse_args()
+
+    backend_config = FakeBackendConfig(
+        latency_median_s=args.latency, latency_sigma=args.latency_sigma, error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate, items=args.items, fenced_rate=args.fenced_rate,
+        prose_rate=args.prose_rate, truncated_rate=args.truncated_rate,
+        first_chunk_fraction=args.first_chunk_fraction, pack_image_cost=args.pack_image_cost, seed=args.seed,
+    )
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    with tempfile.TemporaryDirectory(prefix="nutrisnap-bench-") as corpus_dir:
+        image_paths = make_corpus(corpus_dir, args.distinct_images, args.images, args.seed)
+        concurrency_rows = bench_concurrency(image_paths, levels, backend_config, not args.no_preprocess)
+        streaming = None
+        if args.stream_images > 0:
+            streaming = bench_streaming(image_paths[:args.stream_images], backend_config, not args.no_preprocess)
+        pack_sizes = [int(size) for size in args.pack_sizes.split(",") if size.strip()]
+        packing_rows = bench_packing(image_paths, args.pack_concurrency, pack_sizes, backend_config, not args.no_preprocess)
+    parser_rows = bench_parser([int(size) for size in args.parser_sizes.split(",")], args.parser_samples, args.seed)
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # KB no Linux
+
+    created_at = time.strftime("%Y%m%dT%H%M%S")
+    report = {
+        "meta": {
+            "created_at": created_at,
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "images_per_level": args.images,
+            "preprocess_images": not args.no_preprocess,
+            "backend": backend_config.as_dict(),
+        },
+        "concurrency": concurrency_rows,
+        "streaming": streaming,
+        "packing": packing_rows,
+        "parser": parser_rows,
+        "memory": {"max_rss_mb": round(max_rss_kb / 1024, 1)},
+    }
+
+    output_path = Path(args.output) if args.output else RESULTS_DIR / f"suite-{created_at}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\nRelatório salvo em: {output_path}")
+
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# benchmarks/service_load.py
+"""
+Teste de carga offline do serviço HTTP (nutrisnap_ai1/service.py) com o backend mock, no mesmo processo:
+  - rajada de uploads idênticos (duplo toque): quantas chamadas ao backend foram feitas;
+  - rajada de uploads distintos acima de concorrência + fila: quantas requisições receberam 503;
+  - /health e /metrics respondendo durante a carga.
+Sai com código 1 se os uploads idênticos não forem agrupados em uma única chamada.
+
+Uso: python benchmarks/service_load.py [--duplicates 32] [--distinct 64] [--concurrency 4] [--max-queue 8] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from PIL import Image
+
+from nutrisnap_ai1 import analysis, backends, logs, service
+
+class CountingMockBackend(backends.MockBackend):
+    def __init__(self, latency_s: float):
+        super().__init__(latency_s)
+        self.calls = 0
+
+    async def generate_async(self, request: backends.GenerationRequest) -> backends.TextResponse:
+        self.calls += 1
+        await asyncio.sleep(self.latency_s)
+        return backends.TextResponse(self._text_for(request))
+
+def make_jpeg(seed: int) -> bytes:
+    rng = random.Random(seed)
+    image = Image.new("RGB", (64, 64), tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+async def request(port: int, method: str, path: str, image: bytes | None = None) -> tuple[int, bytes, float]:
+    """Uma requisição por conexão; retorna (status, corpo, latência em s)."""
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body, headers = b"", ""
+    if image is not None:
+        boundary = "nutrisnapbench"
+        body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"prato.jpg\"\r\n"
+                f"Content-Type: image/jpeg\r\n\r\n").encode() + image + f"\r\n--{boundary}--\r\n".encode()
+        headers = f"Content-Type: multipart/form-data; boundary={boundary}\r\n"
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n{headers}"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, response_body = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), response_body, time.perf_counter() - started
+
+def _latency_summary(latencies: list[float]) -> dict:
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+    return {"p50_s": round(statistics.median(ordered), 4), "max_s": round(ordered[-1], 4)}
+
+async def run(args) -> dict:
+    backend = CountingMockBackend(args.latency)
+    session = analysis.AnalyzerSession(api_key="benchmark-offline", backend=backend, limiter=False, near_duplicates=False)
+    analysis_service = service.AnalysisService(session, max_concurrency=args.concurrency, max_queue=args.max_queue)
+    server = await service.start_server(analysis_service, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    report = {"config": vars(args)}
+    async with server:
+        image = make_jpeg(0)
+        responses = await asyncio.gather(*(request(port, "POST", "/analyze", image) for _ in range(args.duplicates)))
+        report["duplicates"] = {
+            "requests": args.duplicates,
+            "backend_calls": backend.calls,
+            "coalesced": sum(1 for status, body, _ in responses if status == 200 and json.loads(body).get("coalesced")),
+            "status_counts": _status_counts(responses),
+            "latency": _latency_summary([latency for _, _, latency in responses]),
+        }
+
+        calls_before = backend.calls
+        images = [make_jpeg(seed) for seed in range(1, args.distinct + 1)]
+        uploads = [request(port, "POST", "/analyze", image) for image in images]
+        probes = [request(port, "GET", "/health"), request(port, "GET", "/metrics")]
+        responses = await asyncio.gather(*uploads, *probes)
+        upload_responses, probe_responses = responses[:len(uploads)], responses[len(uploads):]
+        report["overload"] = {
+            "requests": args.distinct,
+            "backend_calls": backend.calls - calls_before,
+            "status_counts": _status_counts(upload_responses),
+            "accepted_latency": _latency_summary([latency for status, _, latency in upload_responses if status == 200]),
+            "shed_latency": _latency_summary([latency for status, _, latency in upload_responses if status == 503]),
+            "health_status": probe_responses[0][0],
+            "metrics_status": probe_responses[1][0],
+        }
+        report["health"] = analysis_service.health()
+    return report
+
+def _status_counts(responses) -> dict:
+    counts = {}
+    for status, _, _ in responses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga offline do serviço HTTP de análise.")
+    parser.add_argument("--duplicates", type=int, default=32, help="Uploads idênticos simultâneos.")
+    parser.add_argument("--distinct", type=int, default=64, help="Uploads distintos simultâneos.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-queue", dest="max_queue", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="Latência do backend mock (s).")
+    args = parser.parse_args()
+
+    with logs.suppressed():
+        report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if report["duplicates"]["backend_calls"] != 1:
+        print(f"FALHA: {args.duplicates} uploads idênticos geraram {report['duplicates']['backend_calls']} chamadas",
+              file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
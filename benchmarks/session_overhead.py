@@ -0,0 +1,74 @@
+# benchmarks/session_overhead.py
+"""
+Microbenchmark do overhead por chamada: genai.configure + GenerativeModel a cada imagem
+(comportamento antigo) versus AnalyzerSession reutilizada.
+
+O transporte é substituído por um stub (GenerativeServiceClient.generate_content retorna uma
+resposta fixa), então nenhuma chamada de rede é feita; a construção real dos clientes do SDK é mantida.
+
+Uso: python benchmarks/session_overhead.py [--calls 200]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import google.ai.generativelanguage as glm
+import google.generativeai as genai
+from google.generativeai import protos
+
+from nutrisnap_ai1 import analysis, backends
+
+_CANNED_TEXT = json.dumps(backends._MOCK_RESPONSE_DATA)
+
+def _stub_generate_content(self, request=None, **kwargs):
+    return protos.GenerateContentResponse(
+        candidates=[protos.Candidate(content=protos.Content(parts=[protos.Part(text=_CANNED_TEXT)], role="model"), finish_reason=1)]
+    )
+
+def _per_call_setup(api_key: str, parts: list):
+    # Comportamento antigo de analyze_image
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(analysis.config.MODEL_NAME)
+    return model.generate_content(parts)
+
+def _timed(fn, calls: int) -> list[float]:
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter_ns()
+        fn()
+        timings.append((time.perf_counter_ns() - start) / 1e3)
+    return sorted(timings)
+
+def _describe(timings_us: list[float]) -> dict:
+    return {
+        "mean_us": round(sum(timings_us) / len(timings_us), 1),
+        "p50_us": round(timings_us[len(timings_us) // 2], 1),
+        "p99_us": round(timings_us[min(len(timings_us) - 1, int(len(timings_us) * 0.99))], 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead por chamada: configuração por chamada vs AnalyzerSession.")
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    glm.GenerativeServiceClient.generate_content = _stub_generate_content
+    api_key = os.getenv("GEMINI_API_KEY") or "chave-de-benchmark"
+    parts = ["Descreva o prato.", "texto substituindo a imagem para isolar o overhead do cliente"]
+
+    before = _timed(lambda: _per_call_setup(api_key, parts), args.calls)
+    session = analysis.AnalyzerSession(api_key=api_key)
+    session.model.generate_content(parts) # aquecimento: cria o cliente uma vez
+    after = _timed(lambda: session.model.generate_content(parts), args.calls)
+
+    report = {"calls": args.calls, "per_call_setup": _describe(before), "analyzer_session": _describe(after)}
+    report["speedup_mean"] = round(report["per_call_setup"]["mean_us"] / report["analyzer_session"]["mean_us"], 2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -4,5 +4,6 @@
 # Exemplo de como tornar funções de submódulos mais fáceis de importar:
 # from .analysis import analyze_image
 # from .utils import print_log
-
-print("Pacote nutrisnap_ai inicializado.")
\ No newline at end of file
+#
+# O import do pacote não deve ter efeitos colaterais (nada de print, .env ou SDK): a configuração
+# é carregada por config.get_settings() e o SDK do Gemini só é importado na primeira chamada real.
\ No newline at end of file
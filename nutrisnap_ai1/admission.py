@@ -0,0 +1,337 @@
+# nutrisnap_ai1/admission.py
+"""
+Admissão de imagens antes da decodificação e do upload: lê só o cabeçalho do arquivo (sem Pillow)
+para descobrir formato, dimensões e número de quadros e compara com os limites configurados
+(NUTRISNAP_ADMISSION_*). Arquivos corrompidos, não-imagens, TIFFs enormes, GIFs animados e bombas
+de descompressão são recusados em microssegundos, antes de ocupar um worker ou gastar cota da API.
+
+Motivos de recusa (contados em stats()):
+  not_found, empty, too_large           arquivo ausente, vazio ou maior que max_bytes
+  unknown_format, format_not_allowed    assinatura desconhecida, ou formato fora da lista permitida
+  corrupt_header                        cabeçalho truncado ou inconsistente
+  dimensions_too_large                  maior lado acima de max_side
+  decompression_bomb                    pixels acima de max_pixels, ou mais pixels por byte do que
+                                        qualquer codificação real consegue (cabeçalho mentiroso)
+  animated                              mais quadros que max_frames (GIF/APNG/WebP animado, TIFF multipágina)
+"""
+import io
+import os
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from . import config, metrics
+
+REASONS = ("not_found", "empty", "too_large", "unknown_format", "format_not_allowed", "corrupt_header",
+           "dimensions_too_large", "decompression_bomb", "animated")
+# Pixels por byte do arquivo acima do possível para imagens reais (PNG de 1 bit com deflate máximo
+# fica perto de 8.300); acima disso o cabeçalho promete mais do que os dados podem conter
+_MAX_PIXELS_PER_BYTE = 20000
+_MAX_SEGMENTS = 1024 # Segmentos JPEG / chunks PNG e WebP percorridos até achar as dimensões
+_GIF_READ_BYTES = 64 * 1024
+_JPEG_SOF_MARKERS = frozenset({0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF})
+_HEIF_BRANDS = {b"heic": "HEIF", b"heix": "HEIF", b"hevc": "HEIF", b"mif1": "HEIF", b"msf1": "HEIF",
+                b"avif": "AVIF", b"avis": "AVIF"}
+
+class _CorruptHeader(ValueError):
+    pass
+
+@dataclass(frozen=True, slots=True)
+class ImageHeader:
+    format: str # Nome no padrão do Pillow: JPEG, PNG, GIF, WEBP, TIFF, BMP, HEIF, AVIF
+    width: int | None
+    height: int | None
+    frames: int # Contados só até passar de max_frames
+
+@dataclass(frozen=True, slots=True)
+class AdmissionLimits:
+    formats: frozenset[str]
+    max_bytes: int
+    max_side: int
+    max_pixels: int
+    max_frames: int
+
+    @classmethod
+    def from_settings(cls, settings: config.Settings | None = None) -> "AdmissionLimits":
+        settings = settings or config.get_settings()
+        return cls(frozenset(name.strip().upper() for name in settings.admission_formats if name.strip()),
+                   settings.admission_max_bytes, settings.admission_max_side, settings.admission_max_pixels,
+                   max(1, settings.admission_max_frames))
+
+@dataclass(frozen=True, slots=True)
+class Rejection:
+    reason: str # Um de REASONS
+    message: str
+    header: ImageHeader | None = None
+
+    def result(self) -> dict:
+        """Dicionário de resultado no formato da análise, com status próprio ("rejeitado")."""
+        return {"status": "rejeitado", "error": "Imagem rejeitada na admissão", "details": self.message,
+                "rejection_reason": self.reason}
+
+def _read_exact(f: BinaryIO, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise _CorruptHeader("cabeçalho truncado")
+    return data
+
+def _jpeg(f: BinaryIO, max_frames: int) -> ImageHeader:
+    f.seek(2)
+    for _ in range(_MAX_SEGMENTS):
+        if _read_exact(f, 1) != b"\xff":
+            raise _CorruptHeader("marcador JPEG esperado")
+        marker = _read_exact(f, 1)[0]
+        while marker == 0xFF: # Bytes de preenchimento
+            marker = _read_exact(f, 1)[0]
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01: # Marcadores sem comprimento
+            continue
+        if marker in (0xDA, 0xD9): # Início dos dados ou fim da imagem antes de um SOF
+            raise _CorruptHeader("JPEG sem segmento SOF")
+        (length,) = struct.unpack(">H", _read_exact(f, 2))
+        if marker in _JPEG_SOF_MARKERS:
+            _precision, height, width = struct.unpack(">BHH", _read_exact(f, 5))
+            return ImageHeader("JPEG", width, height, 1)
+        if length < 2:
+            raise _CorruptHeader("segmento JPEG com comprimento inválido")
+        f.seek(length - 2, os.SEEK_CUR)
+    raise _CorruptHeader("segmentos JPEG demais antes do SOF")
+
+def _png(f: BinaryIO, max_frames: int) -> ImageHeader:
+    f.seek(8)
+    length, chunk_type = struct.unpack(">I4s", _read_exact(f, 8))
+    if chunk_type != b"IHDR" or length < 8:
+        raise _CorruptHeader("PNG sem IHDR")
+    width, height = struct.unpack(">II", _read_exact(f, 8))
+    f.seek(length - 8 + 4, os.SEEK_CUR) # Resto do IHDR + CRC
+    frames = 1
+    for _ in range(_MAX_SEGMENTS): # APNG: acTL vem antes do primeiro IDAT
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        length, chunk_type = struct.unpack(">I4s", header)
+        if chunk_type == b"acTL":
+            (frames,) = struct.unpack(">I", _read_exact(f, 4))
+            break
+        if chunk_type in (b"IDAT", b"IEND"):
+            break
+        f.seek(length + 4, os.SEEK_CUR)
+    return ImageHeader("PNG", width, height, frames)
+
+def _skip_gif_sub_blocks(f: BinaryIO):
+    # Percorre os sub-blocos (1 byte de tamanho + até 255 de dados) em leituras de 64 KiB
+    base, data, offset = f.tell(), b"", 0
+    while True:
+        if offset >= len(data):
+            base += offset
+            f.seek(base)
+            data, offset = f.read(_GIF_READ_BYTES), 0
+            if not data:
+                return
+        size = data[offset]
+        if size == 0:
+            f.seek(base + offset + 1)
+            return
+        offset += size + 1
+
+def _gif(f: BinaryIO, max_frames: int) -> ImageHeader:
+    f.seek(6)
+    width, height, flags = struct.unpack("<HHB", _read_exact(f, 5))
+    f.seek(2, os.SEEK_CUR)
+    if flags & 0x80: # Tabela de cores global
+        f.seek(3 * (2 << (flags & 0x07)), os.SEEK_CUR)
+    frames = 0
+    while frames <= max_frames: # Conta descritores de imagem só até passar do limite
+        block = f.read(1)
+        if block == b"\x2c":
+            frames += 1
+            descriptor = _read_exact(f, 9)
+            if descriptor[8] & 0x80: # Tabela de cores local
+                f.seek(3 * (2 << (descriptor[8] & 0x07)), os.SEEK_CUR)
+            f.seek(1, os.SEEK_CUR) # Tamanho mínimo do código LZW
+            _skip_gif_sub_blocks(f)
+        elif block == b"\x21":
+            f.seek(1, os.SEEK_CUR) # Rótulo da extensão
+            _skip_gif_sub_blocks(f)
+        else: # Trailer (0x3B), fim do arquivo ou lixo após os quadros
+            break
+    if not frames:
+        raise _CorruptHeader("GIF sem quadros")
+    return ImageHeader("GIF", width, height, frames)
+
+def _webp(f: BinaryIO, max_frames: int) -> ImageHeader:
+    f.seek(12)
+    chunk_type, size = struct.unpack("<4sI", _read_exact(f, 8))
+    if chunk_type == b"VP8 ":
+        data = _read_exact(f, 10)
+        if data[3:6] != b"\x9d\x01\x2a":
+            raise _CorruptHeader("quadro VP8 inválido")
+        width, height = struct.unpack("<HH", data[6:10])
+        return ImageHeader("WEBP", width & 0x3FFF, height & 0x3FFF, 1)
+    if chunk_type == b"VP8L":
+        data = _read_exact(f, 5)
+        if data[0] != 0x2F:
+            raise _CorruptHeader("assinatura VP8L inválida")
+        (bits,) = struct.unpack("<I", data[1:5])
+        return ImageHeader("WEBP", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, 1)
+    if chunk_type != b"VP8X":
+        raise _CorruptHeader("chunk WebP desconhecido")
+    data = _read_exact(f, 10)
+    width = int.from_bytes(data[4:7], "little") + 1
+    height = int.from_bytes(data[7:10], "little") + 1
+    frames = 1
+    if data[0] & 0x02: # Animação: conta os chunks ANMF
+        frames = 0
+        f.seek(20 + size + (size & 1))
+        for _ in range(_MAX_SEGMENTS):
+            header = f.read(8)
+            if len(header) < 8 or frames > max_frames:
+                break
+            chunk_type, chunk_size = struct.unpack("<4sI", header)
+            frames += chunk_type == b"ANMF"
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+    return ImageHeader("WEBP", width, height, max(frames, 1))
+
+def _tiff(f: BinaryIO, max_frames: int) -> ImageHeader:
+    f.seek(0)
+    order = "<" if _read_exact(f, 2) == b"II" else ">"
+    f.seek(4)
+    (offset,) = struct.unpack(order + "I", _read_exact(f, 4))
+    width = height = None
+    frames = 0
+    while offset and frames <= max_frames: # Uma IFD por página
+        f.seek(offset)
+        (entries,) = struct.unpack(order + "H", _read_exact(f, 2))
+        if frames == 0:
+            for _ in range(min(entries, _MAX_SEGMENTS)):
+                tag, field_type, _count, value = struct.unpack(order + "HHI4s", _read_exact(f, 12))
+                if tag in (256, 257):
+                    number = struct.unpack(order + ("H" if field_type == 3 else "I"), value[:2 if field_type == 3 else 4])[0]
+                    width, height = (number, height) if tag == 256 else (width, number)
+        f.seek(offset + 2 + 12 * entries)
+        frames += 1
+        (offset,) = struct.unpack(order + "I", _read_exact(f, 4))
+    if width is None or height is None:
+        raise _CorruptHeader("TIFF sem dimensões")
+    return ImageHeader("TIFF", width, height, frames)
+
+def _bmp(f: BinaryIO, max_frames: int) -> ImageHeader:
+    f.seek(14)
+    (header_size,) = struct.unpack("<I", _read_exact(f, 4))
+    if header_size == 12: # BITMAPCOREHEADER
+        width, height = struct.unpack("<HH", _read_exact(f, 4))
+    else:
+        width, height = struct.unpack("<ii", _read_exact(f, 8))
+    return ImageHeader("BMP", abs(width), abs(height), 1) # Altura negativa: linhas de cima para baixo
+
+def _detect(head: bytes):
+    if head.startswith(b"\xff\xd8\xff"):
+        return _jpeg
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return _png
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return _gif
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return _webp
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return _tiff
+    if head[:2] == b"BM":
+        return _bmp
+    return None
+
+def read_header(f: BinaryIO, max_frames: int = 1) -> ImageHeader | None:
+    """Formato, dimensões e quadros a partir do cabeçalho; None se não for um formato de imagem conhecido."""
+    head = f.read(16)
+    if head[4:8] == b"ftyp" and head[8:12] in _HEIF_BRANDS: # HEIF/AVIF: dimensões ficam em caixas internas
+        return ImageHeader(_HEIF_BRANDS[head[8:12]], None, None, 1)
+    parser = _detect(head)
+    return None if parser is None else parser(f, max_frames)
+
+class _Counters:
+    def __init__(self):
+        self.checked = 0
+        self.admitted = 0
+        self.rejected = dict.fromkeys(REASONS, 0)
+        self.lock = threading.Lock()
+
+_counters = _Counters()
+
+def _record(rejection: Rejection | None, started_ns: int) -> Rejection | None:
+    metrics.observe("admission", time.perf_counter_ns() - started_ns)
+    with _counters.lock:
+        _counters.checked += 1
+        if rejection is None:
+            _counters.admitted += 1
+        else:
+            _counters.rejected[rejection.reason] += 1
+    return rejection
+
+def _evaluate(f: BinaryIO, file_bytes: int, limits: AdmissionLimits) -> Rejection | None:
+    if file_bytes == 0:
+        return Rejection("empty", "Arquivo vazio.")
+    if file_bytes > limits.max_bytes:
+        return Rejection("too_large", f"Arquivo de {file_bytes} bytes excede o limite de {limits.max_bytes} bytes.")
+    try:
+        header = read_header(f, limits.max_frames)
+    except (_CorruptHeader, struct.error) as e:
+        return Rejection("corrupt_header", f"Cabeçalho de imagem inválido: {e}.")
+    if header is None:
+        return Rejection("unknown_format", "O arquivo não é uma imagem em formato reconhecido.")
+    if header.format not in limits.formats:
+        return Rejection("format_not_allowed", f"Formato {header.format} não permitido "
+                                               f"(permitidos: {', '.join(sorted(limits.formats))}).", header)
+    if header.width is None or header.height is None:
+        return None # HEIF/AVIF permitidos explicitamente: dimensões verificadas só na decodificação
+    if not header.width or not header.height:
+        return Rejection("corrupt_header", f"Dimensões inválidas: {header.width}x{header.height}.", header)
+    pixels = header.width * header.height
+    if pixels > limits.max_pixels or pixels > file_bytes * _MAX_PIXELS_PER_BYTE:
+        return Rejection("decompression_bomb", f"{header.width}x{header.height} ({pixels} pixels) em {file_bytes} "
+                                               f"bytes: possível bomba de descompressão.", header)
+    if max(header.width, header.height) > limits.max_side:
+        return Rejection("dimensions_too_large", f"Dimensões {header.width}x{header.height} excedem o lado máximo "
+                                                 f"de {limits.max_side} px.", header)
+    if header.frames > limits.max_frames:
+        return Rejection("animated", f"Imagem com {header.frames} quadros ou mais (máximo: {limits.max_frames}).", header)
+    return None
+
+def check(image_path_str: str, limits: AdmissionLimits | None = None) -> Rejection | None:
+    """Verifica o arquivo pelo cabeçalho; None se a imagem for admitida, senão o motivo da recusa."""
+    started_ns = time.perf_counter_ns()
+    limits = limits or default_limits()
+    try:
+        with open(image_path_str, "rb") as f:
+            rejection = _evaluate(f, os.fstat(f.fileno()).st_size, limits)
+    except FileNotFoundError:
+        rejection = Rejection("not_found", f"Arquivo de imagem não encontrado: {image_path_str}")
+    except OSError as e: # Ex: diretório, sem permissão
+        rejection = Rejection("corrupt_header", f"Não foi possível ler o arquivo: {e}")
+    return _record(rejection, started_ns)
+
+def check_bytes(content: bytes, limits: AdmissionLimits | None = None) -> Rejection | None:
+    """Como check, para um conteúdo já em memória (ex: upload do serviço HTTP)."""
+    started_ns = time.perf_counter_ns()
+    return _record(_evaluate(io.BytesIO(content), len(content), limits or default_limits()), started_ns)
+
+def check_result(image_path_str: str) -> dict | None:
+    """check() no formato usado por batch.run_batch(admit=...): None ou o resultado de recusa."""
+    rejection = check(image_path_str)
+    return None if rejection is None else rejection.result()
+
+def stats() -> dict:
+    """Verificações, admissões e recusas por motivo desde o início do processo."""
+    with _counters.lock:
+        return {"checked": _counters.checked, "admitted": _counters.admitted,
+                "rejected": {reason: count for reason, count in _counters.rejected.items() if count}}
+
+_default_limits: tuple[config.Settings, AdmissionLimits] | None = None
+
+def default_limits() -> AdmissionLimits:
+    """Limites de NUTRISNAP_ADMISSION_* (recalculados se a configuração do processo for trocada)."""
+    global _default_limits
+    settings = config.get_settings()
+    cached = _default_limits
+    if cached is None or cached[0] is not settings:
+        cached = _default_limits = (settings, AdmissionLimits.from_settings(settings))
+    return cached[1]
@@ -1,130 +1,75 @@
 # nutrisnap_ai1/analysis.py
-import google.generativeai as genai
-from PIL import Image
-import json
+import asyncio
+import os
+import sys
+import threading
+import time
+from typing import AsyncIterator, Callable
 
+from . import admission
+from . import backends
+from . import cache
 from . import config
+from . import hedging
+from . import metrics
+from . import packing
+from . import parsing
+from . import ratelimit
 from . import utils # Para usar utils.print_log
 
-# Modo MOCK pode ser alterado por scripts externos (ex: run_analysis.py --mock)
-MOCK_MODE = False
+# O SDK do Gemini, phash (numpy) e preprocess (Pillow) são importados sob demanda,
+# para que importar este módulo continue barato (ver benchmarks/import_time.py).
 
-def _mock_gemini_vision_call(image_path_str: str) -> str:
-    """Retorna uma resposta mockada, como uma string JSON, similar à da API Gemini."""
-    utils.print_log("info", f"**** MODO MOCK ATIVADO PARA CHAMADA GEMINI (imagem: {image_path_str}) ****")
-    import time
-    time.sleep(0.2) # Simula pequena latência
-    
-    mock_data = {
-      "total_calories": 780,
-      "identified_items": [
-        {"item_name": "Peito de Frango Grelhado (Mock)", "estimated_calories": 320, "confidence": "Alto", "notes": "Porção de aproximadamente 150g."},
-        {"item_name": "Batata Doce Assada (Mock)", "estimated_calories": 220, "confidence": "Alto", "notes": "Cerca de 200g, parece ter um pouco de azeite."},
-        {"item_name": "Brócolis no Vapor (Mock)", "estimated_calories": 90, "confidence": "Médio", "notes": "Porção generosa, mas difícil estimar o volume exato."},
-        {"item_name": "Item Não Identificado - 1 (Mock)", "estimated_calories": None, "confidence": "Baixo", "notes": "Pequeno item escuro no canto, aparência inconclusiva."}
-      ],
-      "analysis_summary_notes": "Análise mock executada. A qualidade da imagem de teste é considerada boa. Um item não pôde ser identificado."
-    }
-    return json.dumps(mock_data)
-
-def _parse_gemini_response(response_text: str) -> dict | None:
-    """Analisa a resposta em texto do Gemini para extrair o JSON."""
-    utils.print_log("info", "Tentando parsear a resposta do modelo como JSON...")
-    utils.print_log("debug", f"Texto bruto recebido para parsing (primeiros 500 chars):\n{response_text[:500]}{'...' if len(response_text)>500 else ''}")
-
-    cleaned_text = response_text.strip()
-    # Remove ```json ... ``` se presente
-    if cleaned_text.startswith("```json"):
-        cleaned_text = cleaned_text[7:] # Remove ```json e o \n seguinte
-        if cleaned_text.endswith("```"):
-            cleaned_text = cleaned_text[:-3] # Remove ``` do final
-        cleaned_text = cleaned_text.strip()
-        utils.print_log("debug", "Bloco ```json detectado e removido da resposta.")
-    elif cleaned_text.startswith("```") and cleaned_text.endswith("```"): # Caso mais genérico de ```...```
-        cleaned_text = cleaned_text[3:-3].strip()
-        utils.print_log("debug", "Bloco ``` detectado e removido da resposta.")
-
-
-    if not cleaned_text:
-        utils.print_log("warn", "Após tentativa de limpeza, o texto da resposta está vazio.")
-        raise ValueError("Resposta do LLM vazia após tentativa de limpeza do encapsulamento JSON.")
+# Valores de "error" dos resultados cuja resposta chegou mas não pôde ser aproveitada
+# (usados pelo roteamento entre modelos para decidir a escalada, ver routing.py)
+PARSE_FAILURE_ERRORS = frozenset({"Falha no parsing da resposta do LLM", "Falha no parsing da resposta mock",
+                                  "Resposta de texto vazia"})
 
+def _parse_gemini_response(response_text: str) -> dict:
+    """Valida a resposta em texto do modelo (ver parsing.parse_analysis) e retorna o dicionário normalizado."""
+    if not response_text.strip():
+        raise ValueError("Resposta do LLM vazia.")
     try:
-        parsed_data = json.loads(cleaned_text)
-        # Validação básica da estrutura esperada (pode ser mais robusta)
-        if not isinstance(parsed_data, dict) or \
-           "identified_items" not in parsed_data or \
-           "total_calories" not in parsed_data or \
-           "analysis_summary_notes" not in parsed_data: # Checa se é dict e tem chaves esperadas
-            utils.print_log("warn", "JSON parseado, mas faltam chaves principais ou não é um dicionário. Verifique o prompt e a resposta do modelo.")
-            # Considerar levantar um erro aqui se a estrutura for estritamente necessária
-            # raise ValueError("JSON parseado não contém a estrutura esperada (identified_items, total_calories, analysis_summary_notes).")
-        
-        if "identified_items" in parsed_data and isinstance(parsed_data["identified_items"], list):
-            for item in parsed_data["identified_items"]:
-                if not isinstance(item, dict) or \
-                   not all(key in item for key in ["item_name", "estimated_calories", "confidence", "notes"]):
-                    utils.print_log("warn", f"Item na lista 'identified_items' não possui a estrutura esperada: {item}")
-                    # raise ValueError(f"Item em 'identified_items' não contém a estrutura esperada: {item}")
-                    break # Para o loop na primeira inconsistência de item
-
-        utils.print_log("success", "Resposta do LLM parseada como JSON com sucesso.")
-        return parsed_data
-    except json.JSONDecodeError as e:
-        utils.print_log("error", f"Falha ao decodificar JSON da resposta do LLM: {e}")
-        utils.print_log("debug", f"Texto que causou o erro de parsing (primeiros 500 chars): {cleaned_text[:500]}{'...' if len(cleaned_text)>500 else ''}")
-        raise ValueError(f"A resposta do LLM não era um JSON válido. Erro: {e}") # Re-levanta para ser pego pelo chamador
-    except Exception as e:
-        utils.print_log("error", f"Erro inesperado durante o parsing do JSON: {e}")
-        raise ValueError(f"Erro inesperado no parsing: {e}") # Re-levanta
-
-
-def analyze_image(image_path_str: str) -> dict:
-    """Analisa a imagem dada usando a API Gemini Vision."""
-    utils.print_log("info", f"Iniciando análise para a imagem: {image_path_str}")
-
-    # Checagem da API Key (a menos que em MOCK_MODE)
-    if not MOCK_MODE and not config.GEMINI_API_KEY:
-        utils.print_log("error", "Chave da API Gemini (GEMINI_API_KEY) não configurada.")
-        return {"status": "erro", "error": "API key não configurada", "details": "GEMINI_API_KEY não foi encontrada."}
-
-    pil_image = utils.load_image(image_path_str)
-    if not pil_image:
-        return {"status": "erro", "error": "Falha ao carregar imagem", "details": f"Não foi possível carregar: {image_path_str}"}
-
-    if MOCK_MODE:
-        utils.print_log("info", "Executando em MODO MOCK.")
-        try:
-            mock_response_text = _mock_gemini_vision_call(image_path_str)
-            parsed_data = _parse_gemini_response(mock_response_text)
-            return {"status": "sucesso (mock)", "data": parsed_data}
-        except Exception as e_mock_parse:
-            utils.print_log("error", f"Erro ao parsear resposta mock: {e_mock_parse}")
-            return {"status": "erro (mock)", "error": "Falha no parsing da resposta mock", "details": str(e_mock_parse)}
+        parsed = parsing.parse_analysis(response_text)
+    except ValueError as e:
+        utils.print_log("error", "Falha ao interpretar a resposta do LLM: %s", e)
+        raise
+    if parsed.repairs:
+        utils.print_log("warn", "Resposta do LLM reparada durante o parsing: %s", utils.lazy(", ".join, parsed.repairs))
+    return parsed.to_dict()
 
+def _parse_compact_response(response_text: str) -> dict:
+    """
+    Modo compacto: valida a resposta (itens e gramas, ver parsing.parse_compact_analysis) e calcula
+    as calorias pela tabela nutricional local (nutrition.compute_analysis).
+    """
+    if not response_text.strip():
+        raise ValueError("Resposta do LLM vazia.")
     try:
-        utils.print_log("info", "Configurando cliente Gemini API...")
-        genai.configure(api_key=config.GEMINI_API_KEY)
-        model = genai.GenerativeModel(config.MODEL_NAME)
-        utils.print_log("info", f"Modelo Gemini ({config.MODEL_NAME}) configurado.")
-
-        prompt_to_use = config.OPTIMIZED_PROMPT # Usa o prompt do config.py
-
-        utils.print_log("info", "Enviando requisição para a API Gemini...")
-        response = model.generate_content([prompt_to_use, pil_image])
-        utils.print_log("success", "Resposta recebida da API Gemini.")
-
-        # Processamento da resposta
-        response_text = ""
-        if response.prompt_feedback and response.prompt_feedback.block_reason:
-            reason = response.prompt_feedback.block_reason
-            utils.print_log("error", f"Prompt bloqueado pela API Gemini. Razão: {reason}")
-            return {"status": "erro", "error": "Prompt bloqueado", "details": str(reason), "safety_ratings": str(response.prompt_feedback.safety_ratings or "N/A")}
-        
+        parsed = parsing.parse_compact_analysis(response_text)
+    except ValueError as e:
+        utils.print_log("error", "Falha ao interpretar a resposta do LLM: %s", e)
+        raise
+    if parsed.repairs:
+        utils.print_log("warn", "Resposta do LLM reparada durante o parsing: %s", utils.lazy(", ".join, parsed.repairs))
+    from . import nutrition # numpy só é carregado no modo compacto
+    return nutrition.compute_analysis(parsed)
+
+def _result_from_response(response, timings: metrics.StageTimings | None = None,
+                          parse: Callable[[str], dict] = _parse_gemini_response) -> dict:
+    """Converte a resposta do SDK (sync ou async) no dicionário de resultado padrão (`parse` valida o texto)."""
+    # Processamento da resposta
+    response_text = ""
+    if response.prompt_feedback and response.prompt_feedback.block_reason:
+        reason = response.prompt_feedback.block_reason
+        utils.print_log("error", "Prompt bloqueado pela API Gemini. Razão: %s", reason)
+        return {"status": "erro", "error": "Prompt bloqueado", "details": str(reason), "safety_ratings": str(response.prompt_feedback.safety_ratings or "N/A")}
+    
+    with metrics.span(timings, "extract_text"):
         try:
             response_text = response.text # Tentativa de acesso direto ao texto
         except ValueError as ve: # Pode ocorrer se a resposta não for texto simples
-            utils.print_log("warn", f"response.text não pôde ser acessado diretamente ({ve}). Verificando 'candidates' e 'parts'...")
+            utils.print_log("warn", "response.text não pôde ser acessado diretamente (%s). Verificando 'candidates' e 'parts'...", ve)
             try:
                 if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
                     # Concatena o texto de todas as partes textuais
@@ -134,22 +79,722 @@ def analyze_image(image_path_str: str) -> dict:
                     utils.print_log("error", "Resposta da API não contém 'candidates' ou 'parts' textuais esperadas.")
                     raise ValueError("Conteúdo de texto não encontrado na estrutura de resposta complexa.")
             except Exception as e_parts: # Captura qualquer erro ao tentar acessar as partes
-                utils.print_log("error", f"Não foi possível extrair texto das 'parts' da resposta da API: {e_parts}")
+                utils.print_log("error", "Não foi possível extrair texto das 'parts' da resposta da API: %s", e_parts)
                 return {"status": "erro", "error": "Falha ao extrair conteúdo da resposta", "details": str(e_parts), "raw_response_preview": str(response)[:500]}
-        
-        if not response_text.strip(): # Checa se o texto extraído está vazio ou só com espaços
-            utils.print_log("warn", "O texto da resposta do Gemini está vazio.")
-            return {"status": "erro", "error": "Resposta de texto vazia", "details": "O modelo Gemini retornou um texto vazio."}
-
-        # Parsing da resposta
-        parsed_data = _parse_gemini_response(response_text)
-        return {"status": "sucesso", "data": parsed_data}
-
-    except genai.types.generation_types.BlockedPromptException as bpe:
-        utils.print_log("error", f"Requisição bloqueada (BlockedPromptException): {bpe.prompt_feedback.block_reason}")
-        return {"status": "erro", "error": "Prompt bloqueado pela API", "details": f"Razão: {bpe.prompt_feedback.block_reason}, Safety Ratings: {bpe.prompt_feedback.safety_ratings}"}
-    except Exception as e:
-        utils.print_log("error", f"Erro geral na API Gemini ou processamento: {e}")
-        import traceback
-        utils.print_log("debug", f"Traceback completo: {traceback.format_exc()}")
-        return {"status": "erro", "error": "Erro na comunicação ou processamento da API", "details": str(e)}
\ No newline at end of file
+    
+    if not response_text.strip(): # Checa se o texto extraído está vazio ou só com espaços
+        utils.print_log("warn", "O texto da resposta do Gemini está vazio.")
+        return {"status": "erro", "error": "Resposta de texto vazia", "details": "O modelo Gemini retornou um texto vazio."}
+
+    # Parsing da resposta
+    with metrics.span(timings, "parse_response"):
+        try:
+            parsed_data = parse(response_text)
+        except ValueError as e: # A falha já foi logada pelo parser
+            return {"status": "erro", "error": "Falha no parsing da resposta do LLM", "details": str(e)}
+    return {"status": "sucesso", "data": parsed_data}
+
+def _result_from_stream(parser: parsing.IncrementalItemParser, on_item: Callable[[dict], None], status: str,
+                        timings: metrics.StageTimings | None = None) -> dict:
+    """
+    Finaliza uma resposta em streaming: valida o texto completo e entrega via `on_item` os itens
+    que só apareceram no reparo final (ex: item parcial de uma resposta truncada).
+    """
+    if not parser.text.strip():
+        utils.print_log("warn", "O texto da resposta do Gemini está vazio.")
+        return {"status": "erro", "error": "Resposta de texto vazia", "details": "O modelo Gemini retornou um texto vazio."}
+    with metrics.span(timings, "parse_response"):
+        parsed = parser.finish()
+    for item in parsed.identified_items[parser.items_emitted:]:
+        on_item(parsing.item_to_dict(item))
+    if parsed.repairs:
+        utils.print_log("warn", "Resposta do LLM reparada durante o parsing: %s", utils.lazy(", ".join, parsed.repairs))
+    return {"status": status, "data": parsed.to_dict()}
+
+def _emit_items(result: dict, on_item: Callable[[dict], None]):
+    """Entrega de uma vez os itens de um resultado já pronto (cache, quase-duplicata)."""
+    for item in (result.get("data") or {}).get("identified_items") or []:
+        on_item(item)
+
+def _timed_on_item(on_item: Callable[[dict], None], timings: metrics.StageTimings | None) -> Callable[[dict], None]:
+    """Registra o tempo até o primeiro item (estágio "first_item", desde o início da análise)."""
+    if timings is None:
+        return on_item
+
+    def _wrapped(item: dict):
+        if "first_item" not in timings.stages:
+            timings.add("first_item", time.perf_counter_ns() - timings.started_ns)
+        on_item(item)
+    return _wrapped
+
+def _is_blocked_prompt_exception(e: Exception) -> bool:
+    genai = sys.modules.get("google.generativeai") # Sem o SDK carregado, a exceção não pode ser dele
+    return genai is not None and isinstance(e, genai.types.generation_types.BlockedPromptException)
+
+_PAYLOAD_SIZE_MARKERS = ("payload size", "request entity too large", "request too large", "exceeds the maximum")
+
+def _is_oversized_pack_error(e: Exception) -> bool:
+    """
+    Requisição empacotada recusada pelo tamanho: 413 ou erro da API que cita o tamanho do payload
+    (ex: 400 InvalidArgument "Request payload size exceeds the limit"). Outros 400 (schema,
+    generation_config, imagem inválida) se repetiriam em cada metade e não contam.
+    """
+    if isinstance(e, ValueError):
+        return False
+    if getattr(e, "code", None) == 413:
+        return True
+    return any(marker in str(e).lower() for marker in _PAYLOAD_SIZE_MARKERS)
+
+def _result_from_exception(e: Exception) -> dict:
+    """Converte exceções da chamada à API no dicionário de resultado padrão."""
+    if _is_blocked_prompt_exception(e):
+        utils.print_log("error", "Requisição bloqueada (BlockedPromptException): %s", e.prompt_feedback.block_reason)
+        return {"status": "erro", "error": "Prompt bloqueado pela API", "details": f"Razão: {e.prompt_feedback.block_reason}, Safety Ratings: {e.prompt_feedback.safety_ratings}"}
+    if isinstance(e, backends.PromptBlockedError):
+        utils.print_log("error", "Prompt bloqueado pela API Gemini (streaming). Razão: %s", e)
+        return {"status": "erro", "error": "Prompt bloqueado pela API", "details": f"Razão: {e}"}
+    if isinstance(e, backends.ReplayMissError):
+        utils.print_log("error", str(e))
+        return {"status": "erro", "error": "Resposta gravada não encontrada", "details": str(e)}
+    if ratelimit.classify_error(e) == ratelimit.THROTTLE:
+        utils.print_log("error", "Cota da API Gemini excedida mesmo após retentativas: %s", e)
+        return {"status": "erro", "error": "Limite de requisições da API excedido", "details": str(e)}
+    utils.print_log("error", "Erro geral na API Gemini ou processamento: %s", e)
+    import traceback
+    utils.print_log("debug", "Traceback completo: %s", utils.lazy(traceback.format_exc))
+    return {"status": "erro", "error": "Erro na comunicação ou processamento da API", "details": str(e)}
+
+def _mock_result(response_text: str, timings: metrics.StageTimings | None = None,
+                 parse: Callable[[str], dict] = _parse_gemini_response) -> dict:
+    try:
+        with metrics.span(timings, "parse_response"):
+            parsed_data = parse(response_text)
+        return {"status": "sucesso (mock)", "data": parsed_data}
+    except Exception as e_mock_parse:
+        utils.print_log("error", "Erro ao parsear resposta mock: %s", e_mock_parse)
+        return {"status": "erro (mock)", "error": "Falha no parsing da resposta mock", "details": str(e_mock_parse)}
+
+def _api_key_missing_result() -> dict:
+    utils.print_log("error", "Chave da API Gemini (GEMINI_API_KEY) não configurada.")
+    return {"status": "erro", "error": "API key não configurada", "details": "GEMINI_API_KEY não foi encontrada."}
+
+def _image_load_failed_result(image_path_str: str) -> dict:
+    return {"status": "erro", "error": "Falha ao carregar imagem", "details": f"Não foi possível carregar: {image_path_str}"}
+
+def _load_image_part(image_path_str: str, as_blob: bool, timings: metrics.StageTimings | None = None):
+    """
+    Carrega a imagem (executado fora do event loop). Com `as_blob`, já converte para o
+    blob inline aceito pelo SDK, para que a leitura/codificação não aconteça no event loop.
+    """
+    with metrics.span(timings, "load_image"):
+        pil_image = utils.load_image(image_path_str)
+        if not pil_image or not as_blob:
+            return pil_image
+        from google.generativeai.types import content_types
+        with pil_image: # O blob já tem os bytes; o arquivo não é mais necessário
+            blob = content_types.image_to_blob(pil_image)
+        return {"mime_type": blob.mime_type, "data": blob.data}
+
+def _with_preprocessing(result: dict, preprocessing_report: dict | None) -> dict:
+    if preprocessing_report is not None:
+        result["preprocessing"] = preprocessing_report
+    return result
+
+def _part_size(image_part, image_path_str: str) -> int:
+    """Bytes que a imagem ocupa na requisição (blob inline) ou, para imagens PIL, no disco."""
+    if isinstance(image_part, dict):
+        return len(image_part["data"])
+    return os.path.getsize(image_path_str)
+
+class _PackEntry:
+    """Estado de uma imagem no modo empacotado (analyze_packed)."""
+    __slots__ = ("index", "image_path", "timings", "cache_key", "image_phash", "image_part",
+                 "preprocessing_report", "result")
+
+    def __init__(self, index: int, image_path: str, timings: metrics.StageTimings | None):
+        self.index = index
+        self.image_path = image_path
+        self.timings = timings
+        self.cache_key = None
+        self.image_phash = None
+        self.image_part = None
+        self.preprocessing_report = None
+        self.result: dict | None = None
+
+class AnalyzerSession:
+    """
+    Sessão de análise de longa duração e thread-safe.
+    Mantém o cliente configurado, o modelo, o prompt e as configurações de geração entre chamadas,
+    reaproveitando as conexões HTTP/gRPC em vez de recriá-las a cada imagem.
+    Com `compact` (padrão: NUTRISNAP_PROMPT_MODE=compact), o modelo só informa itens e porções em
+    gramas (config.COMPACT_PROMPT) e as calorias vêm da tabela nutricional local (ver nutrition.py).
+    Com `admission_checks` (padrão: NUTRISNAP_ADMISSION), cada imagem passa antes pela admissão pelo
+    cabeçalho (ver admission.py) e as recusadas retornam status "rejeitado" sem cache nem backend.
+    Com `hedger` (padrão: NUTRISNAP_HEDGE=1), chamadas lentas ao backend ganham uma duplicata (ver hedging.py).
+    """
+
+    def __init__(self, api_key: str | None = None, model_name: str | None = None,
+                 prompt: str | None = None, generation_config: dict | None = None,
+                 preprocess_images: bool | None = None, near_duplicates: bool | None = None,
+                 limiter: ratelimit.RateLimiter | bool | None = None, model=None,
+                 backend: backends.Backend | None = None, compact: bool | None = None,
+                 admission_checks: bool | None = None, hedger: hedging.Hedger | bool | None = None):
+        self.api_key = api_key if api_key is not None else config.get_settings().gemini_api_key
+        self.model_name = model_name or config.MODEL_NAME
+        self.compact = config.get_settings().prompt_mode == "compact" if compact is None else compact
+        if prompt is None:
+            prompt = config.COMPACT_PROMPT if self.compact else config.OPTIMIZED_PROMPT
+        self.prompt = prompt
+        self._parse_response = _parse_compact_response if self.compact else _parse_gemini_response
+        self.generation_config = generation_config
+        self.preprocess_images = config.get_settings().preprocess_enabled if preprocess_images is None else preprocess_images
+        self.near_duplicates = config.get_settings().phash_enabled if near_duplicates is None else near_duplicates
+        self.admission_checks = config.get_settings().admission_enabled if admission_checks is None else admission_checks
+        # limiter: None usa o limitador padrão (se habilitado em config), False desativa
+        if limiter is None:
+            limiter = ratelimit.get_default_limiter() if config.get_settings().rate_limit_enabled else False
+        self.limiter = limiter or None
+        # hedger: None cria um próprio (histograma desta sessão, orçamento global) se habilitado em config, False desativa
+        if hedger is None:
+            hedger = hedging.Hedger.from_settings() if config.get_settings().hedge_enabled else False
+        self.hedger = hedger or None
+        self._estimated_tokens = ratelimit.estimate_input_tokens(self.prompt)
+        # backend: None usa config.get_settings().backend; `model` injeta um modelo pronto no backend Gemini
+        if backend is None:
+            if model is not None:
+                backend = backends.GeminiBackend(self.api_key, self.model_name, generation_config, model=model)
+            else:
+                backend = backends.create_backend(config.get_settings().backend, self.api_key, self.model_name, generation_config,
+                                                  record=config.get_settings().record_responses)
+        self.backend = backend
+
+    @property
+    def model(self):
+        """Modelo do backend Gemini da sessão (criado na primeira chamada)."""
+        return self.backend.model
+
+    def _generate(self, backend: backends.Backend, request: backends.GenerationRequest):
+        limiter = self.limiter if backend.rate_limited else None
+
+        def _hedge(): # A duplicata ocupa vaga e cota próprias no limitador; sem elas agora, não sai
+            if not limiter.try_admit(self._estimated_tokens):
+                raise hedging.HedgeRejected()
+            return limiter.run_admitted(lambda: backend.generate(request))
+
+        def _attempt():
+            if self.hedger is None:
+                return backend.generate(request)
+            return self.hedger.call(lambda: backend.generate(request), _hedge if limiter is not None else None)
+
+        if limiter is None:
+            return _attempt()
+        return limiter.call(_attempt, estimated_tokens=self._estimated_tokens)
+
+    async def _generate_async(self, backend: backends.Backend, request: backends.GenerationRequest):
+        limiter = self.limiter if backend.rate_limited else None
+
+        async def _hedge():
+            if not limiter.try_admit(self._estimated_tokens):
+                raise hedging.HedgeRejected()
+            return await limiter.run_admitted_async(lambda: backend.generate_async(request))
+
+        async def _attempt():
+            if self.hedger is None:
+                return await backend.generate_async(request)
+            return await self.hedger.call_async(lambda: backend.generate_async(request),
+                                                _hedge if limiter is not None else None)
+
+        if limiter is None:
+            return await _attempt()
+        return await limiter.call_async(_attempt, estimated_tokens=self._estimated_tokens)
+
+    def _stream(self, backend: backends.Backend, request: backends.GenerationRequest, on_chunk: Callable[[str], None]):
+        """
+        Consome o streaming do backend repassando cada pedaço a `on_chunk`. Falhas antes do
+        primeiro pedaço são retentadas pelo limitador; depois dele viram StreamInterruptedError,
+        já que parte da resposta foi entregue e repetir a chamada duplicaria itens.
+        """
+        def _attempt():
+            received = False
+            try:
+                for text in backend.generate_stream(request):
+                    received = True
+                    on_chunk(text)
+            except Exception as e:
+                if received:
+                    raise backends.StreamInterruptedError(f"Streaming interrompido após resposta parcial: {e}") from e
+                raise
+
+        if self.limiter is None or not backend.rate_limited:
+            return _attempt()
+        return self.limiter.call(_attempt, estimated_tokens=self._estimated_tokens)
+
+    async def _stream_async(self, backend: backends.Backend, request: backends.GenerationRequest,
+                            on_chunk: Callable[[str], None]):
+        async def _attempt():
+            received = False
+            try:
+                async for text in backend.generate_stream_async(request):
+                    received = True
+                    on_chunk(text)
+            except Exception as e:
+                if received:
+                    raise backends.StreamInterruptedError(f"Streaming interrompido após resposta parcial: {e}") from e
+                raise
+
+        if self.limiter is None or not backend.rate_limited:
+            return await _attempt()
+        return await self.limiter.call_async(_attempt, estimated_tokens=self._estimated_tokens)
+
+    @staticmethod
+    def _item_feeder(parser: parsing.IncrementalItemParser, on_item: Callable[[dict], None]) -> Callable[[str], None]:
+        def _on_chunk(text: str):
+            for item in parser.feed(text):
+                on_item(parsing.item_to_dict(item))
+        return _on_chunk
+
+    def _request(self, image_part, image_path_str: str) -> backends.GenerationRequest:
+        if self.compact:
+            return backends.GenerationRequest([self.prompt, image_part], image_path_str, self.prompt, self.model_name,
+                                              generation_config=parsing.compact_generation_config(), compact=True)
+        return backends.GenerationRequest([self.prompt, image_part], image_path_str, self.prompt, self.model_name)
+
+    def _admit(self, image_path_str: str) -> dict | None:
+        """Resultado de recusa se a imagem não passar na admissão pelo cabeçalho; None se admitida."""
+        if not self.admission_checks:
+            return None
+        rejection = admission.check(image_path_str) # Microssegundos: roda direto, inclusive no event loop
+        if rejection is None:
+            return None
+        utils.print_log("warn", "Imagem rejeitada na admissão (%s): %s", rejection.reason, image_path_str)
+        return rejection.result()
+
+    def _cache_lookup(self, image_path_str: str, refresh_cache: bool) -> tuple[str | None, dict | None]:
+        """Calcula a chave de cache da imagem e retorna (chave, resultado em cache ou None)."""
+        try:
+            image_hash = cache.file_sha256(image_path_str)
+        except OSError:
+            return None, None # A falha de leitura será reportada por load_image
+        cache_key = cache.make_cache_key(image_hash, self.prompt, self.model_name)
+        if refresh_cache:
+            return cache_key, None
+        cached_result = cache.get_default_cache().get(cache_key)
+        if cached_result is not None:
+            utils.print_log("info", "Resultado encontrado no cache para: %s", image_path_str)
+            cached_result["cache_hit"] = True
+        return cache_key, cached_result
+
+    def _prepare_image_part(self, image_path_str: str, as_blob: bool,
+                            timings: metrics.StageTimings | None = None) -> tuple[object | None, dict | None]:
+        """Retorna (parte da imagem para a requisição, relatório de pré-processamento ou None)."""
+        if not self.preprocess_images:
+            return _load_image_part(image_path_str, as_blob, timings), None
+        from . import preprocess
+        prepared = preprocess.prepare_image(image_path_str, timings=timings)
+        if prepared is None:
+            return None, None
+        utils.print_log("info", "Imagem preparada para upload: %s -> %s bytes (%sx%s -> %sx%s%s)",
+                        prepared.bytes_before, prepared.bytes_after, *prepared.size_before, *prepared.size_after,
+                        ", sem recodificação" if prepared.passthrough else "")
+        return prepared.as_part(), prepared.report()
+
+    def _near_duplicate_lookup(self, image_path_str: str, refresh_cache: bool) -> tuple[int | None, dict | None]:
+        """Calcula o pHash e procura uma análise anterior de imagem visualmente idêntica."""
+        from . import phash
+        image_phash = phash.compute_phash(image_path_str)
+        if image_phash is None or refresh_cache:
+            return image_phash, None
+        match = phash.get_default_index(self._phash_scope).lookup(image_phash, config.get_settings().phash_max_distance)
+        if match is None:
+            return image_phash, None
+        matched_key, distance = match
+        matched_result = cache.get_default_cache().get(matched_key)
+        if matched_result is None: # A entrada original já saiu do cache
+            return image_phash, None
+        utils.print_log("info", "Quase-duplicata encontrada para %s (distância de Hamming %s).", image_path_str, distance)
+        matched_result["near_duplicate_hit"] = True
+        matched_result["phash_distance"] = distance
+        return image_phash, matched_result
+
+    @property
+    def _phash_scope(self) -> str:
+        """Índice de quase-duplicatas desta sessão: um por par prompt/modelo (ver phash.index_scope)."""
+        from . import phash
+        return phash.index_scope(self.prompt, self.model_name)
+
+    def _cache_store(self, cache_key: str | None, result: dict, image_phash: int | None = None):
+        if cache_key is None:
+            return
+        if parsing.is_truncated(result.get("data")): # Itens faltando: não reaproveita, a próxima chamada refaz
+            utils.print_log("warn", "Resposta truncada não gravada no cache nem no índice de quase-duplicatas.")
+            return
+        cache.get_default_cache().put(cache_key, result)
+        if image_phash is not None and result.get("status") == "sucesso":
+            from . import phash
+            phash.get_default_index(self._phash_scope).add(image_phash, cache_key)
+
+    def analyze(self, image_path_str: str, use_cache: bool = True, refresh_cache: bool = False,
+                backend: backends.Backend | None = None, admit: bool = True) -> dict:
+        """
+        Analisa a imagem dada usando o backend da sessão (ou `backend`, só para esta chamada).
+        Com `use_cache`, resultados bem-sucedidos são reutilizados a partir do cache persistente
+        (chave: bytes da imagem + prompt + modelo); `refresh_cache` força nova chamada e sobrescreve a entrada.
+        Com a instrumentação ligada (metrics), o resultado inclui o bloco `timings` por estágio.
+        `admit=False` pula a admissão da sessão, para imagens que o chamador já verificou.
+        """
+        timings = metrics.new_timings()
+        result = self._analyze(image_path_str, use_cache, refresh_cache, self.backend if backend is None else backend, timings,
+                               admit=admit)
+        return metrics.finish(timings, result)
+
+    def analyze_stream(self, image_path_str: str, on_item: Callable[[dict], None], use_cache: bool = True,
+                       refresh_cache: bool = False, backend: backends.Backend | None = None) -> dict:
+        """
+        Como analyze, mas pede a resposta em streaming e chama `on_item(item)` para cada entrada de
+        identified_items assim que ela chega completa (no mesmo formato de data["identified_items"]).
+        Resultados do cache entregam todos os itens de uma vez. Retorna o resultado completo ao final.
+        Com a instrumentação ligada, timings inclui "first_item" (tempo até o primeiro item).
+        """
+        timings = metrics.new_timings()
+        result = self._analyze(image_path_str, use_cache, refresh_cache, self.backend if backend is None else backend,
+                               timings, _timed_on_item(on_item, timings))
+        return metrics.finish(timings, result)
+
+    def _analyze(self, image_path_str: str, use_cache: bool, refresh_cache: bool, backend: backends.Backend,
+                 timings: metrics.StageTimings | None, on_item: Callable[[dict], None] | None = None,
+                 admit: bool = True) -> dict:
+        utils.print_log("info", "Iniciando análise para a imagem: %s", image_path_str)
+        rejected = self._admit(image_path_str) if admit else None
+        if rejected is not None:
+            return rejected
+
+        cache_key, image_phash = None, None
+        if use_cache and backend.uses_cache:
+            cache_key, image_phash, cached_result = self._lookup_cached(image_path_str, refresh_cache, timings)
+            if cached_result is not None:
+                if on_item is not None:
+                    _emit_items(cached_result, on_item)
+                return cached_result
+
+        if backend.requires_api_key and not self.api_key:
+            return _api_key_missing_result()
+
+        image_part, preprocessing_report = self._prepare_image_part(image_path_str, False, timings)
+        if not image_part:
+            return _image_load_failed_result(image_path_str)
+        request = self._request(image_part, image_path_str)
+
+        if on_item is not None and not self.compact:
+            try:
+                utils.print_log("info", "Enviando requisição em streaming para o backend '%s'...", backend.name)
+                parser = parsing.IncrementalItemParser()
+                with metrics.span(timings, "generate_content"):
+                    self._stream(backend, request, self._item_feeder(parser, on_item))
+                result = _result_from_stream(parser, on_item, "sucesso (mock)" if backend.is_mock else "sucesso", timings)
+                self._cache_store(cache_key, result, image_phash)
+                return _with_preprocessing(result, preprocessing_report)
+            except Exception as e:
+                return _result_from_exception(e)
+
+        result = self._generate_result(backend, request, timings)
+        self._cache_store(cache_key, result, image_phash)
+        if on_item is not None: # Modo compacto: as calorias só existem com a resposta completa
+            _emit_items(result, on_item)
+        return _with_preprocessing(result, preprocessing_report)
+
+    def _lookup_cached(self, image_path_str: str, refresh_cache: bool,
+                       timings: metrics.StageTimings | None) -> tuple[str | None, int | None, dict | None]:
+        """Consulta o cache exato e o índice de quase-duplicatas: (chave, pHash, resultado ou None)."""
+        with metrics.span(timings, "cache_lookup"):
+            cache_key, cached_result = self._cache_lookup(image_path_str, refresh_cache)
+        if cached_result is not None:
+            return cache_key, None, cached_result
+        image_phash = None
+        if self.near_duplicates and cache_key is not None:
+            with metrics.span(timings, "near_duplicate_lookup"):
+                image_phash, near_result = self._near_duplicate_lookup(image_path_str, refresh_cache)
+            if near_result is not None:
+                return cache_key, image_phash, near_result
+        return cache_key, image_phash, None
+
+    def _generate_result(self, backend: backends.Backend, request: backends.GenerationRequest,
+                         timings: metrics.StageTimings | None) -> dict:
+        """Chamada de uma única imagem ao backend, convertida no dicionário de resultado padrão."""
+        if backend.is_mock:
+            utils.print_log("info", "Executando em MODO MOCK.")
+            with metrics.span(timings, "generate_content"):
+                mock_response = backend.generate(request)
+            return _mock_result(mock_response.text, timings, self._parse_response)
+
+        try:
+            utils.print_log("info", "Enviando requisição para o backend '%s'...", backend.name)
+            with metrics.span(timings, "generate_content"):
+                response = self._generate(backend, request)
+            utils.print_log("success", "Resposta recebida do backend '%s'.", backend.name)
+            return _result_from_response(response, timings, self._parse_response)
+        except Exception as e:
+            return _result_from_exception(e)
+
+    def analyze_packed(self, image_paths: list[str], use_cache: bool = True, refresh_cache: bool = False,
+                       backend: backends.Backend | None = None, max_images: int | None = None,
+                       max_bytes: int | None = None) -> list[dict]:
+        """
+        Analisa várias imagens com menos requisições: as que não estão no cache são agrupadas em
+        pacotes (até `max_images` imagens e `max_bytes` bytes após o pré-processamento, padrão em
+        NUTRISNAP_PACK_*) e cada pacote vai em uma única chamada com o prompt compartilhado.
+        Se a resposta de um pacote não puder ser interpretada, ou se a API recusar o pacote pelo
+        tamanho, ele é dividido ao meio e reenviado; uma imagem sozinha usa a requisição normal. Retorna os resultados na ordem de `image_paths`,
+        no formato de analyze (com "pack_size" nos resultados vindos de pacotes). No modo compacto,
+        cada imagem usa a requisição normal (o formato empacotado é o da resposta completa).
+        """
+        backend = self.backend if backend is None else backend
+        entries = []
+        results: list[dict | None] = [None] * len(image_paths)
+        for index, image_path_str in enumerate(image_paths):
+            rejected = self._admit(image_path_str)
+            if rejected is not None:
+                results[index] = rejected
+                continue
+            entry = _PackEntry(index, image_path_str, metrics.new_timings())
+            if use_cache and backend.uses_cache:
+                entry.cache_key, entry.image_phash, cached_result = self._lookup_cached(image_path_str, refresh_cache, entry.timings)
+                if cached_result is not None:
+                    results[index] = metrics.finish(entry.timings, cached_result)
+                    continue
+            if backend.requires_api_key and not self.api_key:
+                results[index] = _api_key_missing_result()
+                continue
+            entry.image_part, entry.preprocessing_report = self._prepare_image_part(image_path_str, True, entry.timings)
+            if not entry.image_part:
+                results[index] = _image_load_failed_result(image_path_str)
+                continue
+            entries.append(entry)
+
+        sizes = [_part_size(entry.image_part, entry.image_path) for entry in entries]
+        for pack in packing.plan_packs(sizes, max_images, max_bytes):
+            self._analyze_pack(backend, [entries[i] for i in pack])
+
+        for entry in entries:
+            self._cache_store(entry.cache_key, entry.result, entry.image_phash)
+            results[entry.index] = metrics.finish(entry.timings, _with_preprocessing(entry.result, entry.preprocessing_report))
+        return results
+
+    def _analyze_pack(self, backend: backends.Backend, entries: list["_PackEntry"]):
+        """Executa um pacote e preenche entry.result; divide e reenvia o que não veio na resposta."""
+        if len(entries) == 1 or self.compact:
+            for entry in entries:
+                entry.result = self._generate_result(backend, self._request(entry.image_part, entry.image_path), entry.timings)
+            return
+
+        prompt = packing.packed_prompt(self.prompt, len(entries))
+        request = backends.GenerationRequest(
+            packing.packed_parts(prompt, [entry.image_part for entry in entries]), None, prompt, self.model_name,
+            image_count=len(entries), generation_config=parsing.packed_generation_config(),
+            image_sha256=packing.pack_sha256([cache.file_sha256(entry.image_path) for entry in entries]),
+        )
+        utils.print_log("info", "Enviando pacote de %s imagens para o backend '%s'...", len(entries), backend.name)
+        started_ns = time.perf_counter_ns()
+        try:
+            if backend.is_mock or self.limiter is None or not backend.rate_limited:
+                response = backend.generate(request)
+            else:
+                estimated_tokens = ratelimit.estimate_input_tokens(prompt, len(entries))
+                response = self.limiter.call(lambda: backend.generate(request), estimated_tokens=estimated_tokens)
+            response_text = backends.chunk_text(response)
+            generated_ns = time.perf_counter_ns()
+        except Exception as e:
+            if _is_oversized_pack_error(e):
+                utils.print_log("warn", "Pacote de %s imagens recusado pelo tamanho (%s); dividindo e reenviando.", len(entries), e)
+                for half in packing.split_pack(entries):
+                    self._analyze_pack(backend, half)
+                return
+            result = _result_from_exception(e)
+            for entry in entries:
+                entry.result = dict(result)
+            return
+        try:
+            analyses = parsing.parse_packed_analysis(response_text, len(entries))
+        except ValueError as e: # Pacotes menores geram respostas mais curtas, com menos chance de truncar
+            utils.print_log("warn", "Resposta do pacote de %s imagens inaproveitável (%s); dividindo e reenviando.", len(entries), e)
+            for half in packing.split_pack(entries):
+                self._analyze_pack(backend, half)
+            return
+        parsed_ns = time.perf_counter_ns()
+
+        missing = []
+        for position, entry in enumerate(entries):
+            if entry.timings is not None:
+                entry.timings.add("generate_content", generated_ns - started_ns)
+                entry.timings.add("parse_response", parsed_ns - generated_ns)
+            analysis = analyses.get(position)
+            if analysis is None:
+                missing.append(entry)
+                continue
+            if analysis.repairs:
+                utils.print_log("warn", "Resposta do LLM reparada durante o parsing (%s): %s", entry.image_path,
+                                utils.lazy(", ".join, analysis.repairs))
+            entry.result = {"status": "sucesso (mock)" if backend.is_mock else "sucesso",
+                            "data": analysis.to_dict(), "pack_size": len(entries)}
+        if missing:
+            utils.print_log("warn", "%s de %s imagens ausentes na resposta do pacote; reenviando.", len(missing), len(entries))
+            self._analyze_pack(backend, missing)
+
+    async def analyze_async(self, image_path_str: str, use_cache: bool = True, refresh_cache: bool = False,
+                            backend: backends.Backend | None = None, admit: bool = True) -> dict:
+        """Versão asyncio de analyze: usa generate_async do backend e mantém o mesmo formato de resultado."""
+        timings = metrics.new_timings()
+        result = await self._analyze_async(image_path_str, use_cache, refresh_cache, self.backend if backend is None else backend,
+                                           timings, admit=admit)
+        return metrics.finish(timings, result)
+
+    async def analyze_stream_async(self, image_path_str: str, on_item: Callable[[dict], None], use_cache: bool = True,
+                                   refresh_cache: bool = False, backend: backends.Backend | None = None) -> dict:
+        """Versão asyncio de analyze_stream (`on_item` é chamado no event loop, sem await)."""
+        timings = metrics.new_timings()
+        result = await self._analyze_async(image_path_str, use_cache, refresh_cache, self.backend if backend is None else backend,
+                                           timings, _timed_on_item(on_item, timings))
+        return metrics.finish(timings, result)
+
+    async def iter_items_async(self, image_path_str: str, use_cache: bool = True, refresh_cache: bool = False,
+                               backend: backends.Backend | None = None) -> AsyncIterator[tuple[str, dict]]:
+        """
+        Iterador assíncrono sobre analyze_stream_async: produz ("item", item) para cada item
+        à medida que chega e, por último, ("result", resultado completo).
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(self.analyze_stream_async(
+            image_path_str, lambda item: queue.put_nowait(("item", item)),
+            use_cache=use_cache, refresh_cache=refresh_cache, backend=backend))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (event := await queue.get()) is not None:
+                yield event
+            yield "result", task.result()
+        finally:
+            if not task.done(): # O consumidor parou de iterar antes do fim
+                task.cancel()
+
+    async def _analyze_async(self, image_path_str: str, use_cache: bool, refresh_cache: bool, backend: backends.Backend,
+                             timings: metrics.StageTimings | None, on_item: Callable[[dict], None] | None = None,
+                             admit: bool = True) -> dict:
+        utils.print_log("info", "Iniciando análise async para a imagem: %s", image_path_str)
+        rejected = self._admit(image_path_str) if admit else None
+        if rejected is not None:
+            return rejected
+
+        cache_key, image_phash = None, None
+        if use_cache and backend.uses_cache:
+            with metrics.span(timings, "cache_lookup"):
+                cache_key, cached_result = await asyncio.to_thread(self._cache_lookup, image_path_str, refresh_cache)
+            if cached_result is not None:
+                if on_item is not None:
+                    _emit_items(cached_result, on_item)
+                return cached_result
+            if self.near_duplicates and cache_key is not None:
+                with metrics.span(timings, "near_duplicate_lookup"):
+                    image_phash, near_result = await asyncio.to_thread(self._near_duplicate_lookup, image_path_str, refresh_cache)
+                if near_result is not None:
+                    if on_item is not None:
+                        _emit_items(near_result, on_item)
+                    return near_result
+
+        if backend.requires_api_key and not self.api_key:
+            return _api_key_missing_result()
+
+        image_part, preprocessing_report = await asyncio.to_thread(self._prepare_image_part, image_path_str,
+                                                                   not backend.is_mock, timings)
+        if not image_part:
+            return _image_load_failed_result(image_path_str)
+        request = self._request(image_part, image_path_str)
+
+        if on_item is not None and not self.compact:
+            try:
+                utils.print_log("info", "Enviando requisição async em streaming para o backend '%s'...", backend.name)
+                parser = parsing.IncrementalItemParser()
+                with metrics.span(timings, "generate_content"):
+                    await self._stream_async(backend, request, self._item_feeder(parser, on_item))
+                result = _result_from_stream(parser, on_item, "sucesso (mock)" if backend.is_mock else "sucesso", timings)
+                await asyncio.to_thread(self._cache_store, cache_key, result, image_phash)
+                return _with_preprocessing(result, preprocessing_report)
+            except Exception as e:
+                return _result_from_exception(e)
+
+        if backend.is_mock:
+            utils.print_log("info", "Executando em MODO MOCK (async).")
+            with metrics.span(timings, "generate_content"):
+                mock_response = await backend.generate_async(request)
+            result = _mock_result(mock_response.text, timings, self._parse_response)
+            if on_item is not None:
+                _emit_items(result, on_item)
+            return _with_preprocessing(result, preprocessing_report)
+
+        try:
+            utils.print_log("info", "Enviando requisição async para o backend '%s'...", backend.name)
+            with metrics.span(timings, "generate_content"):
+                response = await self._generate_async(backend, request)
+            utils.print_log("success", "Resposta recebida do backend '%s' (async).", backend.name)
+
+            result = _result_from_response(response, timings, self._parse_response)
+            await asyncio.to_thread(self._cache_store, cache_key, result, image_phash)
+            if on_item is not None:
+                _emit_items(result, on_item)
+            return _with_preprocessing(result, preprocessing_report)
+        except Exception as e:
+            return _result_from_exception(e)
+
+_default_session: AnalyzerSession | None = None
+_default_session_lock = threading.Lock()
+
+def get_default_session() -> AnalyzerSession:
+    """Sessão compartilhada usada por analyze_image/analyze_image_async."""
+    global _default_session
+    if _default_session is None:
+        with _default_session_lock:
+            if _default_session is None:
+                _default_session = AnalyzerSession()
+    return _default_session
+
+def analyze_image(image_path_str: str, use_cache: bool = True, refresh_cache: bool = False,
+                  backend: backends.Backend | None = None) -> dict:
+    """Analisa a imagem dada via sessão padrão (backend da sessão, ou `backend` só para esta chamada)."""
+    return get_default_session().analyze(image_path_str, use_cache=use_cache, refresh_cache=refresh_cache, backend=backend)
+
+async def analyze_image_async(image_path_str: str, use_cache: bool = True, refresh_cache: bool = False,
+                              backend: backends.Backend | None = None) -> dict:
+    """Versão asyncio de analyze_image (via sessão padrão)."""
+    return await get_default_session().analyze_async(image_path_str, use_cache=use_cache,
+                                                     refresh_cache=refresh_cache, backend=backend)
+
+def analyze_image_stream(image_path_str: str, on_item: Callable[[dict], None], use_cache: bool = True,
+                         refresh_cache: bool = False, backend: backends.Backend | None = None) -> dict:
+    """Versão em streaming de analyze_image: chama `on_item` para cada item assim que ele chega."""
+    return get_default_session().analyze_stream(image_path_str, on_item, use_cache=use_cache,
+                                                refresh_cache=refresh_cache, backend=backend)
+
+async def analyze_image_stream_async(image_path_str: str, on_item: Callable[[dict], None], use_cache: bool = True,
+                                     refresh_cache: bool = False, backend: backends.Backend | None = None) -> dict:
+    """Versão asyncio de analyze_image_stream (via sessão padrão)."""
+    return await get_default_session().analyze_stream_async(image_path_str, on_item, use_cache=use_cache,
+                                                            refresh_cache=refresh_cache, backend=backend)
+
+def analyze_images_packed(image_paths: list[str], use_cache: bool = True, refresh_cache: bool = False,
+                          backend: backends.Backend | None = None) -> list[dict]:
+    """Analisa várias imagens em requisições empacotadas (via sessão padrão, ver AnalyzerSession.analyze_packed)."""
+    return get_default_session().analyze_packed(image_paths, use_cache=use_cache, refresh_cache=refresh_cache, backend=backend)
+
+async def analyze_many_async(image_paths: list[str], max_in_flight: int = 32,
+                             backend: backends.Backend | None = None) -> list[dict]:
+    """
+    Analisa várias imagens concorrentemente (estilo gather), com no máximo `max_in_flight`
+    chamadas em andamento. Os resultados seguem a ordem de `image_paths`.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_in_flight))
+
+    async def _bounded(image_path_str: str) -> dict:
+        async with semaphore:
+            try:
+                return await analyze_image_async(image_path_str, backend=backend)
+            except Exception as e: # Uma falha isolada não deve cancelar as demais
+                return _result_from_exception(e)
+
+    return await asyncio.gather(*(_bounded(path) for path in image_paths))
@@ -0,0 +1,407 @@
+# nutrisnap_ai1/analytics.py
+"""
+Armazenamento colunar dos resultados para relatórios (uma linha por entrada de identified_items).
+
+Cada coluna é um arquivo binário append-only (little-endian) lido com np.memmap, sem parsing:
+  images.col       int32, código da imagem (dicionário images.dict: image_sha256 ou nome do arquivo)
+  timestamps.col   int64, analysis_timestamp em segundos (datetime64[s], horário gravado no resultado)
+  calories.col     float32, estimated_calories (NaN quando null)
+  confidence.col   int8, 0 = Alto, 1 = Médio, 2 = Baixo, -1 = desconhecida
+  items.col        int32, código do item (dicionário items.dict: item_name normalizado)
+Os dicionários são arquivos de texto com uma string por linha, também append-only. O manifesto
+(manifest.json) guarda as linhas e bytes confirmados e quanto de cada arquivo de resultados já foi
+ingerido; sobras de um append interrompido são descartadas no próximo.
+
+Só a análise mais recente de cada imagem conta: quando um resultado bem-sucedido da mesma imagem
+chega de novo (ex: <nome>_analysis.json regravado por uma nova análise), as linhas anteriores são
+marcadas como substituídas em valid.col (uint8, 1 = válida, atualizado no lugar) e deixam de
+aparecer nas consultas, então reingerir nunca duplica linhas.
+"""
+import glob
+import json
+import os
+import re
+import threading
+import unicodedata
+from datetime import datetime
+from typing import Iterable
+
+import numpy as np
+
+from . import config, parsing, sinks, utils
+
+CONFIDENCE_LEVELS = ("Alto", "Médio", "Baixo")
+# Variações aceitas pelo parser ("alta", "medium"...) -> código da coluna confidence
+_CONFIDENCE_CODES = {text: CONFIDENCE_LEVELS.index(level) for text, level in parsing._CONFIDENCE_LEVELS.items()}
+_COLUMNS = {"images": "<i4", "timestamps": "<i8", "calories": "<f4", "confidence": "i1", "items": "<i4"}
+_DICTIONARIES = ("images", "items")
+_BUCKET_UNITS = {"hour": "h", "day": "D", "week": "W", "month": "M"}
+_WHITESPACE_RE = re.compile(r"\s+")
+_UNKNOWN_ITEM = "item não identificado"
+_INGEST_BATCH = 5000 # Arquivos *_analysis.json por append na ingestão
+_VALID_FILE = "valid.col" # Fora de _COLUMNS: é reescrito no lugar quando uma imagem é reanalisada
+
+def normalize_item_name(name) -> str:
+    """Nome usado para agrupar: Unicode NFKC, minúsculas, espaços colapsados, sem pontuação nas pontas."""
+    text = _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", str(name or ""))).casefold().strip(" .,;:-")
+    return text or _UNKNOWN_ITEM
+
+def _naive_epoch_s(value) -> int:
+    """Segundos desde 1970 do horário "de parede" gravado (sem fuso), como em datetime64[s]."""
+    return int(np.datetime64(datetime.fromisoformat(str(value)).replace(tzinfo=None), "s").astype(np.int64))
+
+def _group_percentiles(sorted_values: np.ndarray, starts: np.ndarray, counts: np.ndarray, pct: float) -> np.ndarray:
+    """Percentil (interpolação linear, como np.percentile) de cada grupo contíguo de `sorted_values`; NaN se vazio."""
+    position = np.maximum(counts - 1, 0) * (pct / 100.0)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, np.maximum(counts - 1, 0))
+    if not len(sorted_values):
+        return np.full(len(counts), np.nan)
+    low_values = sorted_values[np.minimum(starts + lower, len(sorted_values) - 1)]
+    high_values = sorted_values[np.minimum(starts + upper, len(sorted_values) - 1)]
+    values = low_values + (high_values - low_values) * (position - lower)
+    return np.where(counts > 0, values, np.nan)
+
+def _rounded(value) -> float | None:
+    return None if np.isnan(value) else round(float(value), 1)
+
+class AnalyticsColumns:
+    """Colunas (np.memmap somente leitura ou arrays em memória) e os dicionários de strings."""
+    __slots__ = ("images", "timestamps", "calories", "confidence", "items", "image_names", "item_names")
+
+    def __init__(self, columns: dict[str, np.ndarray], image_names: list[str], item_names: list[str]):
+        for name in _COLUMNS:
+            setattr(self, name, columns[name])
+        self.image_names = image_names
+        self.item_names = item_names
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def filter(self, mask: np.ndarray) -> "AnalyticsColumns":
+        return AnalyticsColumns({name: getattr(self, name)[mask] for name in _COLUMNS}, self.image_names, self.item_names)
+
+class AnalyticsStore:
+    """Armazenamento colunar em `path` (diretório), com ingestão incremental e agregações vetorizadas."""
+
+    def __init__(self, path: str | None = None):
+        self.path = os.path.abspath(path or config.get_settings().analytics_dir)
+        self._lock = threading.Lock()
+        self._manifest = self._read_manifest()
+        self._dictionaries = {name: self._read_dictionary(name) for name in _DICTIONARIES}
+        self._codes = {name: {value: code for code, value in enumerate(values)}
+                       for name, values in self._dictionaries.items()}
+        self._raw_item_codes: dict[str, int] = {} # item_name original -> código (evita renormalizar nomes repetidos)
+
+    @property
+    def rows(self) -> int:
+        return self._manifest["rows"]
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self._file("manifest.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": 1, "rows": 0, "sources": {}}
+
+    def _read_dictionary(self, name: str) -> list[str]:
+        committed_bytes = self._manifest.get("dictionary_bytes", {}).get(name, 0)
+        if not committed_bytes:
+            return []
+        with open(self._file(f"{name}.dict"), "rb") as f:
+            return f.read(committed_bytes).decode("utf-8").split("\n")[:-1]
+
+    def _write_manifest(self):
+        tmp_path = self._file("manifest.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._file("manifest.json"))
+
+    def _code(self, dictionary: str, value: str, new_values: list[str]) -> int:
+        codes = self._codes[dictionary]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._dictionaries[dictionary]) + len(new_values)
+            new_values.append(value)
+        return code
+
+    # --- Escrita ---
+
+    def append(self, records: Iterable[dict], sources: dict[str, dict] | None = None) -> int:
+        """
+        Acrescenta os itens dos resultados bem-sucedidos em `records` (formato de saída do run_analysis:
+        image_file/image_sha256, analysis_timestamp, status, data.identified_items), em um único append
+        confirmado. `sources` registra no manifesto o que foi ingerido de cada arquivo. Retorna as linhas gravadas.
+        """
+        with self._lock:
+            new_values = {name: [] for name in _DICTIONARIES}
+            buffers = {name: [] for name in _COLUMNS}
+            known_images = len(self._dictionaries["images"])
+            row_records, latest_record = [], {} # Registro de cada linha nova; último registro de cada imagem
+            for position, record in enumerate(records):
+                before = len(buffers["items"])
+                image_code = self._flatten(record, buffers, new_values)
+                if image_code is not None:
+                    latest_record[image_code] = position
+                    row_records.extend([position] * (len(buffers["items"]) - before))
+            valid = [latest_record[code] == position for code, position in zip(buffers["images"], row_records)]
+            reanalyzed = [code for code in latest_record if code < known_images]
+            if not buffers["items"] and not sources and not reanalyzed:
+                return 0
+            os.makedirs(self.path, exist_ok=True)
+            dictionary_bytes = self._manifest.setdefault("dictionary_bytes", {})
+            for name, values in new_values.items():
+                if values:
+                    with open(self._file(f"{name}.dict"), "ab") as f:
+                        f.truncate(dictionary_bytes.get(name, 0))
+                        f.write("".join(value + "\n" for value in values).encode("utf-8"))
+                        dictionary_bytes[name] = f.tell()
+                    self._dictionaries[name].extend(values)
+            added = len(buffers["items"])
+            self._supersede(reanalyzed)
+            for name, dtype in _COLUMNS.items():
+                column_path = self._file(f"{name}.col")
+                with open(column_path, "ab") as f:
+                    f.truncate(self.rows * np.dtype(dtype).itemsize) # Descarta sobras de um append interrompido
+                    f.write(np.asarray(buffers[name], dtype=dtype).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._ensure_valid_file()
+            with open(self._file(_VALID_FILE), "ab") as f:
+                f.truncate(self.rows)
+                f.write(np.asarray(valid, dtype=np.uint8).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            self._manifest["rows"] += added
+            self._manifest["sources"].update(sources or {})
+            self._write_manifest()
+            return added
+
+    def _supersede(self, image_codes: list[int]):
+        """Marca como substituídas as linhas já gravadas das imagens dadas (antes do append das novas)."""
+        if not image_codes or not self.rows:
+            return
+        self._ensure_valid_file()
+        images = np.memmap(self._file("images.col"), dtype=_COLUMNS["images"], mode="r", shape=(self.rows,))
+        valid = np.memmap(self._file(_VALID_FILE), dtype=np.uint8, mode="r+", shape=(self.rows,))
+        mask = np.isin(images, np.asarray(image_codes, dtype=np.int32)) & (valid != 0)
+        if mask.any():
+            valid[mask] = 0
+            valid.flush()
+        del images, valid
+
+    def _ensure_valid_file(self):
+        """Armazenamentos anteriores a valid.col: as linhas existentes começam todas válidas."""
+        path = self._file(_VALID_FILE)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < self.rows:
+            with open(path, "ab") as f:
+                f.write(b"\x01" * (self.rows - size))
+
+    def _flatten(self, record: dict, buffers: dict[str, list], new_values: dict[str, list]) -> int | None:
+        """Acrescenta as linhas do resultado; retorna o código da imagem (None se o resultado não é um sucesso)."""
+        if not str(record.get("status", "")).startswith("sucesso"):
+            return None
+        image_id = str(record.get("image_sha256") or record.get("image_file") or record.get("image_path") or "?")
+        image_code = self._code("images", _WHITESPACE_RE.sub(" ", image_id), new_values["images"])
+        items = (record.get("data") or {}).get("identified_items") or []
+        try:
+            timestamp = _naive_epoch_s(record.get("analysis_timestamp"))
+        except (TypeError, ValueError):
+            timestamp = 0
+        images, timestamps, calories, confidences, item_codes = (buffers[name] for name in _COLUMNS)
+        raw_item_codes = self._raw_item_codes
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            value = item.get("estimated_calories")
+            if type(value) is not int or value < 0: # Caminho rápido: resultados já validados pelo parser
+                value = parsing._as_calories(value)
+            raw_name = item.get("item_name")
+            item_code = raw_item_codes.get(raw_name)
+            if item_code is None:
+                item_code = self._code("items", normalize_item_name(raw_name), new_values["items"])
+                if isinstance(raw_name, str):
+                    raw_item_codes[raw_name] = item_code
+            images.append(image_code)
+            timestamps.append(timestamp)
+            calories.append(np.nan if value is None else value)
+            confidences.append(_CONFIDENCE_CODES.get(str(item.get("confidence") or "").lower(), -1))
+            item_codes.append(item_code)
+        return image_code
+
+    def ingest(self, results_dir: str, prefix: str = "results") -> int:
+        """
+        Ingere de forma incremental os resultados de `results_dir`: arquivos <nome>_analysis.json (modo json)
+        e arquivos JSONL do sink (modo jsonl). Arquivos JSON já ingeridos e inalterados são pulados;
+        de arquivos JSONL só são lidos os registros novos. Um arquivo JSON alterado (imagem reanalisada)
+        é lido de novo e substitui as linhas anteriores da mesma imagem. Retorna as linhas adicionadas.
+        """
+        results_dir = os.path.abspath(results_dir)
+        added = 0
+        records, sources = [], {}
+        for path in sorted(glob.glob(os.path.join(glob.escape(results_dir), "*_analysis.json"))):
+            stat = os.stat(path)
+            state = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            if self._manifest["sources"].get(path) == state:
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    records.append(json.load(f))
+            except (OSError, json.JSONDecodeError) as e:
+                utils.print_log("warn", "Resultado ignorado na ingestão (%s): %s", path, e)
+                continue
+            sources[path] = state
+            if len(records) >= _INGEST_BATCH: # Um append (e um fsync por coluna) por lote de arquivos
+                added += self.append(records, sources)
+                records, sources = [], {}
+        if records:
+            added += self.append(records, sources)
+        for path in sinks.sink_files(results_dir, prefix):
+            done = self._manifest["sources"].get(path, {}).get("records", 0)
+            total, records = 0, []
+            for total, record in enumerate(sinks.iter_file_records(path), start=1):
+                if total > done:
+                    records.append(record)
+            if records:
+                added += self.append(records, {path: {"records": total}})
+        utils.print_log("info", "Analytics: %s linhas novas ingeridas de %s (total: %s).", added, results_dir, self.rows)
+        return added
+
+    # --- Leitura ---
+
+    def columns(self) -> AnalyticsColumns:
+        """
+        Colunas mapeadas em memória (somente leitura), limitadas às linhas confirmadas e válidas
+        (com linhas substituídas, as colunas filtradas são cópias em memória).
+        """
+        rows = self.rows
+        columns = {}
+        for name, dtype in _COLUMNS.items():
+            if rows:
+                columns[name] = np.memmap(self._file(f"{name}.col"), dtype=dtype, mode="r", shape=(rows,))
+            else:
+                columns[name] = np.empty(0, dtype=dtype)
+        result = AnalyticsColumns(columns, self._dictionaries["images"], self._dictionaries["items"])
+        valid_path = self._file(_VALID_FILE)
+        valid_rows = min(rows, os.path.getsize(valid_path)) if rows and os.path.exists(valid_path) else 0
+        if not valid_rows: # Armazenamento anterior a valid.col: tudo válido
+            return result
+        valid = np.memmap(valid_path, dtype=np.uint8, mode="r", shape=(valid_rows,))
+        if valid.all():
+            return result
+        mask = np.ones(rows, dtype=bool)
+        mask[:valid_rows] = valid != 0
+        return result.filter(mask)
+
+    def _select(self, item: str | None = None, since=None, until=None) -> AnalyticsColumns:
+        columns = self.columns()
+        mask = None
+        if item is not None:
+            code = self._codes["items"].get(normalize_item_name(item), -1)
+            mask = columns.items == code
+        if since is not None:
+            since_mask = columns.timestamps >= _naive_epoch_s(since)
+            mask = since_mask if mask is None else mask & since_mask
+        if until is not None:
+            until_mask = columns.timestamps < _naive_epoch_s(until)
+            mask = until_mask if mask is None else mask & until_mask
+        return columns if mask is None else columns.filter(mask)
+
+    def by_item(self, top: int | None = None, percentiles: tuple = (50, 90), item: str | None = None,
+                since=None, until=None) -> list[dict]:
+        """Por item normalizado: ocorrências, imagens distintas, calorias (soma, média, percentis) e % de confiança alta."""
+        columns = self._select(item, since, until)
+        if not len(columns):
+            return []
+        items = np.asarray(columns.items)
+        calories = np.asarray(columns.calories, dtype=np.float64)
+        groups, inverse, counts = np.unique(items, return_inverse=True, return_counts=True)
+        known = ~np.isnan(calories)
+        known_counts = np.bincount(inverse, weights=known, minlength=len(groups))
+        sums = np.bincount(inverse, weights=np.where(known, calories, 0.0), minlength=len(groups))
+        high = np.bincount(inverse, weights=np.asarray(columns.confidence) == 0, minlength=len(groups))
+        # Imagens distintas por item: pares (item, imagem) únicos
+        pairs = np.unique(inverse.astype(np.int64) * (len(columns.image_names) + 1) + np.asarray(columns.images))
+        distinct_images = np.bincount(pairs // (len(columns.image_names) + 1), minlength=len(groups))
+
+        order = np.argsort(-counts, kind="stable")
+        if top:
+            order = order[:top]
+        # Percentis por grupo: ordena (grupo, calorias) uma vez; os NaN ficam no fim de cada grupo
+        sorted_calories = calories[np.lexsort((calories, inverse))]
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        group_percentiles = {pct: _group_percentiles(sorted_calories, starts, known_counts.astype(np.int64), pct)
+                             for pct in percentiles}
+        means = np.divide(sums, known_counts, out=np.full(len(groups), np.nan), where=known_counts > 0)
+        rows = []
+        for group in order.tolist():
+            row = {
+                "item": columns.item_names[int(groups[group])],
+                "count": int(counts[group]),
+                "images": int(distinct_images[group]),
+                "calories_total": int(sums[group]),
+                "calories_mean": _rounded(means[group]),
+                "high_confidence_pct": round(100.0 * float(high[group]) / int(counts[group]), 1),
+            }
+            for pct, values in group_percentiles.items():
+                row[f"calories_p{pct}"] = _rounded(values[group])
+            rows.append(row)
+        return rows
+
+    def calorie_percentiles(self, percentiles: tuple = (50, 90, 95, 99), item: str | None = None,
+                            since=None, until=None) -> dict:
+        """Percentis de estimated_calories (itens com calorias conhecidas)."""
+        calories = np.asarray(self._select(item, since, until).calories, dtype=np.float64)
+        calories = calories[~np.isnan(calories)]
+        if not len(calories):
+            return {f"p{pct}": None for pct in percentiles}
+        values = np.percentile(calories, percentiles)
+        return {f"p{pct}": round(float(value), 1) for pct, value in zip(percentiles, values)}
+
+    def confidence_distribution(self, item: str | None = None, since=None, until=None) -> dict:
+        """Contagem de itens por nível de confiança (Alto/Médio/Baixo/desconhecida)."""
+        counts = np.bincount(np.asarray(self._select(item, since, until).confidence).astype(np.int64) + 1,
+                             minlength=len(CONFIDENCE_LEVELS) + 1)
+        return {**{level: int(counts[code + 1]) for code, level in enumerate(CONFIDENCE_LEVELS)},
+                "desconhecida": int(counts[0])}
+
+    def time_buckets(self, bucket: str = "day", item: str | None = None, since=None, until=None) -> list[dict]:
+        """Por período (hour/day/week/month): itens, imagens distintas e calorias somadas."""
+        unit = _BUCKET_UNITS.get(bucket)
+        if unit is None:
+            raise ValueError(f"Período não suportado: {bucket}. Use {', '.join(_BUCKET_UNITS)}.")
+        columns = self._select(item, since, until)
+        if not len(columns):
+            return []
+        periods = np.asarray(columns.timestamps).astype("datetime64[s]").astype(f"datetime64[{unit}]")
+        starts, inverse, counts = np.unique(periods, return_inverse=True, return_counts=True)
+        calories = np.asarray(columns.calories, dtype=np.float64)
+        sums = np.bincount(inverse, weights=np.nan_to_num(calories), minlength=len(starts))
+        pairs = np.unique(inverse.astype(np.int64) * (len(columns.image_names) + 1) + np.asarray(columns.images))
+        images = np.bincount(pairs // (len(columns.image_names) + 1), minlength=len(starts))
+        return [{"period": str(start), "items": int(count), "images": int(image_count), "calories_total": int(total)}
+                for start, count, image_count, total in zip(starts, counts.tolist(), images.tolist(), sums.tolist())]
+
+    def summary(self) -> dict:
+        columns = self.columns()
+        return {"rows": len(columns), "superseded_rows": self.rows - len(columns),
+                "images": len(columns.image_names), "distinct_items": len(columns.item_names),
+                "sources": len(self._manifest["sources"]), "path": self.path}
+
+_default_store: AnalyticsStore | None = None
+_default_store_lock = threading.Lock()
+
+def get_default_store() -> AnalyticsStore:
+    """Armazenamento em config.get_settings().analytics_dir (aberto na primeira chamada)."""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = AnalyticsStore()
+    return _default_store
@@ -0,0 +1,414 @@
+# nutrisnap_ai1/backends.py
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import AsyncIterator, Iterator
+
+from . import cache
+from . import config
+from . import parsing
+from . import utils
+
+_MOCK_RESPONSE_DATA = {
+  "total_calories": 630,
+  "identified_items": [
+    {"item_name": "Peito de Frango Grelhado (Mock)", "estimated_calories": 320, "confidence": "Alto", "notes": "Porção de aproximadamente 150g."},
+    {"item_name": "Batata Doce Assada (Mock)", "estimated_calories": 220, "confidence": "Alto", "notes": "Cerca de 200g, parece ter um pouco de azeite."},
+    {"item_name": "Brócolis no Vapor (Mock)", "estimated_calories": 90, "confidence": "Médio", "notes": "Porção generosa, mas difícil estimar o volume exato."},
+    {"item_name": "Item Não Identificado - 1 (Mock)", "estimated_calories": None, "confidence": "Baixo", "notes": "Pequeno item escuro no canto, aparência inconclusiva."}
+  ],
+  "analysis_summary_notes": "Análise mock executada. A qualidade da imagem de teste é considerada boa. Um item não pôde ser identificado."
+}
+
+# Resposta mock do modo compacto (itens e porções; as calorias vêm da tabela nutricional local)
+_MOCK_COMPACT_RESPONSE_DATA = {
+  "items": [
+    {"name": "Peito de Frango Grelhado (Mock)", "grams": 150},
+    {"name": "Batata Doce Assada (Mock)", "grams": 200},
+    {"name": "Brócolis no Vapor (Mock)", "grams": 120},
+    {"name": "Item Não Identificado - 1 (Mock)", "grams": None}
+  ]
+}
+
+MOCK_LATENCY_S = 0.2 # Simula pequena latência
+
+BACKEND_NAMES = ("gemini", "mock", "replay", "http")
+
+class GenerationRequest:
+    """
+    Uma chamada de geração: partes da requisição (prompt + imagem) e a identidade da imagem.
+    Requisições empacotadas (ver packing.py) levam `image_count` > 1, o hash do pacote em
+    `image_sha256` e, se preciso, a configuração de geração que substitui a da sessão.
+    `compact` indica o formato de resposta do modo compacto (itens e gramas, ver nutrition.py).
+    """
+    __slots__ = ("parts", "image_path", "prompt", "model_name", "image_count", "generation_config", "compact",
+                 "_image_sha256")
+
+    def __init__(self, parts: list, image_path: str | None, prompt: str, model_name: str, image_count: int = 1,
+                 generation_config: dict | None = None, image_sha256: str | None = None, compact: bool = False):
+        self.parts = parts
+        self.image_path = image_path
+        self.prompt = prompt
+        self.model_name = model_name
+        self.image_count = image_count
+        self.generation_config = generation_config
+        self.compact = compact
+        self._image_sha256 = image_sha256
+
+    @property
+    def image_sha256(self) -> str:
+        if self._image_sha256 is None:
+            self._image_sha256 = cache.file_sha256(self.image_path)
+        return self._image_sha256
+
+    def replay_key(self) -> str:
+        """Mesma chave do ResultCache: bytes da imagem + prompt + modelo."""
+        return cache.make_cache_key(self.image_sha256, self.prompt, self.model_name)
+
+class TextResponse:
+    """Resposta mínima compatível com o que analysis._result_from_response lê do SDK."""
+    __slots__ = ("text", "prompt_feedback", "candidates")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.prompt_feedback = None
+        self.candidates = []
+
+class PromptBlockedError(Exception):
+    """O modelo bloqueou o prompt (detectado ao ler uma resposta em streaming)."""
+
+class StreamInterruptedError(Exception):
+    """Falha depois que parte da resposta em streaming já foi entregue; não é retentada."""
+
+def chunk_text(chunk) -> str:
+    """Texto de uma resposta (ou pedaço de streaming) do SDK; pedaços sem texto viram ""."""
+    feedback = getattr(chunk, "prompt_feedback", None)
+    if feedback and feedback.block_reason:
+        raise PromptBlockedError(str(feedback.block_reason))
+    try:
+        return chunk.text or ""
+    except ValueError: # Pedaço final só com finish_reason/metadados
+        return ""
+
+def split_text(text: str, parts: int) -> list[str]:
+    """Divide um texto em `parts` pedaços (para simular streaming de respostas prontas)."""
+    size = max(1, -(-len(text) // max(1, parts)))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def _request_label(request: GenerationRequest) -> str:
+    return request.image_path or f"pacote de {request.image_count}"
+
+class Backend:
+    """
+    Interface dos backends de geração. Cada backend é thread-safe e pode ser compartilhado
+    entre sessões; os atributos de classe dizem à sessão como tratá-lo.
+    """
+    name = "base"
+    is_mock = False # Resultados marcados como "sucesso (mock)"/"erro (mock)"
+    requires_api_key = False
+    uses_cache = False # Consulta/grava o ResultCache e o índice pHash
+    rate_limited = False # Passa pelo RateLimiter da sessão
+
+    def generate(self, request: GenerationRequest):
+        raise NotImplementedError
+
+    async def generate_async(self, request: GenerationRequest):
+        return await asyncio.to_thread(self.generate, request)
+
+    def generate_stream(self, request: GenerationRequest) -> Iterator[str]:
+        """Pedaços de texto da resposta, na ordem em que chegam (por padrão, a resposta inteira de uma vez)."""
+        yield chunk_text(self.generate(request))
+
+    async def generate_stream_async(self, request: GenerationRequest) -> AsyncIterator[str]:
+        yield chunk_text(await self.generate_async(request))
+
+def _genai():
+    """SDK do Gemini, importado só na primeira chamada real (o import leva perto de 1 s)."""
+    import google.generativeai as genai
+    return genai
+
+# genai.configure é global ao processo e descarta os clientes (e conexões) existentes,
+# então só é chamado quando a chave muda.
+_configure_lock = threading.Lock()
+_configured_api_key: str | None = None
+
+def _ensure_configured(api_key: str):
+    global _configured_api_key
+    with _configure_lock:
+        if _configured_api_key != api_key:
+            utils.print_log("info", "Configurando cliente Gemini API...")
+            _genai().configure(api_key=api_key)
+            _configured_api_key = api_key
+
+class GeminiBackend(Backend):
+    """API Gemini real. Mantém o modelo (e as conexões) entre chamadas."""
+    name = "gemini"
+    requires_api_key = True
+    uses_cache = True
+    rate_limited = True
+
+    def __init__(self, api_key: str | None, model_name: str, generation_config: dict | None = None, model=None):
+        self.api_key = api_key
+        self.model_name = model_name
+        # Sem configuração explícita, pede JSON estruturado (se habilitado em config)
+        self.generation_config = generation_config if generation_config is not None else parsing.default_generation_config()
+        # model: objeto com generate_content/generate_content_async já pronto (ex: backend falso de benchmark)
+        self._injected_model = model
+        self._model = model
+        self._async_model = None
+        self._async_loop = None
+        self._lock = threading.Lock()
+
+    def _new_model(self):
+        _ensure_configured(self.api_key)
+        model = _genai().GenerativeModel(self.model_name, generation_config=self.generation_config)
+        utils.print_log("info", "Modelo Gemini (%s) configurado.", self.model_name)
+        return model
+
+    @property
+    def model(self):
+        """Modelo síncrono, criado uma única vez (double-checked locking)."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._new_model()
+        return self._model
+
+    def _model_for_running_loop(self):
+        # O cliente async (grpc_asyncio) fica preso ao event loop em que foi criado;
+        # recria o modelo se o backend for usado a partir de outro loop.
+        if self._injected_model is not None:
+            return self._injected_model
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._async_model is None or self._async_loop is not loop:
+                self._async_model = self._new_model()
+                self._async_loop = loop
+            return self._async_model
+
+    def generate(self, request: GenerationRequest):
+        if request.generation_config is not None:
+            return self.model.generate_content(request.parts, generation_config=request.generation_config)
+        return self.model.generate_content(request.parts)
+
+    async def generate_async(self, request: GenerationRequest):
+        if request.generation_config is not None:
+            return await self._model_for_running_loop().generate_content_async(
+                request.parts, generation_config=request.generation_config)
+        return await self._model_for_running_loop().generate_content_async(request.parts)
+
+    def generate_stream(self, request: GenerationRequest) -> Iterator[str]:
+        for chunk in self.model.generate_content(request.parts, stream=True):
+            yield chunk_text(chunk)
+
+    async def generate_stream_async(self, request: GenerationRequest) -> AsyncIterator[str]:
+        response = await self._model_for_running_loop().generate_content_async(request.parts, stream=True)
+        async for chunk in response:
+            yield chunk_text(chunk)
+
+class MockBackend(Backend):
+    """Resposta fixa com latência simulada, sem chamadas à API."""
+    name = "mock"
+    is_mock = True
+
+    def __init__(self, latency_s: float = MOCK_LATENCY_S):
+        self.latency_s = latency_s
+        self._response_text = json.dumps(_MOCK_RESPONSE_DATA)
+        self._compact_text = json.dumps(_MOCK_COMPACT_RESPONSE_DATA)
+
+    def _text_for(self, request: GenerationRequest) -> str:
+        if request.compact:
+            return self._compact_text
+        if request.image_count == 1:
+            return self._response_text
+        return json.dumps([{"image_index": number, **_MOCK_RESPONSE_DATA} for number in range(1, request.image_count + 1)])
+
+    def generate(self, request: GenerationRequest) -> TextResponse:
+        utils.print_log("info", "**** MODO MOCK ATIVADO PARA CHAMADA GEMINI (imagem: %s) ****", _request_label(request))
+        time.sleep(self.latency_s)
+        return TextResponse(self._text_for(request))
+
+    async def generate_async(self, request: GenerationRequest) -> TextResponse:
+        """Versão não bloqueante do mock: cede o event loop durante a latência simulada."""
+        utils.print_log("info", "**** MODO MOCK ATIVADO PARA CHAMADA GEMINI ASYNC (imagem: %s) ****", _request_label(request))
+        await asyncio.sleep(self.latency_s)
+        return TextResponse(self._text_for(request))
+
+    def generate_stream(self, request: GenerationRequest) -> Iterator[str]:
+        """Streaming simulado: primeiro pedaço após 30% da latência, o resto distribuído em 8 pedaços."""
+        utils.print_log("info", "**** MODO MOCK (streaming) ATIVADO PARA CHAMADA GEMINI (imagem: %s) ****", _request_label(request))
+        chunks = split_text(self._text_for(request), 8)
+        time.sleep(self.latency_s * 0.3)
+        for chunk in chunks:
+            yield chunk
+            time.sleep(self.latency_s * 0.7 / len(chunks))
+
+    async def generate_stream_async(self, request: GenerationRequest) -> AsyncIterator[str]:
+        chunks = split_text(self._text_for(request), 8)
+        await asyncio.sleep(self.latency_s * 0.3)
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(self.latency_s * 0.7 / len(chunks))
+
+class ReplayMissError(LookupError):
+    """Não há resposta gravada para a combinação imagem + prompt + modelo."""
+
+class ReplayBackend(Backend):
+    """
+    Respostas gravadas em disco (<directory>/recordings.jsonl), indexadas pela chave imagem + prompt + modelo.
+    Com `record_from`, encaminha as chamadas para outro backend (normalmente o Gemini) e grava cada
+    resposta textual; sem ele, serve apenas as gravações, sem rede e sem latência (ou `latency_s`).
+    """
+    name = "replay"
+
+    def __init__(self, directory: str | None = None, record_from: Backend | None = None, latency_s: float = 0.0):
+        self.directory = os.path.abspath(directory or config.get_settings().replay_dir)
+        self.path = os.path.join(self.directory, "recordings.jsonl")
+        self.record_from = record_from
+        self.latency_s = latency_s
+        self._responses: dict[str, str] = {}
+        self._lock = threading.Lock()
+        if record_from is not None: # Gravando: se comporta como o backend real
+            self.requires_api_key = record_from.requires_api_key
+            self.uses_cache = record_from.uses_cache
+            self.rate_limited = record_from.rate_limited
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError: # Última linha truncada após interrupção
+                    continue
+                self._responses[record["key"]] = record["text"]
+        utils.print_log("info", "Respostas gravadas carregadas: %s de %s", len(self._responses), self.path)
+
+    def _record(self, key: str, request: GenerationRequest, response):
+        try:
+            text = response.text
+        except (ValueError, AttributeError): # Resposta bloqueada ou sem texto: nada a gravar
+            return
+        self._record_text(key, request, text)
+
+    def _record_text(self, key: str, request: GenerationRequest, text: str):
+        if not text:
+            return
+        line = json.dumps({"key": key, "model": request.model_name, "image_sha256": request.image_sha256,
+                           "recorded_at": time.time(), "text": text}, ensure_ascii=False) + "\n"
+        with self._lock:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._responses[key] = text
+
+    def _lookup(self, key: str) -> TextResponse:
+        text = self._responses.get(key)
+        if text is None:
+            raise ReplayMissError(f"Nenhuma resposta gravada para a chave {key[:16]}... em {self.path}")
+        return TextResponse(text)
+
+    def generate(self, request: GenerationRequest):
+        key = request.replay_key()
+        if self.record_from is not None:
+            response = self.record_from.generate(request)
+            self._record(key, request, response)
+            return response
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return self._lookup(key)
+
+    async def generate_async(self, request: GenerationRequest):
+        key = await asyncio.to_thread(request.replay_key) # Hash do arquivo fora do event loop
+        if self.record_from is not None:
+            response = await self.record_from.generate_async(request)
+            await asyncio.to_thread(self._record, key, request, response)
+            return response
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return self._lookup(key)
+
+    def generate_stream(self, request: GenerationRequest) -> Iterator[str]:
+        key = request.replay_key()
+        if self.record_from is not None:
+            received = []
+            for chunk in self.record_from.generate_stream(request):
+                received.append(chunk)
+                yield chunk
+            self._record_text(key, request, "".join(received))
+            return
+        text = self._lookup(key).text
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        yield from split_text(text, 8)
+
+    async def generate_stream_async(self, request: GenerationRequest) -> AsyncIterator[str]:
+        key = await asyncio.to_thread(request.replay_key)
+        if self.record_from is not None:
+            received = []
+            async for chunk in self.record_from.generate_stream_async(request):
+                received.append(chunk)
+                yield chunk
+            await asyncio.to_thread(self._record_text, key, request, "".join(received))
+            return
+        text = self._lookup(key).text
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        for chunk in split_text(text, 8):
+            yield chunk
+
+class HttpStubBackend(Backend):
+    """
+    Cliente de um stub HTTP local (ex: benchmarks/http_stub_server.py). Envia um POST JSON com
+    modelo, prompt e hash da imagem e espera {"text": "..."}; códigos HTTP de erro viram as
+    exceções equivalentes de google.api_core, então retentativas e throttling se comportam como na API real.
+    """
+    name = "http"
+    rate_limited = True
+
+    def __init__(self, url: str | None = None, timeout_s: float | None = None):
+        self.url = url or config.get_settings().http_stub_url
+        self.timeout_s = timeout_s if timeout_s is not None else config.get_settings().http_stub_timeout_s
+
+    def generate(self, request: GenerationRequest) -> TextResponse:
+        import urllib.error # Só o backend http precisa de urllib (import de ~30 ms)
+        import urllib.request
+        body = json.dumps({"model": request.model_name, "prompt": request.prompt, "image_sha256": request.image_sha256,
+                           "image_count": request.image_count, "compact": request.compact}).encode("utf-8")
+        http_request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(http_request, timeout=self.timeout_s) as http_response:
+                payload = json.loads(http_response.read())
+        except urllib.error.HTTPError as e:
+            from google.api_core import exceptions as api_exceptions
+            raise api_exceptions.from_http_status(e.code, e.read().decode("utf-8", "replace")[:200] or str(e)) from e
+        except urllib.error.URLError as e:
+            raise ConnectionError(f"Stub HTTP inacessível em {self.url}: {e.reason}") from e
+        return TextResponse(payload.get("text", ""))
+
+def create_backend(name: str, api_key: str | None = None, model_name: str | None = None,
+                   generation_config: dict | None = None, replay_dir: str | None = None,
+                   record: bool = False, http_url: str | None = None) -> Backend:
+    """
+    Cria um backend pelo nome (gemini, mock, replay, http). Com `record`, as respostas do
+    backend gemini ou http são gravadas em `replay_dir` para uso posterior com o backend replay.
+    """
+    if name == "mock":
+        return MockBackend()
+    if name == "replay":
+        return ReplayBackend(replay_dir)
+    if name == "gemini":
+        backend = GeminiBackend(api_key, model_name or config.MODEL_NAME, generation_config)
+    elif name == "http":
+        backend = HttpStubBackend(http_url)
+    else:
+        raise ValueError(f"Backend desconhecido: {name}. Use um de: {', '.join(BACKEND_NAMES)}.")
+    return ReplayBackend(replay_dir, record_from=backend) if record else backend
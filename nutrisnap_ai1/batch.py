@@ -0,0 +1,229 @@
+# nutrisnap_ai1/batch.py
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable
+
+from . import utils
+
+# Extensões consideradas imagens ao expandir diretórios e globs
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff", ".heic", ".heif"}
+
+def _is_image_file(path: str) -> bool:
+    return os.path.isfile(path) and os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+def collect_image_paths(inputs: list[str]) -> list[str]:
+    """
+    Expande as entradas do modo batch em uma lista ordenada e sem duplicatas de caminhos de imagem.
+    Aceita diretórios (varridos recursivamente), globs (ex: 'data/input_images/**'),
+    arquivos de imagem avulsos e listas de arquivos no formato '@lista.txt' (um caminho por linha).
+    """
+    collected = []
+    for entry in inputs:
+        if entry.startswith("@"):
+            list_file = entry[1:]
+            try:
+                with open(list_file, 'r', encoding='utf-8') as f:
+                    listed = [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+            except IOError as e:
+                utils.print_log("error", "Não foi possível ler a lista de arquivos '%s': %s", list_file, e)
+                continue
+            collected.extend(p for p in listed if _is_image_file(p))
+        elif os.path.isdir(entry):
+            for root, _dirs, files in os.walk(entry):
+                collected.extend(os.path.join(root, name) for name in files if _is_image_file(os.path.join(root, name)))
+        elif glob.has_magic(entry):
+            collected.extend(p for p in glob.glob(entry, recursive=True) if _is_image_file(p))
+        elif _is_image_file(entry):
+            collected.append(entry)
+        else:
+            utils.print_log("warn", "Entrada ignorada (não é imagem, diretório ou glob válido): %s", entry)
+
+    unique_paths = sorted({os.path.abspath(p) for p in collected})
+    return unique_paths
+
+def percentile(sorted_values: list[float], pct: float) -> float | None:
+    """Percentil por interpolação linear sobre uma lista já ordenada."""
+    if not sorted_values:
+        return None
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * (pct / 100.0)
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    fraction = rank - lower
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+
+class BatchStats:
+    """Acumula contagens, erros e latências de uma execução em batch."""
+
+    def __init__(self):
+        self.total = 0
+        self.successes = 0
+        self.errors = 0
+        self.error_counts: dict[str, int] = {}
+        self.rejection_counts: dict[str, int] = {} # Recusas da admissão, por motivo
+        self.latencies: list[float] = []
+        self.upload_bytes_before = 0
+        self.upload_bytes_after = 0
+        self.started_at = time.perf_counter()
+        self.finished_at: float | None = None
+
+    def record(self, result: dict, elapsed: float):
+        self.total += 1
+        self.latencies.append(elapsed)
+        preprocessing = result.get("preprocessing")
+        if preprocessing:
+            self.upload_bytes_before += preprocessing["bytes_before"]
+            self.upload_bytes_after += preprocessing["bytes_after"]
+        if str(result.get("status", "")).startswith("sucesso"):
+            self.successes += 1
+        else:
+            self.errors += 1
+            error_key = result.get("error", "erro_desconhecido")
+            self.error_counts[error_key] = self.error_counts.get(error_key, 0) + 1
+            reason = result.get("rejection_reason")
+            if reason:
+                self.rejection_counts[reason] = self.rejection_counts.get(reason, 0) + 1
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+    def summary(self) -> dict:
+        wall_time = (self.finished_at or time.perf_counter()) - self.started_at
+        ordered = sorted(self.latencies)
+        return {
+            "total_images": self.total,
+            "successes": self.successes,
+            "errors": self.errors,
+            "error_counts": dict(self.error_counts),
+            "rejection_counts": dict(self.rejection_counts),
+            "wall_time_s": round(wall_time, 3),
+            "upload_bytes_before": self.upload_bytes_before,
+            "upload_bytes_after": self.upload_bytes_after,
+            "throughput_images_per_s": round(self.total / wall_time, 3) if wall_time > 0 else None,
+            "latency_s": {
+                "mean": round(sum(ordered) / len(ordered), 4) if ordered else None,
+                "min": round(ordered[0], 4) if ordered else None,
+                "p50": _round_or_none(percentile(ordered, 50)),
+                "p90": _round_or_none(percentile(ordered, 90)),
+                "p95": _round_or_none(percentile(ordered, 95)),
+                "p99": _round_or_none(percentile(ordered, 99)),
+                "max": round(ordered[-1], 4) if ordered else None,
+            },
+        }
+
+def _round_or_none(value: float | None) -> float | None:
+    return round(value, 4) if value is not None else None
+
+def _timed_call(worker: Callable[[str], dict], image_path: str) -> tuple[str, dict, float]:
+    start = time.perf_counter()
+    try:
+        result = worker(image_path)
+    except Exception as e: # O worker não deve derrubar o batch inteiro
+        result = {"status": "erro", "error": "Exceção não tratada no worker", "details": str(e)}
+    return image_path, result, time.perf_counter() - start
+
+def _admission_prepass(image_paths: list[str], admit: Callable[[str], dict | None] | None, stats: BatchStats,
+                       on_result: Callable[[str, dict, float], None] | None) -> list[str]:
+    """
+    Passa cada imagem por `admit` (ex: admission.check_result) na thread chamadora, antes do pool:
+    as recusadas são registradas e entregues a `on_result` sem ocupar um worker. Retorna as admitidas.
+    """
+    if admit is None:
+        return image_paths
+    admitted = []
+    for image_path in image_paths:
+        start = time.perf_counter()
+        rejected = admit(image_path)
+        if rejected is None:
+            admitted.append(image_path)
+            continue
+        elapsed = time.perf_counter() - start
+        stats.record(rejected, elapsed)
+        if on_result:
+            on_result(image_path, rejected, elapsed)
+    return admitted
+
+def run_batch(image_paths: list[str],
+              worker: Callable[[str], dict],
+              concurrency: int = 4,
+              on_result: Callable[[str, dict, float], None] | None = None,
+              admit: Callable[[str], dict | None] | None = None) -> BatchStats:
+    """
+    Executa `worker` sobre cada imagem em um pool limitado de threads.
+    No máximo 2 x concurrency tarefas ficam enfileiradas ao mesmo tempo, para que listas
+    grandes não sejam materializadas como futures de uma só vez. `on_result` é chamado
+    na thread principal (serializado), então pode salvar arquivos e logar sem locks.
+    Com `admit`, as imagens recusadas no pré-passo de admissão não chegam ao pool.
+    """
+    concurrency = max(1, concurrency)
+    stats = BatchStats()
+    image_paths = _admission_prepass(image_paths, admit, stats, on_result)
+
+    def _handle(done_futures):
+        for future in done_futures:
+            image_path, result, elapsed = future.result()
+            stats.record(result, elapsed)
+            if on_result:
+                on_result(image_path, result, elapsed)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="nutrisnap-batch") as pool:
+        pending = set()
+        for image_path in image_paths:
+            if len(pending) >= concurrency * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _handle(done)
+            pending.add(pool.submit(_timed_call, worker, image_path))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            _handle(done)
+
+    stats.finish()
+    return stats
+
+def _timed_group_call(worker: Callable[[list[str]], list[dict]], image_paths: list[str]) -> list[tuple[str, dict, float]]:
+    start = time.perf_counter()
+    try:
+        results = worker(image_paths)
+    except Exception as e:
+        results = [{"status": "erro", "error": "Exceção não tratada no worker", "details": str(e)}] * len(image_paths)
+    elapsed = time.perf_counter() - start
+    return [(image_path, result, elapsed) for image_path, result in zip(image_paths, results)]
+
+def run_packed_batch(image_paths: list[str],
+                     worker: Callable[[list[str]], list[dict]],
+                     group_size: int = 8,
+                     concurrency: int = 4,
+                     on_result: Callable[[str, dict, float], None] | None = None,
+                     admit: Callable[[str], dict | None] | None = None) -> BatchStats:
+    """
+    Como run_batch, mas entrega grupos de até `group_size` imagens a `worker` (ex: analyze_packed,
+    que os divide em pacotes por bytes). A latência de cada imagem é a do grupo inteiro.
+    """
+    concurrency = max(1, concurrency)
+    group_size = max(1, group_size)
+    stats = BatchStats()
+    image_paths = _admission_prepass(image_paths, admit, stats, on_result)
+
+    def _handle(done_futures):
+        for future in done_futures:
+            for image_path, result, elapsed in future.result():
+                stats.record(result, elapsed)
+                if on_result:
+                    on_result(image_path, result, elapsed)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="nutrisnap-batch") as pool:
+        pending = set()
+        for start in range(0, len(image_paths), group_size):
+            if len(pending) >= concurrency * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _handle(done)
+            pending.add(pool.submit(_timed_group_call, worker, image_paths[start:start + group_size]))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            _handle(done)
+
+    stats.finish()
+    return stats
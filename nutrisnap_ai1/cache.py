@@ -0,0 +1,174 @@
+# nutrisnap_ai1/cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from . import config
+from . import utils
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+# Atualizar last_access em todo hit custaria uma escrita por leitura; só atualiza se o valor
+# salvo estiver mais velho que este intervalo (precisão suficiente para o LRU).
+_TOUCH_INTERVAL_S = 60.0
+# A eviction roda a cada N gravações, não em toda gravação.
+_EVICT_EVERY_N_PUTS = 64
+
+def file_sha256(path: str) -> str:
+    """Hash SHA-256 do conteúdo bruto de um arquivo, lido em blocos."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def make_cache_key(image_hash: str, prompt: str, model_name: str) -> str:
+    """Chave endereçada por conteúdo: hash da imagem + prompt + modelo."""
+    digest = hashlib.sha256()
+    digest.update(image_hash.encode("ascii"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(model_name.encode("utf-8"))
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Cache persistente (SQLite) de resultados de análise bem-sucedidos.
+    Thread-safe: uma única conexão protegida por lock, em modo WAL.
+    """
+
+    def __init__(self, db_path: str, max_entries: int | None = None, max_bytes: int | None = None, max_age_s: float | None = None):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_access ON results(last_access)")
+
+    def get(self, key: str) -> dict | None:
+        """Retorna o resultado salvo para `key`, ou None (miss ou entrada expirada)."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at, last_access FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at, last_access = row
+            if self.max_age_s is not None and now - created_at > self.max_age_s:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self.evictions += 1
+                self.misses += 1
+                return None
+            if now - last_access > _TOUCH_INTERVAL_S:
+                self._conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(value)
+
+    def put(self, key: str, result: dict):
+        """Salva `result` se for uma análise bem-sucedida (status == 'sucesso')."""
+        if result.get("status") != "sucesso":
+            return
+        value = json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            self.stores += 1
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= _EVICT_EVERY_N_PUTS:
+                self._evict_locked(now)
+
+    def evict(self):
+        """Aplica imediatamente os limites de idade, número de entradas e tamanho total."""
+        with self._lock:
+            self._evict_locked(time.time())
+
+    def _evict_locked(self, now: float):
+        self._puts_since_evict = 0
+        removed = 0
+        if self.max_age_s is not None:
+            removed += self._conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.max_age_s,)).rowcount
+        if self.max_entries is not None:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+            if count > self.max_entries:
+                removed += self._conn.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                ).rowcount
+        if self.max_bytes is not None:
+            (total_bytes,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()
+            if total_bytes > self.max_bytes:
+                excess = total_bytes - self.max_bytes
+                # Remove as entradas menos acessadas até liberar o excesso
+                keys_to_remove = []
+                for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY last_access ASC"):
+                    keys_to_remove.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                self._conn.executemany("DELETE FROM results WHERE key = ?", keys_to_remove)
+                removed += len(keys_to_remove)
+        if removed:
+            self.evictions += removed
+            utils.print_log("debug", "Cache: %s entradas removidas por eviction.", removed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries, total_bytes) = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": total_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_default_cache: ResultCache | None = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache() -> ResultCache:
+    """Retorna (criando na primeira chamada) o cache configurado em config.py."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                settings = config.get_settings()
+                _default_cache = ResultCache(
+                    settings.cache_path,
+                    max_entries=settings.cache_max_entries,
+                    max_bytes=settings.cache_max_bytes,
+                    max_age_s=settings.cache_max_age_s,
+                )
+    return _default_cache
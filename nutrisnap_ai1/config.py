@@ -1,29 +1,220 @@
 # nutrisnap_ai1/config.py
 import os
-from dotenv import load_dotenv
+import threading
+from dataclasses import dataclass
+
 from .utils import print_log # Importa print_log do mesmo pacote
 
+# Nada é lido nem logado no import: o .env e as variáveis NUTRISNAP_* são carregados
+# na primeira chamada a get_settings() (o import do pacote fica rápido e silencioso).
+
 # Encontra o diretório raiz do projeto para carregar o .env de forma consistente
 # Presume que config.py está em nutrisnap_ai/ e .env está em nutrisnap_ai_project/
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 dotenv_path = os.path.join(project_root, '.env')
 
-if os.path.exists(dotenv_path):
-    print_log("info", f"Carregando arquivo .env de: {dotenv_path}")
-    load_dotenv(dotenv_path)
-else:
-    print_log("warn", f"Arquivo .env não encontrado em: {dotenv_path}. Tentando load_dotenv() padrão (pode não funcionar se o CWD não for a raiz do projeto).")
-    load_dotenv() # Tenta carregar .env do CWD ou diretórios pais
+# Modelo Gemini a ser usado
+MODEL_NAME = "gemini-1.5-flash-latest" # Ou 'gemini-pro-vision', 'gemini-1.5-pro-latest'
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Configuração do processo, lida do ambiente (e do .env) por load_settings."""
+    gemini_api_key: str | None
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+    # Instrumentação de latência por estágio (ver metrics.py); desligada por padrão
+    metrics_enabled: bool
 
-if not GEMINI_API_KEY:
-    print_log("error", "GEMINI_API_KEY não encontrada. Certifique-se de que está definida no seu arquivo .env.")
-else:
-    print_log("info", "GEMINI_API_KEY carregada com sucesso.")
+    # Limitador client-side de cota da API (ver ratelimit.py)
+    rate_limit_enabled: bool
+    rate_limit_rpm: float # Requisições por minuto
+    rate_limit_input_tpm: float # Tokens de entrada por minuto
+    rate_limit_initial_concurrency: int
+    rate_limit_max_concurrency: int
+    retry_max_attempts: int
 
-# Modelo Gemini a ser usado
-MODEL_NAME = "gemini-1.5-flash-latest" # Ou 'gemini-pro-vision', 'gemini-1.5-pro-latest'
+    # Cache persistente de resultados (ver cache.py)
+    cache_path: str
+    cache_max_entries: int
+    cache_max_bytes: int
+    cache_max_age_s: float
+
+    # Índice de quase-duplicatas por pHash (ver phash.py); reaproveita resultados do cache
+    phash_enabled: bool
+    phash_max_distance: int # Distância de Hamming máxima (de 64 bits)
+    phash_index_path: str
+
+    # Pré-processamento antes do upload (ver preprocess.py)
+    preprocess_enabled: bool
+    preprocess_max_side: int # Maior lado em pixels
+    preprocess_format: str # JPEG ou WEBP
+    preprocess_quality: int
+    preprocess_passthrough_bytes: int
+
+    # Pede JSON estruturado ao modelo (response_mime_type + response_schema, ver parsing.py)
+    structured_output: bool
+
+    # Backend de geração padrão das sessões (ver backends.py): gemini, mock, replay ou http
+    backend: str
+    replay_dir: str
+    record_responses: bool # Grava as respostas reais em replay_dir
+    http_stub_url: str
+    http_stub_timeout_s: float
+
+    # Empacotamento de várias imagens em uma requisição (ver packing.py)
+    pack_max_images: int
+    pack_max_bytes: int # Soma dos bytes das imagens enviadas
+
+    # Serviço HTTP de análise (ver service.py)
+    service_host: str
+    service_port: int
+    service_max_concurrency: int # Análises distintas executando ao mesmo tempo
+    service_max_queue: int # Análises distintas aguardando; além disso, 503
+    service_max_upload_bytes: int
+    service_upload_dir: str
+
+    # Armazenamento colunar para relatórios (ver analytics.py)
+    analytics_dir: str
+
+    # Modo do prompt: full (o modelo estima as calorias) ou compact (só itens e gramas; calorias
+    # pela tabela nutricional local, ver nutrition.py)
+    prompt_mode: str
+    nutrition_table_path: str # CSV da tabela; o binário compilado fica ao lado (.bin)
+
+    # Admissão das imagens pelo cabeçalho, antes da decodificação e do upload (ver admission.py)
+    admission_enabled: bool
+    admission_formats: tuple[str, ...] # Nomes do Pillow: JPEG, PNG, WEBP, GIF, TIFF, BMP, HEIF, AVIF
+    admission_max_bytes: int
+    admission_max_side: int # Maior lado em pixels
+    admission_max_pixels: int # Largura x altura; acima disso, bomba de descompressão
+    admission_max_frames: int
+
+    # Roteamento por níveis de modelo (ver routing.py): MODEL_NAME primeiro, escalada quando preciso
+    routing_enabled: bool
+    routing_escalation_model: str
+    routing_max_low_confidence: float # Fração de itens "Baixo" a partir da qual o resultado escala
+    routing_fast_concurrency: int # 0 = sem limite próprio
+    routing_escalation_concurrency: int
+
+    # Requisições duplicadas para cortar a cauda de latência (ver hedging.py); desligadas por padrão
+    hedge_enabled: bool
+    hedge_percentile: float # Percentil da latência recente após o qual a duplicata é enviada
+    hedge_max_fraction: float # Orçamento global: duplicatas / requisições
+    hedge_min_samples: int # Amostras no histograma antes da primeira duplicata
+    hedge_window_s: float
+
+    # Fila de jobs durável para reprocessamentos com vários processos/hosts (ver jobqueue.py)
+    queue_path: str
+    queue_visibility_timeout_s: float # Sem heartbeat por esse tempo, o job volta para a fila
+    queue_max_attempts: int
+    queue_journal_mode: str # wal (um host) ou delete (vários hosts em sistema de arquivos de rede)
+
+def _load_dotenv():
+    from dotenv import load_dotenv # Import tardio: só quando a configuração é carregada
+
+    if os.path.exists(dotenv_path):
+        print_log("info", "Carregando arquivo .env de: %s", dotenv_path)
+        load_dotenv(dotenv_path)
+    else:
+        print_log("warn", "Arquivo .env não encontrado em: %s. Tentando load_dotenv() padrão (pode não funcionar se o CWD não for a raiz do projeto).", dotenv_path)
+        load_dotenv() # Tenta carregar .env do CWD ou diretórios pais
+
+def load_settings(use_dotenv: bool = True) -> Settings:
+    """Lê a configuração (carregando antes o .env, que não sobrescreve variáveis já definidas)."""
+    if use_dotenv:
+        _load_dotenv()
+    env = os.getenv
+
+    gemini_api_key = env("GEMINI_API_KEY")
+    if not gemini_api_key:
+        print_log("error", "GEMINI_API_KEY não encontrada. Certifique-se de que está definida no seu arquivo .env.")
+    else:
+        print_log("info", "GEMINI_API_KEY carregada com sucesso.")
+
+    return Settings(
+        gemini_api_key=gemini_api_key,
+        metrics_enabled=env("NUTRISNAP_METRICS", "0") == "1",
+        rate_limit_enabled=env("NUTRISNAP_RATE_LIMIT", "1") != "0",
+        rate_limit_rpm=float(env("NUTRISNAP_RATE_LIMIT_RPM", "1000")),
+        rate_limit_input_tpm=float(env("NUTRISNAP_RATE_LIMIT_INPUT_TPM", "4000000")),
+        rate_limit_initial_concurrency=int(env("NUTRISNAP_RATE_LIMIT_INITIAL_CONCURRENCY", "8")),
+        rate_limit_max_concurrency=int(env("NUTRISNAP_RATE_LIMIT_MAX_CONCURRENCY", "64")),
+        retry_max_attempts=int(env("NUTRISNAP_RETRY_MAX_ATTEMPTS", "5")),
+        cache_path=env("NUTRISNAP_CACHE_PATH", os.path.join(project_root, "data", "cache", "results.sqlite")),
+        cache_max_entries=int(env("NUTRISNAP_CACHE_MAX_ENTRIES", "200000")),
+        cache_max_bytes=int(env("NUTRISNAP_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+        cache_max_age_s=float(env("NUTRISNAP_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600,
+        phash_enabled=env("NUTRISNAP_PHASH", "1") != "0",
+        phash_max_distance=int(env("NUTRISNAP_PHASH_MAX_DISTANCE", "6")),
+        phash_index_path=env("NUTRISNAP_PHASH_INDEX_PATH", os.path.join(project_root, "data", "cache", "phash_index")),
+        preprocess_enabled=env("NUTRISNAP_PREPROCESS", "1") != "0",
+        preprocess_max_side=int(env("NUTRISNAP_PREPROCESS_MAX_SIDE", "1024")),
+        preprocess_format=env("NUTRISNAP_PREPROCESS_FORMAT", "JPEG"),
+        preprocess_quality=int(env("NUTRISNAP_PREPROCESS_QUALITY", "85")),
+        preprocess_passthrough_bytes=int(env("NUTRISNAP_PREPROCESS_PASSTHROUGH_BYTES", str(300 * 1024))),
+        structured_output=env("NUTRISNAP_STRUCTURED_OUTPUT", "1") != "0",
+        backend=env("NUTRISNAP_BACKEND", "gemini"),
+        replay_dir=env("NUTRISNAP_REPLAY_DIR", os.path.join(project_root, "data", "replay")),
+        record_responses=env("NUTRISNAP_RECORD", "0") == "1",
+        http_stub_url=env("NUTRISNAP_HTTP_STUB_URL", "http://127.0.0.1:8765/generate"),
+        http_stub_timeout_s=float(env("NUTRISNAP_HTTP_STUB_TIMEOUT_S", "30")),
+        pack_max_images=int(env("NUTRISNAP_PACK_MAX_IMAGES", "8")),
+        pack_max_bytes=int(env("NUTRISNAP_PACK_MAX_BYTES", str(4 * 1024 * 1024))),
+        service_host=env("NUTRISNAP_SERVICE_HOST", "127.0.0.1"),
+        service_port=int(env("NUTRISNAP_SERVICE_PORT", "8080")),
+        service_max_concurrency=int(env("NUTRISNAP_SERVICE_MAX_CONCURRENCY", "16")),
+        service_max_queue=int(env("NUTRISNAP_SERVICE_MAX_QUEUE", "64")),
+        service_max_upload_bytes=int(env("NUTRISNAP_SERVICE_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024))),
+        service_upload_dir=env("NUTRISNAP_SERVICE_UPLOAD_DIR", os.path.join(project_root, "data", "uploads")),
+        analytics_dir=env("NUTRISNAP_ANALYTICS_DIR", os.path.join(project_root, "data", "analytics")),
+        prompt_mode=env("NUTRISNAP_PROMPT_MODE", "full"),
+        nutrition_table_path=env("NUTRISNAP_NUTRITION_TABLE", os.path.join(project_root, "data", "nutrition", "nutrition_table.csv")),
+        admission_enabled=env("NUTRISNAP_ADMISSION", "1") != "0",
+        admission_formats=tuple(env("NUTRISNAP_ADMISSION_FORMATS", "JPEG,PNG,WEBP,GIF").split(",")),
+        admission_max_bytes=int(env("NUTRISNAP_ADMISSION_MAX_BYTES", str(20 * 1024 * 1024))),
+        admission_max_side=int(env("NUTRISNAP_ADMISSION_MAX_SIDE", "12000")),
+        admission_max_pixels=int(env("NUTRISNAP_ADMISSION_MAX_PIXELS", "50000000")),
+        admission_max_frames=int(env("NUTRISNAP_ADMISSION_MAX_FRAMES", "1")),
+        routing_enabled=env("NUTRISNAP_ROUTING", "0") == "1",
+        routing_escalation_model=env("NUTRISNAP_ESCALATION_MODEL", "gemini-1.5-pro-latest"),
+        routing_max_low_confidence=float(env("NUTRISNAP_ROUTING_MAX_LOW_CONFIDENCE", "0.5")),
+        routing_fast_concurrency=int(env("NUTRISNAP_ROUTING_FAST_CONCURRENCY", "0")),
+        routing_escalation_concurrency=int(env("NUTRISNAP_ROUTING_ESCALATION_CONCURRENCY", "4")),
+        hedge_enabled=env("NUTRISNAP_HEDGE", "0") == "1",
+        hedge_percentile=float(env("NUTRISNAP_HEDGE_PERCENTILE", "95")),
+        hedge_max_fraction=float(env("NUTRISNAP_HEDGE_MAX_FRACTION", "0.05")),
+        hedge_min_samples=int(env("NUTRISNAP_HEDGE_MIN_SAMPLES", "50")),
+        hedge_window_s=float(env("NUTRISNAP_HEDGE_WINDOW_S", "60")),
+        queue_path=env("NUTRISNAP_QUEUE_PATH", os.path.join(project_root, "data", "queue", "jobs.sqlite")),
+        queue_visibility_timeout_s=float(env("NUTRISNAP_QUEUE_VISIBILITY_S", "300")),
+        queue_max_attempts=int(env("NUTRISNAP_QUEUE_MAX_ATTEMPTS", "3")),
+        queue_journal_mode=env("NUTRISNAP_QUEUE_JOURNAL", "wal").lower(),
+    )
+
+_settings: Settings | None = None
+_settings_lock = threading.Lock()
+
+def get_settings() -> Settings:
+    """Configuração do processo, carregada uma única vez na primeira chamada."""
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = load_settings()
+    return _settings
+
+def set_settings(settings: Settings | None):
+    """Substitui a configuração do processo (None recarrega do ambiente na próxima chamada)."""
+    global _settings
+    with _settings_lock:
+        _settings = settings
+
+def __getattr__(name: str):
+    # Compatibilidade com as antigas constantes de módulo (config.GEMINI_API_KEY etc.),
+    # resolvidas sob demanda a partir de get_settings()
+    field_name = name.lower()
+    if name.isupper() and field_name in Settings.__dataclass_fields__:
+        return getattr(get_settings(), field_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Prompt padrão otimizado
 OPTIMIZED_PROMPT = """
@@ -53,4 +244,14 @@ Sua resposta DEVE ser exclusivamente um objeto JSON. Não inclua nenhum texto in
 }
 
 **Diretrizes Adicionais para Consistência:** Analise apenas os alimentos contidos no prato principal ou porção sendo apresentada. Ignore o ambiente ao redor. Baseie as estimativas calóricas em porções visualmente aparentes. Mantenha um tom técnico, direto e objetivo em todas as descrições e notas.
-"""
\ No newline at end of file
+"""
+
+# Prompt do modo compacto (NUTRISNAP_PROMPT_MODE=compact): o modelo só identifica os itens e as
+# porções em gramas; as calorias são calculadas pela tabela nutricional local (ver nutrition.py)
+COMPACT_PROMPT = """
+Identifique cada alimento distinto no prato da imagem e estime a porção visível em gramas.
+Use nomes genéricos em português, com o preparo quando visível (ex: "arroz branco", "feijão carioca", "peito de frango grelhado", "batata frita").
+Item que não puder ser identificado: "Item Não Identificado - N". Porção impossível de estimar: null.
+Não estime calorias. Responda apenas com JSON:
+{"items": [{"name": "string", "grams": 0}]}
+"""
@@ -0,0 +1,274 @@
+# nutrisnap_ai1/hedging.py
+"""
+Requisições duplicadas ("hedging") para cortar a cauda de latência da chamada ao modelo: se a
+chamada não terminou depois do percentil NUTRISNAP_HEDGE_PERCENTILE da latência recente (histograma
+móvel em processo), uma duplicata é enviada; a primeira resposta bem-sucedida vence e a outra é
+cancelada. Um orçamento global limita as duplicatas a NUTRISNAP_HEDGE_MAX_FRACTION das requisições.
+A duplicata pode ser enviada por outra função (`hedge_fn`), que levanta HedgeRejected se não puder
+sair agora (ex: sem vaga no limitador); nesse caso vale só a primária.
+
+No caminho asyncio a perdedora é cancelada de fato; no síncrono ela roda em uma thread do pool e
+só pode ser cancelada se ainda não começou (o resultado dela é descartado).
+"""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable
+
+from . import config
+
+_MAX_HEDGE_THREADS = 256 # Criadas sob demanda; a primária e a duplicata rodam no pool
+
+class HedgeRejected(Exception):
+    """A duplicata não foi enviada (ex: limitador sem vaga ou cota agora); a primária segue sozinha."""
+
+class RollingHistogram:
+    """
+    Latências (s) da janela recente em buckets logarítmicos (~5% de largura). A janela tem duas
+    metades que se alternam, então o percentil cobre entre window_s / 2 e window_s de histórico.
+    """
+
+    def __init__(self, window_s: float = 60.0, growth: float = 1.05, min_s: float = 0.001, max_s: float = 600.0):
+        self.window_s = window_s
+        self._min_s = min_s
+        self._growth = growth
+        self._log_growth = math.log(growth)
+        self._buckets = int(math.log(max_s / min_s) / self._log_growth) + 2
+        self._current = [0] * self._buckets
+        self._previous = [0] * self._buckets
+        self._counts = [0, 0] # (atual, anterior)
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _bucket(self, seconds: float) -> int:
+        if seconds <= self._min_s:
+            return 0
+        return min(self._buckets - 1, 1 + int(math.log(seconds / self._min_s) / self._log_growth))
+
+    def _rotate_locked(self, now: float):
+        elapsed = now - self._rotated_at
+        if elapsed < self.window_s / 2:
+            return
+        if elapsed >= self.window_s: # Sem observações há uma janela inteira: descarta tudo
+            self._previous, self._counts[1] = [0] * self._buckets, 0
+        else:
+            self._previous, self._counts[1] = self._current, self._counts[0]
+        self._current, self._counts[0] = [0] * self._buckets, 0
+        self._rotated_at = now
+
+    def observe(self, seconds: float):
+        index = self._bucket(seconds)
+        with self._lock:
+            self._rotate_locked(time.monotonic())
+            self._current[index] += 1
+            self._counts[0] += 1
+
+    def count(self) -> int:
+        with self._lock:
+            self._rotate_locked(time.monotonic())
+            return self._counts[0] + self._counts[1]
+
+    def percentile_s(self, pct: float) -> float | None:
+        """Limite superior do bucket que contém o percentil (None sem amostras)."""
+        with self._lock:
+            self._rotate_locked(time.monotonic())
+            total = self._counts[0] + self._counts[1]
+            if not total:
+                return None
+            target = total * pct / 100.0
+            cumulative = 0
+            for index in range(self._buckets):
+                cumulative += self._current[index] + self._previous[index]
+                if cumulative >= target:
+                    return self._min_s * self._growth ** index
+        return None
+
+class HedgeBudget:
+    """
+    Orçamento de duplicatas: cada requisição rende `max_fraction` de crédito (acumulado até `burst`)
+    e cada duplicata gasta 1, então no longo prazo as duplicatas ficam em até max_fraction do tráfego.
+    """
+
+    def __init__(self, max_fraction: float, burst: float = 10.0):
+        self.max_fraction = max(0.0, max_fraction)
+        self.burst = max(1.0, burst)
+        self._credit = 0.0
+        self._lock = threading.Lock()
+
+    def on_request(self):
+        with self._lock:
+            self._credit = min(self.burst, self._credit + self.max_fraction)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._credit < 1.0:
+                return False
+            self._credit -= 1.0
+            return True
+
+    def refund(self):
+        """Devolve o crédito de uma duplicata que acabou não saindo."""
+        with self._lock:
+            self._credit = min(self.burst, self._credit + 1.0)
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_MAX_HEDGE_THREADS, thread_name_prefix="nutrisnap-hedge")
+    return _executor
+
+class Hedger:
+    """Executa uma chamada com duplicata após o percentil `percentile` da latência recente (ver módulo)."""
+
+    def __init__(self, percentile: float = 95.0, min_samples: int = 50, budget: HedgeBudget | None = None,
+                 histogram: RollingHistogram | None = None):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = budget or get_default_budget()
+        self.histogram = histogram or RollingHistogram()
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "hedged": 0, "hedge_wins": 0, "budget_denied": 0, "limiter_denied": 0}
+
+    @classmethod
+    def from_settings(cls) -> "Hedger":
+        """Hedger com os parâmetros NUTRISNAP_HEDGE_* e o orçamento global do processo."""
+        settings = config.get_settings()
+        return cls(settings.hedge_percentile, settings.hedge_min_samples, get_default_budget(),
+                   RollingHistogram(settings.hedge_window_s))
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counters[key] += 1
+
+    def threshold_s(self) -> float | None:
+        """Espera antes da duplicata; None enquanto o histograma não tem amostras suficientes."""
+        if self.histogram.count() < self.min_samples:
+            return None
+        return self.histogram.percentile_s(self.percentile)
+
+    def _start(self) -> float | None:
+        self.budget.on_request()
+        self._count("requests")
+        return self.threshold_s()
+
+    def _on_rejected(self):
+        """Duplicata recusada por `hedge_fn`: não conta como enviada e devolve o crédito do orçamento."""
+        self.budget.refund()
+        with self._lock:
+            self.counters["hedged"] -= 1
+            self.counters["limiter_denied"] += 1
+
+    def _timed(self, fn: Callable[[], object]):
+        started = time.perf_counter()
+        result = fn()
+        self.histogram.observe(time.perf_counter() - started) # Só respostas bem-sucedidas
+        return result
+
+    def call(self, fn: Callable[[], object], hedge_fn: Callable[[], object] | None = None):
+        """
+        Executa `fn` (bloqueante), duplicando-a em outra thread se passar do limiar. A duplicata
+        chama `hedge_fn` (padrão: `fn`), que pode levantar HedgeRejected para não sair.
+        """
+        delay_s = self._start()
+        if delay_s is None:
+            return self._timed(fn)
+        primary = _get_executor().submit(self._timed, fn)
+        done, _ = wait([primary], timeout=delay_s)
+        if done:
+            return primary.result()
+        if not self.budget.try_spend():
+            self._count("budget_denied")
+            return primary.result()
+        self._count("hedged")
+        hedge = _get_executor().submit(self._timed, hedge_fn or fn)
+        return self._first_success(primary, hedge)
+
+    def _first_success(self, primary: Future, hedge: Future):
+        pending, first_error = {primary, hedge}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if isinstance(future.exception(), HedgeRejected):
+                    self._on_rejected()
+                    continue
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel() # Só tem efeito se ainda não começou; senão o resultado é descartado
+                    if future is hedge:
+                        self._count("hedge_wins")
+                    return future.result()
+                first_error = first_error or future.exception()
+        raise first_error
+
+    async def _timed_async(self, fn: Callable[[], Awaitable[object]]):
+        started = time.perf_counter()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Perdedora cancelada: a latência real seria ao menos esta (mantém a cauda no histograma)
+            self.histogram.observe(time.perf_counter() - started)
+            raise
+        self.histogram.observe(time.perf_counter() - started)
+        return result
+
+    async def call_async(self, fn: Callable[[], Awaitable[object]],
+                         hedge_fn: Callable[[], Awaitable[object]] | None = None):
+        """Versão asyncio de `call`: `fn` retorna uma corrotina nova a cada chamada; a perdedora é cancelada."""
+        delay_s = self._start()
+        if delay_s is None:
+            return await self._timed_async(fn)
+        tasks = [asyncio.ensure_future(self._timed_async(fn))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay_s)
+            if done:
+                return tasks[0].result()
+            if not self.budget.try_spend():
+                self._count("budget_denied")
+                return await tasks[0]
+            self._count("hedged")
+            tasks.append(asyncio.ensure_future(self._timed_async(hedge_fn or fn)))
+            pending, first_error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if isinstance(task.exception(), HedgeRejected):
+                        self._on_rejected()
+                        continue
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            self._count("hedge_wins")
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            for task in tasks: # Perdedora (ou tudo, se quem chamou foi cancelado)
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        threshold = self.threshold_s()
+        return {**counters,
+                "hedge_rate": round(counters["hedged"] / counters["requests"], 4) if counters["requests"] else None,
+                "threshold_s": round(threshold, 4) if threshold is not None else None,
+                "window_samples": self.histogram.count()}
+
+_default_budget: HedgeBudget | None = None
+_default_budget_lock = threading.Lock()
+
+def get_default_budget() -> HedgeBudget:
+    """Orçamento global de duplicatas, compartilhado por todas as sessões do processo."""
+    global _default_budget
+    if _default_budget is None:
+        with _default_budget_lock:
+            if _default_budget is None:
+                _default_budget = HedgeBudget(config.get_settings().hedge_max_fraction)
+    return _default_budget
@@ -0,0 +1,424 @@
+# nutrisnap_ai1/jobqueue.py
+"""
+Fila de jobs durável (SQLite) para reprocessamentos grandes, com vários processos no mesmo host ou
+em hosts que compartilham o sistema de arquivos.
+
+Cada imagem é enfileirada uma vez (chave: caminho absoluto). Workers pegam jobs com uma concessão
+(lease) que vale NUTRISNAP_QUEUE_VISIBILITY_S e a renovam por heartbeat enquanto trabalham; um
+job cuja concessão expirou (worker morto ou travado) volta para a fila na próxima concessão de
+qualquer worker, até NUTRISNAP_QUEUE_MAX_ATTEMPTS tentativas. O resultado é gravado no próprio
+banco em uma única transação e só o primeiro vale (complete() é idempotente), então um worker
+considerado morto que termina depois não duplica nada.
+
+Várias máquinas: o banco precisa estar em um caminho compartilhado e com NUTRISNAP_QUEUE_JOURNAL=delete
+(o modo WAL não funciona em sistemas de arquivos de rede); os relógios dos hosts devem divergir
+bem menos que o tempo de visibilidade.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from . import config, utils
+
+STATES = ("pending", "leased", "done", "failed")
+_BUSY_TIMEOUT_S = 30.0
+_ENQUEUE_CHUNK = 1000
+_MAX_RETRY_DELAY_S = 60.0
+_DB_RETRY_BASE_S = 0.5 # Backoff do worker após erro do SQLite (ex: "database is locked" além do busy timeout)
+_DB_RETRY_MAX_S = 30.0
+_DB_RECORD_ATTEMPTS = 5 # Tentativas de gravar o resultado de um job antes de deixá-lo expirar
+_RATE_WINDOW_S = 300.0 # Janela da vazão usada no ETA
+_DEAD_WORKER_ERROR = "Tentativas esgotadas (concessão expirada sem heartbeat)"
+
+class Lease:
+    """Concessão de um job a um worker; `token` identifica esta concessão (muda a cada re-lease)."""
+    __slots__ = ("job_id", "image_path", "token", "attempt")
+
+    def __init__(self, job_id: int, image_path: str, token: str, attempt: int):
+        self.job_id = job_id
+        self.image_path = image_path
+        self.token = token
+        self.attempt = attempt
+
+class JobQueue:
+    """
+    Fila em um arquivo SQLite. Thread-safe (uma conexão por instância, protegida por lock); cada
+    processo abre a sua instância e a concorrência entre processos fica com os locks do SQLite
+    (transações BEGIN IMMEDIATE).
+    """
+
+    def __init__(self, db_path: str, visibility_timeout_s: float | None = None, max_attempts: int | None = None,
+                 journal_mode: str | None = None):
+        settings = config.get_settings()
+        self.db_path = db_path
+        self.visibility_timeout_s = visibility_timeout_s or settings.queue_visibility_timeout_s
+        self.max_attempts = max(1, max_attempts or settings.queue_max_attempts)
+        journal_mode = (journal_mode or settings.queue_journal_mode).lower()
+        if journal_mode not in ("wal", "delete"):
+            raise ValueError(f"Modo de journal não suportado: {journal_mode}. Use 'wal' ou 'delete'.")
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=_BUSY_TIMEOUT_S, check_same_thread=False, isolation_level=None)
+        self._conn.execute(f"PRAGMA journal_mode={journal_mode.upper()}")
+        self._conn.execute("PRAGMA synchronous=NORMAL" if journal_mode == "wal" else "PRAGMA synchronous=FULL")
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY,"
+                " image_path TEXT NOT NULL UNIQUE,"
+                " state TEXT NOT NULL DEFAULT 'pending',"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " available_at REAL NOT NULL DEFAULT 0,"
+                " lease_owner TEXT,"
+                " lease_token TEXT,"
+                " lease_expires_at REAL,"
+                " enqueued_at REAL NOT NULL,"
+                " first_leased_at REAL,"
+                " finished_at REAL,"
+                " completed_by TEXT,"
+                " result TEXT,"
+                " error TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, available_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS workers ("
+                " worker_id TEXT PRIMARY KEY,"
+                " host TEXT NOT NULL,"
+                " pid INTEGER NOT NULL,"
+                " started_at REAL NOT NULL,"
+                " last_heartbeat REAL NOT NULL,"
+                " stopped_at REAL,"
+                " jobs_done INTEGER NOT NULL DEFAULT 0)"
+            )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Transação de escrita: o lock do SQLite é pego no início (evita dois workers com o mesmo job)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue(self, image_paths: list[str]) -> int:
+        """Enfileira as imagens ainda não enfileiradas; retorna quantos jobs novos foram criados."""
+        now = time.time()
+        added = 0
+        for start in range(0, len(image_paths), _ENQUEUE_CHUNK):
+            rows = [(os.path.abspath(path), now) for path in image_paths[start:start + _ENQUEUE_CHUNK]]
+            with self._transaction() as conn:
+                before = conn.total_changes
+                conn.executemany("INSERT OR IGNORE INTO jobs (image_path, enqueued_at) VALUES (?, ?)", rows)
+                added += conn.total_changes - before
+        return added
+
+    def register_worker(self, worker_id: str):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO workers (worker_id, host, pid, started_at, last_heartbeat) VALUES (?, ?, ?, ?, ?)",
+                         (worker_id, socket.gethostname(), os.getpid(), now, now))
+
+    def stop_worker(self, worker_id: str):
+        with self._transaction() as conn:
+            conn.execute("UPDATE workers SET stopped_at = ? WHERE worker_id = ?", (time.time(), worker_id))
+
+    def _requeue_expired(self, conn: sqlite3.Connection, now: float):
+        """Devolve à fila os jobs com concessão expirada (ou os falha, se esgotaram as tentativas)."""
+        expired = conn.execute("SELECT id, lease_owner, attempts FROM jobs WHERE state = 'leased' AND lease_expires_at < ?",
+                               (now,)).fetchall()
+        if not expired:
+            return
+        exhausted = [(now, _DEAD_WORKER_ERROR, job_id) for job_id, _, attempts in expired if attempts >= self.max_attempts]
+        conn.executemany("UPDATE jobs SET state = 'failed', finished_at = ?, error = ?, lease_owner = NULL, lease_token = NULL,"
+                         " lease_expires_at = NULL WHERE id = ?", exhausted)
+        conn.executemany("UPDATE jobs SET state = 'pending', available_at = ?, lease_owner = NULL, lease_token = NULL,"
+                         " lease_expires_at = NULL WHERE id = ?",
+                         [(now, job_id) for job_id, _, attempts in expired if attempts < self.max_attempts])
+        utils.print_log("warn", "Fila: %s jobs com concessão expirada voltaram para a fila (%s falharam de vez); workers: %s",
+                        len(expired) - len(exhausted), len(exhausted),
+                        utils.lazy(lambda: ", ".join(sorted({owner or "?" for _, owner, _ in expired}))))
+
+    def lease(self, worker_id: str, limit: int = 1) -> list[Lease]:
+        """Concede até `limit` jobs pendentes a `worker_id` (recuperando antes os de workers mortos)."""
+        now = time.time()
+        leases = []
+        with self._transaction() as conn:
+            self._requeue_expired(conn, now)
+            rows = conn.execute("SELECT id, image_path, attempts FROM jobs WHERE state = 'pending' AND available_at <= ?"
+                                " ORDER BY id LIMIT ?", (now, limit)).fetchall()
+            for job_id, image_path, attempts in rows:
+                token = uuid.uuid4().hex
+                conn.execute("UPDATE jobs SET state = 'leased', attempts = attempts + 1, lease_owner = ?, lease_token = ?,"
+                             " lease_expires_at = ?, first_leased_at = COALESCE(first_leased_at, ?) WHERE id = ?",
+                             (worker_id, token, now + self.visibility_timeout_s, now, job_id))
+                leases.append(Lease(job_id, image_path, token, attempts + 1))
+        return leases
+
+    def heartbeat(self, worker_id: str, leases: list[Lease]) -> list[Lease]:
+        """Renova as concessões de `worker_id`; retorna as que já foram perdidas (expiradas e re-concedidas)."""
+        now = time.time()
+        lost = []
+        with self._transaction() as conn:
+            conn.execute("UPDATE workers SET last_heartbeat = ? WHERE worker_id = ?", (now, worker_id))
+            for lease in leases:
+                updated = conn.execute("UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND lease_token = ? AND state = 'leased'",
+                                       (now + self.visibility_timeout_s, lease.job_id, lease.token)).rowcount
+                if not updated:
+                    lost.append(lease)
+        return lost
+
+    def complete(self, lease: Lease, result: dict, worker_id: str) -> bool:
+        """
+        Grava o resultado do job. Idempotente: só o primeiro resultado vale (False se o job já estava
+        concluído, por exemplo por outro worker depois que esta concessão expirou).
+        """
+        value = json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET state = 'done', result = ?, error = NULL, finished_at = ?, completed_by = ?,"
+                " lease_owner = NULL, lease_token = NULL, lease_expires_at = NULL WHERE id = ? AND state != 'done'",
+                (value, time.time(), worker_id, lease.job_id),
+            ).rowcount
+            if updated:
+                conn.execute("UPDATE workers SET jobs_done = jobs_done + 1 WHERE worker_id = ?", (worker_id,))
+        return bool(updated)
+
+    def fail(self, lease: Lease, error: str, result: dict | None = None) -> str | None:
+        """
+        Registra uma tentativa que falhou: o job volta para a fila com espera exponencial ou, se
+        esgotou as tentativas, fica 'failed' (com o último resultado). Retorna o novo estado, ou None
+        se a concessão já não era desta tentativa.
+        """
+        now = time.time()
+        value = json.dumps(result, ensure_ascii=False, separators=(",", ":")) if result is not None else None
+        with self._transaction() as conn:
+            if lease.attempt >= self.max_attempts:
+                state = "failed"
+                updated = conn.execute(
+                    "UPDATE jobs SET state = 'failed', error = ?, result = ?, finished_at = ?, lease_owner = NULL,"
+                    " lease_token = NULL, lease_expires_at = NULL WHERE id = ? AND lease_token = ? AND state = 'leased'",
+                    (error, value, now, lease.job_id, lease.token)).rowcount
+            else:
+                state = "pending"
+                updated = conn.execute(
+                    "UPDATE jobs SET state = 'pending', error = ?, available_at = ?, lease_owner = NULL, lease_token = NULL,"
+                    " lease_expires_at = NULL WHERE id = ? AND lease_token = ? AND state = 'leased'",
+                    (error, now + min(_MAX_RETRY_DELAY_S, 2.0 ** lease.attempt), lease.job_id, lease.token)).rowcount
+        return state if updated else None
+
+    def requeue_failed(self) -> int:
+        """Volta os jobs 'failed' para a fila com as tentativas zeradas."""
+        with self._transaction() as conn:
+            return conn.execute("UPDATE jobs SET state = 'pending', attempts = 0, available_at = 0, finished_at = NULL"
+                                " WHERE state = 'failed'").rowcount
+
+    def is_drained(self) -> bool:
+        """Nenhum job pendente ou concedido (concessões de workers mortos ainda contam até expirarem)."""
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('pending', 'leased')").fetchone()
+        return count == 0
+
+    def progress(self) -> dict:
+        """Jobs por estado, vazão recente (jobs/s), ETA e workers ativos ou sem heartbeat."""
+        now = time.time()
+        with self._lock:
+            counts = dict.fromkeys(STATES, 0)
+            counts.update(self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+            (started_at,) = self._conn.execute("SELECT MIN(first_leased_at) FROM jobs").fetchone()
+            window_start = max(now - _RATE_WINDOW_S, started_at) if started_at is not None else now
+            (finished_recently,) = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE finished_at >= ?",
+                                                      (window_start,)).fetchone()
+            (retried,) = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE attempts > 1").fetchone()
+            workers = self._conn.execute("SELECT worker_id, last_heartbeat, stopped_at FROM workers").fetchall()
+        total = sum(counts.values())
+        remaining = counts["pending"] + counts["leased"]
+        elapsed = now - window_start
+        rate = finished_recently / elapsed if elapsed > 0 and finished_recently else None
+        stale_before = now - self.visibility_timeout_s
+        return {
+            "total": total,
+            **counts,
+            "retried": retried,
+            "percent_done": round(100 * (counts["done"] + counts["failed"]) / total, 2) if total else None,
+            "jobs_per_s": round(rate, 3) if rate else None,
+            "eta_s": round(remaining / rate, 1) if rate and remaining else (0.0 if total and not remaining else None),
+            "workers_active": sum(1 for _, heartbeat, stopped in workers if stopped is None and heartbeat >= stale_before),
+            "workers_dead": sum(1 for _, heartbeat, stopped in workers if stopped is None and heartbeat < stale_before),
+        }
+
+    def results(self, states: tuple[str, ...] = ("done", "failed")) -> Iterator[tuple[str, str, dict | None, str | None, float | None]]:
+        """(caminho, estado, resultado, erro, finished_at) dos jobs nos estados pedidos, em ordem de enfileiramento."""
+        placeholders = ", ".join("?" for _ in states)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT image_path, state, result, error, finished_at FROM jobs"
+                                      f" WHERE state IN ({placeholders}) ORDER BY id", states).fetchall()
+        for image_path, state, result, error, finished_at in rows:
+            yield image_path, state, json.loads(result) if result is not None else None, error, finished_at
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def default_worker_id() -> str:
+    """host:pid:sufixo aleatório (único mesmo se o pid for reaproveitado)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+def _is_final(result: dict) -> bool:
+    """Sucesso ou recusa na admissão (não adianta tentar de novo); erros voltam para a fila."""
+    status = str(result.get("status", ""))
+    return status.startswith("sucesso") or status == "rejeitado"
+
+class QueueWorker:
+    """
+    Processa jobs da fila com `concurrency` threads, chamando `analyze(image_path) -> dict` para cada
+    um. Uma thread de heartbeat renova as concessões em andamento a cada 1/3 do tempo de visibilidade.
+    Com `exit_when_idle`, termina quando não há mais jobs pendentes nem concedidos (a qualquer worker).
+    """
+
+    def __init__(self, queue: JobQueue, analyze: Callable[[str], dict], worker_id: str | None = None,
+                 concurrency: int = 4, poll_interval_s: float = 1.0, exit_when_idle: bool = True,
+                 on_result: Callable[[str, dict, bool], None] | None = None):
+        self.queue = queue
+        self.analyze = analyze
+        self.worker_id = worker_id or default_worker_id()
+        self.concurrency = max(1, concurrency)
+        self.poll_interval_s = poll_interval_s
+        self.exit_when_idle = exit_when_idle
+        self.on_result = on_result # (caminho, resultado, gravado) após cada job concluído
+        self._held: dict[int, Lease] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.counters = {"completed": 0, "duplicates": 0, "retried": 0, "failed": 0, "lost_leases": 0, "db_errors": 0}
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.counters[key] += amount
+
+    def stop(self):
+        """Pede o encerramento: as threads terminam o job atual e não pegam outro."""
+        self._stop.set()
+
+    def _heartbeat_loop(self, done: threading.Event):
+        interval = self.queue.visibility_timeout_s / 3
+        while not done.wait(interval):
+            with self._lock:
+                held = list(self._held.values())
+            try:
+                lost = self.queue.heartbeat(self.worker_id, held)
+            except sqlite3.Error as e:
+                utils.print_log("warn", "Fila: falha no heartbeat (%s); nova tentativa em %.0f s.", e, interval)
+                continue
+            if lost:
+                self._count("lost_leases", len(lost))
+                utils.print_log("warn", "Fila: %s concessões perdidas (expiraram antes do heartbeat): %s", len(lost),
+                                utils.lazy(lambda: ", ".join(lease.image_path for lease in lost)))
+
+    def _db_backoff(self, error: sqlite3.Error, failures: int, action: str) -> float:
+        """Conta o erro do banco e retorna a espera antes de tentar de novo (exponencial, com teto)."""
+        self._count("db_errors")
+        delay_s = min(_DB_RETRY_MAX_S, _DB_RETRY_BASE_S * 2 ** failures)
+        utils.print_log("warn", "Fila: erro no banco ao %s (%s); nova tentativa em %.1f s.", action, error, delay_s)
+        return delay_s
+
+    def _record(self, fn: Callable[[], object], lease: Lease):
+        """
+        Grava o desfecho de um job (complete/fail), repetindo em erros do SQLite: a análise já foi
+        paga e não deve se perder por um lock passageiro. Mesmo com stop() pedido, continua tentando.
+        """
+        for failures in range(_DB_RECORD_ATTEMPTS):
+            try:
+                return fn()
+            except sqlite3.Error as e:
+                if failures + 1 >= _DB_RECORD_ATTEMPTS:
+                    raise
+                time.sleep(self._db_backoff(e, failures, f"registrar {lease.image_path}"))
+
+    def _process(self, lease: Lease):
+        try:
+            result = self.analyze(lease.image_path)
+        except Exception as e:
+            result = {"status": "erro", "data": None, "error": f"Exceção no worker: {type(e).__name__}", "details": str(e)}
+        if _is_final(result):
+            stored = self._record(lambda: self.queue.complete(lease, result, self.worker_id), lease)
+            self._count("completed" if stored else "duplicates")
+            if self.on_result:
+                self.on_result(lease.image_path, result, stored)
+            return
+        state = self._record(lambda: self.queue.fail(lease, result.get("error") or "erro desconhecido", result), lease)
+        if state == "failed":
+            self._count("failed")
+            utils.print_log("error", "Fila: %s falhou após %s tentativas: %s", lease.image_path, lease.attempt, result.get("error"))
+        elif state == "pending":
+            self._count("retried")
+            utils.print_log("warn", "Fila: %s falhou (tentativa %s de %s); volta para a fila.", lease.image_path,
+                            lease.attempt, self.queue.max_attempts)
+
+    def _loop(self):
+        failures = 0 # Erros seguidos do banco ao buscar jobs
+        while not self._stop.is_set():
+            try:
+                leases = self.queue.lease(self.worker_id, 1)
+                drained = not leases and self.exit_when_idle and self.queue.is_drained()
+            except sqlite3.Error as e: # Ex: banco travado por outro processo além do busy timeout
+                self._stop.wait(self._db_backoff(e, failures, "buscar jobs"))
+                failures += 1
+                continue
+            failures = 0
+            if drained:
+                return
+            if not leases:
+                self._stop.wait(self.poll_interval_s)
+                continue
+            lease = leases[0]
+            with self._lock:
+                self._held[lease.job_id] = lease
+            try:
+                self._process(lease)
+            except sqlite3.Error as e:
+                # Sem heartbeat, a concessão expira e o job volta para a fila (para este ou outro worker)
+                self._count("db_errors")
+                utils.print_log("error", "Fila: não foi possível registrar %s (%s); o job volta para a fila quando a "
+                                         "concessão expirar.", lease.image_path, e)
+            finally:
+                with self._lock:
+                    self._held.pop(lease.job_id, None)
+
+    def run(self) -> dict:
+        """Roda até a fila esvaziar (ou stop()); retorna os contadores deste worker."""
+        self.queue.register_worker(self.worker_id)
+        utils.print_log("info", "Fila: worker %s iniciado com %s threads.", self.worker_id, self.concurrency)
+        heartbeat_done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(heartbeat_done,), name="nutrisnap-queue-heartbeat",
+                                     daemon=True)
+        heartbeat.start()
+        threads = [threading.Thread(target=self._loop, name=f"nutrisnap-queue-{index}", daemon=True)
+                   for index in range(self.concurrency)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                while thread.is_alive(): # join com timeout: permite interromper com Ctrl+C
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            utils.print_log("warn", "Fila: encerrando o worker %s após os jobs em andamento...", self.worker_id)
+            self.stop()
+            for thread in threads:
+                thread.join()
+        finally:
+            heartbeat_done.set()
+            heartbeat.join()
+            self.queue.stop_worker(self.worker_id)
+        with self._lock:
+            return dict(self.counters)
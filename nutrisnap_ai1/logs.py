@@ -0,0 +1,171 @@
+# nutrisnap_ai1/logs.py
+"""
+Camada de log do pacote (usada por utils.print_log e pelo simple_gemini_analyzer).
+
+- Nível mínimo verificado antes de qualquer formatação: mensagens abaixo dele custam só uma comparação.
+- Argumentos preguiçosos: print_log("debug", "Texto: %s", lazy(func, arg)) só formata (e só chama func)
+  se o nível estiver habilitado.
+- Saída em texto ("2024-01-01 12:00:00 [INFO] mensagem") ou JSON, uma linha por mensagem.
+- A escrita em stdout é feita por uma thread própria (QueueHandler/QueueListener); quem loga só formata
+  a linha e a coloca na fila. A fila é esvaziada no encerramento do processo (atexit) ou em flush().
+
+Configuração pelo ambiente (lida no primeiro log, independente do .env/Settings, que também logam):
+  NUTRISNAP_LOG_LEVEL=debug|info|warn|error|fatal (padrão: info)
+  NUTRISNAP_LOG_FORMAT=text|json (padrão: text)
+  NUTRISNAP_LOG_QUEUE=1|0 (padrão: 1; 0 escreve de forma síncrona)
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "system": logging.INFO + 5,
+    "success": logging.INFO + 5,
+    "warn": logging.WARNING,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+    "fatal": logging.CRITICAL,
+}
+
+_logger = logging.getLogger("nutrisnap")
+_logger.propagate = False # Não interfere na configuração de logging da aplicação que importa o pacote
+_listener: "logging.handlers.QueueListener | None" = None
+_queue: queue.Queue | None = None
+_configured = False
+_config_lock = threading.Lock()
+
+class lazy:
+    """Argumento calculado só quando a mensagem é de fato formatada: lazy(traceback.format_exc)."""
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self) -> str:
+        return str(self.func(*self.args))
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        timestamp = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S")
+        return f"{timestamp} [{record.label}] {record.getMessage()}"
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.label.lower(),
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        entry.update(record.fields)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _StdoutHandler(logging.StreamHandler):
+    """Escreve no sys.stdout atual (respeita redirecionamentos feitos depois da configuração)."""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+def _level_number(level: str) -> int:
+    return LEVELS.get(level.lower(), logging.INFO)
+
+def configure(level: str | None = None, json_format: bool | None = None, use_queue: bool | None = None):
+    """(Re)configura a saída; parâmetros omitidos vêm das variáveis de ambiente NUTRISNAP_LOG_*."""
+    with _config_lock:
+        _configure_locked(level, json_format, use_queue)
+
+def _configure_locked(level: str | None, json_format: bool | None, use_queue: bool | None):
+    import logging.handlers # Só quando o primeiro log é emitido (mantém o import do pacote leve)
+    global _listener, _queue, _configured
+    if level is None:
+        level = os.getenv("NUTRISNAP_LOG_LEVEL", "info")
+    if json_format is None:
+        json_format = os.getenv("NUTRISNAP_LOG_FORMAT", "text").lower() == "json"
+    if use_queue is None:
+        use_queue = os.getenv("NUTRISNAP_LOG_QUEUE", "1").lower() not in ("0", "false", "no")
+    _stop_listener()
+    for handler in list(_logger.handlers):
+        _logger.removeHandler(handler)
+    formatter = _JsonFormatter() if json_format else _TextFormatter()
+    writer = _StdoutHandler()
+    if use_queue:
+        # A linha é formatada por QueueHandler.prepare na thread que loga (tracebacks e objetos ainda válidos);
+        # a thread do listener só escreve.
+        writer.setFormatter(logging.Formatter("%(message)s"))
+        _queue = queue.Queue()
+        handler = logging.handlers.QueueHandler(_queue)
+        handler.setFormatter(formatter)
+        _listener = logging.handlers.QueueListener(_queue, writer)
+        _listener.start()
+    else:
+        writer.setFormatter(formatter)
+        handler = writer
+    _logger.addHandler(handler)
+    _logger.setLevel(_level_number(level))
+    _configured = True
+
+def _ensure_configured():
+    if not _configured:
+        with _config_lock:
+            if not _configured:
+                _configure_locked(None, None, None)
+
+def _stop_listener():
+    global _listener, _queue
+    if _listener is not None:
+        _listener.stop() # Escreve o que ainda está na fila
+        _listener, _queue = None, None
+
+def set_level(level: str):
+    _ensure_configured()
+    _logger.setLevel(_level_number(level))
+
+def is_enabled(level: str) -> bool:
+    _ensure_configured()
+    return _logger.isEnabledFor(_level_number(level))
+
+def print_log(level: str, message, *args, **fields):
+    """
+    Registra uma mensagem. `message` pode ter placeholders %s preenchidos por `args` (formatados só se o nível
+    estiver habilitado). `fields` extras aparecem como chaves próprias no modo JSON.
+    """
+    if not _configured:
+        _ensure_configured()
+    levelno = _level_number(level)
+    if not _logger.isEnabledFor(levelno):
+        return
+    _logger.log(levelno, message, *args, extra={"label": level.upper(), "fields": fields})
+
+def flush():
+    """Aguarda a thread de escrita esvaziar a fila (ex.: antes de escrever diretamente em stdout)."""
+    if _queue is not None:
+        _queue.join()
+    sys.stdout.flush()
+
+@contextmanager
+def suppressed():
+    """Silencia os logs no bloco (usado pelos benchmarks, sem custo de formatação)."""
+    _ensure_configured()
+    previous = _logger.level
+    flush()
+    _logger.setLevel(logging.CRITICAL + 1)
+    try:
+        yield
+    finally:
+        _logger.setLevel(previous)
+
+atexit.register(_stop_listener)
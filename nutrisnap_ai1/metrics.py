@@ -0,0 +1,171 @@
+# nutrisnap_ai1/metrics.py
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+
+from . import config
+
+# Limites dos buckets em segundos (estilo Prometheus), convertidos para ns na observação
+BUCKET_BOUNDS_S = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_BUCKET_BOUNDS_NS = tuple(int(bound * 1e9) for bound in BUCKET_BOUNDS_S)
+_METRIC_NAME = "nutrisnap_stage_duration_seconds"
+_NULL_SPAN = contextlib.nullcontext()
+
+class Histogram:
+    """Histograma de latência com buckets fixos (thread-safe)."""
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(_BUCKET_BOUNDS_NS) + 1) # Último = +Inf
+        self.count = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+        self._lock = threading.Lock()
+
+    def observe(self, duration_ns: int):
+        index = bisect.bisect_left(_BUCKET_BOUNDS_NS, duration_ns)
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.sum_ns += duration_ns
+            if duration_ns > self.max_ns:
+                self.max_ns = duration_ns
+
+    def percentile_ns(self, pct: float) -> float | None:
+        """Estimativa por interpolação linear dentro do bucket que contém o percentil."""
+        if self.count == 0:
+            return None
+        target = self.count * pct / 100.0
+        cumulative = 0
+        for index, bucket_count in enumerate(self.bucket_counts):
+            if bucket_count and cumulative + bucket_count >= target:
+                lower = _BUCKET_BOUNDS_NS[index - 1] if index > 0 else 0
+                upper = _BUCKET_BOUNDS_NS[index] if index < len(_BUCKET_BOUNDS_NS) else self.max_ns
+                return min(lower + (upper - lower) * (target - cumulative) / bucket_count, self.max_ns)
+            cumulative += bucket_count
+        return float(self.max_ns)
+
+class MetricsRegistry:
+    """Histogramas por estágio da análise, exportáveis em texto Prometheus e JSON."""
+
+    def __init__(self):
+        self.histograms: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, duration_ns: int):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, Histogram())
+        histogram.observe(duration_ns)
+
+    def to_prometheus(self) -> str:
+        lines = [f"# HELP {_METRIC_NAME} Duração de cada estágio da análise de imagem.",
+                 f"# TYPE {_METRIC_NAME} histogram"]
+        for stage, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKET_BOUNDS_S + ("+Inf",), histogram.bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{_METRIC_NAME}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{_METRIC_NAME}_sum{{stage="{stage}"}} {histogram.sum_ns / 1e9:.9f}')
+            lines.append(f'{_METRIC_NAME}_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        summary = {}
+        for stage, histogram in sorted(self.histograms.items()):
+            if not histogram.count:
+                continue
+            summary[stage] = {
+                "count": histogram.count,
+                "mean_ms": round(histogram.sum_ns / histogram.count / 1e6, 3),
+                "p50_ms": round(histogram.percentile_ns(50) / 1e6, 3),
+                "p95_ms": round(histogram.percentile_ns(95) / 1e6, 3),
+                "p99_ms": round(histogram.percentile_ns(99) / 1e6, 3),
+                "max_ms": round(histogram.max_ns / 1e6, 3),
+                "total_s": round(histogram.sum_ns / 1e9, 3),
+            }
+        return summary
+
+    def write_prometheus(self, path: str):
+        _write_atomically(path, self.to_prometheus())
+
+    def write_json(self, path: str):
+        _write_atomically(path, json.dumps(self.summary(), indent=2, ensure_ascii=False))
+
+def _write_atomically(path: str, content: str):
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path) # O coletor nunca lê um arquivo pela metade
+
+class StageTimings:
+    """Tempos (ns, relógio monotônico) dos estágios de uma única análise."""
+    __slots__ = ("stages", "started_ns")
+
+    def __init__(self):
+        self.stages: dict[str, int] = {}
+        self.started_ns = time.perf_counter_ns()
+
+    def add(self, stage: str, duration_ns: int):
+        self.stages[stage] = self.stages.get(stage, 0) + duration_ns
+
+class _Span:
+    __slots__ = ("timings", "stage", "start_ns")
+
+    def __init__(self, timings: StageTimings, stage: str):
+        self.timings = timings
+        self.stage = stage
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timings.add(self.stage, time.perf_counter_ns() - self.start_ns)
+        return False
+
+_registry = MetricsRegistry()
+_enabled: bool | None = None # None: ainda não lido de config (NUTRISNAP_METRICS)
+
+def set_enabled(enabled: bool):
+    global _enabled
+    _enabled = enabled
+
+def is_enabled() -> bool:
+    global _enabled
+    if _enabled is None:
+        _enabled = config.get_settings().metrics_enabled
+    return _enabled
+
+def get_registry() -> MetricsRegistry:
+    return _registry
+
+def new_timings() -> StageTimings | None:
+    """Novo acumulador de tempos, ou None com a instrumentação desligada (spans viram no-op)."""
+    return StageTimings() if is_enabled() else None
+
+def span(timings: StageTimings | None, stage: str):
+    """Context manager que mede `stage`; custo de um nullcontext quando `timings` é None."""
+    return _NULL_SPAN if timings is None else _Span(timings, stage)
+
+def observe(stage: str, duration_ns: int):
+    """Registra diretamente uma duração no histograma global (se a instrumentação estiver ligada)."""
+    if is_enabled():
+        _registry.observe(stage, duration_ns)
+
+def finish(timings: StageTimings | None, result: dict) -> dict:
+    """Registra os tempos nos histogramas e anexa o bloco `timings` (ms) ao resultado."""
+    if timings is None:
+        return result
+    timings.add("total", time.perf_counter_ns() - timings.started_ns)
+    for stage, duration_ns in timings.stages.items():
+        _registry.observe(stage, duration_ns)
+    result["timings"] = {stage: round(duration_ns / 1e6, 3) for stage, duration_ns in timings.stages.items()}
+    return result
@@ -0,0 +1,309 @@
+# nutrisnap_ai1/nutrition.py
+"""
+Tabela nutricional local do modo compacto: o modelo informa só os itens e as porções em gramas,
+e as calorias vêm daqui (kcal por 100 g), sempre iguais para o mesmo alimento.
+
+A fonte é um CSV (name,kcal_100g,aliases com apelidos separados por |), compilado em um arquivo
+binário little-endian carregado de uma vez na inicialização, sem parsing:
+  cabeçalho   magic + contagens (ver _HEADER)
+  key_hash    uint64 ordenado, hash do nome normalizado de cada nome/apelido (índice exato)
+  token_hash  uint64 ordenado, hash de cada token dos nomes (postings -> nome)
+  tri_hash    uint64 ordenado, hash de cada trigrama dos nomes (postings -> nome, busca aproximada)
+  name_offsets, key_food, token_key, tri_key   uint32
+  kcal_100g   float32 por alimento
+  key_tokens, key_trigrams   uint16, tamanhos usados no coeficiente de Dice
+  names       nomes dos alimentos em UTF-8
+A consulta tenta o nome exato, depois a sobreposição de tokens e por último os trigramas; cada
+etapa é uma busca binária (np.searchsorted) nos arrays ordenados.
+"""
+import csv
+import hashlib
+import os
+import re
+import struct
+import threading
+import time
+import unicodedata
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import config, metrics, parsing, utils
+
+_MAGIC = b"NSNUTR01"
+_HEADER = struct.Struct("<8sIIIII") # magic, alimentos, nomes, postings de tokens, de trigramas, bytes dos nomes
+_HEADER_BYTES = 32 # Cabeçalho com padding: os arrays uint64 seguintes ficam alinhados
+_STOPWORDS = frozenset({"a", "o", "as", "os", "ao", "de", "da", "do", "das", "dos", "e", "em", "no", "na",
+                        "nos", "nas", "com", "ou", "um", "uma"})
+_PARENTHETICAL_RE = re.compile(r"\([^)]*\)")
+_NON_WORD_RE = re.compile(r"[^0-9a-z]+")
+_TOKEN_MIN_SCORE = 0.5 # Dice mínimo entre os tokens da consulta e os de um nome
+_TRIGRAM_MIN_SCORE = 0.5 # Dice mínimo entre os trigramas
+_MEMO_MAX = 4096 # Nomes já consultados guardados em memória
+_LATENCY_WINDOW = 10000 # Últimas latências usadas nos percentis de stats()
+_NOT_CACHED = object()
+
+def normalize_food_name(name) -> str:
+    """Sem acentos, minúsculas, sem pontuação/parênteses nem stopwords; plural simples vira singular."""
+    text = _PARENTHETICAL_RE.sub(" ", str(name or ""))
+    text = "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+    tokens = []
+    for token in _NON_WORD_RE.sub(" ", text.casefold()).split():
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token[:-1] if len(token) > 3 and token.endswith("s") else token)
+    return " ".join(tokens)
+
+def _hash64(text: str) -> int:
+    # hash() do Python muda a cada processo; o arquivo precisa de um hash estável
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _trigrams(normalized: str) -> set[str]:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+@dataclass(frozen=True, slots=True)
+class FoodMatch:
+    food: str
+    kcal_100g: float
+    method: str # exact, tokens ou fuzzy
+    score: float
+
+def build_table(source_path: str, output_path: str) -> int:
+    """Compila o CSV da tabela no arquivo binário (escrita atômica). Retorna o número de alimentos."""
+    foods, kcal, keys = [], [], {}
+    with open(source_path, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            name = (row.get("name") or "").strip()
+            if not name:
+                continue
+            food_id = len(foods)
+            foods.append(name)
+            kcal.append(float(row["kcal_100g"]))
+            for variant in [name, *(row.get("aliases") or "").split("|")]:
+                normalized = normalize_food_name(variant)
+                if not normalized:
+                    continue
+                if normalized in keys and keys[normalized] != food_id:
+                    utils.print_log("warn", "Nome '%s' já pertence a '%s'; ignorado em '%s'.",
+                                    variant, foods[keys[normalized]], name)
+                    continue
+                keys.setdefault(normalized, food_id)
+
+    names = list(keys)
+    key_hash = np.array([_hash64(name) for name in names], dtype="<u8")
+    order = np.argsort(key_hash, kind="stable")
+    names = [names[i] for i in order]
+    key_hash = key_hash[order]
+    key_food = np.array([keys[name] for name in names], dtype="<u4")
+    token_pairs = [(_hash64(token), key_id) for key_id, name in enumerate(names) for token in set(name.split())]
+    trigram_pairs = [(_hash64(trigram), key_id) for key_id, name in enumerate(names) for trigram in _trigrams(name)]
+    token_pairs.sort()
+    trigram_pairs.sort()
+
+    blobs = [name.encode("utf-8") for name in foods]
+    name_offsets = np.zeros(len(foods) + 1, dtype="<u4")
+    np.cumsum([len(blob) for blob in blobs], out=name_offsets[1:])
+    arrays = [
+        key_hash,
+        np.array([pair[0] for pair in token_pairs], dtype="<u8"),
+        np.array([pair[0] for pair in trigram_pairs], dtype="<u8"),
+        name_offsets,
+        key_food,
+        np.array([pair[1] for pair in token_pairs], dtype="<u4"),
+        np.array([pair[1] for pair in trigram_pairs], dtype="<u4"),
+        np.array(kcal, dtype="<f4"),
+        np.array([len(name.split()) for name in names], dtype="<u2"),
+        np.array([len(_trigrams(name)) for name in names], dtype="<u2"),
+    ]
+    names_blob = b"".join(blobs)
+    header = _HEADER.pack(_MAGIC, len(foods), len(names), len(token_pairs), len(trigram_pairs), len(names_blob))
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(_HEADER_BYTES, b"\0"))
+        for array in arrays:
+            f.write(array.tobytes())
+        f.write(names_blob)
+    os.replace(tmp_path, output_path)
+    utils.print_log("info", "Tabela nutricional compilada: %s alimentos, %s nomes -> %s", len(foods), len(names), output_path)
+    return len(foods)
+
+class NutritionTable:
+    """
+    Índice de nomes normalizados sobre o arquivo binário (ver o topo do módulo). Thread-safe;
+    as consultas repetidas são atendidas por um memo em memória. `stats` resume as consultas e
+    a latência de cada uma (também registrada no histograma "nutrition_lookup" de metrics).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, foods, keys, token_postings, trigram_postings, names_bytes = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError(f"Arquivo de tabela nutricional inválido: {path}")
+        offset = _HEADER_BYTES
+
+        def _take(dtype: str, count: int) -> np.ndarray:
+            nonlocal offset
+            array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += array.nbytes
+            return array
+
+        self._key_hash = _take("<u8", keys)
+        self._token_hash = _take("<u8", token_postings)
+        self._trigram_hash = _take("<u8", trigram_postings)
+        name_offsets = _take("<u4", foods + 1)
+        self._key_food = _take("<u4", keys)
+        self._token_key = _take("<u4", token_postings)
+        self._trigram_key = _take("<u4", trigram_postings)
+        self._kcal_100g = _take("<f4", foods)
+        self._key_tokens = _take("<u2", keys).astype(np.float64)
+        self._key_trigrams = _take("<u2", keys).astype(np.float64)
+        names_blob = data[offset:offset + names_bytes]
+        self.foods = [names_blob[name_offsets[i]:name_offsets[i + 1]].decode("utf-8") for i in range(foods)]
+
+        self._memo: dict[str, FoodMatch | None] = {}
+        self._latencies_ns: deque[int] = deque(maxlen=_LATENCY_WINDOW)
+        self._counts = {"lookups": 0, "memo_hits": 0, "exact": 0, "tokens": 0, "fuzzy": 0, "missing": 0}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.foods)
+
+    def lookup(self, name: str) -> FoodMatch | None:
+        """Alimento da tabela para o nome dado pelo modelo, ou None sem correspondência suficiente."""
+        started_ns = time.perf_counter_ns()
+        normalized = normalize_food_name(name)
+        match = self._memo.get(normalized, _NOT_CACHED)
+        memo_hit = match is not _NOT_CACHED
+        if not memo_hit:
+            match = self._search(normalized)
+            if len(self._memo) >= _MEMO_MAX:
+                self._memo.clear()
+            self._memo[normalized] = match
+        elapsed_ns = time.perf_counter_ns() - started_ns
+        with self._lock:
+            self._latencies_ns.append(elapsed_ns)
+            self._counts["lookups"] += 1
+            self._counts["memo_hits"] += memo_hit
+            self._counts[match.method if match else "missing"] += 1
+        metrics.observe("nutrition_lookup", elapsed_ns)
+        return match
+
+    def _match(self, key_id: int, score: float, method: str) -> FoodMatch:
+        food_id = int(self._key_food[key_id])
+        return FoodMatch(self.foods[food_id], float(self._kcal_100g[food_id]), method, round(score, 3))
+
+    def _search(self, normalized: str) -> FoodMatch | None:
+        if not normalized:
+            return None
+        key_hash = np.uint64(_hash64(normalized))
+        position = int(np.searchsorted(self._key_hash, key_hash))
+        if position < len(self._key_hash) and self._key_hash[position] == key_hash:
+            return self._match(position, 1.0, method="exact")
+
+        by_tokens = self._best_overlap(set(normalized.split()), self._token_hash, self._token_key, self._key_tokens,
+                                       _TOKEN_MIN_SCORE)
+        if by_tokens is not None and by_tokens[1] >= 1.0:
+            return self._match(*by_tokens, method="tokens")
+        # Sobreposição parcial de tokens: um erro de digitação ("strogonof") pode apontar para um
+        # nome mais curto e errado ("frango"); os trigramas decidem quando pontuam mais alto
+        by_trigrams = self._best_overlap(_trigrams(normalized), self._trigram_hash, self._trigram_key,
+                                         self._key_trigrams, _TRIGRAM_MIN_SCORE)
+        if by_trigrams is not None and (by_tokens is None or by_trigrams[1] > by_tokens[1]):
+            return self._match(*by_trigrams, method="fuzzy")
+        return self._match(*by_tokens, method="tokens") if by_tokens is not None else None
+
+    @staticmethod
+    def _best_overlap(terms: set[str], postings_hash: np.ndarray, postings_key: np.ndarray,
+                      key_sizes: np.ndarray, min_score: float) -> tuple[int, float] | None:
+        """Nome com maior coeficiente de Dice entre `terms` e os termos indexados, se >= min_score."""
+        hashes = np.array([_hash64(term) for term in terms], dtype=np.uint64)
+        starts = np.searchsorted(postings_hash, hashes, side="left")
+        ends = np.searchsorted(postings_hash, hashes, side="right")
+        hits = [postings_key[start:end] for start, end in zip(starts, ends) if end > start]
+        if not hits:
+            return None
+        shared = np.bincount(np.concatenate(hits), minlength=len(key_sizes))
+        scores = 2.0 * shared / (len(terms) + key_sizes)
+        best = int(np.argmax(scores))
+        return (best, float(scores[best])) if scores[best] >= min_score else None
+
+    def stats(self) -> dict:
+        """Contagens por tipo de correspondência e percentis da latência por consulta (µs)."""
+        with self._lock:
+            counts = dict(self._counts)
+            latencies = np.array(self._latencies_ns, dtype=np.float64)
+        if len(latencies):
+            p50, p95, p99 = (float(value) / 1000.0 for value in np.percentile(latencies, [50, 95, 99]))
+            counts.update(p50_us=round(p50, 2), p95_us=round(p95, 2), p99_us=round(p99, 2),
+                          max_us=round(float(latencies.max()) / 1000.0, 2))
+        return counts
+
+def compute_analysis(parsed: parsing.CompactAnalysis, table: "NutritionTable | None" = None) -> dict:
+    """
+    Converte a resposta compacta (itens + gramas) no formato de resultado padrão: calorias de cada
+    item pela tabela, total_calories recalculado a partir dos itens (None se a resposta foi truncada)
+    e o bloco "nutrition_lookup".
+    A confiança do item reflete a correspondência na tabela (exata: Alto; tokens/aproximada: Médio).
+    """
+    table = table if table is not None else get_default_table()
+    items, counts = [], {"exact": 0, "tokens": 0, "fuzzy": 0, "missing": 0}
+    started_ns = time.perf_counter_ns()
+    for portion in parsed.items:
+        match = table.lookup(portion.name)
+        counts[match.method if match else "missing"] += 1
+        calories, confidence = None, "Baixo"
+        if match is None:
+            notes = "Sem correspondência na tabela nutricional local."
+        elif portion.grams is None:
+            notes = f"Tabela: {match.food}; porção não informada pelo modelo."
+        else:
+            calories = int(round(portion.grams * match.kcal_100g / 100.0))
+            confidence = "Alto" if match.method == "exact" else "Médio"
+            notes = f"{portion.grams} g x {match.kcal_100g:g} kcal/100 g (tabela: {match.food})."
+        items.append({"item_name": portion.name, "estimated_calories": calories, "confidence": confidence,
+                      "notes": notes, "portion_grams": portion.grams, "matched_food": match.food if match else None,
+                      "match": match.method if match else None})
+    lookup_us = (time.perf_counter_ns() - started_ns) / 1000.0
+
+    known = [item["estimated_calories"] for item in items if item["estimated_calories"] is not None]
+    data = {
+        # Resposta truncada: a soma dos itens que sobraram seria parcial
+        "total_calories": sum(known) if known and parsing.TRUNCATION_REPAIR not in parsed.repairs else None,
+        "identified_items": items,
+        "analysis_summary_notes": f"Calorias calculadas pela tabela nutricional local: {len(known)} de {len(items)} itens.",
+        "nutrition_lookup": {**counts, "lookup_us": round(lookup_us, 2)},
+    }
+    if parsed.repairs:
+        data["parse_repairs"] = list(parsed.repairs)
+    return data
+
+def compiled_path(source_path: str) -> str:
+    """Arquivo binário compilado a partir do CSV (mesmo nome, extensão .bin)."""
+    return os.path.splitext(source_path)[0] + ".bin"
+
+def load_table(source_path: str) -> NutritionTable:
+    """Carrega a tabela compilada, recompilando antes se o binário não existir ou for mais antigo que o CSV."""
+    table_path = compiled_path(source_path)
+    if not os.path.exists(table_path) or os.path.getmtime(table_path) < os.path.getmtime(source_path):
+        build_table(source_path, table_path)
+    table = NutritionTable(table_path)
+    utils.print_log("info", "Tabela nutricional carregada: %s alimentos (%s).", len(table), table_path)
+    return table
+
+_default_table: NutritionTable | None = None
+_default_table_lock = threading.Lock()
+
+def get_default_table() -> NutritionTable:
+    """Tabela compartilhada em NUTRISNAP_NUTRITION_TABLE, carregada no primeiro uso."""
+    global _default_table
+    if _default_table is None:
+        with _default_table_lock:
+            if _default_table is None:
+                _default_table = load_table(config.get_settings().nutrition_table_path)
+    return _default_table
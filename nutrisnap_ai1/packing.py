@@ -0,0 +1,48 @@
+# nutrisnap_ai1/packing.py
+import hashlib
+
+from . import config
+
+PACKED_PROMPT_SUFFIX = """
+**Modo de Múltiplas Imagens:** Esta requisição contém {count} imagens de pratos diferentes, cada uma precedida pelo rótulo "Imagem N" (N de 1 a {count}). Analise cada imagem de forma independente, seguindo todas as instruções acima. Em vez de um único objeto, retorne exclusivamente um array JSON com exatamente {count} objetos, um por imagem, cada um com o campo "image_index" (o número N do rótulo da imagem) e os demais campos do formato obrigatório.
+"""
+
+def plan_packs(sizes: list[int], max_images: int | None = None, max_bytes: int | None = None) -> list[list[int]]:
+    """
+    Agrupa imagens consecutivas (pelos índices em `sizes`, bytes de cada uma) em pacotes de no máximo
+    `max_images` imagens e `max_bytes` bytes somados. Uma imagem maior que `max_bytes` vai sozinha.
+    """
+    max_images = max(1, max_images or config.get_settings().pack_max_images)
+    max_bytes = max_bytes or config.get_settings().pack_max_bytes
+    packs: list[list[int]] = []
+    current: list[int] = []
+    current_bytes = 0
+    for index, size in enumerate(sizes):
+        if current and (len(current) >= max_images or current_bytes + size > max_bytes):
+            packs.append(current)
+            current, current_bytes = [], 0
+        current.append(index)
+        current_bytes += size
+    if current:
+        packs.append(current)
+    return packs
+
+def split_pack(indices: list) -> list[list]:
+    """Divide um pacote ao meio (usado quando a resposta empacotada não pôde ser aproveitada)."""
+    middle = (len(indices) + 1) // 2
+    return [indices[:middle], indices[middle:]]
+
+def packed_prompt(prompt: str, count: int) -> str:
+    return prompt + PACKED_PROMPT_SUFFIX.format(count=count)
+
+def packed_parts(prompt: str, image_parts: list) -> list:
+    """Prompt compartilhado seguido de cada imagem com seu rótulo "Imagem N"."""
+    parts = [prompt]
+    for number, image_part in enumerate(image_parts, start=1):
+        parts.append(f"Imagem {number}:")
+        parts.append(image_part)
+    return parts
+
+def pack_sha256(image_hashes: list[str]) -> str:
+    """Identidade de um pacote (para gravação/replay): hash da sequência ordenada de hashes das imagens."""
+    return hashlib.sha256("\n".join(image_hashes).encode("ascii")).hexdigest()
@@ -0,0 +1,391 @@
+# nutrisnap_ai1/parsing.py
+import json
+import re
+from dataclasses import dataclass, field
+
+from . import config
+
+# Schema da resposta (subconjunto OpenAPI aceito por response_schema do Gemini)
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "total_calories": {"type": "integer", "nullable": True},
+        "identified_items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "item_name": {"type": "string"},
+                    "estimated_calories": {"type": "integer", "nullable": True},
+                    "confidence": {"type": "string"},
+                    "notes": {"type": "string"},
+                },
+                "required": ["item_name", "estimated_calories", "confidence", "notes"],
+            },
+        },
+        "analysis_summary_notes": {"type": "string"},
+    },
+    "required": ["total_calories", "identified_items", "analysis_summary_notes"],
+}
+
+# Resposta de uma requisição com várias imagens (ver packing.py): um objeto por imagem, identificado por image_index
+PACKED_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"image_index": {"type": "integer"}, **RESPONSE_SCHEMA["properties"]},
+        "required": ["image_index", *RESPONSE_SCHEMA["required"]],
+    },
+}
+
+# Resposta do modo compacto (config.COMPACT_PROMPT): só itens e porções; as calorias vêm de nutrition.py
+COMPACT_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"name": {"type": "string"}, "grams": {"type": "integer", "nullable": True}},
+                "required": ["name", "grams"],
+            },
+        },
+    },
+    "required": ["items"],
+}
+
+# Configuração de geração que pede JSON diretamente ao modelo (sem cercas Markdown nem prosa)
+STRUCTURED_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": RESPONSE_SCHEMA}
+PACKED_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": PACKED_RESPONSE_SCHEMA}
+COMPACT_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": COMPACT_RESPONSE_SCHEMA}
+
+def default_generation_config() -> dict | None:
+    return dict(STRUCTURED_GENERATION_CONFIG) if config.get_settings().structured_output else None
+
+def packed_generation_config() -> dict | None:
+    """Sobrescreve o schema da sessão nas requisições empacotadas (None sem saída estruturada)."""
+    return dict(PACKED_GENERATION_CONFIG) if config.get_settings().structured_output else None
+
+def compact_generation_config() -> dict | None:
+    """Sobrescreve o schema da sessão nas requisições do modo compacto (None sem saída estruturada)."""
+    return dict(COMPACT_GENERATION_CONFIG) if config.get_settings().structured_output else None
+
+_CONFIDENCE_LEVELS = {"alto": "Alto", "alta": "Alto", "high": "Alto",
+                      "médio": "Médio", "medio": "Médio", "média": "Médio", "media": "Médio", "medium": "Médio",
+                      "baixo": "Baixo", "baixa": "Baixo", "low": "Baixo"}
+_NUMBER_RE = re.compile(r"-?\d+(?:[.,]\d+)?")
+_DECODER = json.JSONDecoder()
+_CLOSERS = {"{": "}", "[": "]"}
+_STRUCTURE_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|["{}\[\],]') # String completa ou caractere estrutural
+
+@dataclass(slots=True)
+class FoodItem:
+    item_name: str
+    estimated_calories: int | None
+    confidence: str
+    notes: str
+
+@dataclass(slots=True)
+class PortionItem:
+    name: str
+    grams: int | None
+
+@dataclass(slots=True)
+class CompactAnalysis:
+    """Resposta validada do modo compacto (itens e porções, sem calorias)."""
+    items: list[PortionItem]
+    repairs: list[str] = field(default_factory=list)
+
+@dataclass(slots=True)
+class NutritionAnalysis:
+    """Resultado validado da análise; `repairs` lista as correções aplicadas à resposta do modelo."""
+    total_calories: int | None
+    identified_items: list[FoodItem]
+    analysis_summary_notes: str
+    repairs: list[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        data = {
+            "total_calories": self.total_calories,
+            "identified_items": [item_to_dict(item) for item in self.identified_items],
+            "analysis_summary_notes": self.analysis_summary_notes,
+        }
+        if self.repairs:
+            data["parse_repairs"] = list(self.repairs)
+        return data
+
+TRUNCATION_REPAIR = "json_truncado_fechado"
+
+def is_truncated(data: dict | None) -> bool:
+    """Resultado (bloco "data") de uma resposta truncada: itens podem ter ficado de fora."""
+    return bool(data) and TRUNCATION_REPAIR in (data.get("parse_repairs") or ())
+
+def _close_truncated(text: str, start: int) -> str | None:
+    """
+    Fecha um JSON truncado: corta no último ponto seguro (após o último elemento completo de um
+    array, ou após um objeto/array fechado) e acrescenta os fechamentos pendentes, descartando um
+    item parcial no fim. Sem ponto seguro, aceita cortar entre campos do item parcial.
+    Retorna None se nada puder ser aproveitado.
+    """
+    stack: list[str] = []
+    safe_cut, safe_depth = None, 0
+    loose_cut, loose_depth = None, 0
+    for token in _STRUCTURE_RE.finditer(text, start): # Strings inteiras são puladas de uma vez
+        char = token.group()
+        if char[0] == '"':
+            if len(char) == 1: # String não terminada: o texto acabou no meio dela
+                break
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char == ",":
+            if stack and stack[-1] == "]": # Vírgula entre elementos de array
+                safe_cut, safe_depth = token.start(), len(stack)
+            elif stack: # Vírgula entre campos de um objeto
+                loose_cut, loose_depth = token.start(), len(stack)
+        else: # } ou ]
+            if not stack:
+                break
+            stack.pop()
+            safe_cut, safe_depth = token.end(), len(stack)
+    if safe_cut is None:
+        safe_cut, safe_depth = loose_cut, loose_depth
+    # Depois do ponto de corte só há aberturas, então a pilha naquele ponto é um prefixo da pilha final
+    if safe_cut is None or not safe_depth:
+        return None
+    return text[start:safe_cut] + "".join(reversed(stack[:safe_depth]))
+
+def _decode(text: str, repairs: list[str], openers: str = "{") -> object:
+    """
+    Decodifica o primeiro valor JSON do texto que começa com um dos `openers`, ignorando
+    cercas/prosa ao redor e fechando truncamentos.
+    """
+    starts = [index for index in (text.find(opener) for opener in openers) if index >= 0]
+    if not starts:
+        raise ValueError("Nenhum objeto JSON encontrado na resposta do modelo.")
+    start = min(starts)
+    if start > 0 and text[:start].strip() and not text[:start].strip().startswith("```"):
+        repairs.append("texto_antes_do_json_ignorado")
+    try:
+        parsed, end = _DECODER.raw_decode(text, start)
+    except json.JSONDecodeError as e:
+        closed = _close_truncated(text, start)
+        if closed is None:
+            raise ValueError(f"A resposta do LLM não era um JSON válido. Erro: {e}") from e
+        try:
+            parsed = json.loads(closed)
+        except json.JSONDecodeError:
+            raise ValueError(f"A resposta do LLM não era um JSON válido. Erro: {e}") from e
+        repairs.append(TRUNCATION_REPAIR)
+        return parsed
+    trailing = text[end:].strip()
+    if trailing and trailing != "```":
+        repairs.append("texto_apos_o_json_ignorado")
+    return parsed
+
+def _as_calories(value) -> int | None:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(round(value)) if value >= 0 else None
+    if isinstance(value, str): # Ex: "320 kcal", "≈ 150"
+        match = _NUMBER_RE.search(value)
+        if match:
+            number = float(match.group().replace(",", "."))
+            return int(round(number)) if number >= 0 else None
+    return None
+
+def _as_text(value) -> str:
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+def _build_item(raw_item: dict, index: int) -> FoodItem:
+    confidence = _as_text(raw_item.get("confidence")).strip()
+    return FoodItem(
+        item_name=_as_text(raw_item.get("item_name")).strip() or f"Item Não Identificado - {index}",
+        estimated_calories=_as_calories(raw_item.get("estimated_calories")),
+        confidence=_CONFIDENCE_LEVELS.get(confidence.lower(), confidence or "Baixo"),
+        notes=_as_text(raw_item.get("notes")),
+    )
+
+def item_to_dict(item: FoodItem) -> dict:
+    return {"item_name": item.item_name, "estimated_calories": item.estimated_calories,
+            "confidence": item.confidence, "notes": item.notes}
+
+def parse_analysis(response_text: str) -> NutritionAnalysis:
+    """
+    Decodifica e valida a resposta do modelo em uma única passada, normalizando tipos
+    (calorias inteiras ou None, confiança em Alto/Médio/Baixo, textos como str) e reparando
+    defeitos comuns: cercas Markdown, prosa antes/depois do JSON, arrays truncados e
+    total_calories diferente da soma dos itens (exceto em respostas truncadas, em que a soma seria
+    parcial e o total do modelo é mantido, ou None). Levanta ValueError se não houver JSON aproveitável.
+    """
+    repairs: list[str] = []
+    parsed = _decode(response_text, repairs)
+    if not isinstance(parsed, dict):
+        raise ValueError("JSON parseado não é um objeto.")
+    return _build_analysis(parsed, repairs)
+
+def _build_analysis(parsed: dict, repairs: list[str]) -> NutritionAnalysis:
+    raw_items = parsed.get("identified_items")
+    if raw_items is None:
+        raw_items = []
+        repairs.append("identified_items_ausente")
+    elif not isinstance(raw_items, list):
+        raw_items = [raw_items] if isinstance(raw_items, dict) else []
+        repairs.append("identified_items_normalizado")
+
+    items = []
+    known_sum, known_count = 0, 0
+    for index, raw_item in enumerate(raw_items, start=1):
+        if not isinstance(raw_item, dict):
+            repairs.append(f"item_{index}_invalido_descartado")
+            continue
+        item = _build_item(raw_item, index)
+        if item.estimated_calories is not None:
+            known_sum += item.estimated_calories
+            known_count += 1
+        items.append(item)
+
+    total_calories = _as_calories(parsed.get("total_calories"))
+    # O prompt define o total como a soma dos itens estimáveis; numa resposta truncada a soma dos
+    # itens que sobraram seria parcial, então vale o total do modelo (ou None, se ele foi cortado)
+    if known_count and TRUNCATION_REPAIR not in repairs and total_calories != known_sum:
+        repairs.append(f"total_calories_corrigido_{total_calories}_para_{known_sum}")
+        total_calories = known_sum
+
+    return NutritionAnalysis(
+        total_calories=total_calories,
+        identified_items=items,
+        analysis_summary_notes=_as_text(parsed.get("analysis_summary_notes")),
+        repairs=repairs,
+    )
+
+def parse_packed_analysis(response_text: str, image_count: int) -> dict[int, NutritionAnalysis]:
+    """
+    Valida a resposta de uma requisição empacotada: um array com um objeto por imagem, cada um
+    com "image_index" (1..image_count, o rótulo "Imagem N" da requisição). Retorna {índice a partir
+    de 0: análise}; imagens ausentes ou inválidas ficam de fora, para que o chamador as reenvie.
+    Levanta ValueError se não houver array aproveitável.
+    """
+    shared_repairs: list[str] = []
+    parsed = _decode(response_text, shared_repairs, openers="[{")
+    if isinstance(parsed, dict): # Ex: {"results": [...]} ou um único objeto
+        lists = [value for value in parsed.values() if isinstance(value, list) and value and isinstance(value[0], dict)
+                 and "image_index" in value[0]]
+        parsed = lists[0] if lists else [parsed]
+    if not isinstance(parsed, list):
+        raise ValueError("JSON parseado não é um array de análises.")
+
+    analyses: dict[int, NutritionAnalysis] = {}
+    for raw_analysis in parsed:
+        if not isinstance(raw_analysis, dict):
+            continue
+        index = _as_calories(raw_analysis.get("image_index")) # Mesmo tratamento numérico (ex: "2")
+        if index is None or not 1 <= index <= image_count or index - 1 in analyses:
+            continue
+        analyses[index - 1] = _build_analysis(raw_analysis, list(shared_repairs))
+    if not analyses:
+        raise ValueError("Nenhuma análise com image_index válido na resposta empacotada.")
+    return analyses
+
+def parse_compact_analysis(response_text: str) -> CompactAnalysis:
+    """
+    Valida a resposta do modo compacto: {"items": [{"name", "grams"}]} (um array solto também é
+    aceito), com os mesmos reparos de parse_analysis. Gramas viram inteiros ou None (ex: "150 g" -> 150).
+    Levanta ValueError se não houver JSON aproveitável.
+    """
+    repairs: list[str] = []
+    parsed = _decode(response_text, repairs, openers="{[")
+    raw_items = parsed.get("items") if isinstance(parsed, dict) else parsed
+    if raw_items is None:
+        raw_items = []
+        repairs.append("items_ausente")
+    elif not isinstance(raw_items, list):
+        raw_items = [raw_items] if isinstance(raw_items, dict) else []
+        repairs.append("items_normalizado")
+
+    items = []
+    for index, raw_item in enumerate(raw_items, start=1):
+        if not isinstance(raw_item, dict):
+            repairs.append(f"item_{index}_invalido_descartado")
+            continue
+        name = _as_text(raw_item.get("name", raw_item.get("item_name"))).strip()
+        items.append(PortionItem(name=name or f"Item Não Identificado - {index}",
+                                 grams=_as_calories(raw_item.get("grams"))))
+    return CompactAnalysis(items=items, repairs=repairs)
+
+_ITEMS_KEY_RE = re.compile(r'"identified_items"\s*:\s*\[')
+
+class IncrementalItemParser:
+    """
+    Parser incremental para respostas em streaming: recebe pedaços de texto via `feed` e retorna
+    cada entrada de `identified_items` assim que o objeto dela fecha, antes do resto da resposta.
+    O texto já varrido não é revisitado; `finish` valida a resposta completa com parse_analysis.
+    """
+
+    def __init__(self):
+        self._chunks: list[str] = []
+        self._buffer = ""
+        self._scan_pos = 0 # Próxima posição a varrer em _buffer
+        self._in_items = False
+        self._items_done = False # O array já fechou: a chave não é procurada de novo
+        self._depth = 0 # Profundidade relativa ao array identified_items
+        self._item_start = -1
+        self.items_emitted = 0
+
+    def feed(self, chunk: str) -> list[FoodItem]:
+        """Acrescenta um pedaço da resposta e retorna os itens completados por ele."""
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        self._buffer += chunk
+        if self._items_done:
+            return []
+        if not self._in_items:
+            match = _ITEMS_KEY_RE.search(self._buffer, max(0, self._scan_pos - 32))
+            if match is None:
+                self._scan_pos = len(self._buffer)
+                return []
+            self._in_items = True
+            self._scan_pos = match.end()
+        return self._scan()
+
+    def _scan(self) -> list[FoodItem]:
+        completed = []
+        buffer = self._buffer
+        for token in _STRUCTURE_RE.finditer(buffer, self._scan_pos):
+            char = token.group()
+            if char[0] == '"':
+                if len(char) == 1: # String ainda incompleta: retoma daqui no próximo pedaço
+                    self._scan_pos = token.start()
+                    return completed
+            elif char in _CLOSERS:
+                if self._depth == 0 and char == "{":
+                    self._item_start = token.start()
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0: # Fim do array identified_items
+                    self._in_items, self._items_done = False, True
+                    self._scan_pos = len(buffer)
+                    return completed
+                self._depth -= 1
+                if self._depth == 0 and self._item_start >= 0:
+                    try:
+                        raw_item = json.loads(buffer[self._item_start:token.end()])
+                    except json.JSONDecodeError:
+                        raw_item = None
+                    self._item_start = -1
+                    if isinstance(raw_item, dict):
+                        self.items_emitted += 1
+                        completed.append(_build_item(raw_item, self.items_emitted))
+        self._scan_pos = len(buffer)
+        return completed
+
+    @property
+    def text(self) -> str:
+        return self._buffer
+
+    def finish(self) -> NutritionAnalysis:
+        """Valida a resposta completa (mesmas normalizações e reparos de parse_analysis)."""
+        return parse_analysis(self._buffer)
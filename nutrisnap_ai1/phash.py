@@ -0,0 +1,198 @@
+# nutrisnap_ai1/phash.py
+import hashlib
+import os
+import threading
+from array import array
+
+import numpy as np
+from PIL import Image
+
+from . import config
+from . import utils
+
+_HASH_SIDE = 32 # Imagem reduzida para 32x32 antes da DCT
+_LOW_FREQ_SIDE = 8 # 8x8 coeficientes de baixa frequência -> hash de 64 bits
+_BLOCKS = 4 # Multi-index hashing: 4 blocos de 16 bits
+_BLOCK_BITS = 16
+_BLOCK_MASK = (1 << _BLOCK_BITS) - 1
+_KEY_BYTES = 32 # Chave do ResultCache (sha256) em bytes brutos
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Matriz da DCT-II ortonormal (n x n)."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0, :] = np.sqrt(1.0 / n)
+    return matrix
+
+_DCT = _dct_matrix(_HASH_SIDE)
+_BIT_WEIGHTS = (np.uint64(1) << np.arange(64, dtype=np.uint64)[::-1])
+
+def compute_phash(image_path_str: str) -> int | None:
+    """pHash de 64 bits (DCT 32x32, coeficientes 8x8 comparados à mediana). None em caso de erro."""
+    try:
+        img = Image.open(image_path_str)
+        if img.format == "JPEG":
+            img.draft("L", (_HASH_SIDE * 2, _HASH_SIDE * 2)) # Decodificação barata em escala reduzida
+        pixels = np.asarray(img.convert("L").resize((_HASH_SIDE, _HASH_SIDE), Image.Resampling.BOX), dtype=np.float64)
+    except Exception as e:
+        utils.print_log("warn", "Não foi possível calcular o pHash de '%s': %s", image_path_str, e)
+        return None
+    coefficients = (_DCT @ pixels @ _DCT.T)[:_LOW_FREQ_SIDE, :_LOW_FREQ_SIDE].ravel()
+    median = np.median(coefficients[1:]) # Ignora o termo DC
+    bits = (coefficients > median).astype(np.uint64)
+    return int((bits * _BIT_WEIGHTS).sum())
+
+def _popcount64(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"): # NumPy >= 2.0
+        return np.bitwise_count(values)
+    as_bytes = values.view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(as_bytes, axis=1).sum(axis=1)
+
+def _neighbors_16(value: int, radius: int) -> list[int]:
+    """Todos os valores de 16 bits a distância de Hamming <= radius de `value`."""
+    neighbors = [value]
+    frontier = [(value, -1)]
+    for _ in range(radius):
+        next_frontier = []
+        for current, last_bit in frontier:
+            for bit in range(last_bit + 1, _BLOCK_BITS):
+                flipped = current ^ (1 << bit)
+                neighbors.append(flipped)
+                next_frontier.append((flipped, bit))
+        frontier = next_frontier
+    return neighbors
+
+class PHashIndex:
+    """
+    Índice de pHashes para busca por distância de Hamming (multi-index hashing).
+    Cada entrada associa um hash de 64 bits à chave do ResultCache com o resultado já analisado.
+    Os hashes ficam em um array uint64 contíguo; os blocos de 16 bits apontam para ids em array('I').
+    Persistência append-only em dois arquivos binários: <path>.hashes e <path>.keys.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._hashes = np.empty(1024, dtype=np.uint64)
+        self._keys = np.empty((1024, _KEY_BYTES), dtype=np.uint8)
+        self._size = 0
+        self._buckets: list[dict[int, array]] = [{} for _ in range(_BLOCKS)]
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _ensure_capacity(self, extra: int):
+        needed = self._size + extra
+        if needed <= len(self._hashes):
+            return
+        capacity = max(needed, len(self._hashes) * 2)
+        hashes = np.empty(capacity, dtype=np.uint64)
+        hashes[:self._size] = self._hashes[:self._size]
+        keys = np.empty((capacity, _KEY_BYTES), dtype=np.uint8)
+        keys[:self._size] = self._keys[:self._size]
+        self._hashes, self._keys = hashes, keys
+
+    def _index_range(self, start: int, end: int):
+        """Insere os ids [start, end) nos buckets de cada bloco (vetorizado por bloco)."""
+        hashes = self._hashes[start:end]
+        for block in range(_BLOCKS):
+            chunks = ((hashes >> np.uint64(block * _BLOCK_BITS)) & np.uint64(_BLOCK_MASK)).astype(np.int64)
+            order = np.argsort(chunks, kind="stable")
+            values, starts = np.unique(chunks[order], return_index=True)
+            ends = np.append(starts[1:], len(order))
+            ids = (order + start).astype(np.uint32)
+            buckets = self._buckets[block]
+            for value, lo, hi in zip(values.tolist(), starts.tolist(), ends.tolist()):
+                bucket = buckets.get(value)
+                if bucket is None:
+                    bucket = buckets[value] = array("I")
+                bucket.frombytes(ids[lo:hi].tobytes())
+
+    def add_many(self, hashes: np.ndarray, keys: np.ndarray, persist: bool = True):
+        """Adiciona vários hashes (uint64) com suas chaves (n x 32 bytes)."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        keys = np.asarray(keys, dtype=np.uint8).reshape(-1, _KEY_BYTES)
+        with self._lock:
+            start = self._size
+            self._ensure_capacity(len(hashes))
+            self._hashes[start:start + len(hashes)] = hashes
+            self._keys[start:start + len(hashes)] = keys
+            self._size += len(hashes)
+            self._index_range(start, self._size)
+            if persist and self.path:
+                with open(self.path + ".hashes", "ab") as f_hashes, open(self.path + ".keys", "ab") as f_keys:
+                    f_hashes.write(hashes.astype("<u8").tobytes())
+                    f_keys.write(keys.tobytes())
+
+    def add(self, phash: int, cache_key: str):
+        self.add_many(np.array([phash], dtype=np.uint64), np.frombuffer(bytes.fromhex(cache_key), dtype=np.uint8))
+
+    def lookup(self, phash: int, max_distance: int) -> tuple[str, int] | None:
+        """Retorna (chave do cache, distância) da entrada mais próxima com distância <= max_distance."""
+        # Pigeonhole: se a distância total é <= d, algum bloco de 16 bits difere em <= d // 4 bits
+        radius = max_distance // _BLOCKS
+        query = np.uint64(phash)
+        with self._lock:
+            if self._size == 0:
+                return None
+            candidate_chunks = []
+            for block in range(_BLOCKS):
+                buckets = self._buckets[block]
+                chunk = (phash >> (block * _BLOCK_BITS)) & _BLOCK_MASK
+                for neighbor in _neighbors_16(chunk, radius):
+                    bucket = buckets.get(neighbor)
+                    if bucket:
+                        candidate_chunks.append(np.frombuffer(bucket, dtype=np.uint32))
+            if not candidate_chunks:
+                return None
+            candidates = np.concatenate(candidate_chunks)
+            distances = _popcount64(self._hashes[candidates] ^ query)
+            best = int(np.argmin(distances))
+            best_distance = int(distances[best])
+            if best_distance > max_distance:
+                return None
+            return self._keys[candidates[best]].tobytes().hex(), best_distance
+
+    def _load(self):
+        hashes_path, keys_path = self.path + ".hashes", self.path + ".keys"
+        if not os.path.exists(hashes_path) or not os.path.exists(keys_path):
+            directory = os.path.dirname(os.path.abspath(self.path))
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            return
+        hashes = np.fromfile(hashes_path, dtype="<u8").astype(np.uint64)
+        keys = np.fromfile(keys_path, dtype=np.uint8)
+        count = min(len(hashes), len(keys) // _KEY_BYTES) # Tolera um registro parcial no fim após crash
+        self.add_many(hashes[:count], keys[:count * _KEY_BYTES], persist=False)
+        utils.print_log("info", "Índice pHash carregado: %s entradas de %s", count, self.path)
+
+def index_scope(prompt: str, model_name: str) -> str:
+    """
+    Escopo do índice: um resultado só serve para quase-duplicatas analisadas com o mesmo prompt e
+    modelo (a chave do cache já inclui os dois, mas o pHash da imagem não).
+    """
+    digest = hashlib.sha256()
+    digest.update(prompt.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(model_name.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+_default_indexes: dict[str | None, PHashIndex] = {}
+_default_index_lock = threading.Lock()
+
+def get_default_index(scope: str | None = None) -> PHashIndex:
+    """
+    Retorna (carregando na primeira chamada) o índice do escopo `scope` (ver index_scope), em
+    <NUTRISNAP_PHASH_INDEX_PATH>.<scope>; sem escopo, o caminho configurado em config.py.
+    """
+    index = _default_indexes.get(scope)
+    if index is None:
+        with _default_index_lock:
+            index = _default_indexes.get(scope)
+            if index is None:
+                base_path = config.get_settings().phash_index_path
+                index = _default_indexes[scope] = PHashIndex(f"{base_path}.{scope}" if scope else base_path)
+    return index
@@ -0,0 +1,100 @@
+# nutrisnap_ai1/preprocess.py
+import io
+import os
+
+from PIL import Image, ImageOps
+
+from . import config
+from . import metrics
+from . import utils
+
+_EXIF_ORIENTATION_TAG = 0x0112
+_MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+class PreparedImage:
+    """Imagem pronta para envio: bytes codificados, mime type e o relatório de tamanho."""
+    __slots__ = ("data", "mime_type", "bytes_before", "bytes_after", "size_before", "size_after", "passthrough")
+
+    def __init__(self, data: bytes, mime_type: str, bytes_before: int, size_before: tuple[int, int],
+                 size_after: tuple[int, int], passthrough: bool):
+        self.data = data
+        self.mime_type = mime_type
+        self.bytes_before = bytes_before
+        self.bytes_after = len(data)
+        self.size_before = size_before
+        self.size_after = size_after
+        self.passthrough = passthrough
+
+    def as_part(self) -> dict:
+        """Blob inline aceito por generate_content."""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+    def report(self) -> dict:
+        return {
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "size_before": list(self.size_before),
+            "size_after": list(self.size_after),
+            "passthrough": self.passthrough,
+        }
+
+def prepare_image(image_path_str: str,
+                  max_side: int | None = None,
+                  output_format: str | None = None,
+                  quality: int | None = None,
+                  passthrough_bytes: int | None = None,
+                  timings: metrics.StageTimings | None = None) -> PreparedImage | None:
+    """
+    Prepara a imagem para upload: decodifica JPEGs em escala reduzida (draft mode), corrige a
+    orientação EXIF, limita o maior lado a `max_side` e recodifica em JPEG/WebP.
+    Arquivos já pequenos (até `passthrough_bytes`, dentro do limite de dimensões e sem rotação EXIF)
+    são enviados como bytes brutos, sem decodificação. Retorna None em caso de erro, como load_image.
+    """
+    settings = config.get_settings()
+    max_side = max_side or settings.preprocess_max_side
+    output_format = (output_format or settings.preprocess_format).upper()
+    quality = quality or settings.preprocess_quality
+    passthrough_bytes = settings.preprocess_passthrough_bytes if passthrough_bytes is None else passthrough_bytes
+
+    try:
+        with metrics.span(timings, "load_image"):
+            image_path = os.path.abspath(image_path_str)
+            bytes_before = os.path.getsize(image_path)
+            source = Image.open(image_path) # Lazy: só o cabeçalho é lido aqui
+
+        with source: # Fecha o arquivo em qualquer saída, inclusive se a decodificação falhar no meio
+            with metrics.span(timings, "load_image"):
+                size_before = source.size
+                source_format = source.format
+                orientation = source.getexif().get(_EXIF_ORIENTATION_TAG, 1)
+                if (bytes_before <= passthrough_bytes and source_format in _MIME_TYPES
+                        and max(size_before) <= max_side and orientation == 1):
+                    with open(image_path, 'rb') as f:
+                        data = f.read()
+                    return PreparedImage(data, _MIME_TYPES[source_format], bytes_before, size_before, size_before, passthrough=True)
+
+            with metrics.span(timings, "preprocess"):
+                if source_format == "JPEG":
+                    # Decodifica direto em 1/2, 1/4 ou 1/8 da resolução, mantendo pelo menos max_side
+                    source.draft("RGB", (max_side, max_side))
+                img = ImageOps.exif_transpose(source)
+                img.thumbnail((max_side, max_side), Image.Resampling.BICUBIC, reducing_gap=2.0)
+                if img.mode not in ("RGB", "L") and not (output_format == "WEBP" and img.mode == "RGBA"):
+                    img = img.convert("RGB")
+
+                buffer = io.BytesIO()
+                if output_format == "WEBP":
+                    img.save(buffer, format="WEBP", quality=quality, method=4)
+                else:
+                    output_format = "JPEG"
+                    img.save(buffer, format="JPEG", quality=quality)
+        return PreparedImage(buffer.getvalue(), _MIME_TYPES[output_format], bytes_before, size_before, img.size, passthrough=False)
+    except FileNotFoundError:
+        utils.print_log("error", "Arquivo de imagem não encontrado: %s", image_path_str)
+        return None
+    except (IOError, ValueError) as e: # Ex: "cannot identify image file", arquivo truncado
+        utils.print_log("error", "Não foi possível pré-processar a imagem '%s' (pode estar corrompida ou formato não suportado). Erro: %s", image_path_str, e)
+        return None
+    except Exception as e:
+        utils.print_log("error", "Erro inesperado ao pré-processar imagem %s: %s", image_path_str, e)
+        return None
@@ -0,0 +1,360 @@
+# nutrisnap_ai1/ratelimit.py
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+from . import config
+from . import utils
+
+# Classes de erro usadas para decidir retentativas
+THROTTLE = "throttle" # 429 / cota esgotada: retenta e reduz a concorrência
+RETRYABLE = "retryable" # 5xx, timeout, conexão: retenta sem reduzir a concorrência
+PERMANENT = "permanent" # Prompt bloqueado, imagem inválida, 4xx: não adianta repetir
+
+_THROTTLE_CODES = {429}
+_RETRYABLE_CODES = {408, 500, 502, 503, 504}
+_PERMANENT_NAMES = {"BlockedPromptException", "StopCandidateException", "InvalidArgument", "PermissionDenied",
+                    "Unauthenticated", "NotFound", "FailedPrecondition"}
+_RETRYABLE_NAMES = {"DeadlineExceeded", "ServiceUnavailable", "InternalServerError", "BadGateway",
+                    "GatewayTimeout", "ServerError", "RetryError"}
+
+# Custo aproximado de uma imagem em tokens de entrada (Gemini 1.5)
+IMAGE_INPUT_TOKENS = 258
+
+def classify_error(error: BaseException) -> str:
+    """Classifica uma exceção da chamada ao modelo em THROTTLE, RETRYABLE ou PERMANENT."""
+    name = type(error).__name__
+    if name in _PERMANENT_NAMES:
+        return PERMANENT
+    code = getattr(error, "code", None) # google.api_core.exceptions expõe o código HTTP em .code
+    if isinstance(code, int):
+        if code in _THROTTLE_CODES:
+            return THROTTLE
+        if code in _RETRYABLE_CODES:
+            return RETRYABLE
+        if 400 <= code < 500:
+            return PERMANENT
+    if name in ("ResourceExhausted", "TooManyRequests"):
+        return THROTTLE
+    if name in _RETRYABLE_NAMES or isinstance(error, (ConnectionError, TimeoutError)):
+        return RETRYABLE
+    return PERMANENT
+
+def estimate_input_tokens(prompt_text: str, images: int = 1) -> int:
+    """Estimativa barata de tokens de entrada (~4 caracteres por token + custo fixo por imagem)."""
+    return len(prompt_text) // 4 + images * IMAGE_INPUT_TOKENS
+
+class TokenBucket:
+    """
+    Token bucket thread-safe com reserva: `reserve` debita imediatamente (o saldo pode ficar negativo)
+    e retorna quanto o chamador deve esperar, o que serve tanto para threads quanto para asyncio.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate_per_s = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute / 60.0) # Burst de ~1 s
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill_locked(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_s)
+        self._updated_at = now
+
+    def try_acquire(self, amount: float = 1.0) -> bool:
+        """Debita `amount` tokens apenas se estiverem disponíveis agora."""
+        with self._lock:
+            self._refill_locked()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return True
+            return False
+
+    def refund(self, amount: float = 1.0):
+        """Devolve `amount` tokens debitados por uma tentativa que acabou não saindo."""
+        with self._lock:
+            self._refill_locked()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Reserva `amount` tokens e retorna o tempo de espera (s) até que estejam disponíveis."""
+        with self._lock:
+            self._refill_locked()
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate_per_s
+
+    def acquire(self, amount: float = 1.0):
+        wait_s = self.reserve(amount)
+        if wait_s > 0:
+            time.sleep(wait_s)
+
+    async def acquire_async(self, amount: float = 1.0):
+        wait_s = self.reserve(amount)
+        if wait_s > 0:
+            await asyncio.sleep(wait_s)
+
+class AdaptiveConcurrency:
+    """
+    Limite de concorrência AIMD: +1 a cada `limit` sucessos seguidos (crescimento aditivo),
+    x `decrease_factor` a cada throttling (redução multiplicativa, no máximo uma vez por `cooldown_s`).
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64,
+                 decrease_factor: float = 0.5, cooldown_s: float = 2.0):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        self.cooldown_s = cooldown_s
+        self.in_flight = 0
+        self._successes_since_change = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self, poll_interval_s: float = 0.005):
+        while not self.try_acquire():
+            await asyncio.sleep(poll_interval_s)
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        with self._condition:
+            self._successes_since_change += 1
+            if self._successes_since_change >= int(self.limit) and self.limit < self.maximum:
+                self.limit += 1
+                self._successes_since_change = 0
+                self._condition.notify()
+
+    def on_throttle(self):
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown_s:
+                return # Vários 429 da mesma rajada contam como um único sinal
+            self.limit = max(float(self.minimum), self.limit * self.decrease_factor)
+            self._successes_since_change = 0
+            self._last_decrease = now
+
+class RetryPolicy:
+    """Backoff exponencial com jitter completo: espera aleatória em [0, min(max_delay, base * 2^tentativa)]."""
+
+    def __init__(self, max_attempts: int = 5, base_delay_s: float = 0.5, max_delay_s: float = 30.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay_s, self.base_delay_s * (2 ** attempt)))
+
+class RateLimiter:
+    """
+    Limitador client-side para as chamadas ao modelo: token bucket de requisições/minuto,
+    token bucket de tokens de entrada/minuto, concorrência adaptativa (AIMD) e retentativas
+    com backoff para erros retentáveis. Expõe estatísticas ao vivo via `stats()`.
+    """
+
+    def __init__(self, requests_per_minute: float, input_tokens_per_minute: float,
+                 concurrency: AdaptiveConcurrency | None = None, retry_policy: RetryPolicy | None = None):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(input_tokens_per_minute, capacity=max(1.0, input_tokens_per_minute / 60.0))
+        self.concurrency = concurrency or AdaptiveConcurrency(initial=8)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._lock = threading.Lock()
+        self._recent_requests: deque[float] = deque()
+        self._recent_tokens: deque[tuple[float, int]] = deque()
+        self.counters = {"calls": 0, "attempts": 0, "successes": 0, "throttled": 0, "retryable_errors": 0,
+                         "permanent_errors": 0, "retries": 0, "gave_up": 0, "extra_attempts": 0, "extra_denied": 0}
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.counters[key] += amount
+
+    def _record_attempt(self, tokens: int):
+        now = time.monotonic()
+        with self._lock:
+            self.counters["attempts"] += 1
+            self._recent_requests.append(now)
+            self._recent_tokens.append((now, tokens))
+
+    def _record_error(self, error: BaseException) -> str:
+        """Atualiza contadores/concorrência conforme a classe do erro e a retorna."""
+        error_class = classify_error(error)
+        if error_class == THROTTLE:
+            self._count("throttled")
+            self.concurrency.on_throttle()
+        elif error_class == RETRYABLE:
+            self._count("retryable_errors")
+        else:
+            self._count("permanent_errors")
+        return error_class
+
+    def _on_error(self, error: BaseException, attempt: int) -> float | None:
+        """Atualiza contadores/concorrência e retorna a espera antes da próxima tentativa (None = desistir)."""
+        error_class = self._record_error(error)
+        if error_class == PERMANENT:
+            return None
+        if attempt + 1 >= self.retry_policy.max_attempts:
+            self._count("gave_up")
+            return None
+        self._count("retries")
+        delay_s = self.retry_policy.delay(attempt)
+        utils.print_log("warn", "Erro %s na chamada ao modelo (%s); tentativa %s/%s, nova tentativa em %.2fs.",
+                        error_class, type(error).__name__, attempt + 1, self.retry_policy.max_attempts, delay_s,
+                        error_class=error_class, attempt=attempt + 1, delay_s=round(delay_s, 3))
+        return delay_s
+
+    def call(self, fn: Callable[[], object], estimated_tokens: int = 0):
+        """Executa `fn` respeitando as cotas; re-levanta a última exceção se não for possível concluir."""
+        self._count("calls")
+        attempt = 0
+        while True:
+            self.request_bucket.acquire(1)
+            if estimated_tokens:
+                self.token_bucket.acquire(estimated_tokens)
+            self.concurrency.acquire()
+            self._record_attempt(estimated_tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                delay_s = self._on_error(e, attempt)
+                if delay_s is None:
+                    raise
+            else:
+                self.concurrency.on_success()
+                self._count("successes")
+                return result
+            finally: # Também em cancelamento (asyncio.CancelledError) e outras BaseException
+                self.concurrency.release()
+            time.sleep(delay_s)
+            attempt += 1
+
+    async def call_async(self, fn: Callable[[], Awaitable[object]], estimated_tokens: int = 0):
+        """Versão asyncio de `call`: `fn` retorna uma corrotina nova a cada tentativa."""
+        self._count("calls")
+        attempt = 0
+        while True:
+            await self.request_bucket.acquire_async(1)
+            if estimated_tokens:
+                await self.token_bucket.acquire_async(estimated_tokens)
+            await self.concurrency.acquire_async()
+            self._record_attempt(estimated_tokens)
+            try:
+                result = await fn()
+            except Exception as e:
+                delay_s = self._on_error(e, attempt)
+                if delay_s is None:
+                    raise
+            else:
+                self.concurrency.on_success()
+                self._count("successes")
+                return result
+            finally: # Também em cancelamento (asyncio.CancelledError) e outras BaseException
+                self.concurrency.release()
+            await asyncio.sleep(delay_s)
+            attempt += 1
+
+    def try_admit(self, estimated_tokens: int = 0) -> bool:
+        """
+        Admissão sem espera de uma tentativa extra, fora de `call` (ex: a duplicata do hedging): ocupa
+        uma vaga de concorrência e debita a requisição e os tokens só se tudo estiver disponível agora.
+        Se admitida, a tentativa deve ser executada com `run_admitted` (que libera a vaga).
+        """
+        if not self.concurrency.try_acquire():
+            self._count("extra_denied")
+            return False
+        if not self.request_bucket.try_acquire(1):
+            self.concurrency.release()
+            self._count("extra_denied")
+            return False
+        if estimated_tokens and not self.token_bucket.try_acquire(estimated_tokens):
+            self.request_bucket.refund(1)
+            self.concurrency.release()
+            self._count("extra_denied")
+            return False
+        self._record_attempt(estimated_tokens)
+        self._count("extra_attempts")
+        return True
+
+    def run_admitted(self, fn: Callable[[], object]):
+        """Executa uma tentativa admitida por `try_admit`, sem retentativas, e libera a vaga."""
+        try:
+            result = fn()
+        except Exception as e:
+            self._record_error(e)
+            raise
+        else:
+            self.concurrency.on_success()
+            self._count("successes")
+            return result
+        finally:
+            self.concurrency.release()
+
+    async def run_admitted_async(self, fn: Callable[[], Awaitable[object]]):
+        """Versão asyncio de `run_admitted` (a vaga também é liberada se a tarefa for cancelada)."""
+        try:
+            result = await fn()
+        except Exception as e:
+            self._record_error(e)
+            raise
+        else:
+            self.concurrency.on_success()
+            self._count("successes")
+            return result
+        finally:
+            self.concurrency.release()
+
+    def stats(self) -> dict:
+        """Taxas observadas no último minuto, concorrência atual e contadores acumulados."""
+        horizon = time.monotonic() - 60.0
+        with self._lock:
+            while self._recent_requests and self._recent_requests[0] < horizon:
+                self._recent_requests.popleft()
+            while self._recent_tokens and self._recent_tokens[0][0] < horizon:
+                self._recent_tokens.popleft()
+            return {
+                "requests_last_minute": len(self._recent_requests),
+                "input_tokens_last_minute": sum(tokens for _, tokens in self._recent_tokens),
+                "concurrency_limit": int(self.concurrency.limit),
+                "in_flight": self.concurrency.in_flight,
+                **self.counters,
+            }
+
+_default_limiter: RateLimiter | None = None
+_default_limiter_lock = threading.Lock()
+
+def get_default_limiter() -> RateLimiter:
+    """Retorna (criando na primeira chamada) o limitador configurado em config.py."""
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_limiter_lock:
+            if _default_limiter is None:
+                settings = config.get_settings()
+                _default_limiter = RateLimiter(
+                    settings.rate_limit_rpm,
+                    settings.rate_limit_input_tpm,
+                    concurrency=AdaptiveConcurrency(initial=settings.rate_limit_initial_concurrency,
+                                                    maximum=settings.rate_limit_max_concurrency),
+                    retry_policy=RetryPolicy(max_attempts=settings.retry_max_attempts),
+                )
+    return _default_limiter
@@ -0,0 +1,212 @@
+# nutrisnap_ai1/routing.py
+"""
+Roteamento por níveis de modelo: cada imagem vai primeiro ao modelo rápido (config.MODEL_NAME) e só
+é reenviada ao modelo de escalada (NUTRISNAP_ESCALATION_MODEL) quando o resultado pede:
+  low_confidence   fração de itens com confiança "Baixo" >= NUTRISNAP_ROUTING_MAX_LOW_CONFIDENCE
+  null_calories    algum item (ou o total) sem estimated_calories
+  parse_failure    a resposta chegou mas não pôde ser interpretada (analysis.PARSE_FAILURE_ERRORS)
+Erros de API, recusas na admissão etc. não escalam. Se a escalada falhar, fica o resultado anterior.
+
+Cada nível tem limite de concorrência próprio (NUTRISNAP_ROUTING_*_CONCURRENCY, 0 = sem limite) e
+registra sua latência; o roteador conta as escaladas por motivo (stats()).
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from . import analysis, backends, batch, config, metrics, utils
+
+ESCALATION_REASONS = ("low_confidence", "null_calories", "parse_failure")
+_LATENCY_WINDOW = 10000
+
+def escalation_reasons(result: dict, max_low_confidence: float) -> list[str]:
+    """Motivos para reenviar `result` ao próximo nível (lista vazia: o resultado fica)."""
+    if result.get("error") in analysis.PARSE_FAILURE_ERRORS:
+        return ["parse_failure"]
+    if not _is_success(result):
+        return []
+    data = result.get("data") or {}
+    items = data.get("identified_items") or []
+    reasons = []
+    if items and sum(1 for item in items if item.get("confidence") == "Baixo") / len(items) >= max_low_confidence:
+        reasons.append("low_confidence")
+    if data.get("total_calories") is None or any(item.get("estimated_calories") is None for item in items):
+        reasons.append("null_calories")
+    return reasons
+
+def _is_success(result: dict) -> bool:
+    return str(result.get("status", "")).startswith("sucesso")
+
+class Tier:
+    """Um nível do roteamento: sessão (modelo), backend opcional e limite de concorrência próprios."""
+
+    def __init__(self, name: str, session: analysis.AnalyzerSession, backend: backends.Backend | None = None,
+                 max_concurrency: int = 0):
+        self.name = name
+        self.session = session
+        self.backend = backend # None usa o backend da sessão
+        self.max_concurrency = max(0, max_concurrency)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency) if self.max_concurrency else None
+        self._async_slots: asyncio.Semaphore | None = None # Criado no event loop que o usar
+        self._lock = threading.Lock()
+        self.calls = 0
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+
+    def _record(self, elapsed_s: float):
+        metrics.observe(f"tier_{self.name}", int(elapsed_s * 1e9))
+        with self._lock:
+            self.calls += 1
+            self._latencies.append(elapsed_s)
+
+    def analyze(self, image_path_str: str, use_cache: bool, refresh_cache: bool) -> tuple[dict, float]:
+        """(resultado, latência em s); a espera por uma vaga do nível não entra na latência."""
+        if self._slots is not None:
+            self._slots.acquire()
+        try:
+            started = time.perf_counter()
+            result = self.session.analyze(image_path_str, use_cache=use_cache, refresh_cache=refresh_cache,
+                                          backend=self.backend)
+            elapsed = time.perf_counter() - started
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+        self._record(elapsed)
+        return result, elapsed
+
+    async def analyze_async(self, image_path_str: str, use_cache: bool, refresh_cache: bool) -> tuple[dict, float]:
+        if self.max_concurrency and self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        if self._async_slots is not None:
+            await self._async_slots.acquire()
+        try:
+            started = time.perf_counter()
+            result = await self.session.analyze_async(image_path_str, use_cache=use_cache, refresh_cache=refresh_cache,
+                                                      backend=self.backend)
+            elapsed = time.perf_counter() - started
+        finally:
+            if self._async_slots is not None:
+                self._async_slots.release()
+        self._record(elapsed)
+        return result, elapsed
+
+    def stats(self) -> dict:
+        with self._lock:
+            ordered = sorted(self._latencies)
+        return {"model": self.session.model_name, "calls": self.calls, "max_concurrency": self.max_concurrency or None,
+                "latency_s": {"mean": round(sum(ordered) / len(ordered), 4) if ordered else None,
+                              "p50": _round_or_none(batch.percentile(ordered, 50)),
+                              "p95": _round_or_none(batch.percentile(ordered, 95))}}
+
+def _round_or_none(value: float | None) -> float | None:
+    return round(value, 4) if value is not None else None
+
+class TieredRouter:
+    """
+    Analisa cada imagem no primeiro nível e escala para os seguintes enquanto houver motivo
+    (ver escalation_reasons). O resultado devolvido ganha o bloco "routing": nível e modelo
+    escolhidos, se houve escalada e cada tentativa com latência e motivos.
+    """
+
+    def __init__(self, tiers: list[Tier], max_low_confidence: float | None = None):
+        if not tiers:
+            raise ValueError("O roteamento precisa de pelo menos um nível.")
+        self.tiers = tiers
+        self.max_low_confidence = (config.get_settings().routing_max_low_confidence
+                                   if max_low_confidence is None else max_low_confidence)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.escalated = 0
+        self.escalation_failed = 0 # Escaladas cujo resultado não pôde ser usado
+        self.reason_counts = dict.fromkeys(ESCALATION_REASONS, 0)
+
+    @classmethod
+    def from_settings(cls, backend_factory: Callable[[str], backends.Backend] | None = None) -> "TieredRouter":
+        """
+        Dois níveis a partir da configuração: config.MODEL_NAME (sessão padrão) e NUTRISNAP_ESCALATION_MODEL.
+        `backend_factory(model_name)` cria o backend de cada nível (padrão: o backend das sessões).
+        """
+        settings = config.get_settings()
+        fast_session = analysis.get_default_session()
+        strong_session = analysis.AnalyzerSession(model_name=settings.routing_escalation_model)
+        return cls([
+            Tier("fast", fast_session, backend_factory(fast_session.model_name) if backend_factory else None,
+                 settings.routing_fast_concurrency),
+            Tier("strong", strong_session, backend_factory(strong_session.model_name) if backend_factory else None,
+                 settings.routing_escalation_concurrency),
+        ])
+
+    def _choose(self, attempts: list[dict], results: list[dict]) -> dict:
+        """Resultado final: o último aproveitável (ou o último, se nenhum for), anotado com o roteamento."""
+        chosen = len(results) - 1
+        while chosen > 0 and not _is_success(results[chosen]) and _is_success(results[chosen - 1]):
+            chosen -= 1
+        escalated = len(attempts) > 1
+        with self._lock:
+            self.requests += 1
+            if escalated:
+                self.escalated += 1
+                for attempt in attempts:
+                    for reason in attempt["escalation_reasons"]:
+                        self.reason_counts[reason] += 1
+                if chosen < len(results) - 1:
+                    self.escalation_failed += 1
+        if escalated:
+            utils.print_log("info", "Roteamento: %s -> %s (%s)", attempts[0]["tier"], attempts[-1]["tier"],
+                            utils.lazy(", ".join, attempts[0]["escalation_reasons"]))
+        return dict(results[chosen], routing={"tier": attempts[chosen]["tier"], "model": attempts[chosen]["model"],
+                                              "escalated": escalated, "attempts": attempts})
+
+    def _attempt(self, tier: Tier, result: dict, elapsed: float, last: bool) -> tuple[dict, list[str]]:
+        reasons = [] if last else escalation_reasons(result, self.max_low_confidence)
+        return {"tier": tier.name, "model": tier.session.model_name, "status": result.get("status"),
+                "latency_s": round(elapsed, 4), "escalation_reasons": reasons}, reasons
+
+    def analyze(self, image_path_str: str, use_cache: bool = True, refresh_cache: bool = False) -> dict:
+        attempts, results = [], []
+        for position, tier in enumerate(self.tiers):
+            result, elapsed = tier.analyze(image_path_str, use_cache, refresh_cache)
+            attempt, reasons = self._attempt(tier, result, elapsed, position == len(self.tiers) - 1)
+            attempts.append(attempt)
+            results.append(result)
+            if not reasons:
+                break
+        return self._choose(attempts, results)
+
+    async def analyze_async(self, image_path_str: str, use_cache: bool = True, refresh_cache: bool = False) -> dict:
+        attempts, results = [], []
+        for position, tier in enumerate(self.tiers):
+            result, elapsed = await tier.analyze_async(image_path_str, use_cache, refresh_cache)
+            attempt, reasons = self._attempt(tier, result, elapsed, position == len(self.tiers) - 1)
+            attempts.append(attempt)
+            results.append(result)
+            if not reasons:
+                break
+        return self._choose(attempts, results)
+
+    def stats(self) -> dict:
+        """Requisições, taxa de escalada, escaladas por motivo e latência/chamadas por nível."""
+        with self._lock:
+            requests, escalated, failed = self.requests, self.escalated, self.escalation_failed
+            reasons = {reason: count for reason, count in self.reason_counts.items() if count}
+        return {"requests": requests, "escalated": escalated,
+                "escalation_rate": round(escalated / requests, 4) if requests else None,
+                "escalation_failed": failed, "escalation_reasons": reasons,
+                "tiers": {tier.name: tier.stats() for tier in self.tiers}}
+
+_default_router: TieredRouter | None = None
+_default_router_lock = threading.Lock()
+
+def get_default_router() -> TieredRouter:
+    """Roteador compartilhado (níveis de TieredRouter.from_settings)."""
+    global _default_router
+    if _default_router is None:
+        with _default_router_lock:
+            if _default_router is None:
+                _default_router = TieredRouter.from_settings()
+    return _default_router
+
+def analyze_image_routed(image_path_str: str, use_cache: bool = True, refresh_cache: bool = False) -> dict:
+    """analyze_image com roteamento por níveis de modelo (via roteador padrão)."""
+    return get_default_router().analyze(image_path_str, use_cache=use_cache, refresh_cache=refresh_cache)
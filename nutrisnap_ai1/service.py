@@ -0,0 +1,326 @@
+# nutrisnap_ai1/service.py
+"""
+Serviço HTTP de análise, só com asyncio e a biblioteca padrão:
+  POST /analyze   imagem em multipart/form-data (campo "image") ou no corpo (Content-Type: image/*);
+                  ?refresh=1 refaz a análise, ?cache=0 ignora o cache
+  GET  /health    estado do serviço (JSON)
+  GET  /metrics   contadores do serviço + histogramas de estágio (texto Prometheus)
+
+Uploads de conteúdo idêntico (e com as mesmas opções de cache) que chegam enquanto uma análise dele
+está em andamento não geram nova chamada: todos aguardam a mesma análise e recebem o mesmo
+resultado (com "coalesced": true para quem chegou depois). Análises distintas são limitadas a
+`max_concurrency` em execução e `max_queue` aguardando; acima disso a requisição recebe 503 com
+Retry-After. Com a admissão ligada (NUTRISNAP_ADMISSION), o cabeçalho do upload é verificado antes
+de gravar o arquivo ou ocupar uma vaga: recusas respondem 413 (tamanho), 415 (formato) ou 422 (demais motivos), com "rejection_reason".
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from email.message import Message
+from urllib.parse import parse_qs, urlsplit
+
+from . import admission, analysis, backends, config, metrics, utils
+
+_MAX_HEADER_BYTES = 64 * 1024
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+            413: "Payload Too Large", 415: "Unsupported Media Type", 422: "Unprocessable Entity",
+            500: "Internal Server Error", 502: "Bad Gateway", 503: "Service Unavailable"}
+_REJECTION_STATUS = {"too_large": 413, "unknown_format": 415, "format_not_allowed": 415} # Demais motivos: 422
+_IMAGE_SUFFIXES = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/gif": ".gif",
+                   "image/bmp": ".bmp", "image/heic": ".heic"}
+
+class HttpError(Exception):
+    """Erro que vira uma resposta HTTP com `status` e corpo JSON {"status": "erro", "error": ...}."""
+
+    def __init__(self, status: int, message: str, headers: dict | None = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+class ServiceOverloadedError(HttpError):
+    def __init__(self):
+        super().__init__(503, "Serviço sobrecarregado, tente novamente em instantes", {"Retry-After": "1"})
+
+def parse_multipart(body: bytes, content_type: str) -> dict[str, tuple[str | None, str | None, bytes]]:
+    """Campos de um corpo multipart/form-data: {nome: (nome do arquivo, Content-Type, conteúdo)}."""
+    header = Message()
+    header["Content-Type"] = content_type
+    boundary = header.get_param("boundary")
+    if not boundary:
+        raise HttpError(400, "multipart/form-data sem boundary")
+    fields = {}
+    delimiter = b"--" + boundary.encode("latin-1")
+    for chunk in body.split(delimiter)[1:]:
+        if chunk.startswith(b"--"): # Delimitador final
+            break
+        headers_raw, separator, content = chunk.partition(b"\r\n\r\n")
+        if not separator:
+            raise HttpError(400, "Parte multipart malformada")
+        part = Message()
+        for line in headers_raw.decode("utf-8", "replace").strip().split("\r\n"):
+            name, _, value = line.partition(":")
+            part[name.strip()] = value.strip()
+        field_name = part.get_param("name", header="content-disposition")
+        if field_name:
+            filename = part.get_param("filename", header="content-disposition")
+            fields[field_name] = (filename, part.get_content_type() if part["Content-Type"] else None,
+                                  content[:-2] if content.endswith(b"\r\n") else content)
+    return fields
+
+def _suffix_for(filename: str | None, content_type: str | None) -> str:
+    suffix = os.path.splitext(filename or "")[1].lower()
+    return suffix or _IMAGE_SUFFIXES.get(content_type or "", ".jpg")
+
+def _coalescing_key(content_hash: str, use_cache: bool, refresh_cache: bool) -> str:
+    """Chave das análises em andamento: o conteúdo e o modo de cache (refresh sem cache não muda nada)."""
+    mode = ("refresh" if refresh_cache else "cache") if use_cache else "nocache"
+    return f"{content_hash}-{mode}"
+
+def _http_status(result: dict) -> int:
+    if str(result.get("status", "")).startswith("sucesso"):
+        return 200
+    if "rejection_reason" in result:
+        return _REJECTION_STATUS.get(result["rejection_reason"], 422)
+    if result.get("error") == "Falha ao carregar imagem":
+        return 422
+    return 502
+
+class AnalysisService:
+    """Estado do serviço: análises em andamento por hash do conteúdo e modo de cache, limites de fila e contadores."""
+
+    def __init__(self, session: analysis.AnalyzerSession | None = None, backend: backends.Backend | None = None,
+                 max_concurrency: int | None = None, max_queue: int | None = None,
+                 max_upload_bytes: int | None = None, upload_dir: str | None = None):
+        settings = config.get_settings()
+        self.session = session or analysis.get_default_session()
+        self.backend = backend # None usa o backend da sessão
+        self.max_concurrency = max(1, max_concurrency or settings.service_max_concurrency)
+        self.max_queue = max(0, settings.service_max_queue if max_queue is None else max_queue)
+        self.max_upload_bytes = max_upload_bytes or settings.service_max_upload_bytes
+        self.upload_dir = upload_dir or settings.service_upload_dir
+        self.started_at = time.time()
+        self.counters = {"requests": 0, "analyses": 0, "coalesced": 0, "shed": 0, "client_errors": 0, "analysis_errors": 0,
+                         "rejected": 0}
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self._running = 0
+        self._semaphore: asyncio.Semaphore | None = None # Criado no event loop do servidor
+
+    @property
+    def pending(self) -> int:
+        """Análises distintas admitidas (executando + aguardando)."""
+        return len(self._in_flight)
+
+    async def analyze_upload(self, content: bytes, suffix: str = ".jpg", use_cache: bool = True,
+                             refresh_cache: bool = False) -> dict:
+        """
+        Analisa o conteúdo enviado, juntando-se a uma análise idêntica já em andamento, se houver
+        (mesmo conteúdo e mesmas opções: um ?refresh=1 não recebe o resultado de uma análise com cache).
+        A admissão roda aqui, sobre os bytes, antes de gravar o arquivo ou ocupar uma vaga; a sessão não
+        repete a verificação no arquivo gravado.
+        """
+        if self.session.admission_checks:
+            rejection = admission.check_bytes(content)
+            if rejection is not None:
+                self.counters["rejected"] += 1
+                return rejection.result()
+        key = _coalescing_key(hashlib.sha256(content).hexdigest(), use_cache, refresh_cache)
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.counters["coalesced"] += 1
+            # shield: se este cliente desconectar, a análise compartilhada continua para os demais
+            return dict(await asyncio.shield(task), coalesced=True)
+        if self.pending >= self.max_concurrency + self.max_queue:
+            self.counters["shed"] += 1
+            raise ServiceOverloadedError()
+        task = asyncio.create_task(self._analyze(key, content, suffix, use_cache, refresh_cache))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _analyze(self, key: str, content: bytes, suffix: str, use_cache: bool, refresh_cache: bool) -> dict:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            self._running += 1
+            self.counters["analyses"] += 1
+            # Nome pela chave (hash + modo): o cache e o índice pHash já usam o conteúdo do arquivo, e
+            # análises do mesmo conteúdo com opções diferentes não disputam o mesmo arquivo
+            path = os.path.join(self.upload_dir, key + suffix)
+            try:
+                await asyncio.to_thread(self._write_upload, path, content)
+                # A admissão já rodou sobre os bytes em analyze_upload
+                result = await self.session.analyze_async(path, use_cache=use_cache, refresh_cache=refresh_cache,
+                                                          backend=self.backend, admit=False)
+            except Exception as e: # analyze_async já converte erros da API; aqui sobram falhas de E/S do upload
+                utils.print_log("error", "Falha ao processar upload %s: %s", key[:12], e)
+                result = {"status": "erro", "error": "Falha ao processar o upload", "details": str(e)}
+            finally:
+                self._running -= 1
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if _http_status(result) != 200:
+            self.counters["analysis_errors"] += 1
+        return result
+
+    @staticmethod
+    def _write_upload(path: str, content: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+
+    def health(self) -> dict:
+        return {
+            "status": "ok",
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "backend": (self.backend or self.session.backend).name,
+            "running": self._running,
+            "queued": self.pending - self._running,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "counters": dict(self.counters),
+        }
+
+    def prometheus(self) -> str:
+        lines = []
+        for name, value in self.counters.items():
+            lines.append(f"# TYPE nutrisnap_service_{name}_total counter")
+            lines.append(f"nutrisnap_service_{name}_total {value}")
+        for name, value in (("running", self._running), ("queued", self.pending - self._running)):
+            lines.append(f"# TYPE nutrisnap_service_{name} gauge")
+            lines.append(f"nutrisnap_service_{name} {value}")
+        text = "\n".join(lines) + "\n"
+        if metrics.is_enabled():
+            text += metrics.get_registry().to_prometheus()
+        return text
+
+    async def handle_request(self, method: str, target: str, headers: dict[str, str], body: bytes) -> tuple[int, dict, bytes]:
+        """Roteia uma requisição; retorna (status, cabeçalhos extras, corpo)."""
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"Content-Type": "application/json"}, _json_body(self.health())
+        if url.path == "/metrics":
+            return 200, {"Content-Type": "text/plain; version=0.0.4"}, self.prometheus().encode("utf-8")
+        if url.path != "/analyze":
+            raise HttpError(404, f"Rota desconhecida: {url.path}")
+        if method != "POST":
+            raise HttpError(405, "Use POST /analyze", {"Allow": "POST"})
+
+        content_type = headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            fields = parse_multipart(body, content_type)
+            if "image" not in fields:
+                raise HttpError(400, 'Campo "image" ausente no formulário')
+            filename, part_type, content = fields["image"]
+        elif content_type.startswith("image/"):
+            filename, part_type, content = None, content_type.split(";")[0].strip(), body
+        else:
+            raise HttpError(415, "Envie multipart/form-data (campo \"image\") ou o corpo com Content-Type image/*")
+        if not content:
+            raise HttpError(400, "Imagem vazia")
+
+        query = parse_qs(url.query)
+        started_ns = time.perf_counter_ns()
+        result = await self.analyze_upload(content, _suffix_for(filename, part_type),
+                                           use_cache=query.get("cache", ["1"])[0] != "0",
+                                           refresh_cache=query.get("refresh", ["0"])[0] == "1")
+        metrics.observe("http_analyze", time.perf_counter_ns() - started_ns)
+        return _http_status(result), {"Content-Type": "application/json"}, _json_body(result)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Atende uma conexão HTTP/1.1 (com keep-alive) até o cliente fechar."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await _write_response(writer, 400, {}, _json_body({"status": "erro", "error": "Cabeçalhos grandes demais"}), False)
+                    return
+                keep_alive = await self._serve_one(head, reader, writer)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _serve_one(self, head: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        self.counters["requests"] += 1
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            await _write_response(writer, 400, {}, _json_body({"status": "erro", "error": "Linha de requisição inválida"}), False)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            name, separator, value = line.partition(":")
+            if separator:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+        try:
+            if "chunked" in headers.get("transfer-encoding", "").lower():
+                raise HttpError(411, "Transfer-Encoding chunked não suportado; envie Content-Length")
+            try:
+                length = int(headers.get("content-length", "0") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                keep_alive = False # Sem tamanho confiável, não dá para achar o início da próxima requisição
+                raise HttpError(400, "Content-Length inválido")
+            if length > self.max_upload_bytes:
+                keep_alive = False # O corpo não é lido
+                raise HttpError(413, f"Upload maior que o limite de {self.max_upload_bytes} bytes")
+            body = await reader.readexactly(length) if length else b""
+            status, extra_headers, response_body = await self.handle_request(method.upper(), target, headers, body)
+        except HttpError as e:
+            if e.status != 503:
+                self.counters["client_errors"] += 1
+            status, extra_headers = e.status, {"Content-Type": "application/json", **e.headers}
+            response_body = _json_body({"status": "erro", "error": str(e)})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return False
+        except Exception as e: # Falha do próprio serviço, não do cliente
+            utils.print_log("error", "Erro interno ao atender %s %s: %r", method, target, e)
+            status, extra_headers, keep_alive = 500, {"Content-Type": "application/json"}, False
+            response_body = _json_body({"status": "erro", "error": "Erro interno do serviço"})
+        utils.print_log("info", "%s %s -> %s", method, target, status)
+        await _write_response(writer, status, extra_headers, response_body, keep_alive)
+        return keep_alive
+
+def _json_body(payload: dict) -> bytes:
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+async def _write_response(writer: asyncio.StreamWriter, status: int, headers: dict, body: bytes, keep_alive: bool):
+    head = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}", f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    head += [f"{name}: {value}" for name, value in headers.items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+
+async def start_server(service: AnalysisService, host: str | None = None, port: int | None = None) -> asyncio.AbstractServer:
+    """Inicia o servidor no event loop atual (port=0 escolhe uma porta livre)."""
+    settings = config.get_settings()
+    host = host or settings.service_host
+    port = settings.service_port if port is None else port
+    # O limite do StreamReader vale para a linha de requisição + cabeçalhos; o corpo é lido por Content-Length
+    return await asyncio.start_server(service.handle_connection, host, port, limit=_MAX_HEADER_BYTES)
+
+async def serve(service: AnalysisService, host: str | None = None, port: int | None = None):
+    server = await start_server(service, host, port)
+    for sock in server.sockets:
+        utils.print_log("system", "Serviço de análise ouvindo em http://%s:%s", *sock.getsockname()[:2])
+    async with server:
+        await server.serve_forever()
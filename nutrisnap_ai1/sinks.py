@@ -0,0 +1,182 @@
+# nutrisnap_ai1/sinks.py
+import glob
+import gzip
+import json
+import os
+import re
+import threading
+import zlib
+
+from . import utils
+
+try: # Dependência opcional, usada apenas com compression="zstd"
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_EXTENSIONS = {None: ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+
+class JsonFileSink:
+    """Modo original: um arquivo JSON indentado por imagem (<prefixo>_analysis.json)."""
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+
+    def write(self, record: dict, image_path: str) -> str | None:
+        return utils.save_json_result(record, self.output_dir, utils.get_filename_without_extension(image_path))
+
+    def close(self):
+        pass
+
+class JsonlSink:
+    """
+    Grava um registro compacto por linha em arquivos JSONL rotativos (opcionalmente gzip/zstd).
+    As linhas são acumuladas e gravadas em grupos de `flush_every`, com um fsync por grupo.
+    Cada execução abre um arquivo novo (índice seguinte ao último existente), então arquivos
+    anteriores nunca são reabertos para escrita.
+    """
+
+    def __init__(self, output_dir: str, prefix: str = "results", compression: str | None = None,
+                 max_records_per_file: int = 100_000, flush_every: int = 256):
+        if compression not in _EXTENSIONS:
+            raise ValueError(f"Compressão não suportada: {compression}. Use None, 'gzip' ou 'zstd'.")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("Compressão 'zstd' requer o pacote opcional 'zstandard' (pip install zstandard).")
+        self.output_dir = os.path.abspath(output_dir)
+        self.prefix = prefix
+        self.compression = compression
+        self.max_records_per_file = max_records_per_file
+        self.flush_every = max(1, flush_every)
+        self.records_written = 0
+        self._buffer: list[str] = []
+        self._file = None
+        self._raw_file = None
+        self._records_in_file = 0
+        self._file_index = _last_file_index(self.output_dir, prefix)
+        self._lock = threading.Lock()
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+            utils.print_log("info", "Diretório de resultados criado: %s", self.output_dir)
+
+    def _open_next_file(self):
+        self._close_file()
+        self._file_index += 1
+        path = os.path.join(self.output_dir, f"{self.prefix}-{self._file_index:05d}{_EXTENSIONS[self.compression]}")
+        self._raw_file = open(path, "ab")
+        if self.compression == "gzip":
+            self._file = gzip.GzipFile(fileobj=self._raw_file, mode="ab")
+        elif self.compression == "zstd":
+            self._file = zstandard.ZstdCompressor().stream_writer(self._raw_file, closefd=False)
+        else:
+            self._file = self._raw_file
+        self._records_in_file = 0
+        utils.print_log("info", "Gravando resultados em: %s", path)
+
+    def _close_file(self):
+        if self._file is not None:
+            if self._file is not self._raw_file:
+                self._file.close()
+            self._raw_file.close()
+        self._file = None
+        self._raw_file = None
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        lines = self._buffer
+        self._buffer = []
+        for line in lines:
+            if self._file is None or self._records_in_file >= self.max_records_per_file:
+                self._open_next_file()
+            self._file.write(line.encode("utf-8"))
+            self._records_in_file += 1
+        self._file.flush()
+        self._raw_file.flush()
+        os.fsync(self._raw_file.fileno())
+
+    def write(self, record: dict, image_path: str | None = None) -> str | None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._buffer.append(line)
+            self.records_written += 1
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+        return None
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._close_file()
+
+def sink_files(output_dir: str, prefix: str = "results") -> list[str]:
+    """Arquivos do sink em `output_dir`, na ordem em que foram criados."""
+    return sorted(glob.glob(os.path.join(glob.escape(output_dir), f"{glob.escape(prefix)}-*.jsonl*")))
+
+def _last_file_index(output_dir: str, prefix: str) -> int:
+    last_index = 0
+    for path in sink_files(output_dir, prefix):
+        match = re.search(r"-(\d+)\.jsonl", os.path.basename(path))
+        if match:
+            last_index = max(last_index, int(match.group(1)))
+    return last_index
+
+def _iter_gzip_chunks(path: str):
+    """Descompressão incremental de gzip (inclusive vários membros) que preserva o que foi lido antes de um truncamento."""
+    with open(path, "rb") as f:
+        decompressor = zlib.decompressobj(wbits=31)
+        for raw in iter(lambda: f.read(64 * 1024), b""):
+            while raw:
+                yield decompressor.decompress(raw)
+                raw = decompressor.unused_data
+                if decompressor.eof:
+                    decompressor = zlib.decompressobj(wbits=31) # Próximo membro (arquivo aberto em append)
+        yield decompressor.flush()
+
+def _iter_chunks(path: str):
+    if path.endswith(".gz"):
+        yield from _iter_gzip_chunks(path)
+    elif path.endswith(".zst"):
+        if zstandard is None:
+            raise ValueError(f"'{path}' requer o pacote opcional 'zstandard' para leitura.")
+        with zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True) as f:
+            yield from iter(lambda: f.read(64 * 1024), b"")
+    else:
+        with open(path, "rb") as f:
+            yield from iter(lambda: f.read(64 * 1024), b"")
+
+def iter_file_records(path: str):
+    """Itera os registros de um arquivo do sink, tolerando uma última linha truncada (crash)."""
+    pending = b""
+    try:
+        for chunk in _iter_chunks(path):
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        utils.print_log("warn", "Linha inválida ignorada em %s.", path)
+    except (EOFError, OSError, zlib.error) as e: # Ex: stream comprimido corrompido após interrupção
+        utils.print_log("warn", "Arquivo %s terminou de forma inesperada (%s); registros completos foram mantidos.", path, e)
+    if pending.strip():
+        utils.print_log("warn", "Última linha incompleta ignorada em %s.", path)
+
+def iter_records(output_dir: str, prefix: str = "results"):
+    """Itera os registros de todos os arquivos do sink (ver iter_file_records)."""
+    for path in sink_files(os.path.abspath(output_dir), prefix):
+        yield from iter_file_records(path)
+
+def recorded_hashes(output_dir: str, prefix: str = "results", only_successful: bool = True) -> set[str]:
+    """
+    Hashes de conteúdo (image_sha256) já gravados no sink, para retomar um batch interrompido.
+    Por padrão só considera análises bem-sucedidas, para que falhas sejam refeitas na retomada.
+    """
+    return {
+        record["image_sha256"] for record in iter_records(output_dir, prefix)
+        if record.get("image_sha256") and (not only_successful or str(record.get("status", "")).startswith("sucesso"))
+    }
@@ -0,0 +1,64 @@
+# scripts/analytics_report.py
+"""
+Ingere os resultados no armazenamento colunar (nutrisnap_ai1/analytics.py) e imprime relatórios.
+
+Uso: python scripts/analytics_report.py [--results-dir data/results] [--top 20] [--bucket day]
+                                        [--item "arroz branco"] [--since 2024-01-01] [--until 2024-02-01]
+                                        [--no-ingest] [--json]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from nutrisnap_ai1 import analytics, utils
+
+def main():
+    parser = argparse.ArgumentParser(description="NutriSnap AI: relatórios sobre os resultados das análises.")
+    parser.add_argument("--results-dir", dest="results_dir", type=str, default=str(PROJECT_ROOT / "data" / "results"),
+                        help="Diretório com os resultados (arquivos *_analysis.json e/ou JSONL do sink).")
+    parser.add_argument("--store", type=str, default=None, help="Diretório do armazenamento (padrão: NUTRISNAP_ANALYTICS_DIR).")
+    parser.add_argument("--no-ingest", dest="no_ingest", action="store_true", help="Só consulta, sem ingerir resultados novos.")
+    parser.add_argument("--top", type=int, default=20, help="Itens mais frequentes no relatório por item.")
+    parser.add_argument("--bucket", type=str, choices=["hour", "day", "week", "month"], default="day")
+    parser.add_argument("--item", type=str, default=None, help="Restringe os relatórios a um item.")
+    parser.add_argument("--since", type=str, default=None, help="Início do período (ISO, inclusive).")
+    parser.add_argument("--until", type=str, default=None, help="Fim do período (ISO, exclusivo).")
+    parser.add_argument("--json", action="store_true", help="Imprime o relatório como JSON.")
+    args = parser.parse_args()
+
+    store = analytics.AnalyticsStore(args.store) if args.store else analytics.get_default_store()
+    if not args.no_ingest:
+        store.ingest(args.results_dir)
+
+    filters = {"item": args.item, "since": args.since, "until": args.until}
+    report = {
+        "summary": store.summary(),
+        "by_item": store.by_item(top=args.top, **filters),
+        "calorie_percentiles": store.calorie_percentiles(**filters),
+        "confidence": store.confidence_distribution(**filters),
+        "periods": store.time_buckets(args.bucket, **filters),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    summary = report["summary"]
+    utils.print_log("system", "--- Relatório de Análises ---")
+    utils.print_log("info", "Itens: %s | imagens: %s | itens distintos: %s",
+                    summary["rows"], summary["images"], summary["distinct_items"])
+    utils.print_log("info", "Calorias por item (percentis): %s", report["calorie_percentiles"])
+    utils.print_log("info", "Confiança: %s", report["confidence"])
+    for row in report["by_item"]:
+        utils.print_log("info", "  %s: %sx em %s imagens, média %s kcal (p50 %s, p90 %s), confiança alta %s%%",
+                        row["item"], row["count"], row["images"], row["calories_mean"],
+                        row["calories_p50"], row["calories_p90"], row["high_confidence_pct"])
+    for row in report["periods"]:
+        utils.print_log("info", "  %s: %s itens, %s imagens, %s kcal",
+                        row["period"], row["items"], row["images"], row["calories_total"])
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,53 @@
 # scripts/run_analysis.py
 import argparse
+import dataclasses
+import functools
 import os
+from concurrent.futures import ThreadPoolExecutor
 import sys
+import time
 from datetime import datetime
 from pathlib import Path # Usar pathlib para manipulação de caminhos
 
 # Adiciona o diretório raiz do projeto (nutrisnap_ai_project) ao sys.path
-# Isso permite que 'from nutrisnap_ai ...' funcione quando o script é chamado de qualquer lugar,
+# Isso permite que 'from nutrisnap_ai1 ...' funcione quando o script é chamado de qualquer lugar,
 # contanto que a estrutura de pastas seja mantida.
 PROJECT_ROOT = Path(__file__).resolve().parent.parent # Vai para 'scripts/' e depois para 'nutrisnap_ai_project/'
 sys.path.insert(0, str(PROJECT_ROOT))
 
-from nutrisnap_ai import analysis, utils, config # Agora as importações devem funcionar
+from nutrisnap_ai1 import admission, analysis, backends, utils, config, batch, cache, logs, metrics, routing, sinks # Agora as importações devem funcionar
 
 # Define diretórios padrão de dados relativos à raiz do projeto
 DEFAULT_INPUT_DIR = PROJECT_ROOT / "data" / "input_images"
 DEFAULT_RESULTS_DIR = PROJECT_ROOT / "data" / "results"
 
-def main():
-    utils.print_log("system", "------------------------------------")
-    utils.print_log("system", "🥗 NutriSnap AI - Análise de Imagem 🥗")
-    utils.print_log("system", "------------------------------------")
-    utils.print_log("info", f"Timestamp da execução: {datetime.now().isoformat()}")
-    utils.print_log("info", f"Diretório raiz do projeto inferido: {PROJECT_ROOT}")
-
-    parser = argparse.ArgumentParser(description="NutriSnap AI: Analisa imagens de alimentos para estimativa de calorias.")
-    parser.add_argument("--image_path", type=str, required=True,
-                        help="Caminho para o arquivo de imagem de entrada (relativo ou absoluto).")
-    parser.add_argument("--output_dir", type=str, default=str(DEFAULT_RESULTS_DIR),
-                        help=f"Diretório para salvar os resultados da análise (padrão: {DEFAULT_RESULTS_DIR}).")
-    parser.add_argument("--mock", action="store_true",
-                        help="Executa em modo MOCK sem chamadas reais à API (para teste).")
+def resolve_image_path(image_path_arg: str) -> Path | None:
+    """Resolve o caminho da imagem: absoluto, relativo ao CWD ou relativo ao diretório de input padrão."""
+    input_image_path_arg = Path(image_path_arg)
 
-    args = parser.parse_args()
-
-    if args.mock:
-        analysis.MOCK_MODE = True # Ativa o modo mock no módulo de análise
-        utils.print_log("info", "**** MODO MOCK ATIVADO VIA LINHA DE COMANDO ****")
-
-    # Checagem da API Key é feita dentro de analysis.analyze_image se não estiver em MOCK_MODE
-
-    # Resolve o caminho da imagem de entrada de forma mais robusta
-    input_image_path_arg = Path(args.image_path)
-    
     # 1. Se o caminho fornecido é absoluto e existe
     if input_image_path_arg.is_absolute():
         if not input_image_path_arg.exists():
-            utils.print_log("fatal", f"Imagem não encontrada no caminho absoluto fornecido: {input_image_path_arg}")
-            sys.exit(1)
-        final_image_path = input_image_path_arg
-    else:
-        # 2. Tenta relativo ao diretório de execução atual (CWD)
-        path_from_cwd = Path.cwd() / input_image_path_arg
-        if path_from_cwd.exists():
-            final_image_path = path_from_cwd
-        else:
-            # 3. Tenta relativo ao diretório de input padrão do projeto
-            path_from_default_dir = DEFAULT_INPUT_DIR / input_image_path_arg.name # Usa .name para pegar só o nome do arquivo
-            if path_from_default_dir.exists():
-                final_image_path = path_from_default_dir
-            else:
-                utils.print_log("fatal", f"Imagem '{args.image_path}' não encontrada no CWD, nem em '{DEFAULT_INPUT_DIR}'. Verifique o caminho.")
-                sys.exit(1)
-    
-    utils.print_log("info", f"Caminho final da imagem para análise: {final_image_path}")
-    utils.print_log("info", f"Diretório de saída para resultados: {args.output_dir}")
+            utils.print_log("fatal", "Imagem não encontrada no caminho absoluto fornecido: %s", input_image_path_arg)
+            return None
+        return input_image_path_arg
 
-    # Executa a análise
-    analysis_result_wrapper = analysis.analyze_image(str(final_image_path))
+    # 2. Tenta relativo ao diretório de execução atual (CWD)
+    path_from_cwd = Path.cwd() / input_image_path_arg
+    if path_from_cwd.exists():
+        return path_from_cwd
+
+    # 3. Tenta relativo ao diretório de input padrão do projeto
+    path_from_default_dir = DEFAULT_INPUT_DIR / input_image_path_arg.name # Usa .name para pegar só o nome do arquivo
+    if path_from_default_dir.exists():
+        return path_from_default_dir
 
-    # Prepara a estrutura final do JSON de saída
+    utils.print_log("fatal", "Imagem '%s' não encontrada no CWD, nem em '%s'. Verifique o caminho.",
+                    image_path_arg, DEFAULT_INPUT_DIR)
+    return None
+
+def build_output_data(final_image_path: Path, analysis_result_wrapper: dict) -> dict:
+    """Monta a estrutura final do JSON de saída a partir do wrapper retornado pela análise."""
     # Garante que sempre haverá uma estrutura base, mesmo em caso de erro total
     output_data = {
         "image_file": final_image_path.name,
@@ -78,7 +56,9 @@ def main():
         # Inicializa campos opcionais que podem ou não vir do wrapper
         "data": None,
         "error_message": None,
-        "details": None
+        "details": None,
+        "preprocessing": None,
+        "timings": None
     }
     # Atualiza com os dados do wrapper, se existirem
     if "data" in analysis_result_wrapper:
@@ -87,53 +67,347 @@ def main():
         output_data["error_message"] = analysis_result_wrapper["error"]
     if "details" in analysis_result_wrapper:
         output_data["details"] = analysis_result_wrapper["details"]
-    
-    # Remove chaves None para um JSON mais limpo
-    output_data_cleaned = {k: v for k, v in output_data.items() if v is not None}
+    if "preprocessing" in analysis_result_wrapper: # Bytes antes/depois do pré-processamento
+        output_data["preprocessing"] = analysis_result_wrapper["preprocessing"]
+    if "timings" in analysis_result_wrapper: # Tempos por estágio (ms), com a instrumentação ligada
+        output_data["timings"] = analysis_result_wrapper["timings"]
+    if "rejection_reason" in analysis_result_wrapper: # Motivo da recusa na admissão
+        output_data["rejection_reason"] = analysis_result_wrapper["rejection_reason"]
+    if "routing" in analysis_result_wrapper: # Nível/modelo usado e tentativas (--route)
+        output_data["routing"] = analysis_result_wrapper["routing"]
 
+    # Remove chaves None para um JSON mais limpo
+    return {k: v for k, v in output_data.items() if v is not None}
 
-    # Log dos resultados principais
+def log_analysis_result(output_data_cleaned: dict):
+    """Log dos resultados principais de uma análise."""
     if output_data_cleaned["status"].startswith("sucesso"):
         utils.print_log("success", "Análise concluída com sucesso.")
         res_data = output_data_cleaned.get("data")
         if res_data:
             total_cals = res_data.get("total_calories")
             if total_cals is not None:
-                utils.print_log("info", f"🍽️  Total Estimado de Calorias: {total_cals}")
+                utils.print_log("info", "🍽️  Total Estimado de Calorias: %s", total_cals)
             
             items = res_data.get("identified_items", [])
             if items:
                 utils.print_log("info", "🍏 Itens Identificados:")
                 for item in items:
-                    utils.print_log("info", f"  - {item.get('item_name', 'Item Desconhecido')}: "
-                                            f"{item.get('estimated_calories', 'N/A')} kcal "
-                                            f"(Confiança: {item.get('confidence', 'N/A')}) "
-                                            f"Notas: {item.get('notes', 'Nenhuma')}")
+                    utils.print_log("info", "  - %s: %s kcal (Confiança: %s) Notas: %s",
+                                    item.get('item_name', 'Item Desconhecido'), item.get('estimated_calories', 'N/A'),
+                                    item.get('confidence', 'N/A'), item.get('notes', 'Nenhuma'))
             summary_notes = res_data.get("analysis_summary_notes")
             if summary_notes:
-                 utils.print_log("info", f"📋 Notas Sumárias da Análise: {summary_notes}")
+                 utils.print_log("info", "📋 Notas Sumárias da Análise: %s", summary_notes)
 
     else:
-        utils.print_log("error", f"Análise falhou. Status: {output_data_cleaned['status']}.")
+        utils.print_log("error", "Análise falhou. Status: %s.", output_data_cleaned['status'])
         if output_data_cleaned.get("error_message"):
-            utils.print_log("error", f"   Mensagem de Erro: {output_data_cleaned['error_message']}")
+            utils.print_log("error", "   Mensagem de Erro: %s", output_data_cleaned['error_message'])
         if output_data_cleaned.get("details"):
-            utils.print_log("error", f"   Detalhes do Erro: {output_data_cleaned['details']}")
+            utils.print_log("error", "   Detalhes do Erro: %s", output_data_cleaned['details'])
+
+def run_single(args):
+    """Modo de imagem única (comportamento original do script)."""
+    final_image_path = resolve_image_path(args.image_path)
+    if final_image_path is None:
+        sys.exit(1)
+    
+    utils.print_log("info", "Caminho final da imagem para análise: %s", final_image_path)
+    utils.print_log("info", "Diretório de saída para resultados: %s", args.output_dir)
+
+    # Executa a análise
+    if args.route: # Modelo rápido primeiro, escalada para o modelo forte quando preciso
+        analysis_result_wrapper = args.router.analyze(str(final_image_path), use_cache=not args.no_cache,
+                                                      refresh_cache=args.refresh)
+    elif args.stream: # Mostra cada item assim que ele chega, antes do resultado completo
+        def _on_item(item: dict):
+            utils.print_log("info", "Item recebido: %s (%s kcal, confiança %s)",
+                            item['item_name'], item['estimated_calories'], item['confidence'])
+        analysis_result_wrapper = analysis.analyze_image_stream(str(final_image_path), _on_item, use_cache=not args.no_cache,
+                                                                refresh_cache=args.refresh, backend=args.backend_instance)
+    else:
+        analysis_result_wrapper = analysis.analyze_image(str(final_image_path), use_cache=not args.no_cache,
+                                                         refresh_cache=args.refresh, backend=args.backend_instance)
+
+    output_data_cleaned = build_output_data(final_image_path, analysis_result_wrapper)
+    log_analysis_result(output_data_cleaned)
 
     # Salva os resultados
     image_filename_prefix = utils.get_filename_without_extension(str(final_image_path))
     output_dir_path = Path(args.output_dir) # Garante que é um objeto Path
     
+    save_started_ns = time.perf_counter_ns()
     saved_path = utils.save_json_result(output_data_cleaned, str(output_dir_path), image_filename_prefix)
+    metrics.observe("save_json_result", time.perf_counter_ns() - save_started_ns)
 
     if saved_path:
-        utils.print_log("info", f"Relatório completo da análise salvo em: {saved_path}")
+        utils.print_log("info", "Relatório completo da análise salvo em: %s", saved_path)
     else:
-        utils.print_log("warn", f"Falha ao salvar o JSON do relatório da análise no diretório: {output_dir_path}")
+        utils.print_log("warn", "Falha ao salvar o JSON do relatório da análise no diretório: %s", output_dir_path)
+
+def run_batch_mode(args):
+    """Modo batch: analisa diretórios/globs/listas em um pool limitado de workers."""
+    image_paths = batch.collect_image_paths(args.batch)
+    if not image_paths:
+        utils.print_log("fatal", "Nenhuma imagem encontrada para as entradas: %s", args.batch)
+        sys.exit(1)
+
+    utils.print_log("info", "Modo batch: %s imagens encontradas, concorrência = %s.", len(image_paths), args.concurrency)
+    utils.print_log("info", "Diretório de saída para resultados: %s", args.output_dir)
+
+    image_hashes = {}
+    if args.sink == "jsonl":
+        sink = sinks.JsonlSink(args.output_dir, compression=None if args.compression == "none" else args.compression)
+        # Hash de conteúdo de cada imagem: vai no registro e permite retomar após um crash
+        with ThreadPoolExecutor(max_workers=max(4, args.concurrency)) as pool:
+            image_hashes = dict(zip(image_paths, pool.map(cache.file_sha256, image_paths)))
+        if args.resume:
+            already_done = sinks.recorded_hashes(args.output_dir)
+            pending_paths = [path for path in image_paths if image_hashes[path] not in already_done]
+            utils.print_log("info", "Retomada: %s imagens já registradas serão puladas.", len(image_paths) - len(pending_paths))
+            image_paths = pending_paths
+    else:
+        sink = sinks.JsonFileSink(args.output_dir)
+
+    def _on_result(image_path: str, analysis_result_wrapper: dict, elapsed: float):
+        output_data_cleaned = build_output_data(Path(image_path), analysis_result_wrapper)
+        if image_path in image_hashes:
+            output_data_cleaned["image_path"] = image_path
+            output_data_cleaned["image_sha256"] = image_hashes[image_path]
+        save_started_ns = time.perf_counter_ns()
+        sink.write(output_data_cleaned, image_path)
+        metrics.observe("save_json_result", time.perf_counter_ns() - save_started_ns)
+        if not output_data_cleaned["status"].startswith("sucesso"):
+            utils.print_log("error", "Falha em %s: %s", image_path, output_data_cleaned.get('error_message', 'erro desconhecido'))
+
+    # Pré-passo de admissão: arquivos recusados pelo cabeçalho não ocupam um worker
+    admit = admission.check_result if config.get_settings().admission_enabled else None
+    if admit is not None: # As imagens que chegam aos workers já foram admitidas: a sessão não repete a checagem
+        for session in analysis_sessions(args):
+            session.admission_checks = False
+    try:
+        if args.pack:
+            worker = functools.partial(analysis.analyze_images_packed, use_cache=not args.no_cache,
+                                       refresh_cache=args.refresh, backend=args.backend_instance)
+            stats = batch.run_packed_batch(image_paths, worker, group_size=config.get_settings().pack_max_images,
+                                           concurrency=args.concurrency, on_result=_on_result, admit=admit)
+        else:
+            if args.route:
+                worker = functools.partial(args.router.analyze, use_cache=not args.no_cache, refresh_cache=args.refresh)
+            else:
+                worker = functools.partial(analysis.analyze_image, use_cache=not args.no_cache, refresh_cache=args.refresh,
+                                           backend=args.backend_instance)
+            stats = batch.run_batch(image_paths, worker, concurrency=args.concurrency, on_result=_on_result, admit=admit)
+    finally:
+        sink.close()
+    summary = stats.summary()
+    latency = summary["latency_s"]
+
+    utils.print_log("system", "--- Resumo do Batch ---")
+    utils.print_log("info", "Imagens processadas: %s (sucesso: %s, erro: %s)",
+                    summary['total_images'], summary['successes'], summary['errors'])
+    utils.print_log("info", "Tempo total: %s s | Throughput: %s imagens/s",
+                    summary['wall_time_s'], summary['throughput_images_per_s'])
+    utils.print_log("info", "Latência (s): média=%s p50=%s p95=%s p99=%s máx=%s",
+                    latency['mean'], latency['p50'], latency['p95'], latency['p99'], latency['max'])
+    if summary["upload_bytes_before"]:
+        utils.print_log("info", "Upload: %s -> %s bytes após pré-processamento",
+                        summary['upload_bytes_before'], summary['upload_bytes_after'])
+    for error_message, count in sorted(summary["error_counts"].items(), key=lambda kv: -kv[1]):
+        utils.print_log("warn", "  %sx %s", count, error_message)
+    if summary["rejection_counts"]:
+        utils.print_log("warn", "Recusas na admissão por motivo: %s", summary["rejection_counts"])
+    limiter = analysis.get_default_session().limiter
+    if limiter is not None and args.backend_instance.rate_limited:
+        limiter_stats = limiter.stats()
+        utils.print_log("info", "Limitador: concorrência final=%s 429=%s retentativas=%s desistências=%s",
+                        limiter_stats['concurrency_limit'], limiter_stats['throttled'], limiter_stats['retries'],
+                        limiter_stats['gave_up'])
+    if summary["errors"]:
+        sys.exit(2)
+
+def export_metrics(args):
+    """Exporta os histogramas por estágio (texto Prometheus e resumo JSON) ao final da execução."""
+    registry = metrics.get_registry()
+    prom_path = args.metrics_prom or os.path.join(args.output_dir, "metrics.prom")
+    json_path = args.metrics_json or os.path.join(args.output_dir, "metrics_summary.json")
+    registry.write_prometheus(prom_path)
+    registry.write_json(json_path)
+    utils.print_log("info", "Métricas por estágio exportadas em: %s e %s", prom_path, json_path)
+    for stage, stage_summary in registry.summary().items():
+        utils.print_log("info", "  %s: n=%s média=%s ms p95=%s ms p99=%s ms",
+                        stage, stage_summary['count'], stage_summary['mean_ms'], stage_summary['p95_ms'], stage_summary['p99_ms'])
+
+def log_cache_stats():
+    cache_stats = cache.get_default_cache().stats()
+    utils.print_log("info", "Cache: hits=%s misses=%s taxa de acerto=%s entradas=%s",
+                    cache_stats['hits'], cache_stats['misses'], cache_stats['hit_rate'], cache_stats['entries'])
+
+def log_routing_stats(router: routing.TieredRouter):
+    """Taxa de escalada e latência por nível do roteamento."""
+    routing_stats = router.stats()
+    utils.print_log("info", "Roteamento: %s de %s imagens escaladas (taxa=%s, motivos=%s, escaladas sem proveito=%s)",
+                    routing_stats['escalated'], routing_stats['requests'], routing_stats['escalation_rate'],
+                    routing_stats['escalation_reasons'], routing_stats['escalation_failed'])
+    for name, tier_stats in routing_stats["tiers"].items():
+        utils.print_log("info", "  %s (%s): chamadas=%s p50=%s s p95=%s s",
+                        name, tier_stats['model'], tier_stats['calls'], tier_stats['latency_s']['p50'],
+                        tier_stats['latency_s']['p95'])
+
+def analysis_sessions(args) -> list[analysis.AnalyzerSession]:
+    """Sessões usadas nas análises: a sessão padrão e, com --route, as dos níveis do roteamento."""
+    if args.route:
+        return [tier.session for tier in args.router.tiers]
+    return [analysis.get_default_session()]
+
+def log_hedging_stats(args):
+    """Duplicatas enviadas e vencidas por sessão (a sessão padrão e, com --route, a do modelo de escalada)."""
+    for session in analysis_sessions(args):
+        if session.hedger is None:
+            continue
+        hedge_stats = session.hedger.stats()
+        utils.print_log("info", "Hedging (%s): %s duplicatas em %s chamadas (taxa=%s, vencidas pela duplicata=%s, "
+                                "negadas pelo orçamento=%s, pelo limitador=%s, limiar=%s s)",
+                        session.model_name, hedge_stats['hedged'], hedge_stats['requests'], hedge_stats['hedge_rate'],
+                        hedge_stats['hedge_wins'], hedge_stats['budget_denied'], hedge_stats['limiter_denied'],
+                        hedge_stats['threshold_s'])
+
+def _log_options_parser() -> argparse.ArgumentParser:
+    """Opções de log, lidas antes do restante para valerem desde a primeira mensagem."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--log-level", dest="log_level", type=str, choices=["debug", "info", "warn", "error", "fatal"],
+                        default=None, help="Nível mínimo de log (padrão: NUTRISNAP_LOG_LEVEL ou info).")
+    parser.add_argument("--log-json", dest="log_json", action="store_true",
+                        help="Emite os logs como JSON, um objeto por linha (equivale a NUTRISNAP_LOG_FORMAT=json).")
+    return parser
+
+def main():
+    log_parser = _log_options_parser()
+    log_options, _ = log_parser.parse_known_args()
+    if log_options.log_level or log_options.log_json:
+        logs.configure(level=log_options.log_level, json_format=True if log_options.log_json else None)
+
+    utils.print_log("system", "------------------------------------")
+    utils.print_log("system", "🥗 NutriSnap AI - Análise de Imagem 🥗")
+    utils.print_log("system", "------------------------------------")
+    utils.print_log("info", "Timestamp da execução: %s", datetime.now().isoformat())
+    utils.print_log("info", "Diretório raiz do projeto inferido: %s", PROJECT_ROOT)
+
+    settings = config.get_settings()
+    parser = argparse.ArgumentParser(description="NutriSnap AI: Analisa imagens de alimentos para estimativa de calorias.",
+                                     parents=[log_parser])
+    input_group = parser.add_mutually_exclusive_group(required=True)
+    input_group.add_argument("--image_path", type=str,
+                        help="Caminho para o arquivo de imagem de entrada (relativo ou absoluto).")
+    input_group.add_argument("--batch", type=str, nargs="+", metavar="ENTRADA",
+                        help="Modo batch: diretórios, globs (ex: 'data/input_images/**') ou listas '@arquivo.txt'.")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Número máximo de análises simultâneas no modo batch (padrão: 4).")
+    parser.add_argument("--sink", type=str, choices=["json", "jsonl"], default="json",
+                        help="Formato de saída do batch: 'json' (um arquivo por imagem, padrão) ou 'jsonl' (arquivos JSONL rotativos).")
+    parser.add_argument("--compression", type=str, choices=["none", "gzip", "zstd"], default="none",
+                        help="Compressão dos arquivos JSONL (zstd requer o pacote 'zstandard').")
+    parser.add_argument("--resume", action="store_true",
+                        help="Com --sink jsonl: pula imagens (por hash de conteúdo) já registradas com sucesso no diretório de saída.")
+    parser.add_argument("--output_dir", type=str, default=str(DEFAULT_RESULTS_DIR),
+                        help=f"Diretório para salvar os resultados da análise (padrão: {DEFAULT_RESULTS_DIR}).")
+    parser.add_argument("--mock", action="store_true",
+                        help="Executa em modo MOCK sem chamadas reais à API (para teste). Equivale a --backend mock.")
+    parser.add_argument("--backend", type=str, choices=backends.BACKEND_NAMES, default=settings.backend,
+                        help=f"Backend de geração: gemini (API real), mock, replay (respostas gravadas) ou http (stub local). Padrão: {settings.backend}.")
+    parser.add_argument("--record", action="store_true", default=settings.record_responses,
+                        help="Com --backend gemini ou http: grava as respostas em --replay-dir para uso posterior com --backend replay.")
+    parser.add_argument("--replay-dir", dest="replay_dir", type=str, default=settings.replay_dir,
+                        help=f"Diretório das respostas gravadas (padrão: {settings.replay_dir}).")
+    parser.add_argument("--http-url", dest="http_url", type=str, default=settings.http_stub_url,
+                        help=f"URL do stub HTTP local para --backend http (padrão: {settings.http_stub_url}).")
+    parser.add_argument("--pack", action="store_true",
+                        help="Modo batch: envia várias imagens por requisição (até NUTRISNAP_PACK_MAX_IMAGES imagens e NUTRISNAP_PACK_MAX_BYTES bytes).")
+    parser.add_argument("--stream", action="store_true",
+                        help="Modo de imagem única: pede a resposta em streaming e mostra cada item identificado assim que chega.")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Liga a instrumentação de latência por estágio e exporta as métricas ao final.")
+    parser.add_argument("--metrics-prom", dest="metrics_prom", type=str, default=None,
+                        help="Arquivo de saída das métricas em texto Prometheus (padrão: <output_dir>/metrics.prom). Implica --metrics.")
+    parser.add_argument("--metrics-json", dest="metrics_json", type=str, default=None,
+                        help="Arquivo de saída do resumo JSON das métricas (padrão: <output_dir>/metrics_summary.json). Implica --metrics.")
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true",
+                        help="Não consulta nem grava o cache persistente de resultados.")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Ignora resultados em cache, refaz a análise e sobrescreve a entrada no cache.")
+    parser.add_argument("--compact", action="store_true", default=settings.prompt_mode == "compact",
+                        help="Modo compacto: o modelo só informa itens e gramas e as calorias vêm da tabela nutricional local "
+                             "(equivale a NUTRISNAP_PROMPT_MODE=compact). Com --stream, os itens são mostrados ao final.")
+    parser.add_argument("--no-admission", dest="no_admission", action="store_true",
+                        help="Desliga a admissão pelo cabeçalho (formato, dimensões, quadros e tamanho) antes da decodificação "
+                             "(equivale a NUTRISNAP_ADMISSION=0).")
+    parser.add_argument("--route", action="store_true", default=settings.routing_enabled,
+                        help=f"Roteamento por níveis: analisa com {config.MODEL_NAME} e reenvia a NUTRISNAP_ESCALATION_MODEL "
+                             f"({settings.routing_escalation_model}) quando há muitos itens de confiança Baixo, calorias nulas "
+                             "ou falha de parsing (equivale a NUTRISNAP_ROUTING=1). Incompatível com --pack e --stream.")
+    parser.add_argument("--hedge", action="store_true", default=settings.hedge_enabled,
+                        help=f"Envia uma requisição duplicada quando a chamada ao modelo passa do p{settings.hedge_percentile:g} "
+                             f"da latência recente, limitado a {settings.hedge_max_fraction:.0%} das requisições "
+                             "(equivale a NUTRISNAP_HEDGE=1). Não se aplica a --pack nem a --stream.")
+    parser.add_argument("--analytics", action="store_true",
+                        help="Ao final, ingere os resultados de --output_dir no armazenamento colunar de relatórios.")
+
+    args = parser.parse_args()
+    if args.resume and args.sink != "jsonl":
+        parser.error("--resume requer --sink jsonl.")
+    if args.route and (args.pack or args.stream):
+        parser.error("--route não pode ser usado com --pack nem com --stream.")
+
+    if args.metrics or args.metrics_prom or args.metrics_json:
+        metrics.set_enabled(True)
+
+    if args.mock:
+        args.backend = "mock"
+        utils.print_log("info", "**** MODO MOCK ATIVADO VIA LINHA DE COMANDO ****")
+    if args.compact and settings.prompt_mode != "compact": # Antes da criação da sessão padrão
+        config.set_settings(dataclasses.replace(config.get_settings(), prompt_mode="compact"))
+        utils.print_log("info", "Modo compacto: calorias calculadas pela tabela nutricional local.")
+    if args.no_admission and settings.admission_enabled:
+        config.set_settings(dataclasses.replace(config.get_settings(), admission_enabled=False))
+    if args.hedge and not settings.hedge_enabled:
+        config.set_settings(dataclasses.replace(config.get_settings(), hedge_enabled=True))
+    # O backend é passado a cada chamada; a sessão padrão continua compartilhada (limitador, modelo)
+    args.backend_instance = backends.create_backend(args.backend, settings.gemini_api_key, config.MODEL_NAME,
+                                                    replay_dir=args.replay_dir, record=args.record, http_url=args.http_url)
+    if args.route: # Um backend por nível: o backend gemini é criado para um modelo específico
+        args.router = routing.TieredRouter.from_settings(lambda model_name: backends.create_backend(
+            args.backend, settings.gemini_api_key, model_name, replay_dir=args.replay_dir, record=args.record,
+            http_url=args.http_url))
+    utils.print_log("info", "Backend de geração: %s%s",
+                    args.backend, ' (gravando respostas)' if args.record and args.backend in ('gemini', 'http') else '')
+
+    # Checagem da API Key é feita dentro da análise quando o backend a exige
+
+    try:
+        if args.batch:
+            run_batch_mode(args)
+        else:
+            run_single(args)
+    finally:
+        if not args.no_cache and args.backend_instance.uses_cache:
+            log_cache_stats()
+        if metrics.is_enabled():
+            export_metrics(args)
+        if args.compact and "nutrisnap_ai1.nutrition" in sys.modules: # Só se alguma resposta foi calculada
+            from nutrisnap_ai1 import nutrition
+            utils.print_log("info", "Consultas à tabela nutricional: %s", nutrition.get_default_table().stats())
+        if args.route:
+            log_routing_stats(args.router)
+        if args.hedge:
+            log_hedging_stats(args)
+        if args.analytics:
+            from nutrisnap_ai1 import analytics # numpy só é carregado quando a ingestão é pedida
+            analytics.get_default_store().ingest(args.output_dir)
 
     utils.print_log("system", "------------------------------------")
     utils.print_log("system", "✨ Análise Finalizada ✨")
     utils.print_log("system", "------------------------------------")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
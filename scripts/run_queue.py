@@ -0,0 +1,169 @@
+# scripts/run_queue.py
+"""
+Fila de jobs durável para reprocessamentos grandes (nutrisnap_ai1/jobqueue.py).
+
+Uso:
+  python scripts/run_queue.py enqueue 'data/backfill/**'            (uma vez; repetir não duplica jobs)
+  python scripts/run_queue.py work --concurrency 8 [--mock]          (quantos processos/hosts quiser)
+  python scripts/run_queue.py status [--watch 10]
+  python scripts/run_queue.py export --output_dir data/results [--sink jsonl]
+  python scripts/run_queue.py requeue-failed
+"""
+import argparse
+import dataclasses
+import functools
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from nutrisnap_ai1 import analysis, backends, batch, cache, config, jobqueue, logs, sinks, utils
+
+from run_analysis import DEFAULT_RESULTS_DIR, build_output_data
+
+def _format_eta(eta_s: float | None) -> str:
+    if eta_s is None:
+        return "?"
+    minutes, seconds = divmod(int(eta_s), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+def log_progress(queue: jobqueue.JobQueue):
+    progress = queue.progress()
+    utils.print_log("info", "Fila: %s concluídos, %s falhos, %s em andamento, %s pendentes de %s (%s%%) | %s jobs/s | "
+                            "ETA %s | workers ativos=%s sem heartbeat=%s",
+                    progress['done'], progress['failed'], progress['leased'], progress['pending'], progress['total'],
+                    progress['percent_done'], progress['jobs_per_s'], _format_eta(progress['eta_s']), progress['workers_active'],
+                    progress['workers_dead'])
+
+def cmd_enqueue(args, queue: jobqueue.JobQueue):
+    image_paths = batch.collect_image_paths(args.inputs)
+    if not image_paths:
+        utils.print_log("fatal", "Nenhuma imagem encontrada para as entradas: %s", args.inputs)
+        sys.exit(1)
+    added = queue.enqueue(image_paths)
+    utils.print_log("success", "%s jobs novos enfileirados (%s já estavam na fila).", added, len(image_paths) - added)
+    log_progress(queue)
+
+def cmd_work(args, queue: jobqueue.JobQueue):
+    settings = config.get_settings()
+    if args.mock:
+        args.backend = "mock"
+    if args.compact and settings.prompt_mode != "compact": # Antes da criação da sessão padrão
+        config.set_settings(dataclasses.replace(settings, prompt_mode="compact"))
+    if args.backend == "mock" and args.mock_latency is not None:
+        backend = backends.MockBackend(args.mock_latency)
+    else:
+        backend = backends.create_backend(args.backend, settings.gemini_api_key, config.MODEL_NAME,
+                                          replay_dir=args.replay_dir, http_url=args.http_url)
+    analyze = functools.partial(analysis.analyze_image, use_cache=not args.no_cache, backend=backend)
+    worker = jobqueue.QueueWorker(queue, analyze, worker_id=args.worker_id, concurrency=args.concurrency,
+                                  exit_when_idle=not args.wait)
+    utils.print_log("info", "Backend de geração: %s | visibilidade = %g s", args.backend, queue.visibility_timeout_s)
+    counters = worker.run()
+    utils.print_log("info", "Worker %s: %s", worker.worker_id, counters)
+    log_progress(queue)
+
+def cmd_status(args, queue: jobqueue.JobQueue):
+    while True:
+        if args.json:
+            print(json.dumps(queue.progress(), ensure_ascii=False))
+        else:
+            log_progress(queue)
+        if not args.watch or queue.is_drained():
+            return
+        time.sleep(args.watch)
+
+def cmd_export(args, queue: jobqueue.JobQueue):
+    """Grava os resultados da fila no formato do run_analysis.py (o horário é o da conclusão do job)."""
+    if args.sink == "jsonl":
+        sink = sinks.JsonlSink(args.output_dir, compression=None if args.compression == "none" else args.compression)
+    else:
+        sink = sinks.JsonFileSink(args.output_dir)
+    exported = 0
+    try:
+        for image_path, state, result, error, finished_at in queue.results():
+            result = result or {"status": "erro", "error": error}
+            output_data_cleaned = build_output_data(Path(image_path), result)
+            if finished_at is not None:
+                output_data_cleaned["analysis_timestamp"] = datetime.fromtimestamp(finished_at).isoformat()
+            if args.sink == "jsonl":
+                output_data_cleaned["image_path"] = image_path
+                try:
+                    output_data_cleaned["image_sha256"] = cache.file_sha256(image_path)
+                except OSError:
+                    pass
+            sink.write(output_data_cleaned, image_path)
+            exported += 1
+    finally:
+        sink.close()
+    utils.print_log("success", "%s resultados exportados para %s.", exported, args.output_dir)
+
+def cmd_requeue_failed(args, queue: jobqueue.JobQueue):
+    utils.print_log("info", "%s jobs falhos voltaram para a fila.", queue.requeue_failed())
+
+def main():
+    settings = config.get_settings()
+    parser = argparse.ArgumentParser(description="NutriSnap AI: fila de jobs durável para reprocessamentos com vários workers.")
+    parser.add_argument("--queue", type=str, default=settings.queue_path,
+                        help=f"Arquivo SQLite da fila, compartilhado pelos workers (padrão: {settings.queue_path}).")
+    parser.add_argument("--visibility", type=float, default=settings.queue_visibility_timeout_s,
+                        help="Segundos sem heartbeat até o job voltar para a fila (NUTRISNAP_QUEUE_VISIBILITY_S).")
+    parser.add_argument("--max-attempts", dest="max_attempts", type=int, default=settings.queue_max_attempts,
+                        help="Tentativas por job antes de marcá-lo como falho (NUTRISNAP_QUEUE_MAX_ATTEMPTS).")
+    parser.add_argument("--log-level", dest="log_level", type=str, choices=["debug", "info", "warn", "error", "fatal"],
+                        default=None, help="Nível mínimo de log (padrão: NUTRISNAP_LOG_LEVEL ou info).")
+    parser.add_argument("--log-json", dest="log_json", action="store_true", help="Emite os logs como JSON.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = commands.add_parser("enqueue", help="Enfileira imagens (diretórios, globs ou listas '@arquivo.txt').")
+    enqueue_parser.add_argument("inputs", nargs="+", metavar="ENTRADA")
+    enqueue_parser.set_defaults(handler=cmd_enqueue)
+
+    work_parser = commands.add_parser("work", help="Processa jobs até a fila esvaziar.")
+    work_parser.add_argument("--concurrency", type=int, default=4, help="Jobs simultâneos neste processo (padrão: 4).")
+    work_parser.add_argument("--worker-id", dest="worker_id", type=str, default=None,
+                             help="Identificador do worker (padrão: host:pid:sufixo).")
+    work_parser.add_argument("--wait", action="store_true", help="Não termina quando a fila esvazia; espera novos jobs.")
+    work_parser.add_argument("--mock", action="store_true", help="Usa o backend mock (sem chamadas à API).")
+    work_parser.add_argument("--mock-latency", dest="mock_latency", type=float, default=None,
+                             help=f"Latência simulada do backend mock em segundos (padrão: {backends.MOCK_LATENCY_S}).")
+    work_parser.add_argument("--backend", type=str, choices=backends.BACKEND_NAMES, default=settings.backend)
+    work_parser.add_argument("--replay-dir", dest="replay_dir", type=str, default=settings.replay_dir)
+    work_parser.add_argument("--http-url", dest="http_url", type=str, default=settings.http_stub_url)
+    work_parser.add_argument("--compact", action="store_true", default=settings.prompt_mode == "compact",
+                             help="Modo compacto: calorias pela tabela nutricional local (NUTRISNAP_PROMPT_MODE=compact).")
+    work_parser.add_argument("--no-cache", dest="no_cache", action="store_true",
+                             help="Não consulta nem grava o cache persistente de resultados.")
+    work_parser.set_defaults(handler=cmd_work)
+
+    status_parser = commands.add_parser("status", help="Progresso, vazão e ETA.")
+    status_parser.add_argument("--watch", type=float, default=0, help="Repete a cada N segundos até a fila esvaziar.")
+    status_parser.add_argument("--json", action="store_true", help="Imprime o progresso como JSON.")
+    status_parser.set_defaults(handler=cmd_status)
+
+    export_parser = commands.add_parser("export", help="Grava os resultados concluídos e falhos no diretório de saída.")
+    export_parser.add_argument("--output_dir", type=str, default=str(DEFAULT_RESULTS_DIR))
+    export_parser.add_argument("--sink", type=str, choices=["json", "jsonl"], default="json")
+    export_parser.add_argument("--compression", type=str, choices=["none", "gzip", "zstd"], default="none")
+    export_parser.set_defaults(handler=cmd_export)
+
+    requeue_parser = commands.add_parser("requeue-failed", help="Volta os jobs falhos para a fila com as tentativas zeradas.")
+    requeue_parser.set_defaults(handler=cmd_requeue_failed)
+
+    args = parser.parse_args()
+    if args.log_level or args.log_json:
+        logs.configure(level=args.log_level, json_format=True if args.log_json else None)
+
+    queue = jobqueue.JobQueue(args.queue, visibility_timeout_s=args.visibility, max_attempts=args.max_attempts)
+    try:
+        args.handler(args, queue)
+    finally:
+        queue.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# scripts/run_service.py
+"""
+Sobe o serviço HTTP de análise (nutrisnap_ai1/service.py).
+
+Uso: python scripts/run_service.py [--port 8080] [--mock] [--compact] [--concurrency 16] [--max-queue 64]
+     curl -F "image=@data/input_images/example_meal.jpg" http://127.0.0.1:8080/analyze
+"""
+import argparse
+import asyncio
+import dataclasses
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from nutrisnap_ai1 import analysis, backends, config, logs, metrics, service, utils
+
+def main():
+    settings = config.get_settings()
+    parser = argparse.ArgumentParser(description="NutriSnap AI: serviço HTTP de análise de imagens.")
+    parser.add_argument("--host", type=str, default=settings.service_host)
+    parser.add_argument("--port", type=int, default=settings.service_port)
+    parser.add_argument("--concurrency", type=int, default=settings.service_max_concurrency,
+                        help="Análises distintas executando ao mesmo tempo.")
+    parser.add_argument("--max-queue", dest="max_queue", type=int, default=settings.service_max_queue,
+                        help="Análises distintas aguardando; acima disso o serviço responde 503.")
+    parser.add_argument("--max-upload-mb", dest="max_upload_mb", type=float,
+                        default=settings.service_max_upload_bytes / (1024 * 1024), help="Tamanho máximo do upload (MB).")
+    parser.add_argument("--mock", action="store_true", help="Usa o backend mock (sem chamadas à API).")
+    parser.add_argument("--backend", type=str, choices=backends.BACKEND_NAMES, default=settings.backend)
+    parser.add_argument("--replay-dir", dest="replay_dir", type=str, default=settings.replay_dir)
+    parser.add_argument("--http-url", dest="http_url", type=str, default=settings.http_stub_url)
+    parser.add_argument("--compact", action="store_true", default=settings.prompt_mode == "compact",
+                        help="Modo compacto: calorias pela tabela nutricional local (NUTRISNAP_PROMPT_MODE=compact).")
+    parser.add_argument("--metrics", action="store_true", help="Inclui os histogramas por estágio em /metrics.")
+    parser.add_argument("--log-level", dest="log_level", type=str, choices=["debug", "info", "warn", "error", "fatal"],
+                        default=None, help="Nível mínimo de log (padrão: NUTRISNAP_LOG_LEVEL ou info).")
+    parser.add_argument("--log-json", dest="log_json", action="store_true", help="Emite os logs como JSON.")
+    args = parser.parse_args()
+
+    if args.log_level or args.log_json:
+        logs.configure(level=args.log_level, json_format=True if args.log_json else None)
+    if args.metrics:
+        metrics.set_enabled(True)
+    if args.mock:
+        args.backend = "mock"
+    if args.compact and settings.prompt_mode != "compact": # Antes da criação da sessão padrão
+        config.set_settings(dataclasses.replace(settings, prompt_mode="compact"))
+
+    backend = backends.create_backend(args.backend, settings.gemini_api_key, config.MODEL_NAME,
+                                      replay_dir=args.replay_dir, http_url=args.http_url)
+    analysis_service = service.AnalysisService(analysis.get_default_session(), backend=backend,
+                                               max_concurrency=args.concurrency, max_queue=args.max_queue,
+                                               max_upload_bytes=int(args.max_upload_mb * 1024 * 1024))
+    utils.print_log("info", "Backend de geração: %s | concorrência = %s | fila = %s",
+                    args.backend, analysis_service.max_concurrency, analysis_service.max_queue)
+    try:
+        asyncio.run(service.serve(analysis_service, args.host, args.port))
+    except KeyboardInterrupt:
+        utils.print_log("system", "Serviço encerrado.")
+
+if __name__ == "__main__":
+    main()
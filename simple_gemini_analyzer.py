@@ -1,5 +1,5 @@
 # simple_gemini_analyzer.py
-pip install google-generativeai python-dotenv Pillow
+# Dependências: pip install google-generativeai python-dotenv Pillow
 import os
 import sys
 import argparse
@@ -8,7 +8,8 @@ from pathlib import Path
 from dotenv import load_dotenv
 from PIL import Image
 import google.generativeai as genai
-from datetime import datetime
+
+from nutrisnap_ai1 import logs # Mesma camada de log do pacote (nível, JSON e escrita em background)
 
 # --- Configuration and Constants ---
 load_dotenv() # Carrega variáveis do .env se presente no CWD
@@ -46,10 +47,23 @@ Sua resposta DEVE ser exclusivamente um objeto JSON. Não inclua nenhum texto fo
 """
 
 # --- Helper Functions ---
-def print_log_simple(level: str, message: str):
-    """Helper function for printing formatted logs (standalone)."""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"{timestamp} [{level.upper()}] {message}")
+def print_log_simple(level: str, message: str, *args):
+    """Helper function for printing formatted logs (standalone). Args are formatted lazily ("%s")."""
+    logs.print_log(level, message, *args)
+
+# Modelo configurado uma única vez por processo: genai.configure descarta os clientes
+# (e conexões) existentes, então não deve ser chamado a cada análise.
+_cached_model = None
+
+def get_model_standalone():
+    """Retorna o modelo Gemini, configurando o cliente apenas na primeira chamada."""
+    global _cached_model
+    if _cached_model is None:
+        genai.configure(api_key=GEMINI_API_KEY)
+        print_log_simple("info", f"Configurando o modelo Gemini: {MODEL_NAME}...")
+        _cached_model = genai.GenerativeModel(MODEL_NAME)
+        print_log_simple("info", "Modelo configurado.")
+    return _cached_model
 
 # --- Core Logic ---
 def analyze_image_standalone(image_path_obj: Path, prompt_text: str) -> dict:
@@ -62,7 +76,7 @@ def analyze_image_standalone(image_path_obj: Path, prompt_text: str) -> dict:
     print_log_simple("info", "Chave da API Gemini carregada.")
     
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
+        model = get_model_standalone()
     except Exception as e_conf:
         print_log_simple("fatal", f"Erro ao configurar a API Gemini: {e_conf}")
         return {"status": "erro", "error": "Falha na configuração da API Gemini", "details": str(e_conf)}
@@ -80,10 +94,6 @@ def analyze_image_standalone(image_path_obj: Path, prompt_text: str) -> dict:
         return {"status": "erro", "error": "Erro ao carregar imagem", "details": str(e_img)}
 
     try:
-        print_log_simple("info", f"Configurando o modelo Gemini: {MODEL_NAME}...")
-        model = genai.GenerativeModel(MODEL_NAME)
-        print_log_simple("info", "Modelo configurado.")
-
         print_log_simple("info", "Enviando imagem e prompt para o modelo Gemini...")
         response = model.generate_content([prompt_text, img])
         print_log_simple("success", "Resposta recebida do modelo Gemini.")
@@ -114,7 +124,7 @@ def analyze_image_standalone(image_path_obj: Path, prompt_text: str) -> dict:
             return {"status": "erro", "error": "Resposta de texto vazia", "details": "O modelo Gemini retornou um texto vazio."}
 
         print_log_simple("info", "Texto da resposta obtido. Tentando parsear como JSON...")
-        print_log_simple("debug", f"Texto bruto da resposta (primeiros 500 chars):\n{response_text[:500]}{'...' if len(response_text)>500 else ''}")
+        print_log_simple("debug", "Texto bruto da resposta (primeiros 500 chars):\n%s%s", response_text[:500], "..." if len(response_text) > 500 else "")
         
         cleaned_text = response_text.strip()
         if cleaned_text.startswith("```json"):
@@ -140,7 +150,7 @@ def analyze_image_standalone(image_path_obj: Path, prompt_text: str) -> dict:
     except Exception as e_api:
         print_log_simple("error", f"Ocorreu um erro inesperado durante a comunicação com a API Gemini ou processamento: {e_api}")
         import traceback
-        print_log_simple("debug", f"Traceback completo: {traceback.format_exc()}")
+        print_log_simple("debug", "Traceback completo: %s", logs.lazy(traceback.format_exc))
         return {"status": "erro", "error": "Erro na API Gemini ou processamento", "details": str(e_api)}
 
 # --- Main Execution ---
@@ -159,7 +169,7 @@ if __name__ == "__main__":
     print_log_simple("info", f"Caminho da imagem recebido: {image_file_to_analyze}")
     if custom_prompt_text != SIMPLE_PROMPT:
         print_log_simple("info", "Usando prompt personalizado.")
-        print_log_simple("debug", f"Prompt Personalizado (preview):\n{custom_prompt_text[:200]}...")
+        print_log_simple("debug", "Prompt Personalizado (preview):\n%s...", custom_prompt_text[:200])
     else:
         print_log_simple("info", "Usando prompt padrão.")
 
@@ -168,7 +178,8 @@ if __name__ == "__main__":
     final_result = analyze_image_standalone(image_file_to_analyze, custom_prompt_text)
 
     print_log_simple("system", "--- Resultado Final da Análise (Standalone) ---")
-    # Imprime o resultado de forma legível
+    # Imprime o resultado de forma legível (depois dos logs ainda na fila de escrita)
+    logs.flush()
     print(json.dumps(final_result, indent=2, ensure_ascii=False))
     
     print_log_simple("system", "Script standalone finalizado.")
\ No newline at end of file
@@ -0,0 +1,33 @@
+# tests/conftest.py
+import dataclasses
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from nutrisnap_ai1 import cache, config, logs
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    """Configuração isolada: cache, índice pHash e fila em tmp_path, sem .env, logs silenciados."""
+    isolated = dataclasses.replace(
+        config.load_settings(use_dotenv=False),
+        cache_path=str(tmp_path / "cache" / "results.sqlite"),
+        phash_index_path=str(tmp_path / "cache" / "phash_index"),
+        queue_path=str(tmp_path / "queue" / "jobs.sqlite"),
+        analytics_dir=str(tmp_path / "analytics"),
+        service_upload_dir=str(tmp_path / "uploads"),
+        rate_limit_enabled=False,
+        hedge_enabled=False,
+    )
+    previous = config.get_settings()
+    config.set_settings(isolated)
+    monkeypatch.setattr(cache, "_default_cache", None)
+    if "nutrisnap_ai1.phash" in sys.modules:
+        monkeypatch.setattr(sys.modules["nutrisnap_ai1.phash"], "_default_indexes", {})
+    with logs.suppressed():
+        yield isolated
+    config.set_settings(previous)
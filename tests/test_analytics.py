@@ -0,0 +1,62 @@
+# tests/test_analytics.py
+import json
+import os
+
+from nutrisnap_ai1 import analytics, sinks
+
+def _write_result(results_dir, name: str, calories: int, timestamp: str = "2026-01-10T12:00:00", extra_items: int = 0):
+    items = [{"item_name": "Arroz", "estimated_calories": calories, "confidence": "Alto", "notes": ""}]
+    items += [{"item_name": f"Extra {index}", "estimated_calories": 10, "confidence": "Baixo", "notes": ""}
+              for index in range(extra_items)]
+    path = os.path.join(results_dir, f"{name}_analysis.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"image_file": f"{name}.jpg", "analysis_timestamp": timestamp, "status": "sucesso",
+                   "data": {"total_calories": calories, "identified_items": items}}, f)
+    return path
+
+def _arroz(store: analytics.AnalyticsStore) -> dict:
+    return next(row for row in store.by_item() if row["item"] == "arroz")
+
+def test_rewritten_result_file_replaces_previous_rows(settings, tmp_path):
+    results_dir = tmp_path / "results"
+    results_dir.mkdir()
+    path = _write_result(results_dir, "prato", 100, extra_items=2)
+    _write_result(results_dir, "outro", 50)
+    store = analytics.AnalyticsStore(str(tmp_path / "store"))
+    assert store.ingest(str(results_dir)) == 4
+
+    _write_result(results_dir, "prato", 200, timestamp="2026-01-11T12:00:00")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+    store.ingest(str(results_dir))
+
+    assert _arroz(store)["count"] == 2
+    assert _arroz(store)["calories_total"] == 250
+    assert store.summary()["rows"] == 2
+    assert store.summary()["superseded_rows"] == 3
+    reopened = analytics.AnalyticsStore(str(tmp_path / "store"))
+    assert _arroz(reopened)["calories_total"] == 250
+    assert reopened.ingest(str(results_dir)) == 0
+
+def test_unchanged_files_are_not_reingested(settings, tmp_path):
+    results_dir = tmp_path / "results"
+    results_dir.mkdir()
+    _write_result(results_dir, "prato", 100)
+    store = analytics.AnalyticsStore(str(tmp_path / "store"))
+    store.ingest(str(results_dir))
+
+    assert store.ingest(str(results_dir)) == 0
+    assert _arroz(store)["count"] == 1
+
+def test_same_image_twice_in_jsonl_keeps_latest(settings, tmp_path):
+    results_dir = tmp_path / "results"
+    sink = sinks.JsonlSink(str(results_dir))
+    for calories in (100, 300):
+        sink.write({"image_file": "prato.jpg", "image_sha256": "ab" * 32, "analysis_timestamp": "2026-01-10T12:00:00",
+                    "status": "sucesso", "data": {"identified_items": [
+                        {"item_name": "Arroz", "estimated_calories": calories, "confidence": "Alto"}]}}, "prato.jpg")
+    sink.close()
+    store = analytics.AnalyticsStore(str(tmp_path / "store"))
+    store.ingest(str(results_dir))
+
+    assert _arroz(store)["count"] == 1
+    assert _arroz(store)["calories_total"] == 300
@@ -0,0 +1,32 @@
+# tests/test_import.py
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ("google.generativeai", "numpy", "PIL", "dotenv")
+
+def _python(code: str) -> subprocess.CompletedProcess:
+    """Interpretador novo, sem .pyc nem avisos forçados pelo ambiente."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.pop("PYTHONWARNINGS", None)
+    return subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, env=env, capture_output=True, text=True,
+                          check=False, timeout=60)
+
+@pytest.mark.parametrize("module", ["nutrisnap_ai1", "nutrisnap_ai1.analysis", "nutrisnap_ai1.batch"])
+def test_import_is_silent(module):
+    result = _python(f"import {module}")
+
+    assert result.returncode == 0
+    assert result.stdout == ""
+    assert result.stderr == ""
+
+def test_import_does_not_load_heavy_modules():
+    result = _python("import sys, nutrisnap_ai1.analysis; print(','.join(sorted(sys.modules)))")
+
+    loaded = result.stdout.strip().split(",")
+    assert [heavy for heavy in HEAVY_MODULES if any(name == heavy or name.startswith(heavy + ".") for name in loaded)] == []
@@ -0,0 +1,57 @@
+# tests/test_jobqueue.py
+import sqlite3
+
+from nutrisnap_ai1 import jobqueue
+
+def _flaky(fn, failures: int):
+    """Envolve `fn` para levantar "database is locked" nas primeiras `failures` chamadas."""
+    calls = {"count": 0}
+
+    def _wrapped(*args, **kwargs):
+        calls["count"] += 1
+        if calls["count"] <= failures:
+            raise sqlite3.OperationalError("database is locked")
+        return fn(*args, **kwargs)
+    return _wrapped
+
+def test_worker_survives_database_errors(settings, tmp_path, monkeypatch):
+    monkeypatch.setattr(jobqueue, "_DB_RETRY_BASE_S", 0.01)
+    queue = jobqueue.JobQueue(str(tmp_path / "jobs.sqlite"), visibility_timeout_s=30, max_attempts=1)
+    paths = [str(tmp_path / f"prato_{index}.jpg") for index in range(5)]
+    queue.enqueue(paths)
+    monkeypatch.setattr(queue, "lease", _flaky(queue.lease, 2))
+    monkeypatch.setattr(queue, "complete", _flaky(queue.complete, 1))
+    monkeypatch.setattr(queue, "fail", _flaky(queue.fail, 1))
+    analyze = lambda path: ({"status": "erro", "error": "Falha ao carregar imagem"} if path == paths[0]
+                            else {"status": "sucesso", "data": {"total_calories": 100}})
+
+    counters = jobqueue.QueueWorker(queue, analyze, concurrency=1, poll_interval_s=0.01).run()
+
+    progress = queue.progress()
+    assert counters["db_errors"] == 4
+    assert (counters["completed"], counters["failed"]) == (4, 1)
+    assert (progress["done"], progress["failed"], progress["pending"], progress["leased"]) == (4, 1, 0, 0)
+    queue.close()
+
+def test_unrecorded_job_is_left_to_expire(settings, tmp_path, monkeypatch):
+    monkeypatch.setattr(jobqueue, "_DB_RETRY_BASE_S", 0.0)
+    queue = jobqueue.JobQueue(str(tmp_path / "jobs.sqlite"), visibility_timeout_s=30)
+    queue.enqueue([str(tmp_path / "prato.jpg")])
+    monkeypatch.setattr(queue, "complete", _flaky(queue.complete, jobqueue._DB_RECORD_ATTEMPTS))
+    worker = jobqueue.QueueWorker(queue, lambda path: {"status": "sucesso", "data": {}}, concurrency=1,
+                                  poll_interval_s=0.01, exit_when_idle=False)
+    original_process = worker._process
+
+    def _process_once(lease):
+        try:
+            original_process(lease)
+        finally:
+            worker.stop()
+    worker._process = _process_once
+
+    counters = worker.run()
+
+    assert counters["db_errors"] == jobqueue._DB_RECORD_ATTEMPTS
+    assert counters["completed"] == 0
+    assert queue.progress()["leased"] == 1 # Volta para a fila quando a concessão expirar
+    queue.close()
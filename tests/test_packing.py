@@ -0,0 +1,88 @@
+# tests/test_packing.py
+import json
+import threading
+
+from google.api_core import exceptions as api_exceptions
+from PIL import Image
+
+from nutrisnap_ai1 import analysis, backends
+
+def _analysis(index: int | None = None) -> dict:
+    data = {"total_calories": 250, "identified_items": [{"item_name": "Arroz", "estimated_calories": 250,
+                                                         "confidence": "Alto", "notes": ""}],
+            "analysis_summary_notes": ""}
+    return data if index is None else {"image_index": index, **data}
+
+class PackBackend(backends.Backend):
+    """
+    Recusa pacotes acima de `max_images` pelo tamanho, responde `packed_text` aos pacotes com mais
+    de `max_parseable` imagens e uma resposta válida aos demais. `error` é levantado em todo pacote.
+    """
+    name = "pacotes"
+
+    def __init__(self, max_images: int = 8, packed_text: str | None = None, max_parseable: int = 1,
+                 error: Exception | None = None):
+        self.max_images = max_images
+        self.packed_text = packed_text
+        self.max_parseable = max_parseable
+        self.error = error
+        self.image_counts: list[int] = []
+        self._lock = threading.Lock()
+
+    def generate(self, request: backends.GenerationRequest) -> backends.TextResponse:
+        with self._lock:
+            self.image_counts.append(request.image_count)
+        if request.image_count > self.max_images:
+            raise api_exceptions.InvalidArgument("Request payload size exceeds the limit: 20971520 bytes.")
+        if request.image_count == 1:
+            return backends.TextResponse(json.dumps(_analysis()))
+        if self.error is not None:
+            raise self.error
+        if self.packed_text is not None and request.image_count > self.max_parseable:
+            return backends.TextResponse(self.packed_text)
+        return backends.TextResponse(json.dumps([_analysis(index) for index in range(1, request.image_count + 1)]))
+
+def _images(tmp_path, count: int) -> list[str]:
+    paths = []
+    for index in range(count):
+        path = str(tmp_path / f"prato_{index}.jpg")
+        Image.new("RGB", (32, 32), (index * 30, 90, 40)).save(path, format="JPEG")
+        paths.append(path)
+    return paths
+
+def _session() -> analysis.AnalyzerSession:
+    return analysis.AnalyzerSession(api_key="teste", limiter=False, preprocess_images=False, near_duplicates=False,
+                                    compact=False, admission_checks=False, hedger=False)
+
+def test_oversized_pack_is_split(settings, tmp_path):
+    backend = PackBackend(max_images=2)
+
+    results = _session().analyze_packed(_images(tmp_path, 4), use_cache=False, backend=backend)
+
+    assert [result["status"] for result in results] == ["sucesso"] * 4
+    assert backend.image_counts == [4, 2, 2]
+
+def test_unparseable_pack_is_split_and_resent(settings, tmp_path):
+    backend = PackBackend(packed_text="Desculpe, não consegui analisar as imagens.", max_parseable=2)
+
+    results = _session().analyze_packed(_images(tmp_path, 4), use_cache=False, backend=backend)
+
+    assert backend.image_counts == [4, 2, 2]
+    assert [result["status"] for result in results] == ["sucesso"] * 4
+    assert all(result["pack_size"] == 2 for result in results)
+
+def test_unparseable_pack_falls_back_to_single_requests(settings, tmp_path):
+    backend = PackBackend(packed_text="Desculpe, não consegui analisar as imagens.")
+
+    results = _session().analyze_packed(_images(tmp_path, 4), use_cache=False, backend=backend)
+
+    assert backend.image_counts == [4, 2, 1, 1, 2, 1, 1]
+    assert [result["status"] for result in results] == ["sucesso"] * 4
+
+def test_other_invalid_argument_is_not_split(settings, tmp_path):
+    backend = PackBackend(error=api_exceptions.InvalidArgument("Invalid JSON payload received. Unknown name \"schema\"."))
+
+    results = _session().analyze_packed(_images(tmp_path, 4), use_cache=False, backend=backend)
+
+    assert backend.image_counts == [4]
+    assert all(result["status"] == "erro" for result in results)
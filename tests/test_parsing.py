@@ -0,0 +1,68 @@
+# tests/test_parsing.py
+import threading
+
+from PIL import Image
+
+from nutrisnap_ai1 import analysis, backends, cache, parsing
+
+_TRUNCATED = ('{"total_calories": 900, "identified_items": [{"item_name": "Arroz", "estimated_calories": 200, '
+              '"confidence": "Alto", "notes": ""}, {"item_name": "Feijão", "estimated_calories": 150, '
+              '"confidence": "Alto", "notes": ""}, {"item_name": "Bife", "estimated_cal')
+
+def test_truncated_response_keeps_model_total():
+    parsed = parsing.parse_analysis(_TRUNCATED)
+
+    assert [item.item_name for item in parsed.identified_items] == ["Arroz", "Feijão"]
+    assert parsed.total_calories == 900
+    assert parsing.TRUNCATION_REPAIR in parsed.repairs
+    assert not any(repair.startswith("total_calories_corrigido") for repair in parsed.repairs)
+
+def test_truncated_response_without_total_has_no_total():
+    parsed = parsing.parse_analysis('{"identified_items": [{"item_name": "Arroz", "estimated_calories": 200}, {"item_')
+
+    assert parsed.total_calories is None
+    assert len(parsed.identified_items) == 1
+
+def test_complete_response_total_is_still_corrected():
+    parsed = parsing.parse_analysis('{"total_calories": 900, "identified_items": [{"item_name": "Arroz", '
+                                    '"estimated_calories": 200}], "analysis_summary_notes": ""}')
+
+    assert parsed.total_calories == 200
+    assert "total_calories_corrigido_900_para_200" in parsed.repairs
+
+def test_incremental_parser_emits_each_item_once():
+    parser = parsing.IncrementalItemParser()
+
+    emitted = [parser.feed(chunk) for chunk in ('{"identified_items":[{"item_name":"ovo"}]', ',"total_calories":80}',
+                                                ', "identified_items": [{"item_name": "pão"}]')]
+
+    assert [[item.item_name for item in items] for items in emitted] == [["ovo"], [], []]
+    assert parser.items_emitted == 1
+
+class TruncatingBackend(backends.Backend):
+    name = "truncado"
+    uses_cache = True
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, request: backends.GenerationRequest) -> backends.TextResponse:
+        with self._lock:
+            self.calls += 1
+        return backends.TextResponse(_TRUNCATED)
+
+def test_truncated_result_is_not_cached(settings, tmp_path):
+    image_path = str(tmp_path / "prato.jpg")
+    Image.effect_noise((64, 64), 64).convert("RGB").save(image_path, format="JPEG")
+    session = analysis.AnalyzerSession(api_key="teste", model_name="modelo", limiter=False, preprocess_images=False,
+                                       near_duplicates=True, compact=False, admission_checks=False, hedger=False)
+    backend = TruncatingBackend()
+
+    first = session.analyze(image_path, backend=backend)
+    second = session.analyze(image_path, backend=backend)
+
+    assert first["status"] == "sucesso" and first["data"]["total_calories"] == 900
+    assert backend.calls == 2
+    assert "cache_hit" not in second and "near_duplicate_hit" not in second
+    assert cache.get_default_cache().stats()["entries"] == 0
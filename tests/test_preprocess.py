@@ -0,0 +1,32 @@
+# tests/test_preprocess.py
+import gc
+import warnings
+
+import pytest
+from PIL import Image
+
+from nutrisnap_ai1 import preprocess
+
+def _images(tmp_path) -> dict[str, str]:
+    large, small, truncated = tmp_path / "grande.jpg", tmp_path / "pequena.png", tmp_path / "truncada.jpg"
+    Image.effect_noise((1600, 1200), 64).convert("RGB").save(large, format="JPEG", quality=95)
+    Image.new("RGB", (40, 30), (10, 20, 30)).save(small, format="PNG")
+    truncated.write_bytes(large.read_bytes()[:4000])
+    return {"reencoded": str(large), "passthrough": str(small), "truncated": str(truncated)}
+
+@pytest.mark.parametrize("case", ["reencoded", "passthrough", "truncated"])
+def test_prepare_image_closes_the_source_file(settings, tmp_path, case):
+    image_path = _images(tmp_path)[case]
+    gc.collect() # Só os avisos desta chamada contam
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", ResourceWarning)
+        prepared = preprocess.prepare_image(image_path, max_side=512, passthrough_bytes=100_000)
+        gc.collect()
+
+    assert [str(warning.message) for warning in caught if issubclass(warning.category, ResourceWarning)] == []
+    if case == "truncated":
+        assert prepared is None
+    else:
+        assert prepared.passthrough is (case == "passthrough")
+        assert max(prepared.size_after) <= 512
@@ -0,0 +1,142 @@
+# tests/test_ratelimit.py
+import asyncio
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from nutrisnap_ai1 import analysis, backends, hedging, ratelimit
+
+def _limiter(concurrency: int) -> ratelimit.RateLimiter:
+    return ratelimit.RateLimiter(1_000_000, 1_000_000_000,
+                                 concurrency=ratelimit.AdaptiveConcurrency(initial=concurrency, maximum=concurrency),
+                                 retry_policy=ratelimit.RetryPolicy(max_attempts=2, base_delay_s=0.0))
+
+def test_cancelled_async_calls_release_their_slot():
+    limiter = _limiter(2)
+
+    async def _scenario():
+        started = asyncio.Event()
+
+        async def _slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        for _ in range(2):
+            started.clear()
+            task = asyncio.ensure_future(limiter.call_async(_slow))
+            await started.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        assert limiter.concurrency.in_flight == 0
+
+        async def _fast():
+            return "ok"
+        return await asyncio.wait_for(limiter.call_async(_fast), timeout=2)
+
+    assert asyncio.run(_scenario()) == "ok"
+
+def test_base_exception_releases_sync_slot():
+    limiter = _limiter(1)
+
+    def _interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        limiter.call(_interrupted)
+    assert limiter.concurrency.in_flight == 0
+
+    result = []
+    worker = threading.Thread(target=lambda: result.append(limiter.call(lambda: "ok")))
+    worker.start()
+    worker.join(2)
+    assert result == ["ok"]
+
+def test_retry_and_success_release_slots():
+    limiter = _limiter(1)
+    attempts = []
+
+    def _flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("falha transitória")
+        return "ok"
+
+    assert limiter.call(_flaky) == "ok"
+    assert len(attempts) == 2
+    assert limiter.concurrency.in_flight == 0
+    assert limiter.stats()["retries"] == 1
+
+_RESPONSE = ('{"total_calories": 100, "identified_items": [{"item_name": "Arroz", "estimated_calories": 100, '
+             '"confidence": "Alto", "notes": ""}], "analysis_summary_notes": ""}')
+
+class SlowBackend(backends.Backend):
+    """Primeira chamada lenta (dispara a duplicata), as demais rápidas."""
+    name = "lento"
+    rate_limited = True
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _delay_s(self) -> float:
+        with self._lock:
+            self.calls += 1
+            return 0.3 if self.calls == 1 else 0.01
+
+    def generate(self, request: backends.GenerationRequest) -> backends.TextResponse:
+        time.sleep(self._delay_s())
+        return backends.TextResponse(_RESPONSE)
+
+    async def generate_async(self, request: backends.GenerationRequest) -> backends.TextResponse:
+        await asyncio.sleep(self._delay_s())
+        return backends.TextResponse(_RESPONSE)
+
+def _hedger() -> hedging.Hedger:
+    hedger = hedging.Hedger(percentile=50, min_samples=1, budget=hedging.HedgeBudget(1.0))
+    hedger.histogram.observe(0.02) # Limiar de ~20 ms desde a primeira chamada
+    return hedger
+
+def _hedged_session(limiter: ratelimit.RateLimiter) -> analysis.AnalyzerSession:
+    return analysis.AnalyzerSession(api_key="teste", model_name="modelo", limiter=limiter, preprocess_images=False,
+                                    near_duplicates=False, compact=False, admission_checks=False, hedger=_hedger())
+
+def _image(tmp_path) -> str:
+    path = str(tmp_path / "prato.jpg")
+    Image.new("RGB", (32, 32), (120, 90, 40)).save(path, format="JPEG")
+    return path
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_hedge_is_accounted_by_the_limiter(settings, tmp_path, use_async):
+    limiter, backend = _limiter(2), SlowBackend()
+    session = _hedged_session(limiter)
+
+    if use_async:
+        result = asyncio.run(session.analyze_async(_image(tmp_path), use_cache=False, backend=backend))
+    else:
+        result = session.analyze(_image(tmp_path), use_cache=False, backend=backend)
+
+    stats = limiter.stats()
+    assert result["status"] == "sucesso"
+    assert session.hedger.stats()["hedged"] == 1
+    assert (stats["attempts"], stats["extra_attempts"], stats["requests_last_minute"]) == (2, 1, 2)
+    assert limiter.concurrency.in_flight == 0
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_hedge_is_not_sent_without_a_free_slot(settings, tmp_path, use_async):
+    limiter, backend = _limiter(1), SlowBackend()
+    session = _hedged_session(limiter)
+
+    if use_async:
+        result = asyncio.run(session.analyze_async(_image(tmp_path), use_cache=False, backend=backend))
+    else:
+        result = session.analyze(_image(tmp_path), use_cache=False, backend=backend)
+
+    hedge_stats = session.hedger.stats()
+    assert result["status"] == "sucesso"
+    assert backend.calls == 1
+    assert (hedge_stats["hedged"], hedge_stats["limiter_denied"]) == (0, 1)
+    assert (limiter.stats()["attempts"], limiter.stats()["extra_denied"]) == (1, 1)
+    assert limiter.concurrency.in_flight == 0
@@ -0,0 +1,84 @@
+# tests/test_routing.py
+import json
+import threading
+
+from PIL import Image
+
+from nutrisnap_ai1 import analysis, backends, routing
+
+def _response_text(confidence: str) -> str:
+    items = [{"item_name": f"Item {index}", "estimated_calories": 100 + 50 * index, "confidence": confidence, "notes": ""}
+             for index in range(3)]
+    return json.dumps({"total_calories": sum(item["estimated_calories"] for item in items),
+                       "identified_items": items, "analysis_summary_notes": ""}, ensure_ascii=False)
+
+class ScriptedBackend(backends.Backend):
+    """Backend real do ponto de vista da sessão (usa cache e índice pHash) com confiança fixa."""
+    name = "roteirizado"
+    uses_cache = True
+
+    def __init__(self, confidence: str):
+        self.confidence = confidence
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, request: backends.GenerationRequest) -> backends.TextResponse:
+        with self._lock:
+            self.calls += 1
+        return backends.TextResponse(_response_text(self.confidence))
+
+def _session(model_name: str, compact: bool = False) -> analysis.AnalyzerSession:
+    return analysis.AnalyzerSession(api_key="teste", model_name=model_name, limiter=False, preprocess_images=False,
+                                    near_duplicates=True, compact=compact, admission_checks=False, hedger=False)
+
+def _image(tmp_path) -> str:
+    path = str(tmp_path / "prato.jpg")
+    Image.effect_noise((64, 64), 64).convert("RGB").save(path, format="JPEG")
+    return path
+
+def test_escalation_reaches_strong_model_with_cache_enabled(settings, tmp_path):
+    fast, strong = ScriptedBackend("Baixo"), ScriptedBackend("Alto")
+    router = routing.TieredRouter([routing.Tier("fast", _session("modelo-rapido"), fast),
+                                   routing.Tier("strong", _session("modelo-forte"), strong)], max_low_confidence=0.5)
+
+    result = router.analyze(_image(tmp_path))
+
+    assert (fast.calls, strong.calls) == (1, 1)
+    assert result["routing"] == {**result["routing"], "tier": "strong", "model": "modelo-forte", "escalated": True}
+    assert "near_duplicate_hit" not in result
+    assert {item["confidence"] for item in result["data"]["identified_items"]} == {"Alto"}
+    assert router.stats()["escalation_reasons"] == {"low_confidence": 1}
+
+def test_cached_escalation_reuses_each_tier_entry(settings, tmp_path):
+    fast, strong = ScriptedBackend("Baixo"), ScriptedBackend("Alto")
+    router = routing.TieredRouter([routing.Tier("fast", _session("modelo-rapido"), fast),
+                                   routing.Tier("strong", _session("modelo-forte"), strong)], max_low_confidence=0.5)
+    image_path = _image(tmp_path)
+
+    router.analyze(image_path)
+    result = router.analyze(image_path)
+
+    assert (fast.calls, strong.calls) == (1, 1)
+    assert result["routing"]["tier"] == "strong"
+    assert {item["confidence"] for item in result["data"]["identified_items"]} == {"Alto"}
+
+def test_easy_image_stays_on_fast_tier(settings, tmp_path):
+    fast, strong = ScriptedBackend("Alto"), ScriptedBackend("Alto")
+    router = routing.TieredRouter([routing.Tier("fast", _session("modelo-rapido"), fast),
+                                   routing.Tier("strong", _session("modelo-forte"), strong)], max_low_confidence=0.5)
+
+    result = router.analyze(_image(tmp_path))
+
+    assert (fast.calls, strong.calls) == (1, 0)
+    assert result["routing"]["escalated"] is False
+
+def test_near_duplicate_index_is_scoped_by_prompt(settings, tmp_path):
+    image_path = _image(tmp_path)
+    full_backend = ScriptedBackend("Alto")
+    _session("modelo").analyze(image_path, backend=full_backend)
+
+    compact_backend = ScriptedBackend("Alto")
+    result = _session("modelo", compact=True).analyze(image_path, backend=compact_backend)
+
+    assert compact_backend.calls == 1
+    assert "near_duplicate_hit" not in result
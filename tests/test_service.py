@@ -0,0 +1,130 @@
+# tests/test_service.py
+import asyncio
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from nutrisnap_ai1 import admission, analysis, backends, service
+
+def _jpeg(color: tuple[int, int, int]) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+def _service(tmp_path, latency_s: float = 0.2, admission_checks: bool = False, **limits) -> service.AnalysisService:
+    session = analysis.AnalyzerSession(api_key=None, backend=backends.MockBackend(latency_s), limiter=False,
+                                       preprocess_images=False, near_duplicates=False, compact=False,
+                                       admission_checks=admission_checks, hedger=False)
+    return service.AnalysisService(session, upload_dir=str(tmp_path / "uploads"), **limits)
+
+def test_identical_uploads_share_one_analysis(settings, tmp_path):
+    svc, content = _service(tmp_path), _jpeg((200, 80, 40))
+
+    async def _scenario():
+        return await asyncio.gather(*(svc.analyze_upload(content) for _ in range(5)))
+
+    results = asyncio.run(_scenario())
+
+    assert all(result["status"] == "sucesso (mock)" for result in results)
+    assert sum(1 for result in results if result.get("coalesced")) == 4
+    assert (svc.counters["analyses"], svc.counters["coalesced"]) == (1, 4)
+
+def test_refresh_does_not_join_a_cached_analysis(settings, tmp_path):
+    svc, content = _service(tmp_path), _jpeg((200, 80, 40))
+
+    async def _scenario():
+        return await asyncio.gather(svc.analyze_upload(content), svc.analyze_upload(content, refresh_cache=True),
+                                    svc.analyze_upload(content, use_cache=False),
+                                    svc.analyze_upload(content, use_cache=False, refresh_cache=True))
+
+    results = asyncio.run(_scenario())
+
+    assert [bool(result.get("coalesced")) for result in results] == [False, False, False, True]
+    assert svc.counters["analyses"] == 3
+
+def test_uploads_are_admitted_once(settings, tmp_path):
+    svc = _service(tmp_path, latency_s=0.0, admission_checks=True)
+    before = admission.stats()
+
+    async def _scenario():
+        return [await svc.analyze_upload(_jpeg((index * 40, 80, 40))) for index in range(3)]
+    results = asyncio.run(_scenario())
+    rejected = asyncio.run(svc.analyze_upload(b"isto nao e uma imagem"))
+
+    after = admission.stats()
+    assert all(result["status"] == "sucesso (mock)" for result in results)
+    assert rejected["status"] == "rejeitado" and svc.counters["rejected"] == 1
+    assert (after["checked"] - before["checked"], after["admitted"] - before["admitted"]) == (4, 3)
+
+def test_uploads_beyond_the_queue_are_shed(settings, tmp_path):
+    svc = _service(tmp_path, max_concurrency=1, max_queue=1)
+
+    async def _scenario():
+        return await asyncio.gather(*(svc.analyze_upload(_jpeg((index * 40, 80, 40))) for index in range(4)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(_scenario())
+
+    shed = [result for result in results if isinstance(result, service.ServiceOverloadedError)]
+    assert len(shed) == 2
+    assert all(error.status == 503 and error.headers == {"Retry-After": "1"} for error in shed)
+    assert (svc.counters["analyses"], svc.counters["shed"]) == (2, 2)
+
+async def _request(port: int, head: str, body: bytes = b"") -> tuple[int, dict]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status_line, _, payload = response.partition(b"\r\n")
+    return int(status_line.split()[1]), json.loads(payload.partition(b"\r\n\r\n")[2])
+
+def _serve(svc: service.AnalysisService, head: str, body: bytes = b"") -> tuple[int, dict]:
+    async def _scenario():
+        server = await service.start_server(svc, "127.0.0.1", 0)
+        async with server:
+            return await _request(server.sockets[0].getsockname()[1], head, body)
+    return asyncio.run(_scenario())
+
+def test_http_503_when_overloaded(settings, tmp_path):
+    svc, content = _service(tmp_path, latency_s=0.5, max_concurrency=1, max_queue=0), _jpeg((10, 200, 40))
+    head = f"POST /analyze HTTP/1.1\r\nContent-Type: image/jpeg\r\nContent-Length: {len(content)}\r\nConnection: close\r\n\r\n"
+
+    async def _scenario():
+        server = await service.start_server(svc, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            busy = asyncio.ensure_future(svc.analyze_upload(_jpeg((250, 10, 10))))
+            await asyncio.sleep(0.05)
+            response = await _request(port, head, content)
+            await busy
+            return response
+
+    status, payload = asyncio.run(_scenario())
+
+    assert status == 503
+    assert payload["status"] == "erro"
+    assert svc.counters["client_errors"] == 0
+
+@pytest.mark.parametrize("length", ["abc", "-5"])
+def test_invalid_content_length_is_a_client_error(settings, tmp_path, length):
+    svc = _service(tmp_path)
+
+    status, payload = _serve(svc, f"POST /analyze HTTP/1.1\r\nContent-Type: image/jpeg\r\nContent-Length: {length}\r\n\r\n")
+
+    assert (status, payload["error"]) == (400, "Content-Length inválido")
+    assert svc.counters["client_errors"] == 1
+
+def test_internal_errors_are_not_reported_as_bad_content_length(settings, tmp_path, monkeypatch):
+    svc = _service(tmp_path)
+
+    async def _broken(*args):
+        raise UnicodeEncodeError("latin-1", "ç", 0, 1, "caractere fora do latin-1")
+    monkeypatch.setattr(svc, "handle_request", _broken)
+
+    status, payload = _serve(svc, "GET /health HTTP/1.1\r\nConnection: close\r\n\r\n")
+
+    assert (status, payload["error"]) == (500, "Erro interno do serviço")
+    assert svc.counters["client_errors"] == 0